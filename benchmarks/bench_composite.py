@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Benchmark compositing many windows at once.
+
+Simulates windows of four panes where one pane scrolls a build log, one
+redraws a status line in place and the rest sit idle, feeds them for a
+number of frames and times parsing plus rendering, with and without
+damage tracking.
+
+    python benchmarks/bench_composite.py --windows 32 --frames 100
+"""
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import click
+
+from tvmux.cast.tracks import LayoutSnapshot, PaneGeometry
+from tvmux.composite import Compositor
+
+WIDTH, HEIGHT = 161, 49
+
+
+def quad_layout() -> LayoutSnapshot:
+    """Four equal panes with borders between them."""
+    w, h = (WIDTH - 1) // 2, (HEIGHT - 1) // 2
+    panes = [
+        PaneGeometry(pane_id=f"%{i}", index=i, left=(i % 2) * (w + 1), top=(i // 2) * (h + 1),
+                     width=w, height=h, active=i == 0)
+        for i in range(4)
+    ]
+    return LayoutSnapshot(time=0.0, layout="", width=WIDTH, height=HEIGHT, panes=panes)
+
+
+def pane_output(frame: int, lines_per_frame: int):
+    """Output for each pane during one frame."""
+    log = "".join(
+        f"\033[32m[{frame:05d}]\033[0m compiling module_{(frame * lines_per_frame + i) % 97}.c\r\n"
+        for i in range(lines_per_frame)
+    )
+    status = f"\0337\033[1;1H\033[7m load {frame % 10}.{frame % 7} mem {frame % 100}% \033[0m\0338"
+    return {"%0": log.encode(), "%1": status.encode()}
+
+
+def run(directory: Path, windows: int, frames: int, lines_per_frame: int, damage: bool) -> dict:
+    """Feed and render every window for a number of frames."""
+    compositors = [
+        Compositor(directory / f"{'damage' if damage else 'full'}-{i}.composite.cast",
+                   started=0.0, timestamp=0, damage=damage)
+        for i in range(windows)
+    ]
+    layout = quad_layout()
+    for compositor in compositors:
+        compositor.set_layout(layout)
+        compositor.render(now=0.0)
+
+    fed = 0
+    start_cpu = time.process_time()
+    start = time.perf_counter()
+    for frame in range(1, frames + 1):
+        output = pane_output(frame, lines_per_frame)
+        for compositor in compositors:
+            for pane_id, data in output.items():
+                compositor.feed(pane_id, data)
+                fed += len(data)
+            compositor.render(now=frame / 10)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - start_cpu
+
+    for compositor in compositors:
+        compositor.close()
+    written = sum(compositor.path.stat().st_size for compositor in compositors)
+
+    return {
+        "mode": "damage" if damage else "full",
+        "windows": windows,
+        "frames": frames,
+        "bytes_fed": fed,
+        "bytes_written": written,
+        "seconds": round(elapsed, 6),
+        "cpu_seconds": round(cpu, 6),
+        "ms_per_window_frame": round(cpu / (windows * frames) * 1000, 3),
+    }
+
+
+@click.command()
+@click.option("--windows", default=32, help="Windows to composite at once")
+@click.option("--frames", default=100, help="Frames to render per window")
+@click.option("--lines", "lines_per_frame", default=5, help="Log lines per frame in the busy pane")
+@click.option("--dir", "directory", type=click.Path(file_okay=False), help="Where to put the casts")
+@click.option("--skip-full", is_flag=True, help="Only time with damage tracking")
+def main(windows, frames, lines_per_frame, directory, skip_full):
+    """Compare compositing with and without damage tracking."""
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        results = [run(Path(tmp), windows, frames, lines_per_frame, damage=True)]
+        if not skip_full:
+            results.append(run(Path(tmp), windows, frames, lines_per_frame, damage=False))
+
+    click.echo(json.dumps({"benchmark": "composite", "width": WIDTH, "height": HEIGHT,
+                           "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
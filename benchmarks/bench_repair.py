@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Benchmark cast repair on large files.
+
+Builds a synthetic cast of the requested size with a truncated final event,
+then times the in-place tail repair against the full rewrite.
+
+    python benchmarks/bench_repair.py --size-gb 2 --dir /var/tmp
+"""
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import click
+
+from tvmux.repair import repair_cast_file
+
+HEADER = {"version": 2, "width": 80, "height": 24}
+
+
+def write_cast(path: Path, size: int) -> None:
+    """Write a cast of roughly `size` bytes ending in a half-written event."""
+    lines = [json.dumps([i * 0.001, "o", f"build step {i}: compiling module_{i % 97}.c\r\n"]) for i in range(10000)]
+    block = ("\n".join(lines) + "\n").encode()
+
+    with open(path, "wb") as f:
+        f.write((json.dumps(HEADER) + "\n").encode())
+        written = 0
+        while written < size:
+            f.write(block)
+            written += len(block)
+        f.write(b'[999999.0, "o", "interrupted mid-wr')
+
+
+def timed_repair(path: Path, size: int, full: bool) -> dict:
+    """Damage a fresh cast and time repairing it."""
+    write_cast(path, size)
+    os.sync()
+
+    start = time.perf_counter()
+    ok = repair_cast_file(path, backup=full, full=full)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "mode": "full" if full else "tail",
+        "ok": ok,
+        "file_bytes": path.stat().st_size,
+        "seconds": round(elapsed, 6),
+    }
+
+
+@click.command()
+@click.option("--size-gb", type=float, default=2.0, help="Size of the synthetic cast in GiB")
+@click.option("--dir", "directory", type=click.Path(file_okay=False), help="Where to put the cast")
+@click.option("--skip-full", is_flag=True, help="Only time the tail repair")
+def main(size_gb, directory, skip_full):
+    """Compare tail-only and full cast repair."""
+    size = int(size_gb * 1024 ** 3)
+
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        path = Path(tmp) / "bench.cast"
+        results = [timed_repair(path, size, full=False)]
+        if not skip_full:
+            results.append(timed_repair(path, size, full=True))
+
+    click.echo(json.dumps({"benchmark": "repair", "size_bytes": size, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
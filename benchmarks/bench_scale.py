@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""Record hundreds of windows at once and check one core keeps up.
+
+Starts a private tmux server and a tvmux server as bench_server.py does,
+with the tvmux server pinned to a single CPU. Then it opens a window per
+recording, each running a shell loop that prints a burst of numbered lines
+every interval, starts recording them all with one batch request, and
+lets them all print at once. It reports:
+
+- processes_per_recording: processes the recordings added, not counting
+  the generators' `sleep`s. Each recorded pane needs tmux's pipe-pane
+  shell and `cat`; everything else happens in the tvmux server.
+- server_threads, server_rss_mb: the tvmux server while recording
+- server_cpu_share: the tvmux server's CPU time over the wall time the
+  generators ran for, where 1.0 is all of one core
+- lag_seconds: from a generator printing its last line until that line
+  reached the cast
+- missing_lines: numbered lines that never reached a cast
+
+Prints JSON, and exits with status 1 if any output went missing.
+
+    python benchmarks/bench_scale.py --windows 200 --cpu 0
+"""
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Set
+
+import click
+
+from bench_server import CastWatcher, IsolatedServer, wait_until
+
+# Prints a burst of numbered lines every interval, once the start file exists
+GENERATOR = """\
+name=$1 bursts=$2 burst=$3 interval=$4 pad=$5
+while [ ! -e {start} ]; do sleep 0.5; done
+i=0
+while [ $i -lt $bursts ]; do
+    j=0
+    while [ $j -lt $burst ]; do
+        printf 'l%s %06d %s\\n' "$name" $((i * burst + j)) "$pad"
+        j=$((j + 1))
+    done
+    i=$((i + 1))
+    sleep "$interval"
+done
+date +%s.%N > {directory}/"$name".end
+printf 'e%sd\\n' "$name"
+exec sleep 100000
+"""
+
+
+def process_tree(root: int) -> List[int]:
+    """List a process and all its descendants."""
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    tree, pending = [], [root]
+    while pending:
+        pid = pending.pop()
+        tree.append(pid)
+        pending.extend(children.get(pid, []))
+    return tree
+
+
+def count_processes(server: IsolatedServer) -> int:
+    """Count the processes under tmux and the tvmux server, apart from `sleep`s."""
+    count = 0
+    for pid in process_tree(server.tmux_pid) + process_tree(server.server.pid):
+        try:
+            if Path(f"/proc/{pid}/comm").read_text().strip() != "sleep":
+                count += 1
+        except OSError:
+            pass
+    return count
+
+
+def cpu_seconds(pid: int) -> float:
+    """Get the CPU time a process has used, in all its threads."""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def server_status(pid: int) -> Dict[str, float]:
+    """Get a process's thread count and resident memory."""
+    status = {}
+    for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+        key, _, value = line.partition(":")
+        if key == "Threads":
+            status["server_threads"] = int(value)
+        elif key == "VmRSS":
+            status["server_rss_mb"] = round(int(value.split()[0]) / 1024, 1)
+    return status
+
+
+def open_windows(server: IsolatedServer, count: int, script: Path, bursts: int, burst: int,
+                 interval: float, line_bytes: int) -> List[dict]:
+    """Open a window running a generator for each recording."""
+    pad = "x" * max(1, line_bytes - len("lw0000 000000 \r\n"))
+    server.tmux("new-session", "-d", "-s", "scale", "-x", "120", "-y", "40")
+    windows = []
+    for index in range(count):
+        name = f"w{index:04d}"
+        window_id = server.tmux(
+            "new-window", "-d", "-t", "scale:", "-P", "-F", "#{window_id}",
+            f"sh {script} {name} {bursts} {burst} {interval} {pad}",
+        )
+        windows.append({"name": name, "window_id": window_id})
+    return windows
+
+
+def missing_lines(cast_path: Path, name: str, expected: int) -> int:
+    """Count the numbered lines a generator printed that aren't in its cast."""
+    seen = set()
+    prefix = f"l{name} "
+    with open(cast_path) as f:
+        text = "".join(event[2] for event in map(json.loads, f.readlines()[1:]) if event[1] == "o")
+    for line in text.split("\n"):
+        index = line.find(prefix)
+        if index >= 0:
+            number = line[index + len(prefix):index + len(prefix) + 6]
+            if number.isdigit():
+                seen.add(int(number))
+    return len(set(range(expected)) - seen)
+
+
+def run(server: IsolatedServer, windows: List[dict], start_file: Path, lines: int, timeout: float) -> dict:
+    """Record every window while the generators run, and measure the server."""
+    processes_before = count_processes(server)
+
+    start = time.perf_counter()
+    started = server.api("POST", "/recordings/batch", timeout=timeout, json={
+        "session_id": "scale", "window_ids": [window["window_id"] for window in windows],
+    }).json()
+    start_seconds = time.perf_counter() - start
+    by_window = {result["recording_id"].split(":", 1)[1]: result for result in started}
+    failed = [result for result in started if result["status"] != "started"]
+    if failed:
+        raise RuntimeError(f"{len(failed)} recordings failed to start, e.g. {failed[0]}")
+    for window in windows:
+        window["cast_path"] = Path(by_window[window["window_id"]]["cast_path"])
+        window["watcher"] = CastWatcher(window["cast_path"])
+
+    processes_recording = count_processes(server)
+    cpu_before = cpu_seconds(server.server.pid)
+    start = time.perf_counter()
+    start_file.touch()
+
+    pending = {window["name"]: window for window in windows}
+
+    def all_recorded() -> bool:
+        for name, window in list(pending.items()):
+            if window["watcher"].find(f"e{name}d"):
+                window["lag_seconds"] = time.time() - float(
+                    (server.directory / f"{name}.end").read_text()
+                )
+                del pending[name]
+        return not pending
+
+    try:
+        wait_until(all_recorded, timeout, interval=0.05)
+    except TimeoutError:
+        pass
+    elapsed = time.perf_counter() - start
+    cpu = cpu_seconds(server.server.pid) - cpu_before
+    status = server_status(server.server.pid)
+
+    start = time.perf_counter()
+    server.api("POST", "/recordings/stop", timeout=timeout, json={"session_id": "scale", "timeout": timeout})
+    stop_seconds = time.perf_counter() - start
+
+    lags = [window["lag_seconds"] for window in windows if "lag_seconds" in window]
+    return {
+        "recordings": len(windows),
+        "start_seconds": round(start_seconds, 3),
+        "stop_seconds": round(stop_seconds, 3),
+        "processes_per_recording": round((processes_recording - processes_before) / len(windows), 2),
+        **status,
+        "server_cpu_share": round(cpu / elapsed, 3),
+        "lag_seconds": {
+            "median": round(statistics.median(lags), 3) if lags else None,
+            "max": round(max(lags), 3) if lags else None,
+        },
+        "unfinished_windows": len(pending),
+        "missing_lines": sum(
+            missing_lines(window["cast_path"], window["name"], lines) for window in windows
+        ),
+    }
+
+
+@click.command()
+@click.option("--windows", default=200, help="Windows recorded at once")
+@click.option("--seconds", default=30, help="How long the generators print for")
+@click.option("--lines-per-second", default=5, help="Lines each generator prints a second")
+@click.option("--line-bytes", default=80, help="Length of each line")
+@click.option("--cpu", type=int, multiple=True, help="CPU to pin the tvmux server to (default: the first one)")
+@click.option("--timeout", default=300.0, help="Longest to wait for starting, recording and stopping")
+@click.option("--dir", "directory", type=click.Path(file_okay=False), help="Where to put the casts and logs")
+def main(windows, seconds, lines_per_second, line_bytes, cpu, timeout, directory):
+    """Record many windows at once with the server on one core."""
+    cpus: Set[int] = set(cpu) or {min(os.sched_getaffinity(0))}
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        work = Path(tmp)
+        start_file = work / "go"
+        script = work / "generate.sh"
+        script.write_text(GENERATOR.format(start=start_file, directory=work))
+
+        with IsolatedServer(work, cpus=cpus) as server:
+            recorded = open_windows(server, windows, script, seconds, lines_per_second, 1.0, line_bytes)
+            results = run(server, recorded, start_file, seconds * lines_per_second, timeout)
+
+    report = {
+        "benchmark": "scale",
+        "server_cpus": sorted(cpus),
+        "output_bytes_per_second": windows * lines_per_second * line_bytes,
+        "results": results,
+    }
+    click.echo(json.dumps(report, indent=2))
+    if results["missing_lines"] or results["unfinished_windows"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""Benchmark the recorder end to end against a private tmux server.
+
+Starts tmux on a socket of its own (`tmux -L`), and a tvmux server on a
+free port with its own output directory and state directory, pointed at
+that tmux. Then for each run it records a fresh two-pane window and times:
+
+- start: POST /recordings, and until the pane's output reaches the cast
+- hook: `tmux select-pane` until the server has followed it, which is the
+  after-select-pane hook's trip through the CLI and the API
+- switch: `tmux select-pane` until output the new pane printed straight
+  after it reaches the cast
+- throughput: pane output per second, from a command writing flat out
+- cast_bytes_per_output_byte: how much the cast grows per byte of output
+- stop: DELETE /recordings, including the repair on stop
+
+Prints JSON. Given a previous run's JSON, it also compares the medians and
+exits with status 1 if any got worse by more than the tolerance.
+
+    python benchmarks/bench_server.py --runs 5 > baseline.json
+    python benchmarks/bench_server.py --runs 5 --baseline baseline.json
+"""
+import json
+import os
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+import click
+import httpx
+
+# Lines written by the throughput command, 66 bytes each once the pty adds CRs
+THROUGHPUT_LINE = "0123456789abcdef" * 4
+
+# Metrics where a bigger number is better, the rest are costs
+HIGHER_IS_BETTER = {"throughput_bytes_per_second"}
+
+
+def free_port() -> int:
+    """Find a local port nothing is listening on."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until(condition, timeout: float, interval: float = 0.002):
+    """Poll until condition() returns something true, and return it."""
+    deadline = time.perf_counter() + timeout
+    while True:
+        result = condition()
+        if result:
+            return result
+        if time.perf_counter() > deadline:
+            raise TimeoutError("Timed out waiting")
+        time.sleep(interval)
+
+
+class CastWatcher:
+    """Follow a cast as it is written, looking for text in its output."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.offset = 0
+        self.partial = b""
+        self.text = ""
+
+    def find(self, needle: str) -> bool:
+        """Check whether text has shown up in the output, since the last time it was found."""
+        self._read()
+        index = self.text.find(needle)
+        if index >= 0:
+            self.text = self.text[index + len(needle):]
+            return True
+        # Only the end could hold the start of a mark still to come
+        self.text = self.text[-len(needle):]
+        return False
+
+    def _read(self) -> None:
+        """Take in any events written since last time."""
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        self.offset += len(data)
+        *lines, self.partial = (self.partial + data).split(b"\n")
+        for line in lines:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(event, list) and event[1] == "o":
+                self.text += event[2]
+
+    def wait_for(self, needle: str, timeout: float = 30.0) -> None:
+        """Wait until text shows up in the output, since the last time it was looked for."""
+        wait_until(lambda: self.find(needle), timeout)
+
+
+class IsolatedServer:
+    """A private tmux server and a tvmux server driving it."""
+
+    def __init__(self, directory: Path, settings: Optional[Dict[str, str]] = None,
+                 cpus: Optional[Set[int]] = None):
+        """Set up, without starting anything yet.
+
+        Args:
+            directory: Where the casts, config and server log go
+            settings: Config environment variables for the server, e.g.
+                {"TVMUX_RECORDING_OVERFLOW_POLICY": "block"}
+            cpus: CPUs to pin the tvmux server to, all by default
+        """
+        self.directory = directory
+        self.cpus = cpus
+        self.socket_name = f"tvmux-bench-{os.getpid()}"
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.server: Optional[subprocess.Popen] = None
+        self.tmux_pid: Optional[int] = None
+
+        config_file = directory / "tvmux.conf"
+        config_file.write_text("")
+        env = {k: v for k, v in os.environ.items() if not k.startswith(("TVMUX_", "TMUX"))}
+        env.update({
+            "USER": self.socket_name,  # Keeps the server's pid file apart from a real one
+            "TVMUX_CONFIG_FILE": str(config_file),
+            "TVMUX_SERVER_PORT": str(self.port),
+            "TVMUX_SERVER_AUTO_SHUTDOWN": "false",
+            "TVMUX_OUTPUT_DIRECTORY": str(directory / "casts"),
+            "TVMUX_LOGGING_LEVEL": "WARNING",
+        })
+        env.update(settings or {})
+        self.env = env
+
+    def tmux(self, *args: str) -> str:
+        """Run a command against the private tmux server."""
+        return subprocess.run(
+            ["tmux", "-L", self.socket_name, *args], env=self.env, capture_output=True, text=True, check=True
+        ).stdout.strip()
+
+    def tmux_background(self, *args: str) -> subprocess.Popen:
+        """Start a command against the private tmux server without waiting for it."""
+        return subprocess.Popen(["tmux", "-L", self.socket_name, *args], env=self.env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def __enter__(self) -> "IsolatedServer":
+        # Hooks run in tmux's environment, so it needs the settings too
+        self.tmux("-f", "/dev/null", "new-session", "-d", "-s", "bench", "-x", "160", "-y", "48")
+        socket_path = self.tmux("display-message", "-p", "#{socket_path}")
+        self.tmux_pid = int(self.tmux("display-message", "-p", "#{pid}"))
+        self.env["TMUX"] = f"{socket_path},{self.tmux_pid},0"  # Plain `tmux` in the server finds it
+
+        pin = (lambda: os.sched_setaffinity(0, self.cpus)) if self.cpus else None
+        with open(self.directory / "server.log", "w") as log:
+            self.server = subprocess.Popen([sys.executable, "-m", "tvmux.server.main"], env=self.env,
+                                           stdout=log, stderr=subprocess.STDOUT, start_new_session=True,
+                                           preexec_fn=pin)
+        wait_until(self._is_up, timeout=15.0, interval=0.05)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self.server is not None:
+            self.server.send_signal(signal.SIGTERM)
+            try:
+                self.server.wait(15)
+            except subprocess.TimeoutExpired:
+                self.server.kill()
+        subprocess.run(["tmux", "-L", self.socket_name, "kill-server"], env=self.env, capture_output=True)
+        shutil.rmtree(f"/tmp/tvmux-{self.socket_name}", ignore_errors=True)
+
+    def _is_up(self) -> bool:
+        """Check whether the tvmux server answers yet."""
+        if self.server.poll() is not None:
+            raise RuntimeError(f"Server exited, see {self.directory / 'server.log'}")
+        try:
+            return httpx.get(self.base_url + "/", timeout=0.5).status_code == 200
+        except httpx.HTTPError:
+            return False
+
+    def api(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Call the tvmux server."""
+        kwargs.setdefault("timeout", 60.0)
+        response = httpx.request(method, self.base_url + path, **kwargs)
+        response.raise_for_status()
+        return response
+
+
+def mark(server: IsolatedServer, pane_id: str) -> str:
+    """Have a pane print a unique mark, and return it.
+
+    The command is typed into the pane, so the mark is built by printf to
+    tell what it prints apart from what it echoes.
+    """
+    token = uuid.uuid4().hex[:12]
+    server.tmux("send-keys", "-t", pane_id, f"printf 'm%sk\\n' {token}", "Enter")
+    return f"m{token}k"
+
+
+def run_once(server: IsolatedServer, throughput_bytes: int) -> Dict[str, float]:
+    """Record a fresh window and time each step."""
+    results = {}
+    window_id = server.tmux("new-window", "-d", "-t", "bench:", "-P", "-F", "#{window_id}")
+    first = server.tmux("display-message", "-t", window_id, "-p", "#{pane_id}")
+    second = server.tmux("split-window", "-d", "-h", "-t", window_id, "-P", "-F", "#{pane_id}")
+    time.sleep(0.3)  # Let the shells start
+    recording_id = f"bench:{window_id}"
+
+    # Start
+    start = time.perf_counter()
+    recording = server.api("POST", "/recordings", json={
+        "session_id": "bench", "window_id": window_id, "active_pane": first,
+    }).json()
+    results["start_seconds"] = time.perf_counter() - start
+    watcher = CastWatcher(Path(recording["cast_path"]))
+    watcher.wait_for(mark(server, first))
+    results["start_to_output_seconds"] = time.perf_counter() - start
+
+    # Switch, following the hook
+    start = time.perf_counter()
+    selecting = server.tmux_background("select-pane", "-t", second)  # Returns once the hook has run
+    token = mark(server, second)
+    wait_until(lambda: server.api("GET", f"/recordings/{recording_id}").json()["active_pane"] == second,
+               timeout=30.0, interval=0.005)
+    results["hook_seconds"] = time.perf_counter() - start
+    watcher.wait_for(token)
+    results["switch_seconds"] = time.perf_counter() - start
+    selecting.wait()
+
+    server.tmux("select-pane", "-t", first)
+    wait_until(lambda: server.api("GET", f"/recordings/{recording_id}").json()["active_pane"] == first,
+               timeout=30.0, interval=0.005)
+    watcher.wait_for(mark(server, first))
+
+    # Throughput
+    lines = max(1, throughput_bytes // (len(THROUGHPUT_LINE) + 2))
+    output_bytes = lines * (len(THROUGHPUT_LINE) + 2)
+    cast_before = watcher.path.stat().st_size
+    start = time.perf_counter()
+    server.tmux("send-keys", "-t", first, f"yes {THROUGHPUT_LINE} | head -n {lines}", "Enter")
+    watcher.wait_for(mark(server, first), timeout=300.0)
+    elapsed = time.perf_counter() - start
+    results["throughput_bytes_per_second"] = output_bytes / elapsed
+    results["cast_bytes_per_output_byte"] = (watcher.path.stat().st_size - cast_before) / output_bytes
+
+    # Stop
+    start = time.perf_counter()
+    server.api("DELETE", f"/recordings/{recording_id}")
+    results["stop_seconds"] = time.perf_counter() - start
+
+    server.tmux("kill-window", "-t", window_id)
+    return results
+
+
+def summarise(runs: List[Dict[str, float]]) -> Dict[str, dict]:
+    """Get the min, median and max of each metric over the runs."""
+    summary = {}
+    for metric in runs[0]:
+        values = [run[metric] for run in runs]
+        summary[metric] = {
+            "min": round(min(values), 6),
+            "median": round(statistics.median(values), 6),
+            "max": round(max(values), 6),
+        }
+    return summary
+
+
+def regressions(summary: Dict[str, dict], baseline: dict, tolerance: float) -> List[str]:
+    """List metrics whose median got worse than the baseline's by more than the tolerance."""
+    worse = []
+    for metric, values in summary.items():
+        before = baseline.get("results", {}).get(metric, {}).get("median")
+        if not before:
+            continue
+        after = values["median"]
+        if metric in HIGHER_IS_BETTER:
+            got_worse = after < before * (1 - tolerance)
+        else:
+            got_worse = after > before * (1 + tolerance)
+        if got_worse:
+            worse.append(f"{metric}: {before} -> {after}")
+    return worse
+
+
+@click.command()
+@click.option("--runs", default=5, help="Windows to record, one after another")
+@click.option("--throughput-mb", default=8.0, help="Output written for the throughput test, in MiB")
+@click.option("--dir", "directory", type=click.Path(file_okay=False), help="Where to put the casts and logs")
+@click.option("--baseline", type=click.File(), help="Earlier results to compare against")
+@click.option("--tolerance", default=0.25, help="How much worse than the baseline a median can be")
+def main(runs, throughput_mb, directory, baseline, tolerance):
+    """Time recording start, switching, hooks, throughput and stop on a private tmux server."""
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        with IsolatedServer(Path(tmp)) as server:
+            tmux_version = server.tmux("-V")
+            results = [run_once(server, int(throughput_mb * 1024 ** 2)) for _ in range(runs)]
+
+    report = {"benchmark": "server", "tmux": tmux_version, "runs": runs, "results": summarise(results)}
+    click.echo(json.dumps(report, indent=2))
+
+    if baseline:
+        worse = regressions(report["results"], json.load(baseline), tolerance)
+        for line in worse:
+            click.echo(f"Regression: {line}", err=True)
+        if worse:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
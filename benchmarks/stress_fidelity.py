@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""Stress the recorder and check what it recorded against what was printed.
+
+Runs a deterministic output generator in each of a number of recorded
+windows on a private tmux server, at a set rate or flat out. Then it
+checks every cast against what its generator wrote:
+
+- bytes: totals and a hash of the output between the generator's start
+  and end lines
+- records: each line carries a sequence number, so lines that are
+  missing, repeated, out of order or garbled are counted
+- screen: the cast is replayed through a terminal emulator up to the end
+  line, and the screen compared with what tmux shows in the pane
+
+The generator turns off the pane's output processing and ends lines with
+CRLF itself, so what it writes is exactly what the pane outputs. Prints a
+JSON report and exits with status 1 if any window lost fidelity.
+
+    python benchmarks/stress_fidelity.py run --windows 4 --size 16M --rate 1M
+    python benchmarks/stress_fidelity.py run --windows 1 --size 256M --rate 0
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import termios
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List
+
+import click
+from bittty import Board
+
+from bench_server import CastWatcher, IsolatedServer, wait_until
+
+CHUNK_SIZE = 64 * 1024
+RECORD_RE = re.compile(r"(\d{10}) (.*)")
+SIZE_RE = re.compile(r"(\d+(?:\.\d+)?)([KMG]?)B?", re.IGNORECASE)
+PAYLOADS = 256
+
+
+def parse_size(text: str) -> int:
+    """Parse a byte count like 512K, 16M or 1.5G."""
+    match = SIZE_RE.fullmatch(text.strip())
+    if not match:
+        raise click.BadParameter(f"Not a size: {text}")
+    number, unit = match.groups()
+    return int(float(number) * 1024 ** " KMG".index(unit.upper() or " "))
+
+
+def payloads(seed: int, style: str) -> List[str]:
+    """Build the pool of line bodies a generator picks from."""
+    rng = random.Random(seed)
+    alphabet = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 .,:;-_=+*/()[]{}"
+    pool = []
+    for i in range(PAYLOADS):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(10, 120)))
+        if style == "ansi":
+            text = f"\033[{31 + i % 7}m{text[:20]}\033[0m{text[20:]}"
+        pool.append(text)
+    return pool
+
+
+def record(number: int, pool: List[str]) -> str:
+    """Get line `number` of a generator's output."""
+    return f"{number:010d} {pool[(number * 7919) % len(pool)]}\r\n"
+
+
+@click.group()
+def cli():
+    """Stress harness for the recorder."""
+
+
+@cli.command()
+@click.option("--size", default="16M", help="Bytes to write")
+@click.option("--rate", default="1M", help="Bytes a second, 0 for flat out")
+@click.option("--seed", default=0, help="Picks the lines written")
+@click.option("--style", type=click.Choice(["plain", "ansi"]), default="plain")
+@click.option("--name", required=True, help="Goes on the start and end lines")
+@click.option("--start-file", type=click.Path(), required=True, help="Wait for this to exist before writing")
+@click.option("--report", type=click.Path(), required=True, help="Where to write what was written")
+def generate(size, rate, seed, style, name, start_file, report):
+    """Write numbered lines to the terminal, then wait to be killed."""
+    attributes = termios.tcgetattr(1)
+    attributes[1] &= ~termios.OPOST  # What's written is what the pane outputs
+    termios.tcsetattr(1, termios.TCSANOW, attributes)
+
+    size, rate = parse_size(size), parse_size(rate)
+    pool = payloads(seed, style)
+    while not os.path.exists(start_file):
+        time.sleep(0.01)
+
+    out = sys.stdout.buffer
+    out.write(f"GEN-START {name}\r\n".encode())
+    out.flush()
+    digest = hashlib.sha256()
+    written = records = 0
+    start = time.perf_counter()
+    while written < size:
+        lines = []
+        length = 0
+        while length < CHUNK_SIZE and written + length < size:
+            line = record(records, pool)
+            lines.append(line)
+            length += len(line)
+            records += 1
+        chunk = "".join(lines).encode()
+        out.write(chunk)
+        out.flush()
+        digest.update(chunk)
+        written += len(chunk)
+        if rate:
+            ahead = start + written / rate - time.perf_counter()
+            if ahead > 0:
+                time.sleep(ahead)
+    seconds = time.perf_counter() - start
+    out.write(f"GEN-END {name}\r\n".encode())
+    out.flush()
+
+    Path(report).write_text(json.dumps({
+        "bytes": written, "records": records, "sha256": digest.hexdigest(), "seconds": seconds,
+    }))
+    while True:
+        time.sleep(3600)
+
+
+def cast_output(path: Path) -> str:
+    """Get all of a cast's output, as played."""
+    parts = []
+    with open(path, encoding="utf-8", errors="replace") as f:
+        next(f)  # Header
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if event[1] == "o":
+                parts.append(event[2])
+    return "".join(parts)
+
+
+def check_records(text: str, expected: int, pool: List[str]) -> Dict[str, int]:
+    """Count records missing, repeated, out of order or garbled."""
+    seen = set()
+    duplicated = reordered = garbled = 0
+    last = -1
+    for line in text.split("\r\n"):
+        if not line:
+            continue
+        match = RECORD_RE.fullmatch(line)
+        number = int(match.group(1)) if match else -1
+        if not match or number >= expected or record(number, pool) != line + "\r\n":
+            garbled += 1
+            continue
+        if number in seen:
+            duplicated += 1
+        elif number < last:
+            reordered += 1
+        seen.add(number)
+        last = number
+    return {
+        "missing_records": expected - len(seen),
+        "duplicated_records": duplicated,
+        "reordered_records": reordered,
+        "garbled_lines": garbled,
+    }
+
+
+def screen_text(lines: str) -> List[str]:
+    """Normalise screen text for comparing: no trailing spaces or blank lines."""
+    rows = [row.rstrip() for row in lines.split("\n")]
+    while rows and not rows[-1]:
+        rows.pop()
+    return rows
+
+
+def check_screen(output: str, end_text: str, width: int, height: int, expected: str) -> Dict[str, object]:
+    """Replay output to the end of the line with `end_text` and compare the screen with the pane's."""
+    board = Board(width=width, height=height)
+    end = output.find("\n", output.find(end_text))
+    board.parser.feed(output[:end + 1] if end >= 0 else output)
+    replayed, shown = screen_text(board.capture_text()), screen_text(expected)
+    mismatched = [
+        row for row in range(max(len(replayed), len(shown)))
+        if (replayed[row] if row < len(replayed) else "") != (shown[row] if row < len(shown) else "")
+    ]
+    result = {"screen_match": not mismatched, "mismatched_rows": len(mismatched)}
+    if mismatched:
+        row = mismatched[0]
+        result["first_mismatch"] = {
+            "row": row,
+            "replayed": replayed[row] if row < len(replayed) else "",
+            "pane": shown[row] if row < len(shown) else "",
+        }
+    return result
+
+
+def check_window(window: dict, seed: int, style: str) -> Dict[str, object]:
+    """Compare one window's cast with what its generator wrote."""
+    emitted = json.loads(window["report"].read_text())
+    output = cast_output(window["cast_path"])
+    start_line, end_line = f"GEN-START {window['name']}\r\n", f"GEN-END {window['name']}\r\n"
+
+    start, end = output.find(start_line), output.find(end_line)
+    if start < 0 or end < 0:
+        recorded = ""
+    else:
+        recorded = output[start + len(start_line):end]
+    recorded_bytes = recorded.encode("utf-8", errors="replace")
+
+    result = {
+        "window_id": window["window_id"],
+        "emitted_bytes": emitted["bytes"],
+        "recorded_bytes": len(recorded_bytes),
+        "missing_bytes": max(0, emitted["bytes"] - len(recorded_bytes)),
+        "hash_match": hashlib.sha256(recorded_bytes).hexdigest() == emitted["sha256"],
+        "found_start": start >= 0,
+        "found_end": end >= 0,
+        "generator_bytes_per_second": round(emitted["bytes"] / max(emitted["seconds"], 1e-9)),
+        "drain_seconds": round(window["drain_seconds"], 6),
+        "relay": window["stats"],
+    }
+    result.update(check_records(recorded, emitted["records"], payloads(seed, style)))
+    result.update(check_screen(output, end_line.rstrip(), window["width"], window["height"], window["screen"]))
+    result["ok"] = (
+        result["hash_match"] and result["screen_match"] and result["found_start"] and result["found_end"]
+        and not any(result[key] for key in ("missing_records", "duplicated_records",
+                                            "reordered_records", "garbled_lines"))
+    )
+    return result
+
+
+@cli.command()
+@click.option("--windows", default=4, help="Windows recorded at once, each with a generator")
+@click.option("--size", default="16M", help="Bytes each generator writes")
+@click.option("--rate", default="1M", help="Bytes a second each generator writes, 0 for flat out")
+@click.option("--style", type=click.Choice(["plain", "ansi"]), default="plain", help="Plain lines or with colours")
+@click.option("--seed", default=0, help="Picks the lines written")
+@click.option("--overflow-policy", type=click.Choice(["resync", "drop", "block"]),
+              help="Overrides recording.overflow_policy")
+@click.option("--timeout", default=600.0, help="Longest to wait for the output to be recorded")
+@click.option("--dir", "directory", type=click.Path(file_okay=False), help="Where to put the casts and logs")
+@click.option("--keep", is_flag=True, help="Keep the casts, in --dir")
+def run(windows, size, rate, style, seed, overflow_policy, timeout, directory, keep):
+    """Record generators flat out or at a rate, and check the casts."""
+    settings = {}
+    if overflow_policy:
+        settings["TVMUX_RECORDING_OVERFLOW_POLICY"] = overflow_policy
+
+    tmp = Path(tempfile.mkdtemp(dir=directory)) if keep else None
+    with tempfile.TemporaryDirectory(dir=directory) as scratch:
+        work = tmp or Path(scratch)
+        start_file = work / "go"
+        with IsolatedServer(work, settings) as server:
+            recorded = record_windows(server, windows, size, rate, style, seed, start_file, timeout)
+        results = [check_window(window, seed, style) for window in recorded]
+
+    report = {
+        "benchmark": "stress_fidelity",
+        "windows": windows,
+        "size_bytes": parse_size(size),
+        "rate_bytes_per_second": parse_size(rate),
+        "style": style,
+        "overflow_policy": overflow_policy,
+        "ok": all(result["ok"] for result in results),
+        "results": results,
+    }
+    if tmp:
+        report["directory"] = str(tmp)
+    click.echo(json.dumps(report, indent=2))
+    if not report["ok"]:
+        sys.exit(1)
+
+
+def record_windows(server: IsolatedServer, count: int, size: str, rate: str, style: str, seed: int,
+                   start_file: Path, timeout: float) -> List[dict]:
+    """Record generators in windows of their own, and gather what's needed to check them."""
+    windows = []
+    for i in range(count):
+        name = uuid.uuid4().hex[:12]
+        report = server.directory / f"{name}.json"
+        command = " ".join([
+            sys.executable, str(Path(__file__).resolve()), "generate", "--size", size, "--rate", rate,
+            "--seed", str(seed), "--style", style, "--name", name,
+            "--start-file", str(start_file), "--report", str(report),
+        ])
+        window_id, pane_id, width, height = server.tmux(
+            "new-window", "-d", "-t", "bench:", "-P", "-F", "#{window_id} #{pane_id} #{pane_width} #{pane_height}",
+            command,
+        ).split()
+        windows.append({"name": name, "report": report, "window_id": window_id, "pane_id": pane_id,
+                        "width": int(width), "height": int(height)})
+
+    for window in windows:
+        recording = server.api("POST", "/recordings", json={
+            "session_id": "bench", "window_id": window["window_id"], "active_pane": window["pane_id"],
+        }).json()
+        window["recording_id"] = recording["id"]
+        window["cast_path"] = Path(recording["cast_path"])
+        window["watcher"] = CastWatcher(window["cast_path"])
+
+    start_file.touch()
+    for window in windows:
+        wait_until(window["report"].exists, timeout, interval=0.05)
+        finished = time.perf_counter()
+        window["watcher"].wait_for(f"GEN-END {window['name']}", timeout)
+        window["drain_seconds"] = time.perf_counter() - finished
+
+    for window in windows:
+        window["screen"] = server.tmux("capture-pane", "-p", "-t", window["pane_id"])
+        window["stats"] = server.api("GET", f"/recordings/{window['recording_id']}/stats").json()
+        server.api("DELETE", f"/recordings/{window['recording_id']}")
+        server.tmux("kill-window", "-t", window["window_id"])
+        del window["watcher"]
+    return windows
+
+
+if __name__ == "__main__":
+    cli()
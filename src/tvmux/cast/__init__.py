@@ -0,0 +1,29 @@
+"""Cast file formats and tools."""
+
+from .binary import BinaryCast, BinaryCastWriter, is_binary
+from .convert import convert_cast
+from .compress import CompressedCastWriter, compress_cast, is_compressed, open_cast, repair_compressed_cast
+from .idle import IdleMap, compress_idle, idle_path, load_idle_map
+from .index import CastIndex, index_path, load_index, read_index, update_index, iter_events
+
+__all__ = [
+    "CastIndex",
+    "index_path",
+    "load_index",
+    "read_index",
+    "update_index",
+    "iter_events",
+    "BinaryCast",
+    "BinaryCastWriter",
+    "is_binary",
+    "convert_cast",
+    "CompressedCastWriter",
+    "compress_cast",
+    "is_compressed",
+    "open_cast",
+    "repair_compressed_cast",
+    "IdleMap",
+    "compress_idle",
+    "idle_path",
+    "load_idle_map",
+]
@@ -0,0 +1,430 @@
+"""Compact binary casts, which load without parsing JSON.
+
+A binary cast, ``<name>.tvcast``, holds the same events as an asciicast
+v2 cast, packed into blocks. Each block header carries the times of its
+first and last events, so readers memory map the file and hop from block
+header to block header to find the duration, the event count and where
+any time is, and only decode the blocks they need. Blocks are only ever
+appended, so a cast can be read while it is still being written.
+
+Layout (little endian):
+
+    header   magic "TVMUXCST", version u32, header_size u32, then the
+             asciicast v2 header as JSON
+    blocks   repeated block header (size u32, event_count u32, first_time u64,
+             last_time u64, crc32 u32), then its events:
+
+    event    time varint, microseconds since the event before, or since
+             first_time for the first event of a block
+             kind u8, e.g. "o"
+             size varint, then the data as UTF-8
+
+Times in block headers are microseconds since the start of the cast.
+"""
+import bisect
+import io
+import json
+import logging
+import mmap
+import struct
+import time
+import zlib
+from json.encoder import encode_basestring
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from .writer import CastWriter, WriteMeter, dumps
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"TVMUXCST"
+VERSION = 1
+HEADER = struct.Struct("<8sII")
+BLOCK = struct.Struct("<IIQQI")
+
+BINARY_SUFFIX = ".tvcast"
+
+DEFAULT_BLOCK_SIZE = 64 * 1024
+
+# Longest a block is held open by flush(), in seconds, so casts that get
+# a little output at a time aren't made of tiny blocks
+BLOCK_AGE = 1.0
+
+
+class Block(NamedTuple):
+    """One block of a binary cast."""
+    offset: int  # Where its block header starts
+    size: int  # Size of its events
+    event_count: int
+    first_us: int  # Time of its first event, in microseconds since the start of the cast
+    last_us: int  # Time of its last event
+    crc: int  # CRC32 of its events
+
+    @property
+    def end(self) -> int:
+        """Where the next block starts."""
+        return self.offset + BLOCK.size + self.size
+
+
+def is_binary(cast_path: Path) -> bool:
+    """Check whether a cast path refers to a binary cast."""
+    return cast_path.name.endswith(BINARY_SUFFIX)
+
+
+def _varint(value: int) -> bytes:
+    """Encode an unsigned integer seven bits at a time, low bits first."""
+    out = bytearray()
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    """Decode an unsigned integer, returning it and the position after it."""
+    byte = data[pos]
+    if byte < 0x80:
+        return byte, pos + 1
+    value, shift = byte & 0x7F, 7
+    while True:
+        pos += 1
+        byte = data[pos]
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos + 1
+        shift += 7
+
+
+def write_header(f: BinaryIO, header: Dict[str, Any]) -> int:
+    """Start a binary cast with its asciicast v2 header.
+
+    Returns:
+        Number of bytes written
+    """
+    data = dumps(header).encode("utf-8")
+    f.write(HEADER.pack(MAGIC, VERSION, len(data)) + data)
+    return HEADER.size + len(data)
+
+
+class BlockWriter:
+    """Packs events into blocks and appends them to a binary cast."""
+
+    def __init__(self, f: BinaryIO, block_size: int = DEFAULT_BLOCK_SIZE):
+        self.file = f
+        self.block_size = block_size
+        self.events = bytearray()
+        self.event_count = 0
+        self.first_us = 0
+        self.last_us = 0
+        self.opened = 0.0  # time.monotonic() the pending block got its first event
+
+    @property
+    def full(self) -> bool:
+        """Whether the pending block is big enough to write out."""
+        return len(self.events) >= self.block_size
+
+    def add(self, time_us: int, kind: str, data: str) -> None:
+        """Add an event to the pending block.
+
+        Args:
+            time_us: Microseconds since the start of the cast, moved up to
+                the last event's time if it is earlier
+
+        Raises:
+            ValueError: If the kind isn't a single ASCII character
+        """
+        code = kind.encode("ascii")
+        if len(code) != 1:
+            raise ValueError(f"Can't store event kind {kind!r}")
+
+        time_us = max(time_us, self.last_us)
+        if not self.event_count:
+            self.first_us = self.last_us = time_us
+            self.opened = time.monotonic()
+        payload = data.encode("utf-8")
+        self.events += _varint(time_us - self.last_us) + code + _varint(len(payload)) + payload
+        self.event_count += 1
+        self.last_us = time_us
+
+    def write(self) -> int:
+        """Write out the pending block, if it has any events.
+
+        Returns:
+            Number of bytes written
+        """
+        if not self.event_count:
+            return 0
+        events = bytes(self.events)
+        self.file.write(BLOCK.pack(len(events), self.event_count, self.first_us, self.last_us,
+                                   zlib.crc32(events)) + events)
+        self.events = bytearray()
+        self.event_count = 0
+        return BLOCK.size + len(events)
+
+
+class BinaryCastWriter(CastWriter):
+    """Writes a binary cast from output as it arrives.
+
+    Output is handled as by CastWriter, but events are packed into blocks.
+    A buffered writer's flush() only writes the pending block once it is
+    BLOCK_AGE old, so readers following the file see events up to a second
+    late, and close() writes whatever is left.
+    """
+
+    def __init__(self, path: Path, width: int, height: int, started: Optional[float] = None,
+                 timestamp: Optional[int] = None, title: Optional[str] = None, buffered: bool = False,
+                 meter: Optional[WriteMeter] = None, block_size: int = DEFAULT_BLOCK_SIZE,
+                 idle_time_limit: float = 0.0):
+        """Create the cast and write its header.
+
+        Args:
+            block_size: Size of events a block is written out at
+        """
+        self.block_size = block_size
+        super().__init__(path, width, height, started, timestamp, title, buffered, meter,
+                         idle_time_limit=idle_time_limit)
+
+    def event(self, kind: str, data: str, at: Optional[float] = None) -> None:
+        """Write an event of any kind."""
+        self.blocks.add(round(self._elapsed(at) * 1_000_000), kind, data)
+        self.events += 1
+        self.clock = self.blocks.last_us / 1_000_000
+        if self.blocks.full or not self.buffered:
+            self._write_block()
+        if not self.buffered:
+            self.file.flush()
+
+    @property
+    def holding(self) -> bool:
+        """Whether flush() left events to write on a later flush()."""
+        return bool(self.blocks.event_count)
+
+    def flush(self) -> None:
+        """Write out the pending block if it's old enough, or always if the writer isn't buffered."""
+        if not self.buffered or time.monotonic() - self.blocks.opened >= BLOCK_AGE:
+            self._write_block()
+        self.file.flush()
+
+    def close(self) -> None:
+        """Write any partial character and the pending block, and close the file."""
+        self.buffered = False  # So flush() writes the last block whatever its age
+        super().close()
+
+    def _write_header(self, header: Dict[str, Any]) -> None:
+        self.blocks = BlockWriter(self.file, self.block_size)
+        self._count(write_header(self.file, header), 0)
+
+    def _write_block(self) -> None:
+        events = self.blocks.event_count
+        self._count(self.blocks.write(), events)
+
+    def _count(self, size: int, events: int) -> None:
+        """Count bytes written, and the events they held."""
+        self.bytes_written += size
+        if self.meter is not None and size:
+            self.meter.add(size, events)
+
+
+def scan_blocks(data: bytes, start: int, verify: bool = False) -> Tuple[List[Block], int]:
+    """Walk the block headers from `start`.
+
+    Args:
+        data: The whole cast, usually memory mapped
+        start: Offset of the first block
+        verify: Check each block's CRC too, which reads every event
+
+    Returns:
+        The complete blocks, and the offset where the last one ends
+    """
+    blocks = []
+    pos = start
+    while pos + BLOCK.size <= len(data):
+        size, event_count, first_us, last_us, crc = BLOCK.unpack_from(data, pos)
+        end = pos + BLOCK.size + size
+        if end > len(data) or not event_count or last_us < first_us:
+            break  # Still being written, or damaged
+        if verify and zlib.crc32(data[pos + BLOCK.size:end]) != crc:
+            break
+        blocks.append(Block(pos, size, event_count, first_us, last_us, crc))
+        pos = end
+    return blocks, pos
+
+
+class BinaryCast:
+    """A binary cast, memory mapped for reading.
+
+    Only the header and block headers are read on opening; events are
+    decoded a block at a time as they are asked for.
+    """
+
+    def __init__(self, path: Path, verify: bool = False):
+        """
+        Args:
+            path: The cast to read
+            verify: Check every block's CRC on opening, and stop at the first bad one
+
+        Raises:
+            OSError: If the cast can't be read
+            ValueError: If it isn't a binary cast
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            size = f.seek(0, 2)
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+        try:
+            magic, version, header_size = HEADER.unpack_from(self.data)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} isn't a tvmux binary cast")
+            self.header_end = HEADER.size + header_size
+            if self.header_end > len(self.data):
+                raise ValueError(f"Header of {path} is cut off")
+            self.header: Dict[str, Any] = json.loads(self.data[HEADER.size:self.header_end])
+        except (struct.error, ValueError):
+            self.close()
+            raise ValueError(f"Can't read {path} as a binary cast")
+
+        self.blocks, self.end = scan_blocks(self.data, self.header_end, verify)
+
+    def __enter__(self) -> "BinaryCast":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Unmap the cast."""
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    @property
+    def event_count(self) -> int:
+        """Number of events in complete blocks."""
+        return sum(block.event_count for block in self.blocks)
+
+    @property
+    def duration(self) -> float:
+        """Time of the last event."""
+        return self.blocks[-1].last_us / 1_000_000 if self.blocks else 0.0
+
+    def block_events(self, block: Block) -> Iterator[list]:
+        """Decode one block's events as [time, kind, data] lists.
+
+        Raises:
+            ValueError: If the block's CRC doesn't match
+        """
+        events = self.data[block.offset + BLOCK.size:block.end]
+        if zlib.crc32(events) != block.crc:
+            raise ValueError(f"Block at {block.offset} of {self.path} is damaged")
+
+        time_us = block.first_us
+        pos = 0
+        end = len(events)
+        while pos < end:
+            # Most times and sizes fit in one byte, so skip the call for those
+            delta = events[pos]
+            if delta < 0x80:
+                pos += 1
+            else:
+                delta, pos = _read_varint(events, pos)
+            time_us += delta
+            kind = chr(events[pos])
+            size = events[pos + 1]
+            if size < 0x80:
+                pos += 2
+            else:
+                size, pos = _read_varint(events, pos + 1)
+            yield [time_us / 1_000_000, kind, events[pos:pos + size].decode("utf-8", errors="replace")]
+            pos += size
+
+    def events(self, start: float = 0.0, end: Optional[float] = None) -> Iterator[list]:
+        """Iterate over events between two times, decoding only the blocks needed."""
+        first = bisect.bisect_left([block.last_us for block in self.blocks], round(start * 1_000_000))
+
+        for block in self.blocks[first:]:
+            if end is not None and block.first_us / 1_000_000 > end:
+                return
+            try:
+                for event in self.block_events(block):
+                    if event[0] < start:
+                        continue
+                    if end is not None and event[0] > end:
+                        return
+                    yield event
+            except ValueError as e:
+                logger.warning(f"Skipping block: {e}")
+
+
+class AsciicastStream(io.RawIOBase):
+    """A binary cast read as asciicast v2 lines, converted a block at a time as they're read."""
+
+    def __init__(self, path: Path):
+        self.cast = BinaryCast(path)
+        self.chunks = self._chunks()
+        self.pending = b""
+        self.position = 0  # How much of pending has been read
+
+    def _chunks(self) -> Iterator[bytes]:
+        yield (dumps(self.cast.header) + "\n").encode("utf-8")
+        for block in self.cast.blocks:
+            try:
+                events = list(self.cast.block_events(block))
+            except ValueError as e:
+                logger.warning(f"Skipping block: {e}")
+                continue
+            # Formatted by hand as json.dumps() would, which takes most of the time otherwise
+            yield "".join(f"[{time!r}, {encode_basestring(kind)}, {encode_basestring(data)}]\n"
+                          for time, kind, data in events).encode("utf-8")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while self.position == len(self.pending):
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return 0
+            self.pending, self.position = chunk, 0
+        size = min(len(buffer), len(self.pending) - self.position)
+        buffer[:size] = self.pending[self.position:self.position + size]
+        self.position += size
+        return size
+
+    def close(self) -> None:
+        if not self.closed:
+            self.cast.close()
+        super().close()
+
+
+def open_binary_cast(cast_path: Path) -> BinaryIO:
+    """Open a binary cast for reading as asciicast v2 bytes."""
+    return io.BufferedReader(AsciicastStream(cast_path))
+
+
+def validate_binary_cast(cast_path: Path) -> bool:
+    """Check a binary cast's header, and that every block is complete and intact."""
+    try:
+        with BinaryCast(cast_path, verify=True) as cast:
+            return cast.end == len(cast.data)
+    except (OSError, ValueError):
+        return False
+
+
+def repair_binary_cast(cast_path: Path) -> bool:
+    """Cut a binary cast off after its last intact block.
+
+    Returns:
+        True if the cast is usable, False if its header can't be read
+    """
+    try:
+        with BinaryCast(cast_path, verify=True) as cast:
+            good_end, size = cast.end, len(cast.data)
+        if good_end < size:
+            logger.info(f"Truncating {size - good_end} damaged bytes from {cast_path}")
+            with open(cast_path, "r+b") as f:
+                f.truncate(good_end)
+        return True
+    except (OSError, ValueError) as e:
+        logger.error(f"Failed to repair {cast_path}: {e}")
+        return False
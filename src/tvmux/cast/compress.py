@@ -0,0 +1,474 @@
+"""Compressed cast files made of independently decodable frames.
+
+A compressed cast is a multi-member gzip file, ``<name>.cast.gz``. Each
+member holds whole lines of the original cast, so any gzip reader (and the
+TUI player) sees an ordinary cast, while tvmux can jump straight to one
+member and decompress only that.
+
+The frame table lives next to it as ``<name>.cast.gz.frames``:
+
+    header   magic "TVMUXFRM", version u32, event_count u64, last_time f64
+    entries  repeated (offset u64, uncompressed_offset u64, first_time f64)
+
+Times are seconds since the start of the cast, whatever its asciicast
+version.
+
+The server writes compressed casts as it records them, a frame at a time,
+and adds each frame to the table once it is written, so the table only
+ever lists whole frames. Plain casts can be compressed afterwards too.
+"""
+import bisect
+import gzip
+import itertools
+import json
+import logging
+import struct
+import time
+import zlib
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, NamedTuple, Optional
+
+from .binary import is_binary, open_binary_cast
+from .events import EventClock, cast_version, event_time
+from .writer import CastWriter, WriteMeter, dumps
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"TVMUXFRM"
+VERSION = 1
+HEADER = struct.Struct("<8sIQd")
+ENTRY = struct.Struct("<QQd")
+
+DEFAULT_FRAME_SIZE = 1024 * 1024
+DEFAULT_LEVEL = 6
+
+# Read size when scanning members
+CHUNK_SIZE = 1024 * 1024
+
+# Longest a frame is held open by flush(), in seconds. Frames are compressed
+# on their own, so short ones compress worse, but readers following a cast
+# only see output once its frame is written.
+FRAME_AGE = 5.0
+
+
+class Frame(NamedTuple):
+    """One gzip member of a compressed cast."""
+    offset: int  # Where the member starts in the compressed file
+    uncompressed_offset: int  # Where its first line starts in the plain cast
+    first_time: float  # Time of its first event since the start of the cast, or of the last one before it if it has none
+
+
+class FrameTable(NamedTuple):
+    """All frames of a compressed cast, plus totals."""
+    frames: List[Frame]
+    event_count: int
+    last_time: float
+
+    def frame_for(self, time: float) -> int:
+        """Get the index of the frame to start reading from for `time`.
+
+        Events at `time` itself may end the frame before the first one
+        starting then, so reading starts from that one.
+        """
+        times = [frame.first_time for frame in self.frames]
+        return max(bisect.bisect_left(times, time) - 1, 0)
+
+
+def is_compressed(cast_path: Path) -> bool:
+    """Check whether a cast path refers to a compressed cast."""
+    return cast_path.name.endswith(".gz")
+
+
+def frames_path(cast_path: Path) -> Path:
+    """Get the frame table path for a compressed cast."""
+    return cast_path.with_name(cast_path.name + ".frames")
+
+
+def open_cast(cast_path: Path) -> BinaryIO:
+    """Open a plain, compressed or binary cast for reading as plain asciicast bytes.
+
+    Binary casts read as asciicast v2, converted as they are read, so they can't seek.
+    """
+    if is_compressed(cast_path):
+        return gzip.open(cast_path, "rb")
+    if is_binary(cast_path):
+        return open_binary_cast(cast_path)
+    return open(cast_path, "rb")
+
+
+def _write_frame_table(cast_path: Path, table: FrameTable) -> None:
+    """Save a frame table next to its compressed cast."""
+    with open(frames_path(cast_path), "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, table.event_count, table.last_time))
+        f.write(b"".join(ENTRY.pack(*frame) for frame in table.frames))
+
+
+def load_frame_table(cast_path: Path) -> Optional[FrameTable]:
+    """Load the frame table for a compressed cast, if present and readable."""
+    try:
+        data = frames_path(cast_path).read_bytes()
+        magic, version, event_count, last_time = HEADER.unpack_from(data)
+    except (OSError, struct.error):
+        return None
+
+    if magic != MAGIC or version != VERSION:
+        return None
+
+    body = data[HEADER.size:]
+    usable = len(body) - len(body) % ENTRY.size
+    frames = [Frame(*entry) for entry in ENTRY.iter_unpack(body[:usable])]
+    return FrameTable(frames, event_count, last_time)
+
+
+class CompressedCastWriter(CastWriter):
+    """Writes a compressed cast, and its frame table, from output as it arrives.
+
+    Output is handled as by CastWriter, but lines are gathered into a frame,
+    which is written as one gzip member once it reaches the frame size.
+    flush() only writes the pending frame once it is FRAME_AGE old, and an
+    unbuffered writer checks that as each event is written, rather than
+    making every event a frame of its own. The header is a frame of its
+    own, written straight away, and close() writes whatever is left.
+    """
+
+    def __init__(self, path: Path, width: int, height: int, started: Optional[float] = None,
+                 timestamp: Optional[int] = None, title: Optional[str] = None, buffered: bool = False,
+                 meter: Optional[WriteMeter] = None, version: int = 2, idle_time_limit: float = 0.0,
+                 frame_size: int = DEFAULT_FRAME_SIZE, level: int = DEFAULT_LEVEL):
+        """Create the cast and its frame table, and write the header.
+
+        Args:
+            frame_size: Uncompressed size of lines a frame is written out at
+            level: gzip compression level
+        """
+        self.frame_size = frame_size
+        self.level = level
+        self.frame = bytearray()  # Lines of the pending frame
+        self.frame_events = 0
+        self.frame_time: Optional[float] = None  # Time of the pending frame's first event
+        self.frame_opened = time.monotonic()
+        self.uncompressed_offset = 0  # Where the pending frame starts in the plain cast
+        self.last_time = 0.0  # Time of the last event, since the start of the cast
+        super().__init__(path, width, height, started, timestamp, title, buffered, meter,
+                         version=version, idle_time_limit=idle_time_limit)
+        self.table = open(frames_path(path), "wb")
+        self.table.write(HEADER.pack(MAGIC, VERSION, 0, 0.0))
+        self._write_frame()
+
+    @property
+    def holding(self) -> bool:
+        """Whether flush() left events to write on a later flush()."""
+        return bool(self.frame)
+
+    def flush(self) -> None:
+        """Write out the pending frame if it's old enough, or always if the writer isn't buffered."""
+        if not self.buffered or time.monotonic() - self.frame_opened >= FRAME_AGE:
+            self._write_frame()
+
+    def close(self) -> None:
+        """Write any partial character and the pending frame, and close the cast and its table."""
+        self.buffered = False  # So flush() writes the last frame whatever its age
+        super().close()
+        self.table.close()
+
+    def _write_header(self, header: Dict[str, Any]) -> None:
+        # Written as a frame of its own once the table is open
+        self.frame += (dumps(header) + "\n").encode("utf-8")
+
+    def _write_line(self, value: Any, event: bool = True) -> None:
+        line = (dumps(value) + "\n").encode("utf-8")
+        if not self.frame:
+            self.frame_opened = time.monotonic()
+        self.frame += line
+        if event:
+            self.events += 1
+            self.frame_events += 1
+            self.last_time = self.clock
+            if self.frame_time is None:
+                self.frame_time = self.clock
+        if len(self.frame) >= self.frame_size:
+            self._write_frame()
+        elif event and not self.buffered and time.monotonic() - self.frame_opened >= FRAME_AGE:
+            self._write_frame()
+
+    def _write_frame(self) -> None:
+        """Write the pending lines as a frame, then add it to the frame table."""
+        if not self.frame:
+            return
+        # Frames without events take the time of the last one before them
+        frame = Frame(self.file.tell(), self.uncompressed_offset,
+                      self.frame_time if self.frame_time is not None else self.last_time)
+        data = gzip.compress(bytes(self.frame), compresslevel=self.level, mtime=0)
+        self.file.write(data)
+        self.file.flush()
+
+        # The entry goes in before the totals, so the table never lists a frame that isn't there
+        self.table.seek(0, 2)
+        self.table.write(ENTRY.pack(*frame))
+        self.table.seek(0)
+        self.table.write(HEADER.pack(MAGIC, VERSION, self.events, self.last_time))
+        self.table.flush()
+
+        self.bytes_written += len(data)
+        if self.meter is not None:
+            self.meter.add(len(data), self.frame_events)
+        self.uncompressed_offset += len(self.frame)
+        self.frame = bytearray()
+        self.frame_events = 0
+        self.frame_time = None
+
+
+def compress_cast(cast_path: Path, frame_size: int = DEFAULT_FRAME_SIZE,
+                  level: int = DEFAULT_LEVEL, remove: bool = True) -> Optional[Path]:
+    """Compress a plain cast into framed gzip, streaming.
+
+    This reads the whole cast again, so it is for casts written plain,
+    once they are finished; the server writes compressed casts with
+    CompressedCastWriter as it records them.
+
+    Args:
+        cast_path: Plain cast to compress
+        frame_size: Target uncompressed size of each frame
+        level: gzip compression level
+        remove: Delete the plain cast (and its seek index) afterwards
+
+    Returns:
+        Path of the compressed cast, or None on failure
+    """
+    gz_path = cast_path.with_name(cast_path.name + ".gz")
+    temp_path = gz_path.with_name(gz_path.name + ".tmp")
+
+    frames = []
+    event_count = 0
+    last_time = 0.0
+
+    try:
+        with open(cast_path, "rb") as src, open(temp_path, "wb") as dst:
+            uncompressed_offset = 0
+            lines = []
+            size = 0
+            first_time = None
+
+            def flush():
+                nonlocal uncompressed_offset, lines, size, first_time
+                frames.append(Frame(dst.tell(), uncompressed_offset,
+                                    first_time if first_time is not None else last_time))
+                dst.write(gzip.compress(b"".join(lines), compresslevel=level, mtime=0))
+                uncompressed_offset += size
+                lines, size, first_time = [], 0, None
+
+            header = src.readline()
+            clock = EventClock(cast_version(header))
+            for line in itertools.chain([header], src):
+                time = clock.feed(line)
+                if time is not None:
+                    event_count += 1
+                    last_time = time
+                    if first_time is None:
+                        first_time = time
+
+                lines.append(line)
+                size += len(line)
+                if size >= frame_size:
+                    flush()
+
+            if lines:
+                flush()
+
+        temp_path.replace(gz_path)
+        _write_frame_table(gz_path, FrameTable(frames, event_count, last_time))
+
+    except OSError as e:
+        logger.error(f"Failed to compress {cast_path}: {e}")
+        temp_path.unlink(missing_ok=True)
+        return None
+
+    if remove:
+        cast_path.unlink()
+        cast_path.with_name(cast_path.name + ".idx").unlink(missing_ok=True)
+
+    logger.info(f"Compressed {cast_path} into {len(frames)} frames")
+    return gz_path
+
+
+def scan_frames(cast_path: Path) -> tuple[FrameTable, int]:
+    """Rebuild a frame table by walking the gzip members.
+
+    Returns:
+        The frame table, and the offset where the last complete member ends
+    """
+    frames = []
+    event_count = 0
+    last_time = 0.0
+    good_end = 0
+    uncompressed_offset = 0
+    clock = None  # Set from the header, in the first frame
+
+    with open(cast_path, "rb") as f:
+        pending = f.read(CHUNK_SIZE)
+
+        while pending:
+            decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            plain = []
+            consumed = 0
+
+            try:
+                while True:
+                    plain.append(decompressor.decompress(pending))
+                    if decompressor.eof:
+                        consumed += len(pending) - len(decompressor.unused_data)
+                        pending = decompressor.unused_data
+                        break
+                    consumed += len(pending)
+                    pending = f.read(CHUNK_SIZE)
+                    if not pending:
+                        break
+            except zlib.error:
+                break
+
+            if not decompressor.eof:
+                break  # Member cut off part way through
+
+            text = b"".join(plain)
+            if clock is None:
+                clock = EventClock(cast_version(text.split(b"\n", 1)[0]))
+            first_time = None
+            previous_time = last_time
+            for line in text.splitlines():
+                time = clock.feed(line)
+                if time is not None:
+                    event_count += 1
+                    last_time = time
+                    if first_time is None:
+                        first_time = time
+
+            frames.append(Frame(good_end, uncompressed_offset,
+                                first_time if first_time is not None else previous_time))
+            uncompressed_offset += len(text)
+            good_end += consumed
+
+            if not pending:
+                pending = f.read(CHUNK_SIZE)
+
+    return FrameTable(frames, event_count, last_time), good_end
+
+
+def repair_compressed_cast(cast_path: Path) -> bool:
+    """Drop a partly written last frame and rebuild the frame table.
+
+    Returns:
+        True if the cast is usable, False if no complete frame was found
+    """
+    try:
+        table, good_end = scan_frames(cast_path)
+        if not table.frames:
+            return False
+
+        if good_end < cast_path.stat().st_size:
+            logger.info(f"Truncating partial frame from {cast_path}")
+            with open(cast_path, "r+b") as f:
+                f.truncate(good_end)
+
+        _write_frame_table(cast_path, table)
+        return True
+
+    except OSError as e:
+        logger.error(f"Failed to repair {cast_path}: {e}")
+        return False
+
+
+def validate_compressed_cast(cast_path: Path) -> bool:
+    """Check a compressed cast's header, frame table and last frame."""
+    table = load_frame_table(cast_path)
+    if table is None or not table.frames:
+        return False
+
+    try:
+        with open_cast(cast_path) as f:
+            json.loads(f.readline())
+        # Frames decode independently, so only a cut-off last frame, or anything after it, matters
+        with open(cast_path, "rb") as f:
+            f.seek(table.frames[-1].offset)
+            decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            decompressor.decompress(f.read())
+        return decompressor.eof and not decompressor.unused_data
+    except (OSError, EOFError, ValueError, zlib.error):
+        return False
+
+
+def read_frame(cast_path: Path, table: FrameTable, number: int) -> bytes:
+    """Decompress a single frame.
+
+    Raises:
+        EOFError: If the frame is cut off
+    """
+    start = table.frames[number].offset
+    end = table.frames[number + 1].offset if number + 1 < len(table.frames) else None
+
+    with open(cast_path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start if end is not None else -1)
+
+    # Only the one member, so a frame still being written after the last one isn't read
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    plain = decompressor.decompress(data)
+    if not decompressor.eof:
+        raise EOFError(f"Frame {number} of {cast_path} is cut off")
+    return plain
+
+
+def iter_frame_lines(cast_path: Path, offset: int = 0) -> Iterator[bytes]:
+    """Iterate over the lines of a compressed cast from an offset into the plain cast.
+
+    Only the frames from `offset` on are decompressed, and only those in
+    the frame table, so a cast can be read while it is being written.
+
+    Args:
+        offset: Where a line starts in the plain cast
+    """
+    table = load_frame_table(cast_path)
+    if table is None:
+        table, _ = scan_frames(cast_path)
+    if not table.frames:
+        return
+
+    starts = [frame.uncompressed_offset for frame in table.frames]
+    first = max(bisect.bisect_right(starts, offset) - 1, 0)
+    for number in range(first, len(table.frames)):
+        data = read_frame(cast_path, table, number)
+        skip = offset - table.frames[number].uncompressed_offset
+        yield from data[max(skip, 0):].splitlines(keepends=True)
+
+
+def iter_frame_events(cast_path: Path, start: float = 0.0,
+                      end: Optional[float] = None) -> Iterator[list]:
+    """Iterate over events between two times, decompressing only the frames needed."""
+    table = load_frame_table(cast_path)
+    if table is None:
+        table, _ = scan_frames(cast_path)
+    if not table.frames:
+        return
+
+    first = table.frame_for(start)
+    with open_cast(cast_path) as f:
+        clock = EventClock(cast_version(f.readline()))
+    resuming = first > 0
+
+    for number in range(first, len(table.frames)):
+        # Frames without events pass the resume on to the next one
+        resume_at = table.frames[number].first_time
+        for line in read_frame(cast_path, table, number).splitlines():
+            if resuming and event_time(line) is not None:
+                clock.resume(line, resume_at)
+                resuming = False
+            time = clock.feed(line)
+            if time is None or time < start:
+                continue
+            if end is not None and time > end:
+                return
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            event[0] = time
+            yield event
@@ -0,0 +1,120 @@
+"""Convert casts between asciicast v2, v3 and binary casts, streaming.
+
+The server writes either version, but some players only read v2, so
+casts can be turned into the other version whenever needed, one line at
+a time. Event times are converted between times since the start (v2)
+and since the previous event (v3). v3 comments are dropped, and so are
+exit events when writing v2, which has none. Binary casts read as v2,
+and any cast can be written as one.
+"""
+import json
+from pathlib import Path
+from typing import Any, BinaryIO, Dict
+
+from .binary import DEFAULT_BLOCK_SIZE, BlockWriter, is_binary, write_header
+from .compress import open_cast
+from .events import EventClock, cast_version
+from .writer import VERSIONS, dumps
+
+
+def convert_header(header: Dict[str, Any], version: int) -> Dict[str, Any]:
+    """Convert a header to another asciicast version, keeping what both versions have."""
+    header = dict(header)
+    if header.get("version", 2) == version:
+        return header
+
+    env = dict(header.get("env") or {})
+    if version == 3:
+        term = {"cols": header.pop("width", None), "rows": header.pop("height", None)}
+        if env.get("TERM"):
+            term["type"] = env.pop("TERM")
+        header["term"] = term
+    else:
+        term = header.pop("term", None) or {}
+        header["width"], header["height"] = term.get("cols"), term.get("rows")
+        if term.get("type"):
+            env["TERM"] = term["type"]
+
+    if env or "env" in header:
+        header["env"] = env
+    return {"version": version, **{key: value for key, value in header.items() if key != "version"}}
+
+
+def convert_stream(src: BinaryIO, dst: BinaryIO, version: int) -> int:
+    """Copy a cast from one stream to another as the given asciicast version.
+
+    Returns:
+        Number of events written
+
+    Raises:
+        ValueError: If the version isn't one of VERSIONS, or the header can't be read
+    """
+    if version not in VERSIONS:
+        raise ValueError(f"Can't write asciicast version {version}")
+
+    header_line = src.readline()
+    header = json.loads(header_line)
+    if not isinstance(header, dict):
+        raise ValueError("Cast header isn't an object")
+    clock = EventClock(cast_version(header_line))
+    dst.write((dumps(convert_header(header, version)) + "\n").encode("utf-8"))
+
+    events = 0
+    written = 0.0  # Time of the last event written, as stored
+    for line in src:
+        event = clock.decode(line)
+        if event is None or len(event) < 3:
+            continue
+        if version < 3 and event[1] == "x":
+            continue
+
+        time = round(max(event[0], written), 6)
+        event[0] = round(time - written, 6) if version >= 3 else time
+        written = written + event[0] if version >= 3 else time
+        dst.write((dumps(event) + "\n").encode("utf-8"))
+        events += 1
+    return events
+
+
+def convert_to_binary(src: BinaryIO, dst: BinaryIO, block_size: int = DEFAULT_BLOCK_SIZE) -> int:
+    """Copy a cast of either asciicast version from one stream to another as a binary cast.
+
+    Returns:
+        Number of events written
+
+    Raises:
+        ValueError: If the header can't be read, or an event kind isn't one character
+    """
+    header_line = src.readline()
+    header = json.loads(header_line)
+    if not isinstance(header, dict):
+        raise ValueError("Cast header isn't an object")
+    clock = EventClock(cast_version(header_line))
+    write_header(dst, convert_header(header, 2))
+
+    blocks = BlockWriter(dst, block_size)
+    events = 0
+    for line in src:
+        event = clock.decode(line)
+        if event is None or len(event) < 3:
+            continue
+        blocks.add(round(event[0] * 1_000_000), str(event[1]), str(event[2]))
+        events += 1
+        if blocks.full:
+            blocks.write()
+    blocks.write()
+    return events
+
+
+def convert_cast(src_path: Path, dst_path: Path, version: int) -> int:
+    """Write a plain, compressed or binary cast to a new cast as the given asciicast version.
+
+    A destination with the binary suffix gets a binary cast instead, whatever the version.
+
+    Returns:
+        Number of events written
+    """
+    with open_cast(src_path) as src, open(dst_path, "wb") as dst:
+        if is_binary(dst_path):
+            return convert_to_binary(src, dst)
+        return convert_stream(src, dst, version)
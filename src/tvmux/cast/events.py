@@ -0,0 +1,90 @@
+"""Low level helpers for cast event lines.
+
+Casts are asciicast v2 or v3. A v2 event's time is seconds since the
+start of the cast, a v3 event's is seconds since the event before it, and
+v3 casts may also have comment lines starting with ``#``. Readers that
+need times since the start feed each line to an EventClock, which works
+them out for either version.
+"""
+import json
+from typing import Optional
+
+
+def event_time(line: bytes) -> Optional[float]:
+    """Get the time field of an event line without decoding the payload.
+
+    This is the time since the start of the cast in v2, and since the
+    previous event in v3.
+
+    Returns:
+        The event time, or None if the line isn't an event
+    """
+    if not line.startswith(b"["):
+        return None
+    comma = line.find(b",")
+    try:
+        return float(line[1:comma])
+    except ValueError:
+        return None
+
+
+def cast_version(header: bytes) -> int:
+    """Get the asciicast version a header line declares, 2 if it doesn't say."""
+    try:
+        version = json.loads(header).get("version", 2)
+    except (ValueError, AttributeError):
+        return 2
+    return version if isinstance(version, int) else 2
+
+
+class EventClock:
+    """Works out each event's time since the start of a cast, reading its lines in order."""
+
+    def __init__(self, version: int = 2, time: float = 0.0):
+        """
+        Args:
+            version: asciicast version of the cast
+            time: Time of the event before the first line fed, when
+                starting part way through a cast
+        """
+        self.version = version
+        self.time = time
+
+    @property
+    def relative(self) -> bool:
+        """Whether event times count from the event before."""
+        return self.version >= 3
+
+    def feed(self, line: bytes) -> Optional[float]:
+        """Get the time of an event line, without decoding the payload.
+
+        Returns:
+            Seconds since the start of the cast, or None if the line isn't an event
+        """
+        time = event_time(line)
+        if time is None:
+            return None
+        self.time = self.time + time if self.relative else time
+        return self.time
+
+    def decode(self, line: bytes) -> Optional[list]:
+        """Decode an event line, with its time changed to seconds since the start of the cast.
+
+        Returns:
+            The [time, type, data] event, or None if the line isn't an event
+        """
+        if not line.startswith(b"["):
+            return None
+        try:
+            event = json.loads(line)
+            time = float(event[0])
+        except (ValueError, TypeError, IndexError):
+            return None
+        self.time = self.time + time if self.relative else time
+        event[0] = self.time
+        return event
+
+    def resume(self, line: bytes, at: float) -> None:
+        """Start from an event line whose time since the start is known, e.g. from an index."""
+        time = event_time(line)
+        self.time = at - time if self.relative and time is not None else at
@@ -0,0 +1,158 @@
+"""Idle gap compression for cast files.
+
+A window left open overnight records hours of nothing between a handful of
+events. Capping each gap to a limit keeps casts easy to play, and the gaps
+that were shortened are listed next to the cast as
+``<name>.cast.idle.json``, so the original timing can be reconstructed
+and tools can skip idle periods without reading any events.
+
+The server's cast writers cap gaps as they write, and keep the sidecar
+up to date as they go; compress_idle() does the same for a cast that has
+already been written, such as one recorded without a limit.
+
+Times in the sidecar are seconds since the start of the cast, in the
+capped (stored) timeline unless noted, for asciicast v2 and v3 casts
+alike. In a v3 cast only the capped events' intervals change.
+"""
+import bisect
+import json
+import logging
+from pathlib import Path
+from typing import List, Optional
+
+from pydantic import BaseModel, Field, ValidationError
+
+from .events import EventClock, cast_version
+
+logger = logging.getLogger(__name__)
+
+IDLE_SUFFIX = ".idle.json"
+
+
+class IdlePeriod(BaseModel):
+    """A gap between events that was shortened."""
+    start: float = Field(..., description="Stored time of the last event before the gap")
+    original_start: float = Field(..., description="Original time of the last event before the gap")
+    original: float = Field(..., description="Original length of the gap in seconds")
+    stored: float = Field(..., description="Length of the gap in the stored cast")
+
+
+class IdleMap(BaseModel):
+    """Every shortened gap in a cast, in order."""
+    version: int = 1
+    limit: float = Field(..., description="Longest gap kept in the stored cast")
+    removed: float = Field(0.0, description="Total seconds taken out")
+    original_duration: float = Field(0.0, description="Time of the last event before capping")
+    periods: List[IdlePeriod] = Field(default_factory=list)
+
+    def original_time(self, time: float) -> float:
+        """Map a time in the stored cast back to the original timeline."""
+        starts = [period.start for period in self.periods]
+        shift = 0.0
+        for period in self.periods[:bisect.bisect_left(starts, time)]:
+            shift += period.original - period.stored
+        return time + shift
+
+
+def idle_path(cast_path: Path) -> Path:
+    """Get the idle sidecar path for a cast file."""
+    return cast_path.with_name(cast_path.name + IDLE_SUFFIX)
+
+
+def load_idle_map(cast_path: Path) -> Optional[IdleMap]:
+    """Load the idle sidecar for a cast file, if present and readable."""
+    path = idle_path(cast_path)
+    try:
+        return IdleMap.model_validate_json(path.read_text())
+    except (OSError, ValidationError) as e:
+        logger.debug(f"Can't load idle map {path}: {e}")
+        return None
+
+
+def _format_time(time: float) -> bytes:
+    """Format an event time the way asciinema does."""
+    return json.dumps(round(time, 6)).encode()
+
+
+def compress_idle(cast_path: Path, limit: float) -> Optional[IdleMap]:
+    """Cap every gap between events in a plain cast to `limit` seconds, streaming.
+
+    The cast is only rewritten if a gap was too long. Either way the idle
+    sidecar is written, so its presence shows the cast has been checked,
+    and a cast that already has one is left alone.
+
+    Args:
+        cast_path: Plain cast to rewrite in place
+        limit: Longest gap to keep, in seconds
+
+    Returns:
+        The idle map, or None on failure
+    """
+    existing = load_idle_map(cast_path)
+    if existing is not None:
+        logger.debug(f"{cast_path} already has its idle time capped")
+        return existing
+
+    temp_path = cast_path.with_name(cast_path.name + ".tmp")
+
+    periods = []
+    removed = 0.0
+    last_original = 0.0
+    last_stored = 0.0
+
+    try:
+        with open(cast_path, "rb") as src, open(temp_path, "wb") as dst:
+            header_line = src.readline()
+            clock = EventClock(cast_version(header_line))
+            try:
+                header = json.loads(header_line)
+                header["idle_time_limit"] = limit
+                header_line = json.dumps(header).encode() + b"\n"
+            except (ValueError, TypeError):
+                logger.warning(f"Unreadable header in {cast_path}, leaving it as it is")
+            dst.write(header_line)
+
+            for line in src:
+                time = clock.feed(line)
+                if time is None:
+                    dst.write(line)
+                    continue
+
+                gap = time - last_original
+                capped = gap > limit
+                if capped:
+                    periods.append(IdlePeriod(
+                        start=last_stored, original_start=last_original, original=gap, stored=limit
+                    ))
+                    removed += gap - limit
+
+                previous_stored = last_stored
+                last_original = time
+                last_stored = time - removed
+                if clock.relative:
+                    # Intervals after a capped gap are as they were
+                    if capped:
+                        line = b"[" + _format_time(last_stored - previous_stored) + line[line.find(b","):]
+                    dst.write(line)
+                elif removed:
+                    dst.write(b"[" + _format_time(last_stored) + line[line.find(b","):])
+                else:
+                    dst.write(line)
+
+        if periods:
+            temp_path.replace(cast_path)
+        else:
+            temp_path.unlink()
+    except OSError as e:
+        logger.error(f"Failed to compress idle time in {cast_path}: {e}")
+        temp_path.unlink(missing_ok=True)
+        return None
+
+    idle_map = IdleMap(limit=limit, removed=removed, original_duration=last_original, periods=periods)
+    idle_path(cast_path).write_text(idle_map.model_dump_json(indent=2))
+    if periods:
+        # Offsets and times have changed, so the seek index has to be rebuilt
+        cast_path.with_name(cast_path.name + ".idx").unlink(missing_ok=True)
+        logger.info(f"Took {removed:.1f}s of idle time out of {cast_path} in {len(periods)} gaps")
+    return idle_map
+
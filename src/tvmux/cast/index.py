@@ -0,0 +1,368 @@
+"""Time-to-offset index sidecar for cast files.
+
+The index lives next to the cast as ``<name>.cast.idx`` and maps event
+times, in seconds since the start of the cast whatever its asciicast
+version, to byte offsets every few seconds or megabytes, so readers can
+seek without parsing the file from the start. It is append-only: updating
+it only reads the part of the cast written since the last update.
+
+Layout (little endian):
+
+    header   magic "TVMUXIDX", version u32, every_seconds f64, every_bytes u64,
+             indexed_to u64, event_count u64, last_time f64
+    entries  repeated (time f64, offset u64)
+"""
+import bisect
+import json
+import logging
+import struct
+import time
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from .binary import BinaryCast, is_binary
+from .compress import is_compressed, iter_frame_events
+from .events import EventClock, cast_version, event_time
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"TVMUXIDX"
+VERSION = 1
+HEADER = struct.Struct("<8sIdQQQd")
+ENTRY = struct.Struct("<dQ")
+
+DEFAULT_EVERY_SECONDS = 10.0
+DEFAULT_EVERY_BYTES = 1024 * 1024
+
+# Read size when scanning new parts of the cast
+CHUNK_SIZE = 1024 * 1024
+
+# Most seconds a live index's header is left behind its cast
+SAVE_INTERVAL = 1.0
+
+
+def index_path(cast_path: Path) -> Path:
+    """Get the sidecar index path for a cast file."""
+    return cast_path.with_name(cast_path.name + ".idx")
+
+
+class CastIndex:
+    """Loaded index for one cast file."""
+
+    def __init__(self, every_seconds: float = DEFAULT_EVERY_SECONDS,
+                 every_bytes: int = DEFAULT_EVERY_BYTES):
+        self.every_seconds = every_seconds
+        self.every_bytes = every_bytes
+        self.indexed_to = 0
+        self.event_count = 0
+        self.last_time = 0.0
+        self.times: List[float] = []
+        self.offsets: List[int] = []
+
+    @property
+    def duration(self) -> float:
+        """Time of the last indexed event."""
+        return self.last_time
+
+    def offset_for(self, at: float) -> int:
+        """Get an offset to start reading from to find events at time `at`.
+
+        Returns:
+            Offset of the last indexed event at or before `at`, or of the
+            first event if `at` is before it
+        """
+        if not self.offsets:
+            return self.indexed_to
+        return self.entry_for(at)[1]
+
+    def entry_for(self, at: float) -> Tuple[float, int]:
+        """Get the (time, offset) of the entry offset_for() would pick. There must be entries."""
+        i = max(bisect.bisect_right(self.times, at) - 1, 0)
+        return self.times[i], self.offsets[i]
+
+    def add(self, at: float, offset: int, end: int) -> bool:
+        """Count an event line, adding an entry for it if one is due.
+
+        Args:
+            at: Time of the event since the start of the cast
+            offset: Where its line starts
+            end: Where its line ends
+
+        Returns:
+            Whether an entry was added
+        """
+        self.event_count += 1
+        self.last_time = at
+        self.indexed_to = end
+        if (not self.times
+                or at - self.times[-1] >= self.every_seconds
+                or offset - self.offsets[-1] >= self.every_bytes):
+            self.times.append(at)
+            self.offsets.append(offset)
+            return True
+        return False
+
+    def save(self, cast_path: Path, added: int) -> None:
+        """Write the index next to its cast.
+
+        Args:
+            cast_path: Cast the index is for
+            added: Entries added since the sidecar was last written, which
+                are appended to it, if it has the ones before
+
+        Raises:
+            OSError: If the sidecar can't be written
+        """
+        path = index_path(cast_path)
+        if path.exists() and len(self.times) > added:
+            # Append the new entries, then rewrite the header in place
+            with open(path, "r+b") as f:
+                f.seek(HEADER.size + (len(self.times) - added) * ENTRY.size)
+                f.write(self.pack_entries(len(self.times) - added))
+                f.seek(0)
+                f.write(self.pack_header())
+        else:
+            with open(path, "wb") as f:
+                f.write(self.pack_header())
+                f.write(self.pack_entries())
+
+    def pack_entries(self, start: int = 0) -> bytes:
+        """Serialise the entries from `start` on."""
+        return b"".join(ENTRY.pack(t, o) for t, o in zip(self.times[start:], self.offsets[start:]))
+
+    def pack_header(self) -> bytes:
+        """Serialise the header."""
+        return HEADER.pack(MAGIC, VERSION, self.every_seconds, self.every_bytes,
+                           self.indexed_to, self.event_count, self.last_time)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CastIndex":
+        """Parse an index file's contents.
+
+        Raises:
+            ValueError: If the data isn't a valid index
+        """
+        if len(data) < HEADER.size:
+            raise ValueError("Index too short")
+
+        magic, version, every_seconds, every_bytes, indexed_to, event_count, last_time = \
+            HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a tvmux index")
+
+        index = cls(every_seconds, every_bytes)
+        index.indexed_to = indexed_to
+        index.event_count = event_count
+        index.last_time = last_time
+
+        body = data[HEADER.size:]
+        usable = len(body) - len(body) % ENTRY.size
+        for at, offset in ENTRY.iter_unpack(body[:usable]):
+            index.times.append(at)
+            index.offsets.append(offset)
+
+        return index
+
+
+class LiveIndex:
+    """Keeps a cast's index sidecar up to date while a writer writes the cast.
+
+    The writer counts each event line as it writes it, and saves after
+    flushing the cast, so the sidecar never covers more than is on disk
+    and readers can seek in the cast while it is still being recorded.
+    """
+
+    def __init__(self, cast_path: Path, every_seconds: float = DEFAULT_EVERY_SECONDS,
+                 every_bytes: int = DEFAULT_EVERY_BYTES):
+        self.cast_path = cast_path
+        self.index = CastIndex(every_seconds, every_bytes)
+        self.saved = -1  # Entries in the sidecar, -1 until it is written
+        self.saved_at = 0.0  # time.monotonic() of the last save
+        self.failed = False
+
+    def add(self, at: float, offset: int, end: int) -> None:
+        """Count an event line the writer wrote."""
+        self.index.add(at, offset, end)
+
+    def save(self, force: bool = False) -> None:
+        """Write what was counted since the last save, once the cast has been flushed.
+
+        The header alone is rewritten at most every SAVE_INTERVAL seconds,
+        as readers carry on from where it says the index ends anyway.
+        """
+        if self.failed:
+            return
+        added = len(self.index.times) - max(self.saved, 0)
+        now = time.monotonic()
+        if not (force or added or self.saved < 0 or now - self.saved_at >= SAVE_INTERVAL):
+            return
+        try:
+            self.index.save(self.cast_path, added)
+        except OSError as e:
+            logger.warning(f"Failed to write index for {self.cast_path}, leaving it for later: {e}")
+            self.failed = True
+            return
+        self.saved = len(self.index.times)
+        self.saved_at = now
+
+
+def load_index(cast_path: Path) -> Optional[CastIndex]:
+    """Load the sidecar index for a cast file, if present and readable."""
+    path = index_path(cast_path)
+    try:
+        return CastIndex.from_bytes(path.read_bytes())
+    except (OSError, ValueError):
+        return None
+
+
+def _is_stale(index: CastIndex, cast_path: Path) -> bool:
+    """Check whether the cast was rewritten underneath the index."""
+    try:
+        with open(cast_path, "rb") as f:
+            size = f.seek(0, 2)
+            if size < index.indexed_to:
+                return True
+            if index.indexed_to == 0:
+                return False
+            f.seek(index.indexed_to - 1)
+            return f.read(1) != b"\n"
+    except OSError:
+        return True
+
+
+def update_index(cast_path: Path, every_seconds: float = DEFAULT_EVERY_SECONDS,
+                 every_bytes: int = DEFAULT_EVERY_BYTES) -> Optional[CastIndex]:
+    """Bring a cast's index up to date, building it if needed.
+
+    Only complete lines are indexed, so this is safe to call while the cast
+    is still being written. An index whose cast has since been truncated or
+    rewritten is rebuilt from scratch.
+
+    Args:
+        cast_path: Path to the cast file
+        every_seconds: Add an entry at least this often in recording time
+        every_bytes: Add an entry at least this often in file size
+
+    Returns:
+        The updated index, or None if the cast can't be read, or is a
+        binary cast, which its block headers index
+    """
+    extended = _extend_index(cast_path, every_seconds, every_bytes)
+    if extended is None:
+        return None
+    index, added = extended
+
+    try:
+        index.save(cast_path, added)
+    except OSError as e:
+        logger.warning(f"Failed to write index for {cast_path}: {e}")
+
+    return index
+
+
+def read_index(cast_path: Path, every_seconds: float = DEFAULT_EVERY_SECONDS,
+               every_bytes: int = DEFAULT_EVERY_BYTES) -> Optional[CastIndex]:
+    """Get a cast's index brought up to date, without writing the sidecar.
+
+    Like update_index(), only what was written since the sidecar was last
+    updated is read, but nothing is written, so it suits scans of an
+    archive that shouldn't change it.
+    """
+    extended = _extend_index(cast_path, every_seconds, every_bytes)
+    return extended[0] if extended is not None else None
+
+
+def _extend_index(cast_path: Path, every_seconds: float,
+                  every_bytes: int) -> Optional[Tuple[CastIndex, int]]:
+    """Load a cast's index and add what was written since, in memory.
+
+    Returns:
+        (the index, how many entries were added to it), or None if the
+        cast can't be read or is a binary cast
+    """
+    if not cast_path.exists() or is_binary(cast_path):
+        return None
+
+    index = load_index(cast_path)
+    if index is None or _is_stale(index, cast_path):
+        index = CastIndex(every_seconds, every_bytes)
+
+    entries = len(index.times)
+
+    try:
+        with open(cast_path, "rb") as f:
+            clock = EventClock(cast_version(f.readline()), index.last_time)
+            f.seek(index.indexed_to)
+            offset = index.indexed_to
+            pending = b""
+
+            while chunk := f.read(CHUNK_SIZE):
+                lines = (pending + chunk).split(b"\n")
+                pending = lines.pop()  # Incomplete until we see its newline
+
+                for line in lines:
+                    line_offset = offset
+                    offset += len(line) + 1
+
+                    at = clock.feed(line)
+                    if at is not None:
+                        index.add(at, line_offset, offset)
+
+            index.indexed_to = offset
+
+    except OSError as e:
+        logger.warning(f"Failed to index {cast_path}: {e}")
+        return None
+
+    return index, len(index.times) - entries
+
+
+def iter_events(cast_path: Path, start: float = 0.0, end: Optional[float] = None,
+                index: Optional[CastIndex] = None) -> Iterator[list]:
+    """Iterate over events between two times, seeking with the index.
+
+    Compressed casts are read through their frame table, and binary casts
+    through their block headers, instead.
+
+    Args:
+        cast_path: Path to the cast file
+        start: Skip events before this time
+        end: Stop after this time
+        index: Index to use, otherwise it is loaded and updated
+
+    Yields:
+        Decoded events as [time, type, data] lists
+    """
+    if is_compressed(cast_path):
+        yield from iter_frame_events(cast_path, start, end)
+        return
+    if is_binary(cast_path):
+        with BinaryCast(cast_path) as cast:
+            yield from cast.events(start, end)
+        return
+
+    if index is None:
+        index = update_index(cast_path)
+
+    with open(cast_path, "rb") as f:
+        clock = EventClock(cast_version(f.readline()))
+        resume_at = None
+        if index is not None and index.offsets:
+            resume_at, offset = index.entry_for(start)
+            f.seek(offset)
+
+        for line in f:
+            if resume_at is not None and event_time(line) is not None:
+                clock.resume(line, resume_at)
+                resume_at = None
+            at = clock.feed(line)
+            if at is None or at < start:
+                continue
+            if end is not None and at > end:
+                break
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            event[0] = at
+            yield event
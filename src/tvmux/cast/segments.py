@@ -0,0 +1,85 @@
+"""Segmented recordings tied together by a manifest.
+
+A long recording can be split into several casts. The first keeps the
+normal name, later ones get a ``.partNNNN`` suffix, and a
+``<name>.manifest.json`` next to them lists the segments in order. Every
+segment starts with a snapshot of the pane, so each one plays on its own.
+"""
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+from pydantic import BaseModel, Field, ValidationError
+
+from .binary import BINARY_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_SUFFIX = ".manifest.json"
+
+
+class Segment(BaseModel):
+    """One cast file of a segmented recording."""
+    path: str = Field(..., description="Cast file name, relative to the manifest")
+    started: datetime = Field(..., description="When the segment started")
+    ended: Optional[datetime] = Field(None, description="When the segment was closed")
+    bytes: Optional[int] = Field(None, description="Size of the finished cast")
+
+
+class Manifest(BaseModel):
+    """Ordered list of the segments making up a recording."""
+    version: int = 1
+    recording_id: str
+    hostname: str
+    session_id: str
+    window_id: str
+    window_name: str
+    segments: List[Segment] = Field(default_factory=list)
+
+
+def _stem(cast_path: Path) -> str:
+    """Get a cast's file name without its .cast, .cast.gz or .tvcast extension."""
+    name = cast_path.name
+    for suffix in (BINARY_SUFFIX, ".cast.gz", ".cast"):
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def manifest_path(first_cast_path: Path) -> Path:
+    """Get the manifest path for a recording, from its first segment."""
+    return first_cast_path.with_name(_stem(first_cast_path) + MANIFEST_SUFFIX)
+
+
+def segment_path(first_cast_path: Path, number: int) -> Path:
+    """Get the cast path for a segment number, 0 being the first."""
+    if number == 0:
+        return first_cast_path
+    stem = _stem(first_cast_path)
+    suffix = first_cast_path.name[len(stem):]  # Segments are all binary, compressed or plain alike
+    return first_cast_path.with_name(f"{stem}.part{number:04d}{suffix}")
+
+
+def load_manifest(path: Path) -> Optional[Manifest]:
+    """Load a manifest, if present and readable."""
+    try:
+        return Manifest.model_validate_json(path.read_text())
+    except (OSError, ValidationError) as e:
+        logger.debug(f"Can't load manifest {path}: {e}")
+        return None
+
+
+def save_manifest(path: Path, manifest: Manifest) -> None:
+    """Write a manifest atomically."""
+    temp_path = path.with_name(path.name + ".tmp")
+    temp_path.write_text(manifest.model_dump_json(indent=2))
+    temp_path.replace(path)
+
+
+def segment_paths(path: Path) -> List[Path]:
+    """Get the cast paths of every segment in a manifest, in order."""
+    manifest = load_manifest(path)
+    if manifest is None:
+        return []
+    return [path.parent / segment.path for segment in manifest.segments]
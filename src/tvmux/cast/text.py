@@ -0,0 +1,81 @@
+"""Plain text from terminal output.
+
+Recorded output is full of escape sequences and carriage returns. These
+helpers turn it back into the lines a person would have read, each tagged
+with the time it started, for searching.
+"""
+import re
+from typing import List, Optional, Tuple
+
+# Escape sequences and control characters, except tab and line endings
+ESCAPES_RE = re.compile(
+    r"\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)"  # OSC, e.g. window titles
+    r"|\x1b[P_^X][^\x1b]*\x1b\\"  # DCS, APC, PM and SOS strings
+    r"|\x1b\[[0-?]*[ -/]*[@-~]"  # CSI, e.g. colours and cursor movement
+    r"|\x1b[ -/]*[0-~]"  # Other escapes, e.g. charset selection
+    r"|\x9b[0-?]*[ -/]*[@-~]"  # 8-bit CSI
+    r"|[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]"
+)
+
+# Longest line kept before it is cut, so output without newlines can't grow forever
+MAX_LINE = 16 * 1024
+
+
+def strip_escapes(text: str) -> str:
+    """Remove escape sequences and control characters from terminal output."""
+    return ESCAPES_RE.sub("", text)
+
+
+def visible_line(raw: str) -> str:
+    """Get the visible text of one line of raw output.
+
+    Carriage returns overwrite the line, so only the text after the last
+    one that was followed by anything is kept, e.g. for progress bars.
+    """
+    text = strip_escapes(raw).rstrip("\r\n")
+    if "\r" in text:
+        text = text.rsplit("\r", 1)[1]
+    return text.strip()
+
+
+class TextLines:
+    """Assemble timed text lines from a stream of output events.
+
+    A line can be spread over many events, so the unfinished one is kept
+    in `pending` along with the time it started, and can be saved and
+    restored to continue later.
+    """
+
+    def __init__(self, pending: str = "", pending_time: Optional[float] = None):
+        self.pending = pending
+        self.pending_time = pending_time
+
+    def feed(self, time: float, data: str) -> List[Tuple[float, str]]:
+        """Add an output event.
+
+        Returns:
+            (start time, text) for each line it completed, skipping blank ones
+        """
+        lines = []
+        parts = data.split("\n")
+
+        for number, part in enumerate(parts):
+            if part and self.pending_time is None:
+                self.pending_time = time
+            self.pending += part
+
+            finished = number < len(parts) - 1
+            if finished or len(self.pending) >= MAX_LINE:
+                lines.extend(self._take())
+        return lines
+
+    def flush(self) -> List[Tuple[float, str]]:
+        """Finish the pending line, at the end of a recording."""
+        return self._take()
+
+    def _take(self) -> List[Tuple[float, str]]:
+        """Emit the pending line and start a new one."""
+        text = visible_line(self.pending)
+        time = self.pending_time
+        self.pending, self.pending_time = "", None
+        return [(time, text)] if text else []
@@ -0,0 +1,127 @@
+"""Per-pane tracks of a window recording.
+
+In all-panes mode every pane of a window is recorded into its own cast,
+``<name>.pane-N.cast`` for pane ``%N``, next to the window's main cast,
+or ``<name>.pane-N.cast.gz`` if that is compressed.
+The tracks share one clock and header timestamp, so event times line up
+across panes.
+
+Where the panes were is kept in ``<name>.layout.json``: a snapshot of the
+window layout and every pane's geometry at the start, and again whenever
+panes are added, removed, resized or selected. Times are seconds on the
+tracks' clock.
+"""
+import logging
+from pathlib import Path
+from typing import List, Optional
+
+from pydantic import BaseModel, Field, ValidationError
+
+from .binary import BINARY_SUFFIX
+from .compress import is_compressed
+
+logger = logging.getLogger(__name__)
+
+LAYOUT_SUFFIX = ".layout.json"
+
+# tmux list-panes format matching parse_panes()
+LIST_PANES_FORMAT = "\t".join([
+    "#{pane_id}", "#{pane_index}", "#{pane_left}", "#{pane_top}", "#{pane_width}",
+    "#{pane_height}", "#{pane_active}", "#{window_width}", "#{window_height}", "#{window_layout}",
+])
+
+
+class PaneGeometry(BaseModel):
+    """Where one pane sits in its window."""
+    pane_id: str = Field(..., description="tmux pane ID, e.g. %3")
+    index: int = Field(..., description="Pane index within the window")
+    left: int = Field(..., description="Column of the pane's left edge")
+    top: int = Field(..., description="Row of the pane's top edge")
+    width: int = Field(..., description="Columns")
+    height: int = Field(..., description="Rows")
+    active: bool = Field(False, description="Whether this is the window's active pane")
+    track: Optional[str] = Field(None, description="Track cast file name, relative to the layout file")
+
+
+class LayoutSnapshot(BaseModel):
+    """The window's panes at one point in time."""
+    time: float = Field(..., description="Seconds since the tracks started")
+    layout: str = Field(..., description="tmux window_layout string")
+    width: int = Field(..., description="Window columns")
+    height: int = Field(..., description="Window rows")
+    panes: List[PaneGeometry] = Field(default_factory=list)
+
+    def same_as(self, other: "LayoutSnapshot") -> bool:
+        """Check whether two snapshots describe the same arrangement."""
+        return self.model_dump(exclude={"time"}) == other.model_dump(exclude={"time"})
+
+
+class TrackLayout(BaseModel):
+    """Layout history for one segment's set of tracks."""
+    version: int = 1
+    recording_id: str
+    window_id: str
+    timestamp: int = Field(..., description="Unix time the tracks' clock starts at")
+    snapshots: List[LayoutSnapshot] = Field(default_factory=list)
+
+
+def _stem(cast_path: Path) -> str:
+    """Get a cast's file name without its .cast, .cast.gz or .tvcast extension."""
+    name = cast_path.name
+    for suffix in (BINARY_SUFFIX, ".cast.gz", ".cast"):
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def track_path(cast_path: Path, pane_id: str) -> Path:
+    """Get the track cast path for a pane of the window recorded in `cast_path`."""
+    suffix = ".cast.gz" if is_compressed(cast_path) else ".cast"
+    return cast_path.with_name(f"{_stem(cast_path)}.pane-{pane_id.lstrip('%')}{suffix}")
+
+
+def layout_path(cast_path: Path) -> Path:
+    """Get the layout file path for the tracks of `cast_path`."""
+    return cast_path.with_name(_stem(cast_path) + LAYOUT_SUFFIX)
+
+
+def parse_panes(output: str, time: float = 0.0) -> Optional[LayoutSnapshot]:
+    """Build a layout snapshot from `tmux list-panes -F LIST_PANES_FORMAT` output.
+
+    Returns:
+        The snapshot, or None if the output couldn't be parsed
+    """
+    snapshot = None
+    for line in output.splitlines():
+        fields = line.split("\t")
+        if len(fields) != 10:
+            continue
+        try:
+            pane = PaneGeometry(
+                pane_id=fields[0], index=int(fields[1]), left=int(fields[2]), top=int(fields[3]),
+                width=int(fields[4]), height=int(fields[5]), active=fields[6] == "1",
+            )
+            if snapshot is None:
+                snapshot = LayoutSnapshot(time=time, width=int(fields[7]), height=int(fields[8]),
+                                          layout=fields[9])
+        except ValueError:
+            logger.debug(f"Can't parse pane line {line!r}")
+            continue
+        snapshot.panes.append(pane)
+    return snapshot
+
+
+def load_layout(path: Path) -> Optional[TrackLayout]:
+    """Load a layout file, if present and readable."""
+    try:
+        return TrackLayout.model_validate_json(path.read_text())
+    except (OSError, ValidationError) as e:
+        logger.debug(f"Can't load layout {path}: {e}")
+        return None
+
+
+def save_layout(path: Path, layout: TrackLayout) -> None:
+    """Write a layout file atomically."""
+    temp_path = path.with_name(path.name + ".tmp")
+    temp_path.write_text(layout.model_dump_json(indent=2))
+    temp_path.replace(path)
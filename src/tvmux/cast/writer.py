@@ -0,0 +1,275 @@
+"""Write asciicast v2 or v3 files from output as it arrives.
+
+Used for every cast the server writes: main casts, per-pane tracks and
+composites. v2 event times are seconds since the start of the cast, v3
+ones seconds since the previous event, which are shorter to write and
+don't grow with the length of the recording. Several writers can share one clock, so that their event
+times line up, and one meter, which counts what they all wrote.
+
+Output that sets the terminal size, ``ESC [ 8 ; rows ; cols t``, as pane
+snapshots start with and resizes are recorded as, becomes a resize event
+right after it, if the size changed, so players resize the terminal at
+that point.
+
+With an idle time limit, a longer gap between events is written as the
+limit, and noted in the cast's idle sidecar as it happens, so casts are
+capped as they are written rather than rewritten once finished. With a
+live index, the cast's seek index sidecar is kept up to date the same
+way, so a cast can be played and seeked in while it is recorded.
+"""
+import codecs
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Deque, Dict, List, Optional
+
+from .idle import IdleMap, IdlePeriod, idle_path
+
+if TYPE_CHECKING:
+    from .index import LiveIndex
+
+# asciicast versions a writer can write
+VERSIONS = (2, 3)
+
+# Seconds of writes a meter's rate is averaged over
+RATE_WINDOW = 10
+
+# Sets the terminal size, in rows and columns
+RESIZE = re.compile(r"\x1b\[8;(\d+);(\d+)t")
+
+# The start of a size sequence that is cut off at the end of the output so far
+PARTIAL_RESIZE = re.compile(r"\x1b(?:\[(?:8(?:;\d*(?:;\d*)?)?)?)?\Z")
+
+
+# Made once, as json.dumps() makes a new encoder for every call with options
+_ENCODER = json.JSONEncoder(ensure_ascii=False, indent=None, separators=(", ", ": "))
+
+
+def dumps(value: Any) -> str:
+    """Encode a header or event the way asciinema does."""
+    return _ENCODER.encode(value)
+
+
+class WriteMeter:
+    """Counts bytes and events written by one or more writers, in any threads."""
+
+    def __init__(self):
+        self.bytes = 0
+        self.events = 0
+        self._recent: Deque[List[int]] = deque()  # [whole second, bytes] pairs within the window
+        self._lock = threading.Lock()
+
+    def add(self, size: int, events: int = 1) -> None:
+        """Count a write."""
+        second = int(time.monotonic())
+        with self._lock:
+            self.bytes += size
+            self.events += events
+            if self._recent and self._recent[-1][0] == second:
+                self._recent[-1][1] += size
+            else:
+                self._recent.append([second, size])
+                while self._recent[0][0] <= second - RATE_WINDOW:
+                    self._recent.popleft()
+
+    def rate(self, now: Optional[float] = None) -> float:
+        """Get the bytes written a second, over the last RATE_WINDOW seconds."""
+        second = int(now if now is not None else time.monotonic())
+        with self._lock:
+            recent = sum(size for at, size in self._recent if at > second - RATE_WINDOW)
+        return recent / RATE_WINDOW
+
+
+class CastWriter:
+    """Appends output events to a new cast file.
+
+    Each event is flushed as it is written, so readers such as the search
+    indexer can follow the file while it grows, unless the writer is
+    buffered, in which case whoever writes to it calls flush() instead.
+    """
+
+    def __init__(self, path: Path, width: int, height: int, started: Optional[float] = None,
+                 timestamp: Optional[int] = None, title: Optional[str] = None, buffered: bool = False,
+                 meter: Optional[WriteMeter] = None, version: int = 2, idle_time_limit: float = 0.0,
+                 index: Optional["LiveIndex"] = None):
+        """Create the cast and write its header.
+
+        Args:
+            path: Cast file to create, replacing any existing one
+            width: Terminal columns
+            height: Terminal rows
+            started: time.monotonic() value that event times count from
+            timestamp: Unix time the cast starts at, for the header
+            title: Optional title for the header
+            buffered: Leave events in the file's buffer until flush()
+            meter: Also counts what this writer writes
+            version: asciicast version to write, 2 or 3
+            idle_time_limit: Longest gap between events to write, in
+                seconds (0 = keep every gap as it was)
+            index: Seek index for the cast, kept up to date as it is flushed
+
+        Raises:
+            ValueError: If the version isn't one of VERSIONS
+        """
+        if version not in VERSIONS:
+            raise ValueError(f"Can't write asciicast version {version}")
+        self.path = path
+        self.version = version
+        self.width = width
+        self.height = height
+        self.buffered = buffered
+        self.meter = meter
+        self.bytes_written = 0
+        self.started = started if started is not None else time.monotonic()
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.pending = ""  # A size sequence cut off at the end of the last output
+        self.events = 0
+        self.clock = 0.0  # Time of the last event written, as stored
+        self.original_clock = 0.0  # Time of the last event written, before capping idle gaps
+        self.idle = IdleMap(limit=idle_time_limit) if idle_time_limit > 0 else None
+        self.index = index
+
+        header: Dict[str, Any]
+        if version == 3:
+            header = {
+                "version": 3,
+                "term": {"cols": width, "rows": height, "type": os.environ.get("TERM")},
+                "timestamp": timestamp if timestamp is not None else int(time.time()),
+                "env": {"SHELL": os.environ.get("SHELL")},
+            }
+        else:
+            header = {
+                "version": 2,
+                "width": width,
+                "height": height,
+                "timestamp": timestamp if timestamp is not None else int(time.time()),
+                "env": {"SHELL": os.environ.get("SHELL"), "TERM": os.environ.get("TERM")},
+            }
+        if title:
+            header["title"] = title
+        if self.idle is not None:
+            header["idle_time_limit"] = idle_time_limit
+
+        self.file = open(path, "wb")
+        self._write_header(header)
+        self.file.flush()  # The header is there to read as soon as the cast exists
+        if self.idle is not None:
+            self._save_idle()
+
+    def output(self, data: bytes, at: Optional[float] = None) -> None:
+        """Write an output event.
+
+        Args:
+            data: Raw terminal output, which may end part way through a character
+            at: time.monotonic() value the output arrived at, defaults to now
+        """
+        text = self.pending + self.decoder.decode(data)
+        self.pending = ""
+        partial = PARTIAL_RESIZE.search(text)
+        if partial:
+            text, self.pending = text[:partial.start()], text[partial.start():]
+
+        start = 0
+        for match in RESIZE.finditer(text):
+            height, width = int(match.group(1)), int(match.group(2))
+            if (width, height) != (self.width, self.height) and width and height:
+                self.event("o", text[start:match.end()], at)
+                self.resize(width, height, at)
+                start = match.end()
+        if start < len(text):
+            self.event("o", text[start:], at)
+
+    def resize(self, width: int, height: int, at: Optional[float] = None) -> None:
+        """Write a resize event, if the size changed."""
+        if (width, height) == (self.width, self.height):
+            return
+        self.width, self.height = width, height
+        self.event("r", f"{width}x{height}", at)
+
+    def marker(self, label: str = "", at: Optional[float] = None) -> None:
+        """Write a marker, a point players can jump to."""
+        self.event("m", label, at)
+
+    def exit(self, status: int, at: Optional[float] = None) -> None:
+        """Write the exit status of the recorded program. Only v3 has exit events."""
+        if self.version >= 3:
+            self.event("x", str(status), at)
+
+    def event(self, kind: str, data: str, at: Optional[float] = None) -> None:
+        """Write an event of any kind."""
+        elapsed = self._elapsed(at)
+        if self.version >= 3:
+            # Never before the last event, and counted from it as stored, so rounding doesn't add up
+            interval = round(max(elapsed - self.clock, 0.0), 6)
+            self.clock += interval
+            self._write_line([interval, kind, data])
+        else:
+            self.clock = round(max(elapsed, 0.0), 6)
+            self._write_line([self.clock, kind, data])
+
+    def _elapsed(self, at: Optional[float]) -> float:
+        """Get the time to store for an event, with any idle gap before it capped."""
+        original = max((at if at is not None else time.monotonic()) - self.started, 0.0)
+        if self.idle is None:
+            return original
+
+        gap = original - self.original_clock
+        if gap > self.idle.limit:
+            self.idle.periods.append(IdlePeriod(
+                start=self.clock, original_start=self.original_clock, original=gap, stored=self.idle.limit
+            ))
+            self.idle.removed += gap - self.idle.limit
+            self.original_clock = original
+            self._save_idle()
+        self.original_clock = max(self.original_clock, original)
+        return original - self.idle.removed
+
+    def _save_idle(self) -> None:
+        """Write the idle sidecar, with every gap capped so far."""
+        self.idle.original_duration = self.original_clock
+        idle_path(self.path).write_text(self.idle.model_dump_json(indent=2))
+
+    @property
+    def holding(self) -> bool:
+        """Whether flush() left events to write on a later flush()."""
+        return False
+
+    def flush(self) -> None:
+        """Write out any buffered events, and the index entries for them."""
+        self.file.flush()
+        if self.index is not None:
+            self.index.save()
+
+    def close(self) -> None:
+        """Write any partial character left over and close the file."""
+        if self.file.closed:
+            return
+        text = self.pending + self.decoder.decode(b"", final=True)
+        self.pending = ""
+        if text:
+            self.event("o", text)
+        self.flush()
+        self.file.close()
+        if self.index is not None:
+            self.index.save(force=True)
+        if self.idle is not None:
+            self._save_idle()
+
+    def _write_header(self, header: Dict[str, Any]) -> None:
+        self._write_line(header, event=False)
+
+    def _write_line(self, value: Any, event: bool = True) -> None:
+        line = (dumps(value) + "\n").encode("utf-8")
+        self.file.write(line)
+        self.bytes_written += len(line)
+        self.events += event
+        if event and self.index is not None:
+            self.index.add(self.clock, self.bytes_written - len(line), self.bytes_written)
+        if self.meter is not None:
+            self.meter.add(len(line), int(event))
+        if not self.buffered:
+            self.flush()
@@ -0,0 +1,362 @@
+"""SQLite catalog of recordings under the output directory.
+
+The catalog keeps one row per cast file with its origin and stats, so
+listing and searching recordings doesn't have to walk the archive and
+parse every file. The server updates it as recordings start, roll over
+and stop, and `Catalog.scan` picks up anything else by comparing each
+file's mtime and size with what was stored.
+"""
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from pydantic import BaseModel, Field
+
+from .cast.binary import BINARY_SUFFIX, BinaryCast, is_binary
+from .cast.compress import is_compressed, load_frame_table, open_cast, scan_frames
+from .cast.index import read_index
+from .cast.segments import MANIFEST_SUFFIX, load_manifest
+from .config import get_config
+
+logger = logging.getLogger(__name__)
+
+CATALOG_NAME = ".catalog.sqlite3"
+
+# Files a scan stores before committing, so recordings can be added meanwhile
+SCAN_BATCH = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    path TEXT PRIMARY KEY,
+    host TEXT,
+    session TEXT,
+    window TEXT,
+    name TEXT,
+    segment INTEGER NOT NULL DEFAULT 0,
+    manifest TEXT,
+    started REAL,
+    ended REAL,
+    duration REAL NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    events INTEGER NOT NULL DEFAULT 0,
+    active INTEGER NOT NULL DEFAULT 0,
+    mtime REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS recordings_started ON recordings (started);
+CREATE INDEX IF NOT EXISTS recordings_host_session ON recordings (host, session);
+CREATE INDEX IF NOT EXISTS recordings_name ON recordings (name);
+"""
+
+# {timestamp}_{host}_{window_id}_{window name}[.partNNNN][.pane-N].cast[.gz], or .tvcast
+FILENAME_RE = re.compile(
+    r"^(?P<timestamp>\d{4}-\d{2}-\d{2}_\d{4})_(?P<host>.*?)_(?P<window>@\d+)_(?P<name>.*?)"
+    r"(?:\.part(?P<segment>\d+))?(?P<track>\.pane-\d+|\.composite)?(?:\.cast(?:\.gz)?|\.tvcast)$"
+)
+
+
+class CatalogEntry(BaseModel):
+    """A cast file known to the catalog."""
+    path: str = Field(..., description="Absolute path of the cast file")
+    host: Optional[str] = Field(None, description="Host the recording was made on")
+    session: Optional[str] = Field(None, description="tmux session, if known")
+    window: Optional[str] = Field(None, description="tmux window ID")
+    name: Optional[str] = Field(None, description="Window name")
+    segment: int = Field(0, description="Segment number within the recording")
+    manifest: Optional[str] = Field(None, description="Segment manifest, if segmented")
+    started: Optional[float] = Field(None, description="Start time (unix timestamp)")
+    ended: Optional[float] = Field(None, description="End time (unix timestamp)")
+    duration: float = Field(0.0, description="Length in seconds")
+    bytes: int = Field(0, description="File size")
+    events: int = Field(0, description="Number of events")
+    active: bool = Field(False, description="Still being recorded")
+
+
+class ScanResult(BaseModel):
+    """Counts from an incremental scan."""
+    added: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    removed: int = 0
+
+
+def parse_cast_filename(name: str) -> dict:
+    """Get host, window, name and segment from a cast filename, where possible."""
+    match = FILENAME_RE.match(name)
+    if not match:
+        return {}
+    return {
+        "host": match["host"],
+        "window": match["window"],
+        "name": match["name"] + (match["track"] or ""),  # Pane tracks and composites keep their suffix
+        "segment": int(match["segment"] or 0),
+    }
+
+
+def cast_stats(cast_path: Path) -> dict:
+    """Read start time, duration and event count for a cast file.
+
+    Plain casts use their seek index, compressed casts their frame
+    table and binary casts their block headers, so only new data is
+    parsed. Nothing is written, so scanning an archive leaves it as it is.
+    """
+    stats = {"started": None, "duration": 0.0, "events": 0}
+
+    if is_binary(cast_path):
+        try:
+            with BinaryCast(cast_path) as cast:
+                stats["started"] = cast.header.get("timestamp")
+                stats["duration"], stats["events"] = cast.duration, cast.event_count
+        except (OSError, ValueError, AttributeError):
+            pass
+        return stats
+
+    try:
+        with open_cast(cast_path) as f:
+            header = json.loads(f.readline())
+        stats["started"] = header.get("timestamp")
+    except (OSError, EOFError, ValueError, AttributeError):
+        pass
+
+    if is_compressed(cast_path):
+        table = load_frame_table(cast_path)
+        if table is None:
+            try:
+                table, _ = scan_frames(cast_path)
+            except OSError:
+                return stats
+        stats["duration"], stats["events"] = table.last_time, table.event_count
+    else:
+        config = get_config()
+        index = read_index(cast_path, config.recording.index_every_seconds,
+                           config.recording.index_every_bytes)
+        if index is not None:
+            stats["duration"], stats["events"] = index.duration, index.event_count
+
+    return stats
+
+
+class Catalog:
+    """Catalog database for one output directory."""
+
+    def __init__(self, root: Path, db_path: Optional[Path] = None):
+        self.root = root
+        self.db_path = db_path or root / CATALOG_NAME
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        """Open the database, creating it if needed."""
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=10.0)
+        try:
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add_cast(self, cast_path: Path, active: bool = False, **known) -> Optional[CatalogEntry]:
+        """Add or refresh one cast file.
+
+        Args:
+            cast_path: The cast file
+            active: Whether it is still being recorded
+            **known: Fields already known to the caller (host, session, ...),
+                which take precedence over ones parsed from the filename
+
+        Returns:
+            The stored entry, or None if the file doesn't exist
+        """
+        try:
+            stat = cast_path.stat()
+        except OSError:
+            return None
+
+        fields = parse_cast_filename(cast_path.name)
+        fields.update({k: v for k, v in known.items() if v is not None})
+        fields.update(cast_stats(cast_path))
+
+        entry = CatalogEntry(path=str(cast_path), bytes=stat.st_size, active=active, **fields)
+        if entry.started is not None:
+            entry.ended = entry.started + entry.duration
+
+        with self.connect() as conn:
+            self._store(conn, entry, stat.st_mtime)
+        return entry
+
+    def remove(self, cast_path: Path) -> None:
+        """Forget a cast file."""
+        with self.connect() as conn:
+            conn.execute("DELETE FROM recordings WHERE path = ?", (str(cast_path),))
+
+    def rename(self, old_path: Path, new_path: Path) -> None:
+        """Move a cast's row to a new path, e.g. after compressing it."""
+        with self.connect() as conn:
+            conn.execute("DELETE FROM recordings WHERE path = ?", (str(new_path),))
+            conn.execute("UPDATE recordings SET path = ? WHERE path = ?", (str(new_path), str(old_path)))
+
+    def _store(self, conn: sqlite3.Connection, entry: CatalogEntry, mtime: float) -> None:
+        """Insert or replace a row."""
+        row = entry.model_dump()
+        row["mtime"] = mtime
+        columns = ", ".join(row)
+        placeholders = ", ".join(f":{column}" for column in row)
+        conn.execute(f"INSERT OR REPLACE INTO recordings ({columns}) VALUES ({placeholders})", row)
+
+    def scan(self, active: Optional[Callable[[], Iterable[str]]] = None) -> ScanResult:
+        """Bring the catalog in line with the files on disk.
+
+        Files whose mtime and size match the stored row are skipped without
+        being opened. Changes are committed a batch at a time, so the server
+        can go on adding recordings while a long scan runs.
+
+        Args:
+            active: Gets the paths still being recorded, if known, once the
+                files have been scanned, so recordings started meanwhile are
+                included. Every other cast is then marked finished,
+                otherwise active flags are kept.
+        """
+        result = ScanResult()
+        started = time.monotonic()
+
+        with self.connect() as conn:
+            known = {
+                row["path"]: (row["mtime"], row["bytes"], row["active"])
+                for row in conn.execute("SELECT path, mtime, bytes, active FROM recordings")
+            }
+            sessions = self._manifest_sessions()
+            seen = set()
+
+            for path, stat in self._walk(self.root):
+                key = str(path)
+                seen.add(key)
+                previous = known.get(key)
+                if previous and previous[0] == stat.st_mtime and previous[1] == stat.st_size:
+                    result.unchanged += 1
+                    continue
+
+                fields = parse_cast_filename(path.name)
+                fields.update(sessions.get(key, {}))
+                fields.update(cast_stats(path))
+                entry = CatalogEntry(path=key, bytes=stat.st_size,
+                                     active=bool(previous and previous[2]), **fields)
+                if entry.started is not None:
+                    entry.ended = entry.started + entry.duration
+
+                self._store(conn, entry, stat.st_mtime)
+                if previous:
+                    result.updated += 1
+                else:
+                    result.added += 1
+                if (result.added + result.updated) % SCAN_BATCH == 0:
+                    conn.commit()
+
+            conn.commit()
+            active_paths = list(active()) if active is not None else None
+
+            gone = [path for path in known if path not in seen]
+            conn.executemany("DELETE FROM recordings WHERE path = ?", [(path,) for path in gone])
+            result.removed = len(gone)
+
+            if active_paths is not None:
+                conn.execute("UPDATE recordings SET active = 0 WHERE active = 1")
+                conn.executemany("UPDATE recordings SET active = 1 WHERE path = ?",
+                                 [(path,) for path in active_paths])
+
+        logger.info(f"Catalog scan of {self.root} took {time.monotonic() - started:.2f}s: {result}")
+        return result
+
+    def _walk(self, directory: Path):
+        """Yield (path, stat) for every cast file below a directory."""
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return
+
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from self._walk(Path(entry.path))
+            elif entry.name.endswith((".cast", ".cast.gz", BINARY_SUFFIX)):
+                yield Path(entry.path), entry.stat()
+
+    def _manifest_sessions(self) -> dict:
+        """Map segment paths to the session info in their manifests."""
+        sessions = {}
+        for manifest_file in self.root.rglob(f"*{MANIFEST_SUFFIX}"):
+            manifest = load_manifest(manifest_file)
+            if manifest is None:
+                continue
+            for number, segment in enumerate(manifest.segments):
+                sessions[str(manifest_file.parent / segment.path)] = {
+                    "session": manifest.session_id,
+                    "name": manifest.window_name,
+                    "segment": number,
+                    "manifest": str(manifest_file),
+                }
+        return sessions
+
+    def search(self, name: Optional[str] = None, host: Optional[str] = None,
+               session: Optional[str] = None, window: Optional[str] = None, since: Optional[float] = None,
+               until: Optional[float] = None, active: Optional[bool] = None,
+               limit: int = 100) -> List[CatalogEntry]:
+        """Find recordings, newest first.
+
+        Args:
+            name: Substring of the window name
+            host: Exact host
+            session: Exact session
+            window: Exact window ID, e.g. "@1"
+            since: Only recordings still running at or after this time
+            until: Only recordings started before this time
+            active: Only active (True) or finished (False) recordings
+            limit: Maximum number of results
+        """
+        clauses = []
+        params = []
+
+        if name:
+            clauses.append("name LIKE ?")
+            params.append(f"%{name}%")
+        if host:
+            clauses.append("host = ?")
+            params.append(host)
+        if session:
+            clauses.append("session = ?")
+            params.append(session)
+        if window:
+            clauses.append("window = ?")
+            params.append(window)
+        if since is not None:
+            clauses.append("ended >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("started < ?")
+            params.append(until)
+        if active is not None:
+            clauses.append("active = ?")
+            params.append(int(active))
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        params.append(limit)
+
+        with self.connect() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM recordings {where} ORDER BY started DESC, segment DESC LIMIT ?", params
+            ).fetchall()
+
+        return [CatalogEntry(**{k: row[k] for k in row.keys() if k != "mtime"}) for row in rows]
+
+
+def get_catalog() -> Optional[Catalog]:
+    """Get the catalog for the configured output directory, if enabled."""
+    config = get_config()
+    if not config.output.catalog:
+        return None
+    return Catalog(Path(config.output.directory).expanduser())
@@ -8,12 +8,28 @@ from typing import Any, Dict, Optional, get_type_hints, get_origin, get_args
 from pydantic import BaseModel
 from fastapi.routing import APIRoute
 
+try:
+    from fastapi.routing import iter_route_contexts
+except ImportError:  # FastAPI that copies included routers' routes into app.routes
+    iter_route_contexts = None
+
 from ..connection import Connection
 from ..server.main import app
 
 logger = logging.getLogger(__name__)
 
 
+def api_routes() -> list:
+    """Get every API route of the app, including those of included routers.
+
+    Newer FastAPI keeps included routers in app.routes as they are, so
+    they are walked for routes with the full path and methods.
+    """
+    if iter_route_contexts is None:
+        return [route for route in app.routes if isinstance(route, APIRoute)]
+    return [context for context in iter_route_contexts(app.routes) if isinstance(context.original_route, APIRoute)]
+
+
 def pydantic_to_click_options(model: type[BaseModel]):
     """Convert Pydantic model fields to Click options."""
     options = []
@@ -221,10 +237,7 @@ def generate_cli():
     # Group routes by base resource
     resources = {}
 
-    for route in app.routes:
-        if not isinstance(route, APIRoute):
-            continue
-
+    for route in api_routes():
         # Skip internal routes
         if route.path in ['/', '/version', '/openapi.json', '/docs', '/redoc']:
             continue
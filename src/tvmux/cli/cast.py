@@ -0,0 +1,141 @@
+"""Cast file commands."""
+import shutil
+import sys
+from pathlib import Path
+
+import click
+
+from ..cast import (
+    BinaryCast, compress_cast, compress_idle, convert_cast, is_binary, is_compressed, load_idle_map, open_cast,
+    update_index
+)
+from ..config import get_config
+
+
+@click.group()
+def cast():
+    """Work with recorded cast files."""
+    pass
+
+
+@cast.command("index")
+@click.argument("cast_files", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+def index(cast_files):
+    """Build or update the seek index for cast files."""
+    config = get_config()
+    failed = False
+
+    for cast_file in cast_files:
+        if is_binary(Path(cast_file)):
+            # Binary casts are indexed by their block headers
+            try:
+                with BinaryCast(Path(cast_file)) as binary:
+                    click.echo(f"{cast_file}: {binary.event_count} events, "
+                               f"{binary.duration:.1f}s, {len(binary.blocks)} blocks")
+            except (OSError, ValueError) as e:
+                click.echo(f"Failed to read {cast_file}: {e}", err=True)
+                failed = True
+            continue
+
+        cast_index = update_index(Path(cast_file), config.recording.index_every_seconds,
+                                  config.recording.index_every_bytes)
+        if cast_index is None:
+            click.echo(f"Failed to index {cast_file}", err=True)
+            failed = True
+            continue
+
+        click.echo(f"{cast_file}: {cast_index.event_count} events, "
+                   f"{cast_index.duration:.1f}s, {len(cast_index.offsets)} index entries")
+
+    if failed:
+        raise SystemExit(1)
+
+
+@cast.command("compress")
+@click.argument("cast_files", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("--frame-size", type=int, help="Uncompressed bytes per frame (default: recording.compression_frame_size)")
+@click.option("--keep", is_flag=True, help="Keep the uncompressed cast")
+def compress(cast_files, frame_size, keep):
+    """Compress cast files into seekable gzip frames."""
+    config = get_config()
+    frame_size = frame_size or config.recording.compression_frame_size
+    failed = False
+
+    for cast_file in cast_files:
+        path = Path(cast_file)
+        if is_compressed(path):
+            click.echo(f"{cast_file} is already compressed")
+            continue
+        if is_binary(path):
+            click.echo(f"{cast_file} is a binary cast, convert it to asciicast to compress it")
+            continue
+
+        before = path.stat().st_size
+        compressed = compress_cast(path, frame_size, remove=not keep)
+        if compressed is None:
+            click.echo(f"Failed to compress {cast_file}", err=True)
+            failed = True
+            continue
+
+        after = compressed.stat().st_size
+        click.echo(f"{compressed}: {before} -> {after} bytes ({after * 100 // max(before, 1)}%)")
+
+    if failed:
+        raise SystemExit(1)
+
+
+@cast.command("idle")
+@click.argument("cast_files", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("--limit", type=float, help="Longest gap to keep in seconds (default: recording.idle_time_limit)")
+def idle(cast_files, limit):
+    """Cap idle gaps in cast files, or show the gaps already capped."""
+    limit = limit if limit is not None else get_config().recording.idle_time_limit
+    failed = False
+
+    for cast_file in cast_files:
+        path = Path(cast_file)
+        idle_map = load_idle_map(path)
+        if idle_map is None:
+            if is_compressed(path) or is_binary(path) or limit <= 0:
+                click.echo(f"{cast_file}: idle time not capped")
+                continue
+            idle_map = compress_idle(path, limit)
+            if idle_map is None:
+                click.echo(f"Failed to cap idle time in {cast_file}", err=True)
+                failed = True
+                continue
+
+        click.echo(f"{cast_file}: {len(idle_map.periods)} gaps over {idle_map.limit:g}s, "
+                   f"{idle_map.removed:.1f}s removed of {idle_map.original_duration:.1f}s")
+        for period in idle_map.periods:
+            click.echo(f"  at {period.start:10.1f}s  {period.original:10.1f}s -> {period.stored:g}s")
+
+    if failed:
+        raise SystemExit(1)
+
+
+@cast.command("cat")
+@click.argument("cast_file", type=click.Path(exists=True, dir_okay=False))
+def cat(cast_file):
+    """Write a plain, compressed or binary cast to stdout as asciicast."""
+    with open_cast(Path(cast_file)) as f:
+        shutil.copyfileobj(f, sys.stdout.buffer)
+
+
+@cast.command("convert")
+@click.argument("cast_file", type=click.Path(exists=True, dir_okay=False))
+@click.argument("output", type=click.Path(dir_okay=False))
+@click.option("--to", "version", type=click.Choice(["2", "3"]), default="2", show_default=True,
+              help="asciicast version to write, unless OUTPUT is a binary cast")
+def convert(cast_file, output, version):
+    """Write a plain, compressed or binary cast to OUTPUT as asciicast v2 or v3.
+
+    An OUTPUT ending in .tvcast gets a binary cast instead.
+    """
+    try:
+        events = convert_cast(Path(cast_file), Path(output), int(version))
+    except (OSError, ValueError) as e:
+        click.echo(f"Failed to convert {cast_file}: {e}", err=True)
+        raise SystemExit(1)
+    written_as = "a binary cast" if is_binary(Path(output)) else f"asciicast v{version}"
+    click.echo(f"{output}: {events} events as {written_as}")
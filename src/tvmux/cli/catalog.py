@@ -0,0 +1,63 @@
+"""Recording catalog commands."""
+from datetime import datetime
+
+import click
+
+from ..catalog import get_catalog
+from ..search import get_search_index
+
+
+def _require_catalog():
+    """Get the catalog, or exit if it is disabled."""
+    catalog = get_catalog()
+    if catalog is None:
+        click.echo("Catalog is disabled (output.catalog = false)", err=True)
+        raise SystemExit(1)
+    return catalog
+
+
+@click.group()
+def catalog():
+    """Find past recordings."""
+    pass
+
+
+@catalog.command("scan")
+def scan():
+    """Update the catalog and search index from the files in the output directory."""
+    result = _require_catalog().scan()
+    click.echo(f"{result.added} added, {result.updated} updated, "
+               f"{result.unchanged} unchanged, {result.removed} removed")
+
+    search_index = get_search_index()
+    if search_index:
+        click.echo(f"{search_index.update()} lines of output indexed")
+
+
+@catalog.command("ls")
+@click.option("-n", "--name", help="Window name contains this")
+@click.option("--host", help="Recorded on this host")
+@click.option("-s", "--session", help="Recorded in this tmux session")
+@click.option("--since", type=click.DateTime(), help="Still running at or after this time")
+@click.option("--until", type=click.DateTime(), help="Started before this time")
+@click.option("--limit", type=int, default=50, show_default=True, help="Maximum number of results")
+@click.option("--paths", is_flag=True, help="Only print cast paths")
+def ls(name, host, session, since, until, limit, paths):
+    """List recordings, newest first."""
+    entries = _require_catalog().search(
+        name=name, host=host, session=session,
+        since=since.timestamp() if since else None,
+        until=until.timestamp() if until else None,
+        limit=limit,
+    )
+
+    for entry in entries:
+        if paths:
+            click.echo(entry.path)
+            continue
+
+        started = datetime.fromtimestamp(entry.started).strftime("%Y-%m-%d %H:%M") if entry.started else "?"
+        state = " (recording)" if entry.active else ""
+        click.echo(f"{started}  {entry.duration:8.1f}s  {entry.bytes:>10}  "
+                   f"{entry.host or '?'}:{entry.session or '?'}:{entry.name or '?'}{state}")
+        click.echo(f"    {entry.path}")
@@ -0,0 +1,51 @@
+"""Live grep command."""
+import json
+from datetime import datetime
+
+import click
+import httpx
+
+from ..connection import Connection
+
+
+@click.command()
+@click.argument("patterns", nargs=-1, required=True)
+@click.option("-f", "--follow", is_flag=True, help="Keep streaming matches from live output")
+@click.option("-i", "--ignore-case", is_flag=True, help="Match case-insensitively")
+def grep(patterns, follow, ignore_case):
+    """Match active recordings' output against regular expressions.
+
+    Without --follow, searches what has been recorded so far. With it,
+    matches new output from every active recording as it happens.
+    """
+    conn = Connection()
+    if not conn.is_running:
+        click.echo("Server not running", err=True)
+        raise SystemExit(1)
+
+    params = {"pattern": list(patterns), "follow": follow, "ignore_case": ignore_case}
+    found = False
+
+    try:
+        with conn.client() as client:
+            with client.stream("GET", "/grep/", params=params, timeout=None) as response:
+                if response.status_code != 200:
+                    response.read()
+                    click.echo(f"Error: {response.json().get('detail', response.text)}", err=True)
+                    raise SystemExit(1)
+
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    match = json.loads(line)
+                    at = datetime.fromtimestamp(match["at"]).strftime("%H:%M:%S") if match["at"] else "?"
+                    click.echo(f"{at} {match['recording_id']}: {match['text']}")
+                    found = True
+    except KeyboardInterrupt:
+        pass
+    except httpx.HTTPError as e:
+        click.echo(f"Connection to server lost: {e}", err=True)
+        raise SystemExit(1)
+
+    if not found:
+        raise SystemExit(1)
@@ -11,6 +11,10 @@ from .record import rec
 from .config import config
 from .api_cli import api
 from .tui import tui
+from .cast import cast
+from .catalog import catalog
+from .search import search
+from .grep import grep
 from ..config import load_config, set_config
 from ..connection import Connection
 from .. import __version__
@@ -107,6 +111,10 @@ cli.add_command(rec)
 cli.add_command(config)
 cli.add_command(api)
 cli.add_command(tui)
+cli.add_command(cast)
+cli.add_command(catalog)
+cli.add_command(search)
+cli.add_command(grep)
 
 
 if __name__ == "__main__":
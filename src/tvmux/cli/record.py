@@ -5,7 +5,7 @@ import subprocess
 import click
 
 from ..connection import Connection
-from ..server.routers.recording import RecordingCreate
+from ..server.routers.recording import RecordingCreate, RecordingCreateBatch, RecordingStopBulk
 from ..config import get_config
 
 
@@ -19,8 +19,14 @@ def rec(ctx):
 
 
 @rec.command("start")
-def start():
-    """Start recording the current tmux window."""
+@click.option("-s", "--session", "session_id", help="Record every window in this session")
+@click.option("-a", "--all", "all_sessions", is_flag=True, help="Record every window in every session")
+@click.option("--coalesce", "coalesce_interval", type=float,
+              help="Merge output within this many seconds into one event, e.g. 0.016 for noisy windows")
+@click.option("--all-panes/--active-pane", "all_panes", default=None,
+              help="Also record every pane into its own track (default: recording.all_panes)")
+def start(session_id=None, all_sessions=False, coalesce_interval=None, all_panes=None):
+    """Start recording the current tmux window, or many windows at once."""
     conn = Connection()
     config = get_config()
 
@@ -35,6 +41,10 @@ def start():
             click.echo("Server not running", err=True)
             raise SystemExit(1)
 
+    if session_id or all_sessions:
+        _start_batch(conn, session_id, all_sessions, coalesce_interval, all_panes)
+        return
+
     # Check if we're in tmux
     if not os.environ.get("TMUX"):
         click.echo("Not in a tmux session", err=True)
@@ -60,7 +70,9 @@ def start():
         request_data = RecordingCreate(
             session_id=session_name,
             window_id=window_id,
-            active_pane=pane_id
+            active_pane=pane_id,
+            coalesce_interval=coalesce_interval,
+            all_panes=all_panes,
         )
 
         # Use Connection client to get status code
@@ -86,6 +98,47 @@ def start():
         raise click.Abort()
 
 
+def _start_batch(conn: Connection, session_id, all_sessions, coalesce_interval=None, all_panes=None):
+    """Start recording many windows with one API call."""
+    try:
+        request_data = RecordingCreateBatch(session_id=session_id, all=all_sessions,
+                                            coalesce_interval=coalesce_interval, all_panes=all_panes)
+
+        api = conn.client()
+        response = api.post("/recordings/batch", json=request_data.model_dump(), timeout=60.0)
+
+        if response.status_code != 200:
+            click.echo(f"Failed to start recordings: {response.text}", err=True)
+            raise click.Abort()
+
+        results = response.json()
+        if not results:
+            click.echo("No windows to record")
+            return
+
+        failed_count = 0
+        for result in results:
+            rec_id = result['recording_id']
+            if result['status'] == "started":
+                click.echo(f"Started recording {rec_id}")
+                click.echo(f"Recording to: {result['cast_path']}")
+            elif result['status'] == "already_active":
+                click.echo(f"Recording already active {rec_id}")
+            else:
+                click.echo(f"Failed to start recording {rec_id}: {result.get('error')}", err=True)
+                failed_count += 1
+
+        if failed_count > 0:
+            click.echo(f"Failed to start {failed_count} recording(s)", err=True)
+            raise SystemExit(1)
+
+    except (click.Abort, SystemExit):
+        raise
+    except Exception as e:
+        click.echo(f"Error starting recordings: {e}", err=True)
+        raise click.Abort()
+
+
 @rec.command("ls")
 @click.option("-q", "--quiet", is_flag=True, help="Only output recording IDs (one per line)")
 def ls(quiet):
@@ -136,77 +189,67 @@ def ls(quiet):
 
 @rec.command("stop")
 @click.argument("recording_ids", nargs=-1)
-def stop(recording_ids):
+@click.option("-s", "--session", "session_id", help="Only stop recordings in this session")
+@click.option("--timeout", type=float, help="Overall deadline in seconds (default: server.stop_timeout)")
+def stop(recording_ids, session_id, timeout):
     """Stop recording(s). Stop all recordings if no IDs specified."""
     conn = Connection()
     if not conn.is_running:
         click.echo("Server not running", err=True)
         raise SystemExit(1)
 
-    # Call API to stop recording(s)
+    # Call API to stop all matching recordings in one request
     try:
         api = conn.client()
 
-        if recording_ids:
-            # Stop specific recording(s)
-            stopped_count = 0
-            failed_count = 0
-
-            for recording_id in recording_ids:
-                response = api.delete(f"/recordings/{recording_id}", timeout=10.0)
-
-                if response.status_code == 200:
-                    data = response.json()
-                    click.echo(f"Stopped recording '{recording_id}'")
-                    if 'cast_path' in data and data['cast_path']:
-                        click.echo(f"Recording saved to: {data['cast_path']}")
-                    stopped_count += 1
-                elif response.status_code == 404:
-                    click.echo(f"Recording '{recording_id}' not found", err=True)
-                    failed_count += 1
-                else:
-                    click.echo(f"Failed to stop recording '{recording_id}': {response.text}", err=True)
-                    failed_count += 1
-
-            # Summary message for multiple IDs
-            if len(recording_ids) > 1:
-                if stopped_count > 0:
-                    click.echo(f"Successfully stopped {stopped_count} recording(s)")
-                if failed_count > 0:
-                    click.echo(f"Failed to stop {failed_count} recording(s)", err=True)
-                    raise SystemExit(1)
-        else:
-            # Stop all recordings (default behavior)
-            # First get list of active recordings
-            list_response = api.get("/recordings/")
-
-            if list_response.status_code != 200:
-                click.echo(f"Failed to list recordings: {list_response.text}", err=True)
-                raise click.Abort()
-
-            recordings = list_response.json()
-
-            if not recordings:
-                click.echo("No active recordings to stop")
-                return
-
-            # Stop each recording
-            stopped_count = 0
-            for recording in recordings:
-                rec_id = recording['id']
-                response = api.delete(f"/recordings/{rec_id}", timeout=10.0)
-                if response.status_code == 200:
-                    stopped_count += 1
-                    data = response.json()
-                    click.echo(f"Stopped recording '{rec_id}'")
-                    if 'cast_path' in data and data['cast_path']:
-                        click.echo(f"Recording saved to: {data['cast_path']}")
-                else:
-                    click.echo(f"Failed to stop recording '{rec_id}': {response.text}", err=True)
+        request_data = RecordingStopBulk(
+            session_id=session_id,
+            recording_ids=list(recording_ids) if recording_ids else None,
+            timeout=timeout
+        )
+        deadline = timeout if timeout is not None else get_config().server.stop_timeout
+        response = api.post("/recordings/stop", json=request_data.model_dump(),
+                            timeout=deadline + 10.0)
+
+        if response.status_code != 200:
+            click.echo(f"Failed to stop recordings: {response.text}", err=True)
+            raise click.Abort()
 
-            if stopped_count > 0:
-                click.echo(f"Stopped {stopped_count} recording(s)")
+        results = response.json()
+
+        if not results:
+            click.echo("No active recordings to stop")
+            return
+
+        stopped_count = 0
+        failed_count = 0
+        for result in results:
+            rec_id = result['recording_id']
+            if result['status'] == "stopped":
+                click.echo(f"Stopped recording '{rec_id}'")
+                if result.get('cast_path'):
+                    click.echo(f"Recording saved to: {result['cast_path']}")
+                stopped_count += 1
+            elif result['status'] == "not_found":
+                click.echo(f"Recording '{rec_id}' not found", err=True)
+                failed_count += 1
+            elif result['status'] == "timeout":
+                click.echo(f"Recording '{rec_id}' is still stopping in the background", err=True)
+                failed_count += 1
+            else:
+                click.echo(f"Failed to stop recording '{rec_id}': {result.get('error')}", err=True)
+                failed_count += 1
+
+        # Summary message for multiple recordings
+        if len(results) > 1 and stopped_count > 0:
+            click.echo(f"Stopped {stopped_count} recording(s)")
+        if failed_count > 0:
+            if len(results) > 1:
+                click.echo(f"Failed to stop {failed_count} recording(s)", err=True)
+            raise SystemExit(1)
 
+    except (click.Abort, SystemExit):
+        raise
     except Exception as e:
         click.echo(f"Error stopping recording: {e}", err=True)
         raise click.Abort()
@@ -0,0 +1,37 @@
+"""Full-text search command."""
+from datetime import datetime
+
+import click
+
+from ..search import get_search_index
+
+
+@click.command()
+@click.argument("query")
+@click.option("-n", "--name", help="Window name contains this")
+@click.option("--host", help="Recorded on this host")
+@click.option("-s", "--session", help="Recorded in this tmux session")
+@click.option("--raw", is_flag=True, help="Use SQLite FTS5 query syntax (AND, OR, NEAR, prefix*)")
+@click.option("--limit", type=int, default=50, show_default=True, help="Maximum number of results")
+def search(query, name, host, session, raw, limit):
+    """Find recordings containing QUERY in their output.
+
+    Searches the index built by the server and `tvmux catalog scan`.
+    """
+    search_index = get_search_index()
+    if search_index is None:
+        click.echo("Search is disabled (search.enabled or output.catalog = false)", err=True)
+        raise SystemExit(1)
+
+    try:
+        hits = search_index.search(query, name=name, host=host, session=session, raw=raw, limit=limit)
+    except ValueError as e:
+        click.echo(str(e), err=True)
+        raise SystemExit(1)
+
+    if not hits:
+        raise SystemExit(1)
+
+    for hit in hits:
+        at = datetime.fromtimestamp(hit.at).strftime("%Y-%m-%d %H:%M:%S") if hit.at else "?"
+        click.echo(f"{at}  {hit.path}@{hit.time:.1f}s  {hit.text}")
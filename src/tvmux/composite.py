@@ -0,0 +1,464 @@
+"""Composite a window's panes into one recording of what was on screen.
+
+Every pane recorded as a track also feeds a virtual screen here, a headless
+bittty terminal the size of the pane. A render thread lays the screens out
+by the window's layout, draws the borders between them the way tmux does,
+and writes the result to ``<name>.composite.cast`` a few times a second,
+or ``<name>.composite.cast.gz`` if the window's cast is compressed.
+
+Only what changed is written: each screen tracks which of its rows were
+touched since the last frame, a frame redraws just those rows, and rows
+that come out the same as last time are skipped. Borders are only drawn
+again when the layout changes. Parsing and rendering happen in the render
+thread, so the relay only hands over bytes.
+"""
+import codecs
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from bittty import Board
+from bittty.style import Style
+
+from .cast.binary import BINARY_SUFFIX
+from .cast.compress import DEFAULT_FRAME_SIZE, CompressedCastWriter, is_compressed
+from .cast.tracks import LayoutSnapshot, PaneGeometry
+from .cast.writer import CastWriter, WriteMeter
+
+logger = logging.getLogger(__name__)
+
+COMPOSITE_SUFFIX = ".composite.cast"
+
+DEFAULT_FPS = 10.0
+
+# How long the render thread sleeps when no frame is due
+IDLE_TIMEOUT = 0.1
+
+# Border characters by which neighbours are also border: up, down, left, right
+_UP, _DOWN, _LEFT, _RIGHT = 1, 2, 4, 8
+BORDER_CHARS = {
+    0: "│", _UP: "│", _DOWN: "│", _UP | _DOWN: "│",
+    _LEFT: "─", _RIGHT: "─", _LEFT | _RIGHT: "─",
+    _UP | _LEFT: "┘", _UP | _RIGHT: "└", _DOWN | _LEFT: "┐", _DOWN | _RIGHT: "┌",
+    _UP | _DOWN | _LEFT: "┤", _UP | _DOWN | _RIGHT: "├",
+    _UP | _LEFT | _RIGHT: "┴", _DOWN | _LEFT | _RIGHT: "┬",
+    _UP | _DOWN | _LEFT | _RIGHT: "┼",
+}
+
+# tmux's default pane-active-border-style
+ACTIVE_BORDER = "\033[32m"
+RESET = "\033[0m"
+
+# The empty character bittty stores after a double width one
+CONTINUATION = ""
+
+_DEFAULT_STYLE = Style()
+
+
+def composite_path(cast_path: Path) -> Path:
+    """Get the composite cast path for the window recorded in `cast_path`."""
+    name = cast_path.name
+    for suffix in (BINARY_SUFFIX, ".cast.gz", ".cast"):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+            break
+    return cast_path.with_name(name + COMPOSITE_SUFFIX + (".gz" if is_compressed(cast_path) else ""))
+
+
+def _move(row: int, column: int) -> str:
+    """Move the cursor to a zero-based cell."""
+    return f"\033[{row + 1};{column + 1}H"
+
+
+def render_row(row: list, width: int) -> str:
+    """Render a row of screen cells as text and escape sequences.
+
+    Does the same as bittty's Video.get_line(), but only works out style
+    changes where the style differs from the cell before, which neighbouring
+    cells usually share.
+    """
+    parts = []
+    current = _DEFAULT_STYLE
+    limit = min(len(row), width)
+    for x in range(limit):
+        style, char = row[x]
+        if char == CONTINUATION:
+            continue
+        if x + 1 == limit and x + 1 < len(row) and row[x + 1][1] == CONTINUATION:
+            char = " "  # Double width character cut off by the edge
+        if style is not current and style != current:
+            parts.append(current.diff(style))
+            current = style
+        parts.append(char)
+
+    if current != _DEFAULT_STYLE:
+        parts.append(current.diff(_DEFAULT_STYLE))
+    if limit < width:
+        parts.append(" " * (width - limit))
+    return "".join(parts)
+
+
+def draw_borders(snapshot: LayoutSnapshot) -> str:
+    """Draw the borders between a window's panes, with the active pane's highlighted."""
+    width, height = snapshot.width, snapshot.height
+    covered = [[False] * width for _ in range(height)]
+    for pane in snapshot.panes:
+        for y in range(max(pane.top, 0), min(pane.top + pane.height, height)):
+            row = covered[y]
+            for x in range(max(pane.left, 0), min(pane.left + pane.width, width)):
+                row[x] = True
+
+    active = next((pane for pane in snapshot.panes if pane.active), None)
+
+    def border(x: int, y: int) -> bool:
+        return 0 <= x < width and 0 <= y < height and not covered[y][x]
+
+    def highlighted(x: int, y: int) -> bool:
+        return active is not None and active.left - 1 <= x <= active.left + active.width \
+            and active.top - 1 <= y <= active.top + active.height
+
+    parts = []
+    for y in range(height):
+        run_start = None
+        for x in range(width + 1):
+            if x < width and border(x, y):
+                if run_start is None:
+                    run_start = x
+                    parts.append(_move(y, x))
+                mask = (_UP if border(x, y - 1) else 0) | (_DOWN if border(x, y + 1) else 0) \
+                    | (_LEFT if border(x - 1, y) else 0) | (_RIGHT if border(x + 1, y) else 0)
+                char = BORDER_CHARS[mask]
+                parts.append(ACTIVE_BORDER + char + RESET if highlighted(x, y) else char)
+            else:
+                run_start = None
+    return "".join(parts)
+
+
+class PaneScreen:
+    """A virtual screen holding what one pane shows."""
+
+    def __init__(self, width: int, height: int):
+        self.board = Board(width=width, height=height)
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.page = None  # Screen buffer the rows were last taken from
+        self.seen = 0  # Dirty tracking epoch of the last frame
+        self.lines: List[Optional[str]] = [None] * height  # Rows as last written
+
+    @property
+    def width(self) -> int:
+        return self.board.width
+
+    @property
+    def height(self) -> int:
+        return self.board.height
+
+    def feed(self, data: bytes) -> None:
+        """Update the screen with output from the pane."""
+        text = self.decoder.decode(data)
+        if text:
+            self.board.parser.feed(text)
+
+    def resize(self, width: int, height: int) -> None:
+        """Resize the screen, so the next frame redraws all of it."""
+        self.board.resize(width, height)
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        """Forget what was written, so the next frame redraws every row."""
+        self.page = None
+        self.lines = [None] * self.height
+
+    def changed_rows(self, damage: bool = True) -> List[Tuple[int, str]]:
+        """Get the rows that look different since the last call.
+
+        Args:
+            damage: Only look at rows written to since the last call. Without
+                it every row is rendered and compared, for benchmarking.
+
+        Returns:
+            (row, rendered line) for each changed row
+        """
+        page = self.board.blitter.current_buffer
+        if not damage or page is not self.page:
+            # Switched between the normal and alternate screen, or never drawn
+            rows = range(self.height)
+        else:
+            rows = page.dirty_rows(self.seen)
+        self.page = page
+        self.seen = page.observe()
+
+        changed = []
+        for y in rows:
+            line = render_row(page.grid[y], self.width)
+            if line != self.lines[y]:
+                self.lines[y] = line
+                changed.append((y, line))
+        return changed
+
+    def cursor(self) -> Tuple[int, int, bool]:
+        """Get the cursor's column, row and visibility."""
+        cursor = self.board.cursor
+        return (min(cursor.x, self.width - 1), min(cursor.y, self.height - 1),
+                bool(self.board.modes.cursor_visible))
+
+
+class Compositor:
+    """Builds one window's composite cast from its panes' output.
+
+    Output and layout changes can arrive from any thread; they are applied
+    when the next frame is rendered.
+    """
+
+    def __init__(self, path: Path, started: Optional[float] = None, timestamp: Optional[int] = None,
+                 fps: float = DEFAULT_FPS, damage: bool = True, meter: Optional[WriteMeter] = None,
+                 version: int = 2, idle_time_limit: float = 0.0, frame_size: int = DEFAULT_FRAME_SIZE):
+        """Set up a compositor. The cast is created when the first layout arrives.
+
+        Args:
+            path: Composite cast to write
+            started: time.monotonic() value that event times count from
+            timestamp: Unix time the cast starts at, for the header
+            fps: Most frames written per second
+            damage: Only redraw changed rows (turn off to benchmark without it)
+            meter: Also counts what is written to the composite
+            version: asciicast version to write
+            idle_time_limit: Longest gap between frames to write (0 = no limit)
+            frame_size: Uncompressed bytes per frame, if the cast is compressed
+        """
+        self.path = path
+        self.started = started
+        self.timestamp = timestamp
+        self.interval = 1.0 / fps if fps > 0 else 0.0
+        self.damage = damage
+        self.meter = meter
+        self.version = version
+        self.idle_time_limit = idle_time_limit
+        self.frame_size = frame_size
+
+        self.writer: Optional[CastWriter] = None
+        self.screens: Dict[str, PaneScreen] = {}
+        self.layout: Optional[LayoutSnapshot] = None
+        self.cursor: Optional[Tuple[int, int, bool]] = None
+        self.frames = 0
+
+        self._lock = threading.Lock()  # Guards what arrives from other threads
+        self._render_lock = threading.Lock()  # Guards the screens and writer
+        self._pending: Dict[str, bytearray] = {}
+        self._pending_layout: Optional[LayoutSnapshot] = None
+        self._dirty = False
+        self._last_frame = 0.0
+        self._closed = False
+
+    def feed(self, pane_id: str, data: bytes) -> None:
+        """Queue output from a pane for the next frame."""
+        with self._lock:
+            pending = self._pending.get(pane_id)
+            if pending is None:
+                self._pending[pane_id] = bytearray(data)
+            else:
+                pending += data
+            self._dirty = True
+
+    def set_layout(self, snapshot: LayoutSnapshot) -> None:
+        """Queue a new pane layout for the next frame."""
+        with self._lock:
+            self._pending_layout = snapshot
+            self._dirty = True
+
+    def due(self) -> Optional[float]:
+        """Get when the next frame should be rendered, or None if nothing has changed."""
+        if not self._dirty:
+            return None
+        return self._last_frame + self.interval
+
+    def render(self, now: Optional[float] = None) -> bool:
+        """Bring the screens up to date and write a frame of what changed.
+
+        Returns:
+            Whether a frame was written
+        """
+        with self._render_lock:
+            if self._closed:
+                return False
+            now = now if now is not None else time.monotonic()
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                layout, self._pending_layout = self._pending_layout, None
+                self._dirty = False
+            self._last_frame = now
+
+            parts = []
+            if layout is not None:
+                parts.append(self._apply_layout(layout, now))
+            if self.writer is None:
+                return False
+
+            for pane_id, data in pending.items():
+                screen = self.screens.get(pane_id)
+                if screen is not None:
+                    screen.feed(bytes(data))
+
+            for pane in self.layout.panes:
+                screen = self.screens[pane.pane_id]
+                for y, line in screen.changed_rows(self.damage):
+                    parts.append(_move(pane.top + y, pane.left) + line)
+
+            cursor = self._active_cursor()
+            if cursor is not None and (parts or cursor != self.cursor):
+                column, row, visible = cursor
+                if self.cursor is None or visible != self.cursor[2]:
+                    parts.append("\033[?25h" if visible else "\033[?25l")
+                parts.append(_move(row, column))
+                self.cursor = cursor
+
+            frame = "".join(parts)
+            if not frame:
+                return False
+            self.writer.event("o", frame, now)
+            self.frames += 1
+            return True
+
+    def close(self) -> None:
+        """Render whatever is left and close the cast."""
+        self.render()
+        with self._render_lock:
+            self._closed = True
+            if self.writer is not None:
+                self.writer.close()
+
+    def _apply_layout(self, snapshot: LayoutSnapshot, now: float) -> str:
+        """Arrange the screens for a new layout. Called with the render lock held.
+
+        Returns:
+            Output redrawing the borders, and clearing the window if it changed size
+        """
+        previous = self.layout
+        if previous is not None and previous.same_as(snapshot):
+            return ""
+        self.layout = snapshot
+
+        current = {pane.pane_id: pane for pane in snapshot.panes}
+        for pane_id in list(self.screens):
+            if pane_id not in current:
+                del self.screens[pane_id]
+        for pane_id, pane in current.items():
+            screen = self.screens.get(pane_id)
+            if screen is None:
+                self.screens[pane_id] = PaneScreen(pane.width, pane.height)
+            elif (screen.width, screen.height) != (pane.width, pane.height):
+                screen.resize(pane.width, pane.height)
+
+        resized = previous is None or (previous.width, previous.height) != (snapshot.width, snapshot.height)
+        if self.writer is None:
+            if is_compressed(self.path):
+                self.writer = CompressedCastWriter(self.path, snapshot.width, snapshot.height,
+                                                   started=self.started, timestamp=self.timestamp,
+                                                   meter=self.meter, version=self.version,
+                                                   idle_time_limit=self.idle_time_limit,
+                                                   frame_size=self.frame_size)
+            else:
+                self.writer = CastWriter(self.path, snapshot.width, snapshot.height,
+                                         started=self.started, timestamp=self.timestamp, meter=self.meter,
+                                         version=self.version, idle_time_limit=self.idle_time_limit)
+        elif resized:
+            self.writer.resize(snapshot.width, snapshot.height, now)
+
+        moved = previous is None or resized or self._moved(previous, snapshot)
+        if not moved:
+            # Only the active pane changed, so just the borders need drawing
+            return draw_borders(snapshot)
+
+        # Panes moved, so everything has to be drawn again
+        for screen in self.screens.values():
+            screen.invalidate()
+        self.cursor = None
+        return RESET + "\033[2J" + draw_borders(snapshot)
+
+    @staticmethod
+    def _moved(previous: LayoutSnapshot, snapshot: LayoutSnapshot) -> bool:
+        """Check whether any pane was added, removed, moved or resized."""
+        def places(layout: LayoutSnapshot):
+            return {(p.pane_id, p.left, p.top, p.width, p.height) for p in layout.panes}
+        return places(previous) != places(snapshot)
+
+    def _active_cursor(self) -> Optional[Tuple[int, int, bool]]:
+        """Get the cursor position in the window, from the active pane."""
+        pane: Optional[PaneGeometry] = next((p for p in self.layout.panes if p.active), None)
+        if pane is None:
+            return None
+        column, row, visible = self.screens[pane.pane_id].cursor()
+        return (pane.left + column, pane.top + row, visible)
+
+
+class Renderer:
+    """Renders frames for every compositor in a single thread."""
+
+    def __init__(self):
+        self._compositors: Dict[str, Compositor] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, key: str, compositor: Compositor) -> None:
+        """Start rendering frames for a compositor."""
+        with self._lock:
+            self._compositors[key] = compositor
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="tvmux-composite", daemon=True)
+                self._thread.start()
+
+    def remove(self, key: str) -> Optional[Compositor]:
+        """Stop rendering for a compositor, writing its last frame and closing its cast."""
+        with self._lock:
+            compositor = self._compositors.pop(key, None)
+        if compositor is None:
+            return None
+
+        try:
+            compositor.close()
+        except Exception:
+            logger.exception(f"Failed to finish composite {compositor.path}")
+        logger.debug(f"Stopped compositing {key} after {compositor.frames} frames")
+        return compositor
+
+    def get(self, key: str) -> Optional[Compositor]:
+        """Get the compositor for a recording, if it has one."""
+        with self._lock:
+            return self._compositors.get(key)
+
+    def _run(self) -> None:
+        """Render frames as they fall due until no compositors are left."""
+        while True:
+            with self._lock:
+                if not self._compositors:
+                    self._thread = None
+                    return
+                compositors = list(self._compositors.values())
+
+            now = time.monotonic()
+            timeout = IDLE_TIMEOUT
+            for compositor in compositors:
+                due = compositor.due()
+                if due is None:
+                    continue
+                if due <= now:
+                    try:
+                        compositor.render(now)
+                    except Exception:
+                        logger.exception(f"Failed to render composite {compositor.path}")
+                    continue
+                timeout = min(timeout, due - now)
+
+            time.sleep(timeout)
+
+
+_renderer: Optional[Renderer] = None
+
+
+def get_renderer() -> Renderer:
+    """Get the server's composite renderer."""
+    global _renderer
+    if _renderer is None:
+        _renderer = Renderer()
+    return _renderer
@@ -18,6 +18,7 @@ class OutputConfig(BaseModel):
     """Output configuration."""
     directory: str = Field(default="~/Videos/tmux", description="Base directory for recordings")
     date_format: str = Field(default="%Y-%m", description="Date format for subdirectories")
+    catalog: bool = Field(default=True, description="Keep a catalog database of recordings in the output directory")
 
 
 class ServerConfig(BaseModel):
@@ -25,12 +26,39 @@ class ServerConfig(BaseModel):
     port: int = Field(default=21590, description="Server port")
     auto_start: bool = Field(default=True, description="Auto-start server when needed")
     auto_shutdown: bool = Field(default=True, description="Auto-shutdown when no recordings")
+    stop_timeout: float = Field(default=10.0, description="Deadline in seconds for stopping all recordings at once")
 
 
 class RecordingConfig(BaseModel):
     """Recording configuration."""
     repair_on_stop: bool = Field(default=True, description="Repair cast files on stop")
     follow_active_pane: bool = Field(default=True, description="Follow active pane switches")
+    index: bool = Field(default=True, description="Keep a time-to-offset index next to each cast")
+    index_every_seconds: float = Field(default=10.0, description="Index entry interval in recording time")
+    index_every_bytes: int = Field(default=1048576, description="Index entry interval in cast bytes")
+    compression: str = Field(default="none", description="Compress casts as they are written (none/gzip)")
+    compression_frame_size: int = Field(default=1048576, description="Uncompressed bytes per seekable frame")
+    segment_max_bytes: int = Field(default=0, description="Start a new cast segment after this many bytes (0 = never)")
+    segment_max_seconds: int = Field(default=0, description="Start a new cast segment after this many seconds (0 = never)")
+    buffer_bytes: int = Field(default=4194304, description="Output held for a cast writer that falls behind")
+    overflow_policy: str = Field(default="resync", description="When the buffer is full (resync/drop/block)")
+    pipe_size: int = Field(default=0, description="Kernel buffer size for recording FIFOs, counted against the per-user pipe quota (0 = system default)")
+    coalesce_interval: float = Field(default=0.0, description="Merge output arriving within this many seconds into one event (0 = off)")
+    coalesce_bytes: int = Field(default=65536, description="Most output merged into one event")
+    all_panes: bool = Field(default=False, description="Also record every pane of a window into its own track")
+    composite: bool = Field(default=False, description="With all_panes, also record the panes laid out as on screen")
+    composite_fps: float = Field(default=10.0, description="Most frames a second written to composite casts")
+    scrollback_lines: int = Field(default=0, description="Lines of history above the screen written at the start of a recording (0 = none)")
+    idle_time_limit: float = Field(default=0.0, description="Cap idle gaps in casts to this many seconds as they are written, keeping the original timing in a sidecar (0 = off)")
+    switch_settle_time: float = Field(default=0.1, description="Seconds the selected pane has to stay put before the recording follows it, so a burst of selections costs one switch (0 = no wait)")
+    cast_version: int = Field(default=2, description="asciicast version to write (2/3); v3 has shorter event times and marks pane switches")
+    cast_format: str = Field(default="asciicast", description="Format of main casts (asciicast/binary); binary casts load without parsing, other players need them converted")
+
+
+class SearchConfig(BaseModel):
+    """Full-text search configuration."""
+    enabled: bool = Field(default=True, description="Index recorded output for searching (needs output.catalog)")
+    index_interval: float = Field(default=30.0, description="Seconds between indexing runs over active recordings")
 
 
 class AnnotationConfig(BaseModel):
@@ -50,6 +78,7 @@ class Config(BaseModel):
     output: OutputConfig = Field(default_factory=OutputConfig)
     server: ServerConfig = Field(default_factory=ServerConfig)
     recording: RecordingConfig = Field(default_factory=RecordingConfig)
+    search: SearchConfig = Field(default_factory=SearchConfig)
     annotations: AnnotationConfig = Field(default_factory=AnnotationConfig)
     logging: LoggingConfig = Field(default_factory=LoggingConfig)
 
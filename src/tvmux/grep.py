@@ -0,0 +1,87 @@
+"""Match recorded output against regular expressions.
+
+Used by `tvmux grep` both over what active recordings have written so far
+and over live output as the relay passes it on.
+"""
+import json
+import re
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from .cast.compress import open_cast
+from .cast.events import EventClock, cast_version
+from .cast.text import TextLines
+
+
+class GrepMatch(BaseModel):
+    """A line of output matching one or more patterns."""
+    recording_id: str = Field(..., description="Recording the line came from")
+    at: Optional[float] = Field(None, description="When the line appeared (unix timestamp)")
+    text: str = Field(..., description="The line, without escape sequences")
+    patterns: List[str] = Field(..., description="Patterns that matched")
+
+
+class PatternSet:
+    """Several regular expressions matched against each line at once.
+
+    One combined expression rejects the common case of no match in a single
+    pass, then the individual patterns work out which ones matched.
+
+    Raises:
+        ValueError: If a pattern isn't a valid regular expression
+    """
+
+    def __init__(self, patterns: List[str], ignore_case: bool = False):
+        flags = re.IGNORECASE if ignore_case else 0
+        try:
+            self.compiled = [re.compile(pattern, flags) for pattern in patterns]
+            self.combined = re.compile("|".join(f"(?:{pattern})" for pattern in patterns), flags)
+        except re.error as e:
+            raise ValueError(f"Invalid pattern: {e}")
+        self.patterns = patterns
+
+    def match(self, line: str) -> List[str]:
+        """Get the patterns matching a line, if any."""
+        if not self.combined.search(line):
+            return []
+        return [pattern.pattern for pattern in self.compiled if pattern.search(line)]
+
+
+def cast_lines(cast_path: Path) -> Iterator[Tuple[float, str]]:
+    """Yield (time into the cast, text) for each line of output in a cast."""
+    lines = TextLines()
+
+    with open_cast(cast_path) as f:
+        clock = EventClock(cast_version(f.readline()))
+
+        for raw in f:
+            try:
+                time, kind, data = clock.decode(raw)
+            except (ValueError, TypeError):
+                continue
+            if kind == "o":
+                yield from lines.feed(time, data)
+
+    yield from lines.flush()
+
+
+def cast_started(cast_path: Path) -> Optional[float]:
+    """Get the start time from a cast's header."""
+    try:
+        with open_cast(cast_path) as f:
+            return json.loads(f.readline()).get("timestamp")
+    except (OSError, EOFError, ValueError, AttributeError):
+        return None
+
+
+def grep_cast(cast_path: Path, recording_id: str, patterns: PatternSet) -> Iterator[GrepMatch]:
+    """Find lines in a cast matching any of the patterns."""
+    started = cast_started(cast_path)
+
+    for time, text in cast_lines(cast_path):
+        matched = patterns.match(text)
+        if matched:
+            at = started + time if started is not None else None
+            yield GrepMatch(recording_id=recording_id, at=at, text=text, patterns=matched)
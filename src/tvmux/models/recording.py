@@ -1,22 +1,253 @@
 """Recording model for tvmux."""
 import asyncio
+import io
 import logging
 import os
+import sqlite3
 import subprocess
+import time
+import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import BinaryIO, Callable, Dict, List, NamedTuple, Optional, Tuple
 
 from pydantic import BaseModel, Field, ConfigDict
 
-from ..utils import get_session_dir, safe_filename, file_has_readers
+from ..utils import get_session_dir, safe_filename
 from ..repair import repair_cast_file
-from ..proc import run_bg
-from ..proc import bg
+from ..cast import update_index
+from ..cast.index import LiveIndex
+from ..catalog import Catalog
+from ..search import SearchIndex
+from ..cast.binary import BINARY_SUFFIX, BinaryCastWriter, is_binary
+from ..cast.compress import CompressedCastWriter, is_compressed
+from ..cast.segments import Manifest, Segment, load_manifest, manifest_path, save_manifest, segment_path
+from ..cast.tracks import (
+    LIST_PANES_FORMAT, LayoutSnapshot, TrackLayout, layout_path, load_layout, parse_panes, save_layout,
+    track_path
+)
+from ..cast.writer import CastWriter, WriteMeter
+from ..composite import Compositor, composite_path, get_renderer
+from ..recorder import get_recorder
+from ..relay import get_relay
 from ..config import get_config
 
 logger = logging.getLogger(__name__)
 
+# How long the recorder gets to finish writing after its input ends
+WRITER_EXIT_TIMEOUT = 5.0
+
+# Cast size when the pane's can't be found out
+DEFAULT_WIDTH, DEFAULT_HEIGHT = 80, 24
+
+# Bytes of captured pane content passed to the relay at a time
+CAPTURE_CHUNK_SIZE = 64 * 1024
+
+# Terminal state needed to redraw a pane, see _parse_pane_state()
+PANE_STATE_FORMAT = ",".join([
+    "#{pane_width}", "#{pane_height}", "#{cursor_x}", "#{cursor_y}", "#{cursor_flag}", "#{alternate_on}",
+    "#{alternate_saved_x}", "#{alternate_saved_y}", "#{scroll_region_upper}", "#{scroll_region_lower}",
+    "#{history_size}", "#{pane_title}",
+])
+
+# Switches to the alternate screen and clears it
+ALTERNATE_SCREEN = "\033[?1049h\033[2J\033[H"
+
+
+class PaneState(NamedTuple):
+    """What a pane's terminal looks like, apart from its content."""
+    width: int
+    height: int
+    cursor_x: int
+    cursor_y: int
+    cursor_visible: bool
+    alternate_on: bool
+    scroll_upper: int
+    scroll_lower: int
+    history_size: int
+    title: str
+
+
+def _parse_pane_state(output: str) -> Optional[PaneState]:
+    """Parse `tmux display-message -p PANE_STATE_FORMAT` output."""
+    try:
+        parts = output.strip().split(",", 11)
+        cursor_x, cursor_y = int(parts[2]), int(parts[3])
+        alternate_on = int(parts[5]) == 1
+        if alternate_on:
+            cursor_x, cursor_y = int(parts[6]), int(parts[7])
+        return PaneState(
+            width=int(parts[0]), height=int(parts[1]), cursor_x=cursor_x, cursor_y=cursor_y,
+            cursor_visible=int(parts[4]) == 1, alternate_on=alternate_on,
+            scroll_upper=int(parts[8]), scroll_lower=int(parts[9]), history_size=int(parts[10]),
+            title=parts[11] if len(parts) > 11 else "",
+        )
+    except (ValueError, IndexError) as e:
+        logger.warning(f"Failed to parse pane state: {output} - {e}")
+        return None
+
+
+def _capture_command(pane_target: str, history: int = 0, alternate: bool = False) -> List[str]:
+    """Get the tmux capture-pane command for a pane's screen, with any history above it."""
+    command = ["capture-pane", "-t", pane_target, "-e", "-p"]
+    if alternate:
+        command += ["-a", "-q"]  # Quietly nothing if the pane isn't using it
+    elif history > 0:
+        command += ["-S", f"-{history}"]
+    return command
+
+
+def _write_snapshot(output: BinaryIO, out: BinaryIO, history: int = 0) -> None:
+    """Turn pane state and captures from one tmux command list into a redraw of the pane.
+
+    Expects the output of display-message with PANE_STATE_FORMAT, then a
+    capture of the normal screen with `history` lines above it, then one of
+    the alternate screen. Lines are copied in batches as they arrive.
+    """
+    state = _parse_pane_state(output.readline().decode(errors="replace"))
+    if state is None:
+        return
+
+    out.write(_screen_setup(state).encode())
+    _copy_lines(output, out, state.height + min(state.history_size, max(history, 0)))
+    if state.alternate_on:
+        out.write(ALTERNATE_SCREEN.encode())
+        _copy_lines(output, out, state.height)
+    out.write(_screen_finish(state).encode())
+
+
+def _copy_lines(output: BinaryIO, out: BinaryIO, count: int) -> None:
+    """Copy lines CRLF separated, without ending the last, a batch at a time."""
+    batch = bytearray()
+    for index in range(count):
+        line = output.readline()
+        if not line:
+            break
+        if index:
+            batch += b"\r\n"
+        batch += line.rstrip(b"\n")
+        if len(batch) >= CAPTURE_CHUNK_SIZE:
+            out.write(batch)
+            batch.clear()
+    out.write(batch)
+
+
+class _SnapshotOutput:
+    """Writes a snapshot into a relay channel, which passes it on without telling listeners."""
+
+    def __init__(self, key: str):
+        self.key = key
+
+    def write(self, data: bytes) -> int:
+        if data and not get_relay().write(self.key, bytes(data)):
+            raise OSError(f"Output for {self.key} isn't being relayed")
+        return len(data)
+
+
+def _file_id(path: Path) -> Optional[int]:
+    """Get a file's inode, which changes when it is replaced by a rewritten copy."""
+    try:
+        return path.stat().st_ino
+    except OSError:
+        return None
+
+
+def _live_index(cast_path: Path) -> Optional[LiveIndex]:
+    """Get a seek index to keep up to date as a cast is written, if casts are indexed."""
+    config = get_config().recording
+    if not config.index:
+        return None
+    return LiveIndex(cast_path, config.index_every_seconds, config.index_every_bytes)
+
+
+def _cast_writer(cast_path: Path, width: int, height: int, **kwargs) -> CastWriter:
+    """Create a buffered writer for the kind of cast `cast_path` is, as configured."""
+    config = get_config().recording
+    if is_binary(cast_path):
+        return BinaryCastWriter(cast_path, width, height, buffered=True,
+                                idle_time_limit=config.idle_time_limit, **kwargs)
+    if is_compressed(cast_path):
+        # Its frame table stands in for the seek index
+        return CompressedCastWriter(cast_path, width, height, buffered=True, version=config.cast_version,
+                                    idle_time_limit=config.idle_time_limit,
+                                    frame_size=config.compression_frame_size, **kwargs)
+    return CastWriter(cast_path, width, height, buffered=True, version=config.cast_version,
+                      idle_time_limit=config.idle_time_limit, index=_live_index(cast_path), **kwargs)
+
+
+def _end_marker() -> bytes:
+    """Make a marker for the end of a stream, unique to it.
+
+    It is a DCS string, which terminals ignore, in case it ever gets through.
+    """
+    return b"\033Ptvmux;end;" + uuid.uuid4().hex.encode() + b"\033\\"
+
+
+def _rollover_marker() -> bytes:
+    """Make a marker for where output moves on to the next segment, unique to it.
+
+    The recorder switches casts where it finds it, and leaves it out.
+    """
+    return b"\033Ptvmux;segment;" + uuid.uuid4().hex.encode() + b"\033\\"
+
+
+def _stream_command(fifo: Path, marker: Optional[bytes] = None) -> str:
+    """Get the pipe-pane command that streams a pane into a FIFO, then writes the end marker.
+
+    tmux expands formats and strftime escapes in the command, so # and %,
+    which pane FIFO names have, are escaped.
+    """
+    command = f"stdbuf -o0 cat >> {fifo}"
+    if marker is not None:
+        printf_format = marker.decode().replace("\\", "\\\\").replace("\033", "\\033")
+        command = f"{{ stdbuf -o0 cat; printf '{printf_format}'; }} >> {fifo}"
+    return command.replace("#", "##").replace("%", "%%")
+
+
+def _size_sequence(width: int, height: int) -> str:
+    """Set the terminal size, which cast writers record as a resize."""
+    return f"\033[8;{height};{width}t"
+
+
+def _screen_setup(state: PaneState) -> str:
+    """Reset the terminal to a blank normal screen of the pane's size."""
+    return (
+        "\033c"                                    # Full terminal reset (ESC c)
+        f"{_size_sequence(state.width, state.height)}"  # Set window size
+        "\033[?1049l"                              # Ensure we're in normal screen buffer
+        "\033[2J\033[H"                            # Clear screen and move cursor to home
+    )
+
+
+def _screen_finish(state: PaneState) -> str:
+    """Restore the pane's modes, title and cursor after its content is drawn."""
+    parts = []
+
+    # Set scroll region if not full screen, converting to 1-based
+    if state.scroll_upper > 0 or state.scroll_lower < state.height - 1:
+        parts.append(f"\033[{state.scroll_upper + 1};{state.scroll_lower + 1}r")
+
+    parts.append("\033[?1000h")   # Enable mouse reporting
+    parts.append("\033[?1002h")   # Enable button event mouse reporting
+    parts.append("\033[?1006h")   # Enable SGR extended mouse reporting
+    parts.append("\033[?7h")      # Enable auto-wrap mode
+
+    if state.title:
+        parts.append(f"\033]0;{state.title}\007")
+
+    if get_config().annotations.include_cursor_state:
+        parts.append(f"\033[{state.cursor_y + 1};{state.cursor_x + 1}H")
+        parts.append("\033[?25h" if state.cursor_visible else "\033[?25l")
+
+    return "".join(parts)
+
+
+class SwitchStats(BaseModel):
+    """How many pane selections a recording followed, and how many it didn't need to."""
+    requested: int = Field(0, description="Pane selections received for the window")
+    switched: int = Field(0, description="Switches made to another pane")
+    skipped: int = Field(0, description="Selections superseded by a later one, or of the pane already recorded")
+
 
 class Recording(BaseModel):
     """A tmux recording session."""
@@ -28,14 +259,35 @@ class Recording(BaseModel):
     active: bool = Field(False, description="Is recording active")
     cast_path: Optional[str] = Field(None, description="Path to cast file")
     active_pane: Optional[str] = Field(None, description="Currently recording pane")
+    segment: int = Field(0, description="Current segment number")
+    manifest_path: Optional[str] = Field(None, description="Path to segment manifest, if segmenting")
+    coalesce_interval: Optional[float] = Field(
+        None, description="Seconds of output merged into one event, overriding recording.coalesce_interval"
+    )
+    all_panes: Optional[bool] = Field(
+        None, description="Record every pane into its own track, overriding recording.all_panes"
+    )
+    track_paths: Dict[str, str] = Field(default_factory=dict, description="Track cast of each pane being recorded")
+    layout_path: Optional[str] = Field(None, description="Path to the pane layout file, if recording all panes")
+    composite_path: Optional[str] = Field(None, description="Path to the composite of all panes, if recording one")
+    switch_stats: SwitchStats = Field(default_factory=SwitchStats, description="Pane selections followed and skipped")
 
     # Internal fields (excluded from API responses)
     output_dir: Optional[Path] = Field(None, exclude=True, alias="_output_dir")
     hostname: Optional[str] = Field(None, exclude=True, alias="_hostname")
     session_dir: Optional[Path] = Field(None, exclude=True, alias="_session_dir")
     fifo_path: Optional[Path] = Field(None, exclude=True, alias="_fifo_path")
-    asciinema_pid: Optional[int] = Field(None, exclude=True, alias="_asciinema_pid")
+    input_fifo_path: Optional[Path] = Field(None, exclude=True, alias="_input_fifo_path")
     running: bool = Field(False, exclude=True, alias="_running")
+    window_name: Optional[str] = Field(None, exclude=True, alias="_window_name")
+    first_cast_path: Optional[Path] = Field(None, exclude=True, alias="_first_cast_path")
+    segment_started: Optional[float] = Field(None, exclude=True, alias="_segment_started")
+    rolling_over: bool = Field(False, exclude=True, alias="_rolling_over")
+    track_clock: Optional[float] = Field(None, exclude=True, alias="_track_clock")
+    track_timestamp: Optional[int] = Field(None, exclude=True, alias="_track_timestamp")
+    stream_key: Optional[str] = Field(None, exclude=True, alias="_stream_key")
+    meter: Optional[WriteMeter] = Field(None, exclude=True, alias="_meter")
+    pane_sizes: Dict[str, Tuple[int, int]] = Field(default_factory=dict, exclude=True, alias="_pane_sizes")
 
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
@@ -53,20 +305,28 @@ class Recording(BaseModel):
             )
             self.session_dir.mkdir(parents=True, exist_ok=True)
 
-    async def start(self, active_pane: str, output_dir: Path):
-        """Start recording this window."""
+    async def start(self, active_pane: str, output_dir: Path, window_name: Optional[str] = None):
+        """Start recording this window.
+
+        Args:
+            active_pane: Pane to record first
+            output_dir: Base directory for cast files
+            window_name: Window name if already known, saves asking tmux
+        """
         if self.active:
             raise ValueError(f"Already recording {self.id}")
 
         self.output_dir = output_dir
         self.active_pane = active_pane
+        self.meter = WriteMeter()  # Counts what every cast of the recording writes, across segments
 
-        # Create FIFO
-        safe_window_id = safe_filename(self.window_id)
-        self.fifo_path = self.session_dir / f"window_{safe_window_id}.fifo"
-        if self.fifo_path.exists():
-            self.fifo_path.unlink()
-        os.mkfifo(self.fifo_path)
+        # Create FIFOs: tmux writes to the input, the relay copies it to the recorder
+        self.fifo_path = Path(self.fifo_prefix() + "fifo")
+        self.input_fifo_path = Path(self.fifo_prefix() + "in.fifo")
+        for path in (self.fifo_path, self.input_fifo_path):
+            if path.exists():
+                path.unlink()
+            os.mkfifo(path)
 
         # Create output directory with date
         config = get_config()
@@ -75,22 +335,48 @@ class Recording(BaseModel):
 
         # Generate cast filename
         timestamp = datetime.now().strftime("%Y-%m-%d_%H%M")
-        display_name = self._get_display_name()
-        safe_window_name = safe_filename(display_name)
-        cast_filename = f"{timestamp}_{safe_filename(self.hostname)}_{safe_filename(self.window_id)}_{safe_window_name}.cast"
+        self.window_name = window_name or self._get_display_name()
+        safe_window_name = safe_filename(self.window_name)
+        suffix = ".cast"
+        if config.recording.cast_format == "binary":
+            suffix = BINARY_SUFFIX
+        elif config.recording.cast_format != "asciicast":
+            logger.warning(f"Unknown cast format {config.recording.cast_format}, writing asciicast")
+        if suffix == ".cast":
+            if config.recording.compression == "gzip":
+                suffix = ".cast.gz"  # Compressed a frame at a time as it is written
+            elif config.recording.compression != "none":
+                logger.warning(f"Unknown compression {config.recording.compression}, writing uncompressed")
+        cast_filename = f"{timestamp}_{safe_filename(self.hostname)}_{safe_filename(self.window_id)}_{safe_window_name}{suffix}"
         cast_path = date_dir / cast_filename
         self.cast_path = str(cast_path)
-
-        # Start asciinema process
-        await self._start_asciinema()
-
-        # Wait for asciinema to be ready
-        if not await self._wait_for_reader():
-            raise RuntimeError("Asciinema reader not ready")
+        self.first_cast_path = cast_path
+        self.segment = 0
+        self.segment_started = time.monotonic()
+
+        if config.recording.segment_max_bytes or config.recording.segment_max_seconds:
+            self.manifest_path = str(manifest_path(cast_path))
+            save_manifest(Path(self.manifest_path), Manifest(
+                recording_id=self.id,
+                hostname=self.hostname,
+                session_id=self.session_id,
+                window_id=self.window_id,
+                window_name=self.window_name,
+                segments=[Segment(path=cast_path.name, started=datetime.now())]
+            ))
+
+        await asyncio.to_thread(self._start_writer)
+        await self._connect_relay()
 
         self.active = True
-        self._dump_pane(active_pane)
-        self._start_streaming(active_pane)
+        # Off the event loop so that many windows can start in parallel
+        history = config.recording.scrollback_lines
+        if self._records_all_panes():
+            await asyncio.to_thread(self._dump_pane, active_pane, history=history)
+            await asyncio.to_thread(self._start_tracks)
+        else:
+            await asyncio.to_thread(self._begin_stream, active_pane, history)
+        await asyncio.to_thread(self._catalog, cast_path, True)
         logger.info(f"Started recording window {self.window_id} to {cast_path}")
 
     def switch_pane(self, new_pane_id: str):
@@ -103,35 +389,136 @@ class Recording(BaseModel):
             logger.debug(f"Already recording pane {new_pane_id}")
             return
 
+        if self.rolling_over:
+            # The new segment will start on whichever pane is active by then
+            self.active_pane = new_pane_id
+            return
+
         logger.info(f"Switching from pane {self.active_pane} to {new_pane_id} in window {self.window_id}")
 
-        # Stop streaming current pane
-        self._stop_streaming()
+        if self.track_paths:
+            self._switch_track(new_pane_id)
+        else:
+            self._switch_stream(new_pane_id)
+            self.active_pane = new_pane_id
+            self.pane_sizes.clear()  # The new pane's snapshot sets its size
 
-        # Dump new pane state (includes reset)
-        self._dump_pane(new_pane_id)
+        if get_config().recording.cast_version >= 3:
+            self.mark(f"pane {new_pane_id}")
 
-        # Start streaming new pane
-        self._start_streaming(new_pane_id)
+    def mark(self, label: str = "") -> bool:
+        """Mark the current point in the main cast, for players to jump to.
 
-        self.active_pane = new_pane_id
+        Returns:
+            Whether the marker was written
+        """
+        return self.active and get_recorder().mark(self.id, label)
 
-        # Send SIGWINCH to the new pane's process group to trigger resize handling
-        self._send_sigwinch(new_pane_id)
+    def _hold_stream(self, pane_id: str) -> Optional[Tuple[str, Path, bytes]]:
+        """Set up a FIFO for a pane's stream, which the relay holds until switched to.
 
-    def _send_sigwinch(self, pane_id: str):
-        """Send SIGWINCH signal to asciinema process to handle terminal resize in recording."""
-        if not self.asciinema_pid:
-            logger.warning("No asciinema process to send SIGWINCH to")
-            return
+        Each stream ends with a marker of its own, so the relay knows when
+        the last of it has arrived.
+
+        Returns:
+            (relay channel, FIFO, end marker), or None if the relay couldn't open it
+        """
+        marker = _end_marker()
+        key = f"{self._track_key(pane_id)}#{marker[-10:-2].decode()}"  # Unique per stream
+        fifo = self._pane_fifo(pane_id)
+        if fifo.exists():
+            fifo.unlink()
+        os.mkfifo(fifo)
 
         try:
-            subprocess.run([
-                "kill", "-SIGWINCH", str(self.asciinema_pid)
-            ], check=True)
-            logger.debug(f"Sent SIGWINCH to asciinema process {self.asciinema_pid} for pane {pane_id}")
-        except subprocess.CalledProcessError as e:
-            logger.warning(f"Failed to send SIGWINCH to asciinema process {self.asciinema_pid}: {e}")
+            get_relay().hold(key, self.id, fifo, marker, get_config().recording.pipe_size)
+        except OSError as e:
+            logger.error(f"Failed to open stream for pane {pane_id}: {e}")
+            fifo.unlink()
+            return None
+        return key, fifo, marker
+
+    def _begin_stream(self, pane_id: str, history: int = 0):
+        """Snapshot a pane into the recording's relay channel and start streaming it, with no gap.
+
+        The snapshot is taken in the same tmux command list that starts the
+        pipe, and passed to the relay as tmux sends it, so deep histories
+        are never held in memory.
+        """
+        held = self._hold_stream(pane_id)
+        if held is None:
+            self._dump_pane(pane_id, history=history)
+            self._start_streaming(pane_id)
+            return
+        key, fifo, marker = held
+
+        pane_target = f"{self.session_id}:{self.window_id}.{pane_id}"
+        proc = subprocess.Popen([
+            "tmux", "pipe-pane", "-t", pane_target, _stream_command(fifo, marker), ";",
+            "display-message", "-t", pane_target, "-p", PANE_STATE_FORMAT, ";",
+            *_capture_command(pane_target, history=history), ";",
+            *_capture_command(pane_target, alternate=True),
+        ], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            _write_snapshot(proc.stdout, _SnapshotOutput(self.id), history)
+        except OSError as e:
+            logger.warning(f"Failed to dump pane {pane_id}: {e}")
+        finally:
+            proc.stdout.close()
+            proc.wait()
+
+        # The snapshot is all with the relay now, so the stream can follow it
+        get_relay().switch(self.id, key, self.id, b"")
+        self.stream_key = key
+
+    def _switch_stream(self, new_pane_id: str, before: bytes = b"") -> bool:
+        """Move the recording to another pane's output without losing or repeating any.
+
+        The relay holds the new pane's stream until the old stream has
+        ended, then passes it on after the snapshot. Switching to the same
+        pane restarts its stream, e.g. for a new segment.
+
+        Args:
+            new_pane_id: Pane to switch to
+            before: Passed on before the snapshot, e.g. a rollover marker
+
+        Returns:
+            Whether the switch went ahead
+        """
+        held = self._hold_stream(new_pane_id)
+        if held is None:
+            return False
+        key, fifo, marker = held
+
+        snapshot = self._switch_snapshot(self.active_pane, new_pane_id, _stream_command(fifo, marker))
+        get_relay().switch(self.stream_key or self.id, key, self.id, before + (snapshot or b""))
+
+        # The relay still has the old FIFO open, and closes it once its stream has ended
+        if self.stream_key and new_pane_id != self.active_pane:
+            self._pane_fifo(self.active_pane).unlink(missing_ok=True)
+        self.stream_key = key
+        return True
+
+    def _end_stream(self):
+        """Pass on the rest of the active pane's stream once it has stopped, if it has a FIFO of its own."""
+        if not self.stream_key:
+            return
+        get_relay().remove(self.stream_key)
+        self._pane_fifo(self.active_pane).unlink(missing_ok=True)
+        self.stream_key = None
+
+    def _switch_track(self, new_pane_id: str):
+        """Point the main cast at another pane's track, which is already streaming."""
+        relay = get_relay()
+        if new_pane_id not in self.track_paths:
+            self.update_panes()  # Probably a pane split off since the last update
+
+        relay.forward(self._track_key(self.active_pane), None)
+        self._dump_pane(new_pane_id)
+        relay.forward(self._track_key(new_pane_id), self.id)
+
+        self.active_pane = new_pane_id
+        self.update_panes()
 
     def stop(self):
         """Stop recording."""
@@ -141,37 +528,210 @@ class Recording(BaseModel):
         logger.info(f"Stopping recording for window {self.window_id}")
 
         # Stop streaming
-        self._stop_streaming()
+        if self.track_paths:
+            self._stop_tracks()
+        else:
+            self._stop_streaming()
+            self._end_stream()
 
         # Send final reset sequence and close FIFO
         self._write_reset_sequence()
+        self._close_writer()
 
-        # Close the FIFO by writing EOF to it - this will cause tail -f to exit
-        try:
-            # Write EOF to the FIFO to signal end of data
-            with open(self.fifo_path, 'w'):
-                pass  # Just opening and closing sends EOF
-        except (OSError, IOError):
-            pass
-
-        # Stop asciinema
-        if self.asciinema_pid:
-            logger.debug(f"Terminating asciinema process tree: {self.asciinema_pid}")
-            if not bg.terminate(self.asciinema_pid):
-                logger.warning(f"Failed to terminate asciinema process tree: {self.asciinema_pid}")
-
-        # Clean up FIFO
-        if self.fifo_path and self.fifo_path.exists():
-            self.fifo_path.unlink()
+        # Clean up FIFOs
+        for path in (self.fifo_path, self.input_fifo_path):
+            if path and path.exists():
+                path.unlink()
 
-        # Repair cast file if configured
-        config = get_config()
-        if self.cast_path and config.recording.repair_on_stop:
-            repair_cast_file(Path(self.cast_path))
+        if self.cast_path:
+            self._finish_segment()
 
         self.active = False
         logger.info(f"Stopped recording for window {self.window_id}")
 
+    def needs_rollover(self) -> bool:
+        """Check whether the current segment has reached its size or age limit."""
+        if not self.active or self.rolling_over or not self.cast_path:
+            return False
+
+        config = get_config()
+        max_bytes = config.recording.segment_max_bytes
+        max_seconds = config.recording.segment_max_seconds
+
+        if max_seconds and time.monotonic() - self.segment_started >= max_seconds:
+            return True
+
+        if max_bytes:
+            try:
+                return Path(self.cast_path).stat().st_size >= max_bytes
+            except OSError:
+                return False
+
+        return False
+
+    async def rollover(self) -> Optional[Callable[[], None]]:
+        """Continue recording in a new segment, leaving the current one to be finished.
+
+        The recorder is switched to the new segment's cast first, at a marker
+        written into the output after the last of the old segment's, so no
+        output is lost or repeated in between. The new segment opens with a
+        snapshot so it plays on its own.
+
+        Returns:
+            Finishes the old segment, e.g. in the background; or None if
+            there was nothing to roll over
+        """
+        if not self.active or self.rolling_over:
+            return None
+
+        self.rolling_over = True
+        try:
+            logger.info(f"Starting segment {self.segment + 1} for window {self.window_id}")
+
+            new_path = segment_path(self.first_cast_path, self.segment + 1)
+            writer = await asyncio.to_thread(self._new_writer, new_path)
+            marker = _rollover_marker()
+            switched = get_recorder().rollover(self.id, writer, marker)
+            if switched is None:
+                writer.close()
+                raise RuntimeError(f"Cast for {self.id} isn't being written")
+
+            old_path, old_segment = Path(self.cast_path), self.segment
+            self.segment += 1
+            self.cast_path = str(new_path)
+            self.segment_started = time.monotonic()
+            self._update_manifest(lambda m: m.segments.append(
+                Segment(path=new_path.name, started=datetime.now())
+            ))
+
+            finish_tracks = await asyncio.to_thread(self._end_tracks) if self.track_paths else None
+            await asyncio.to_thread(self._begin_segment, marker)
+            await asyncio.to_thread(self._catalog, new_path, True)
+        finally:
+            self.rolling_over = False
+
+        def finish_segment():
+            if not switched.wait(WRITER_EXIT_TIMEOUT):
+                get_recorder().cut(self.id)
+            if finish_tracks is not None:
+                finish_tracks()
+            self._finish_segment(old_path, old_segment)
+
+        return finish_segment
+
+    def _begin_segment(self, marker: bytes):
+        """Move the main cast's output on to a new segment at a marker, followed by a snapshot."""
+        if self._records_all_panes():
+            get_relay().write(self.id, marker)
+            self._dump_pane(self.active_pane)
+            self._start_tracks()
+        elif not self._switch_stream(self.active_pane, marker):
+            get_relay().write(self.id, marker)
+            self._dump_pane(self.active_pane)
+
+    def _close_writer(self):
+        """Pass on the last output, close the FIFO and wait for the cast to be closed."""
+        # Closing the relay's end of the FIFO ends the recorder's input
+        get_relay().remove(self.id)
+        get_recorder().remove(self.id, WRITER_EXIT_TIMEOUT)
+
+    def _finish_segment(self, cast_path: Optional[Path] = None, number: Optional[int] = None):
+        """Finish a segment's cast, the current one by default, and record it in the manifest."""
+        cast_path = cast_path or Path(self.cast_path)
+        number = self.segment if number is None else number
+        self._finish_cast(cast_path)
+
+        def close(manifest: Manifest):
+            if number >= len(manifest.segments):
+                return
+            segment = manifest.segments[number]
+            segment.ended = datetime.now()
+            segment.bytes = cast_path.stat().st_size if cast_path.exists() else None
+
+        self._update_manifest(close)
+        self._catalog(cast_path, False, segment=number)
+
+    def _catalog(self, cast_path: Path, active: bool, name: Optional[str] = None,
+                 segment: Optional[int] = None):
+        """Record a cast in the output directory's catalog and search index, if enabled.
+
+        Args:
+            cast_path: The cast to add or refresh
+            active: Whether it is still being written
+            name: Name to list it under, if not the window's
+            segment: Segment it belongs to, if not the current one
+        """
+        if not get_config().output.catalog or not self.output_dir:
+            return
+
+        try:
+            catalog = Catalog(self.output_dir)
+            catalog.add_cast(
+                cast_path,
+                active=active,
+                host=self.hostname,
+                session=self.session_id,
+                window=self.window_id,
+                name=name or self.window_name,
+                segment=self.segment if segment is None else segment,
+                manifest=self.manifest_path,
+            )
+            if not active and get_config().search.enabled:
+                # Picks up where periodic indexing left off, plus the last line
+                SearchIndex(catalog).index_cast(cast_path, final=True)
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to update catalog for {cast_path}: {e}")
+
+    def _forget_text(self, cast_path: Path):
+        """Drop a cast's indexed text, so the final indexing reads it from the start."""
+        config = get_config()
+        if not config.output.catalog or not config.search.enabled or not self.output_dir:
+            return
+
+        try:
+            SearchIndex(Catalog(self.output_dir)).forget(cast_path)
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to reset indexed text of {cast_path}: {e}")
+
+    def _update_manifest(self, change):
+        """Apply a change to the segment manifest, if there is one."""
+        if not self.manifest_path:
+            return
+
+        path = Path(self.manifest_path)
+        manifest = load_manifest(path)
+        if manifest is None:
+            logger.warning(f"Segment manifest {path} missing or unreadable")
+            return
+
+        change(manifest)
+        save_manifest(path, manifest)
+
+    def _finish_cast(self, cast_path: Path):
+        """Repair, then index a finished cast, as configured.
+
+        Idle gaps were capped and compressed casts compressed as the cast
+        was written, so only a repair of a damaged tail changes it in place.
+        Binary and compressed casts are only repaired.
+        """
+        config = get_config()
+
+        # Repair cast file if configured
+        if config.recording.repair_on_stop:
+            before = _file_id(cast_path)
+            repair_cast_file(cast_path)
+            if _file_id(cast_path) != before:
+                # Rewritten as a new file, so offsets the text index saved no longer line up
+                self._forget_text(cast_path)
+
+        if is_binary(cast_path) or is_compressed(cast_path):
+            return  # Their blocks or frame table already make them seekable
+
+        # The writer kept the seek index up to date; this only reads any tail it missed
+        if config.recording.index:
+            update_index(cast_path, config.recording.index_every_seconds,
+                         config.recording.index_every_bytes)
+
     def _get_display_name(self) -> str:
         """Get friendly display name for this window."""
         try:
@@ -186,153 +746,416 @@ class Recording(BaseModel):
         except Exception:
             return self.window_id
 
-    async def _start_asciinema(self):
-        """Start asciinema process."""
-        cmd = [
-            "asciinema", "rec", "--stdin", "--quiet", "--overwrite",
-            str(self.cast_path), "--command", f"stdbuf -o0 tail -f {self.fifo_path}"
-        ]
-
-        proc = await run_bg(cmd)
-        self.asciinema_pid = proc.pid
-        logger.info(f"Started asciinema process: {self.asciinema_pid}")
-
-    async def _wait_for_reader(self) -> bool:
-        """Wait for asciinema to open the FIFO for reading."""
-        for _ in range(100):  # Wait up to 10 seconds
-            if file_has_readers(self.fifo_path):
-                return True
-            await asyncio.sleep(0.1)
-        return False
+    def _start_writer(self):
+        """Create the cast and have the recorder write to it."""
+        writer = self._new_writer(Path(self.cast_path))
+        try:
+            get_recorder().add(self.id, self.fifo_path, writer)
+        except OSError as e:
+            writer.close()
+            raise RuntimeError(f"Cast writer not ready: {e}")
+
+    def _new_writer(self, cast_path: Path) -> CastWriter:
+        """Create a cast the size of the active pane."""
+        width, height = self._pane_size(self.active_pane)
+        self.pane_sizes[self.active_pane] = (width, height)
+        return _cast_writer(cast_path, width, height, meter=self.meter)
+
+    def _pane_size(self, pane_id: str) -> Tuple[int, int]:
+        """Get a pane's width and height, or the usual terminal size if tmux can't say."""
+        size = self._query_pane_size(pane_id)
+        if size is None:
+            logger.warning(f"Failed to get the size of pane {pane_id}")
+            return DEFAULT_WIDTH, DEFAULT_HEIGHT
+        return size
+
+    def _query_pane_size(self, pane_id: str) -> Optional[Tuple[int, int]]:
+        """Get a pane's width and height from tmux, or None if it can't say."""
+        result = subprocess.run([
+            "tmux", "display-message", "-t", f"{self.session_id}:{self.window_id}.{pane_id}",
+            "-p", "#{pane_width} #{pane_height}"
+        ], capture_output=True, text=True)
+        try:
+            width, height = (int(part) for part in result.stdout.split())
+            return width, height
+        except ValueError:
+            return None
+
+    def resize_panes(self):
+        """Record a resize in the casts of any recorded pane whose size changed."""
+        if not self.active or self.rolling_over:
+            return
+
+        if self.track_paths:
+            self.update_panes()
+            return
 
-    def _dump_pane(self, pane_id: str):
-        """Dump current pane content with proper terminal state handling."""
+        if self.active_pane:
+            size = self._query_pane_size(self.active_pane)
+            if size is not None:
+                self._note_size(self.active_pane, *size, self.id)
+
+    def _note_size(self, pane_id: str, width: int, height: int, key: str):
+        """Have the recorder write a pane's size into the cast it is recorded in, if it changed.
+
+        It goes to the recorder as an event of its own, after the output
+        it has written so far, rather than into the pane's stream, where
+        it could land in the middle of output being written at the same
+        time.
+        """
+        if self.pane_sizes.get(pane_id) == (width, height):
+            return
+        self.pane_sizes[pane_id] = (width, height)
+        if not get_recorder().resize(key, width, height):
+            logger.warning(f"Failed to record the size of pane {pane_id}: its cast isn't being written")
+
+    async def _connect_relay(self):
+        """Relay the input FIFO to the recorder, which has opened its FIFO already."""
+        try:
+            config = get_config().recording
+            coalesce_interval = self.coalesce_interval
+            if coalesce_interval is None:
+                coalesce_interval = config.coalesce_interval
+            await asyncio.to_thread(
+                get_relay().add, self.id, self.input_fifo_path, self.fifo_path,
+                buffer_bytes=config.buffer_bytes, policy=config.overflow_policy,
+                pipe_size=config.pipe_size, on_resync=self._resync,
+                coalesce_interval=coalesce_interval, coalesce_bytes=config.coalesce_bytes,
+            )
+        except OSError as e:
+            get_recorder().remove(self.id, timeout=0)
+            raise RuntimeError(f"Cast writer not ready: {e}")
+
+    def _resync(self):
+        """Redraw the screen after the relay dropped output."""
+        if self.active and self.active_pane:
+            logger.info(f"Recording {self.id} fell behind, redrawing from a snapshot")
+            self._dump_pane(self.active_pane)
+
+    def _resync_track(self, pane_id: str):
+        """Redraw a pane's track after the relay dropped some of its output."""
+        if self.active and pane_id in self.track_paths:
+            logger.info(f"Track of pane {pane_id} in {self.id} fell behind, redrawing from a snapshot")
+            self._dump_pane(pane_id, self._track_key(pane_id))
+
+    def _dump_pane(self, pane_id: str, key: Optional[str] = None, history: int = 0):
+        """Dump current pane content with proper terminal state handling.
+
+        Args:
+            pane_id: Pane to snapshot
+            key: Relay channel to write it to, the recording's by default
+            history: Lines of scrollback to write before the screen, which
+                scroll up out of view as the screen is drawn below them
+        """
+        out = _SnapshotOutput(key or self.id)
         try:
             pane_target = f"{self.session_id}:{self.window_id}.{pane_id}"
 
             # Get all terminal state info in one call
             state_result = subprocess.run([
-                "tmux", "display-message", "-t", pane_target,
-                "-p", "#{pane_width},#{pane_height},#{cursor_x},#{cursor_y},#{cursor_flag},#{alternate_on},#{alternate_saved_x},#{alternate_saved_y},#{scroll_region_upper},#{scroll_region_lower},#{pane_title}"
+                "tmux", "display-message", "-t", pane_target, "-p", PANE_STATE_FORMAT
             ], capture_output=True, text=True)
 
             if state_result.returncode != 0:
                 logger.warning(f"Failed to get pane state for {pane_id}")
                 return
 
-            try:
-                state_parts = state_result.stdout.strip().split(',')
-                pane_width, pane_height = int(state_parts[0]), int(state_parts[1])
-                cursor_x, cursor_y, cursor_flag = int(state_parts[2]), int(state_parts[3]), int(state_parts[4])
-                alternate_on = int(state_parts[5]) == 1
-                alt_saved_x, alt_saved_y = int(state_parts[6]), int(state_parts[7])
-                scroll_upper, scroll_lower = int(state_parts[8]), int(state_parts[9])
-                pane_title = state_parts[10] if len(state_parts) > 10 else ""
-            except (ValueError, IndexError) as e:
-                logger.warning(f"Failed to parse pane state: {state_result.stdout} - {e}")
+            state = _parse_pane_state(state_result.stdout)
+            if state is None:
                 return
 
-            # Phase 1: Write reset sequences and close
-            with open(self.fifo_path, "w") as f:
-                # 1. Full terminal reset first
-                f.write("\033c")         # Full terminal reset (ESC c)
-
-                # 2. Set terminal size
-                f.write(f"\033[8;{pane_height};{pane_width}t")  # Set window size
-
-                # 3. Ensure we're in normal screen buffer and clear
-                f.write("\033[?1049l")   # Ensure we're in normal screen buffer
-                f.write("\033[2J\033[H") # Clear screen and move cursor to home
-
-                f.flush()
-            # File handle closed, EOF sent to tail
+            # Phase 1: Write reset sequences
+            out.write(_screen_setup(state).encode())
 
-            # Phase 2: Let tmux write normal screen content directly to FIFO
-            subprocess.run([
-                "tmux", "capture-pane", "-t", pane_target, "-e", "-p"
-            ], stdout=open(self.fifo_path, "w"), check=False)
-            # tmux opens FIFO, writes content, closes (EOF sent)
+            # Phase 2: Copy normal screen content, and any history above it
+            self._copy_capture(pane_target, out, history=history)
 
             # Phase 3: Handle alternate screen if needed
-            if alternate_on:
-                with open(self.fifo_path, "w") as f:
-                    f.write("\033[?1049h")   # Switch to alternate screen buffer
-                    f.write("\033[2J\033[H") # Clear alternate screen
-                    f.flush()
-                # File closed, EOF sent
-
-                # Let tmux write alternate screen content
-                subprocess.run([
-                    "tmux", "capture-pane", "-t", pane_target, "-a", "-e", "-p"
-                ], stdout=open(self.fifo_path, "w"), check=False)
-                # tmux writes alt content, closes (EOF sent)
-
-                # Update cursor position for alt screen
-                cursor_x, cursor_y = alt_saved_x, alt_saved_y
-
-            # Phase 4: Write final terminal setup and close
-            with open(self.fifo_path, "w") as f:
-                # 5. Set scroll region if not full screen
-                if scroll_upper > 0 or scroll_lower < pane_height - 1:
-                    # Convert to 1-based for terminal escape sequence
-                    f.write(f"\033[{scroll_upper + 1};{scroll_lower + 1}r")
-
-                # 6. Set terminal modes
-                f.write("\033[?1000h")   # Enable mouse reporting
-                f.write("\033[?1002h")   # Enable button event mouse reporting
-                f.write("\033[?1006h")   # Enable SGR extended mouse reporting
-                f.write("\033[?7h")      # Enable auto-wrap mode
-
-                # 7. Set window title
-                if pane_title:
-                    f.write(f"\033]0;{pane_title}\007")
-
-                # 8. Set cursor position and visibility
-                config = get_config()
-                if config.annotations.include_cursor_state:
-                    # Position cursor (convert to 1-based)
-                    row = cursor_y + 1
-                    col = cursor_x + 1
-                    f.write(f"\033[{row};{col}H")
-
-                    # Set cursor visibility
-                    if cursor_flag == 1:
-                        f.write("\033[?25h")  # Show cursor
-                    else:
-                        f.write("\033[?25l")  # Hide cursor
+            if state.alternate_on:
+                out.write(ALTERNATE_SCREEN.encode())
 
-                f.flush()
-            # Final file handle closed, EOF sent
+                # Copy alternate screen content
+                self._copy_capture(pane_target, out, alternate=True)
+
+            # Phase 4: Write final terminal setup
+            out.write(_screen_finish(state).encode())
 
         except Exception as e:
             logger.warning(f"Failed to dump pane {pane_id}: {e}")
 
-    def _start_streaming(self, pane_id: str):
-        """Start streaming pane output."""
+    def _switch_snapshot(self, old_pane_id: str, new_pane_id: str, stream_command: str) -> Optional[bytes]:
+        """Move the pipe from one pane to another and snapshot the new pane, atomically.
+
+        tmux runs a command list without handling pane output in between,
+        so the new pipe starts at exactly the output the snapshot shows.
+
+        Returns:
+            The snapshot, or None if tmux failed
+        """
+        window = f"{self.session_id}:{self.window_id}"
+        new_target = f"{window}.{new_pane_id}"
+        result = subprocess.run([
+            "tmux", "pipe-pane", "-t", f"{window}.{old_pane_id}", ";",
+            "pipe-pane", "-t", new_target, stream_command, ";",
+            "display-message", "-t", new_target, "-p", PANE_STATE_FORMAT, ";",
+            *_capture_command(new_target), ";",
+            *_capture_command(new_target, alternate=True),
+        ], capture_output=True)
+        if result.returncode != 0:
+            logger.warning(f"Failed to switch to pane {new_pane_id}: {result.stderr.decode(errors='replace')}")
+            return None
+
+        snapshot = io.BytesIO()
+        _write_snapshot(io.BytesIO(result.stdout), snapshot)
+        return snapshot.getvalue()
+
+    def _copy_capture(self, pane_target: str, out: BinaryIO, history: int = 0, alternate: bool = False):
+        """Copy `tmux capture-pane` output a chunk at a time.
+
+        Lines are ended with CRLF, since tracks don't pass through a terminal
+        that adds the CR, and the last line isn't ended at all, so the screen
+        doesn't scroll by a line. Deep histories are never held in memory.
+        """
+        command = ["tmux", *_capture_command(pane_target, history=history, alternate=alternate)]
+        proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            newline = False
+            while chunk := proc.stdout.read1(CAPTURE_CHUNK_SIZE):
+                if newline:
+                    out.write(b"\r\n")
+                newline = chunk.endswith(b"\n")
+                if newline:
+                    chunk = chunk[:-1]
+                out.write(chunk.replace(b"\n", b"\r\n"))
+        finally:
+            proc.stdout.close()
+            proc.wait()
+
+    def _start_streaming(self, pane_id: str, fifo: Optional[Path] = None):
+        """Start streaming pane output, into the window's input FIFO by default."""
         try:
             subprocess.run([
                 "tmux", "pipe-pane", "-t", f"{self.session_id}:{self.window_id}.{pane_id}",
-                f"stdbuf -o0 cat >> {self.fifo_path}"
+                _stream_command(fifo or self.input_fifo_path)
             ], check=True)
         except subprocess.CalledProcessError as e:
             logger.error(f"Failed to start streaming for pane {pane_id}: {e}")
 
-    def _stop_streaming(self):
-        """Stop streaming current pane."""
-        if not self.active_pane:
+    def _stop_streaming(self, pane_id: Optional[str] = None):
+        """Stop streaming a pane, the current one by default."""
+        pane_id = pane_id or self.active_pane
+        if not pane_id:
             return
 
         try:
             subprocess.run([
-                "tmux", "pipe-pane", "-t", f"{self.session_id}:{self.window_id}.{self.active_pane}"
+                "tmux", "pipe-pane", "-t", f"{self.session_id}:{self.window_id}.{pane_id}"
             ], check=True)
         except subprocess.CalledProcessError as e:
             logger.warning(f"Failed to stop streaming: {e}")
 
+    def _records_all_panes(self) -> bool:
+        """Check whether every pane gets a track, or only the active pane is recorded."""
+        if self.all_panes is not None:
+            return self.all_panes
+        return get_config().recording.all_panes
+
+    def _track_key(self, pane_id: str) -> str:
+        """Get the relay channel name for a pane's track."""
+        return f"{self.id}/{pane_id}"
+
+    def _pane_fifo(self, pane_id: str) -> Path:
+        """Get the input FIFO for a pane's track."""
+        return Path(self.fifo_prefix() + f"pane_{safe_filename(pane_id)}.in.fifo")
+
+    def _track_fifo(self, pane_id: str) -> Path:
+        """Get the FIFO the relay passes a pane's track output on through, to the recorder."""
+        return Path(self.fifo_prefix() + f"pane_{safe_filename(pane_id)}.fifo")
+
+    def fifo_prefix(self) -> str:
+        """Get what the path of every FIFO of this recording starts with.
+
+        The commands tmux runs to stream panes name their FIFO, which is how
+        their processes can be told apart from other recordings'.
+        """
+        return str(self.session_dir / f"window_{safe_filename(self.window_id)}.")
+
+    def _start_tracks(self):
+        """Start a track for every pane of the window, for the current segment."""
+        self.track_clock = time.monotonic()
+        self.track_timestamp = int(time.time())
+        self.layout_path = str(layout_path(Path(self.cast_path)))
+        save_layout(Path(self.layout_path), TrackLayout(
+            recording_id=self.id, window_id=self.window_id, timestamp=self.track_timestamp
+        ))
+
+        config = get_config()
+        if config.recording.composite:
+            path = composite_path(Path(self.cast_path))
+            get_renderer().add(self.id, Compositor(
+                path, started=self.track_clock, timestamp=self.track_timestamp,
+                fps=config.recording.composite_fps, meter=self.meter, version=config.recording.cast_version,
+                idle_time_limit=config.recording.idle_time_limit,
+                frame_size=config.recording.compression_frame_size,
+            ))
+            self.composite_path = str(path)
+
+        self.update_panes()
+
+    def update_panes(self):
+        """Start and stop tracks as panes come and go, and note any layout change."""
+        if not self.active or self.track_clock is None:
+            return
+
+        result = subprocess.run([
+            "tmux", "list-panes", "-t", f"{self.session_id}:{self.window_id}", "-F", LIST_PANES_FORMAT
+        ], capture_output=True, text=True)
+        snapshot = parse_panes(result.stdout, time.monotonic() - self.track_clock) \
+            if result.returncode == 0 else None
+        if snapshot is None:
+            logger.warning(f"Failed to list panes of window {self.window_id}")
+            return
+
+        compositor = get_renderer().get(self.id)
+        if compositor is not None:
+            # Before any new track starts, so its first output has a screen to go to
+            compositor.set_layout(snapshot)
+
+        current = {pane.pane_id for pane in snapshot.panes}
+        for pane_id in list(self.track_paths):
+            if pane_id not in current:
+                self._stop_track(pane_id)
+        for pane in snapshot.panes:
+            if pane.pane_id in self.track_paths:
+                self._note_size(pane.pane_id, pane.width, pane.height, self._track_key(pane.pane_id))
+            else:
+                self._start_track(pane.pane_id, pane.width, pane.height)
+            if pane.pane_id in self.track_paths:
+                pane.track = Path(self.track_paths[pane.pane_id]).name
+
+        self._note_layout(snapshot)
+
+    def _start_track(self, pane_id: str, width: int, height: int):
+        """Start recording a pane into its own track, written by the recorder like the main cast."""
+        fifo = self._pane_fifo(pane_id)
+        out_fifo = self._track_fifo(pane_id)
+        for path in (fifo, out_fifo):
+            if path.exists():
+                path.unlink()
+            os.mkfifo(path)
+
+        config = get_config().recording
+        path = track_path(Path(self.cast_path), pane_id)
+        writer = _cast_writer(path, width, height, started=self.track_clock,
+                              timestamp=self.track_timestamp, meter=self.meter)
+        key = self._track_key(pane_id)
+        compositor = get_renderer().get(self.id)
+        tap = (lambda data: compositor.feed(pane_id, data)) if compositor is not None else None
+        try:
+            get_recorder().add(key, out_fifo, writer)
+        except OSError as e:
+            logger.error(f"Failed to start track for pane {pane_id}: {e}")
+            writer.close()
+            fifo.unlink()
+            out_fifo.unlink()
+            return
+        try:
+            get_relay().add_track(
+                key, self.id, fifo, out_fifo, buffer_bytes=config.buffer_bytes,
+                policy=config.overflow_policy, pipe_size=config.pipe_size,
+                on_resync=lambda: self._resync_track(pane_id), tap=tap,
+            )
+        except OSError as e:
+            logger.error(f"Failed to start track for pane {pane_id}: {e}")
+            get_recorder().remove(key, timeout=0)
+            fifo.unlink()
+            out_fifo.unlink()
+            return
+
+        self.track_paths[pane_id] = str(path)
+        self.pane_sizes[pane_id] = (width, height)
+        self._dump_pane(pane_id, key)
+        self._start_streaming(pane_id, fifo)
+        if pane_id == self.active_pane:
+            get_relay().forward(key, self.id)
+        self._catalog(path, True, name=self._track_name(pane_id))
+        logger.debug(f"Recording pane {pane_id} to {path}")
+
+    def _stop_track(self, pane_id: str):
+        """Stop and finish a pane's track."""
+        path = self._end_track(pane_id)
+        self._finish_track(path, self._track_name(pane_id), self.segment)
+
+    def _end_track(self, pane_id: str) -> Path:
+        """Stop a pane's track, leaving it to be finished.
+
+        Returns:
+            Path of the track
+        """
+        path = Path(self.track_paths.pop(pane_id))
+        self.pane_sizes.pop(pane_id, None)
+        self._stop_streaming(pane_id)
+        # Closing the relay's end of the FIFO ends the recorder's input
+        get_relay().remove(self._track_key(pane_id))
+        get_recorder().remove(self._track_key(pane_id), WRITER_EXIT_TIMEOUT)
+        self._pane_fifo(pane_id).unlink(missing_ok=True)
+        self._track_fifo(pane_id).unlink(missing_ok=True)
+        return path
+
+    def _finish_track(self, path: Path, name: str, segment: int):
+        """Finish a stopped track."""
+        self._finish_cast(path)
+        self._catalog(path, False, name=name, segment=segment)
+
+    def _stop_tracks(self):
+        """Stop every track, at the end of a segment, and the composite made from them."""
+        finish_tracks = self._end_tracks()
+        finish_tracks()
+
+    def _end_tracks(self) -> Callable[[], None]:
+        """Stop every track and the composite made from them, leaving them to be finished.
+
+        Returns:
+            Finishes the tracks and composite
+        """
+        tracks = [(self._end_track(pane_id), self._track_name(pane_id)) for pane_id in list(self.track_paths)]
+        segment = self.segment
+        self.track_clock = None
+
+        composite = None
+        if get_renderer().remove(self.id) is not None and self.composite_path:
+            composite = Path(self.composite_path)
+
+        def finish_tracks():
+            for path, name in tracks:
+                self._finish_track(path, name, segment)
+            if composite is not None and composite.exists():
+                self._finish_cast(composite)
+                self._catalog(composite, False, name=f"{self.window_name}.composite", segment=segment)
+
+        return finish_tracks
+
+    def _track_name(self, pane_id: str) -> str:
+        """Get the catalog name for a pane's track."""
+        return f"{self.window_name}.pane-{pane_id.lstrip('%')}"
+
+    def _note_layout(self, snapshot: LayoutSnapshot):
+        """Add a layout snapshot, unless nothing has changed."""
+        path = Path(self.layout_path)
+        layout = load_layout(path)
+        if layout is None:
+            logger.warning(f"Pane layout {path} missing or unreadable")
+            return
+        if layout.snapshots and layout.snapshots[-1].same_as(snapshot):
+            return
+
+        layout.snapshots.append(snapshot)
+        save_layout(path, layout)
+
     def _write_reset_sequence(self):
         """Write terminal reset sequence to return to known state."""
         try:
-            with open(self.fifo_path, "w") as f:
+            with open(self.input_fifo_path, "w") as f:
                 # 1. Disable alt mode (return to main buffer)
                 f.write("\033[?1049l")  # Disable alternate screen buffer
                 # 2. Clear the screen
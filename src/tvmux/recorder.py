@@ -0,0 +1,344 @@
+"""Write every recording's main cast from one thread.
+
+Each recording's output leaves the relay through ``window_X.fifo``. The
+recorder reads all of those FIFOs with one selector, stamps each chunk
+with the time it arrived, and appends it to the recording's cast. So
+recording N windows takes one thread in the server rather than N
+asciinema processes, each with a shell and a `cat` of its own.
+
+Casts are written through the file's buffer and flushed once per pass
+over the FIFOs that were ready, rather than once per event, so a busy
+pass over many recordings costs one write per cast. Readers following a
+cast, such as the search indexer or the segment size check, see it at
+most one pass behind.
+
+The recorder only reads as fast as it can write, so when the disk falls
+behind, the FIFOs fill up and the relay's overflow policy applies just
+as it did when asciinema was the reader.
+
+A recording's input ends when the relay closes its end of the FIFO. The
+recorder then writes what is left, closes the cast, and lets anyone
+waiting in remove() carry on.
+
+A recording rolls over to a new cast without its input ending. The
+recording writes a marker into its output after the last of the old
+cast's, and the recorder switches casts where it finds it, so no output
+is lost or repeated in between.
+"""
+import logging
+import os
+import selectors
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from pydantic import BaseModel, Field
+
+from .cast.writer import CastWriter
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from a FIFO at a time
+READ_SIZE = 64 * 1024
+
+# Wakes the recorder thread to check for new inputs when there is no output
+SELECT_TIMEOUT = 0.5
+
+# How long remove() waits for a recording's input to end
+END_TIMEOUT = 5.0
+
+
+class RecorderStats(BaseModel):
+    """Counters for one cast the recorder is writing."""
+    bytes_in: int = Field(0, description="Bytes read from the relay")
+    events: int = Field(0, description="Events written to the cast")
+    reads: int = Field(0, description="Reads from the relay")
+    flushes: int = Field(0, description="Times the cast was flushed to disk")
+
+
+class Rollover:
+    """A cast to switch a recording to where a marker turns up in its output."""
+
+    def __init__(self, writer: CastWriter, marker: bytes):
+        self.writer = writer
+        self.marker = marker
+        self.tail = b""  # Output that might be the start of the marker
+        self.done = threading.Event()  # Switched, and the old cast closed
+
+
+class CastInput:
+    """One recording's FIFO and the cast it is written to."""
+
+    def __init__(self, key: str, fd: int, writer: CastWriter):
+        self.key = key
+        self.fd = fd
+        self.writer = writer
+        self.stats = RecorderStats()
+        self.unflushed = False  # Written since the last flush, or held back by it
+        self.at_end = False  # End-of-file has been read
+        self.rollover: Optional[Rollover] = None  # Waiting for its marker
+        self.ended = threading.Event()  # Input ended and the cast is closed
+
+
+class Recorder:
+    """Writes the casts of all recordings in a single thread."""
+
+    def __init__(self):
+        self._selector = selectors.DefaultSelector()
+        self._inputs: Dict[str, CastInput] = {}
+        self._finished: Dict[str, CastInput] = {}  # Ended, until remove() is called
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, key: str, fifo: Path, writer: CastWriter) -> None:
+        """Start writing a FIFO's output into a cast.
+
+        The FIFO is opened for reading here, so the relay can open it for
+        writing straight away.
+
+        Args:
+            key: Recording the FIFO belongs to
+            fifo: FIFO that the relay writes the recording's output to
+            writer: Cast to write to, closed when the input ends. It is
+                flushed by the recorder, so it should be a buffered one.
+
+        Raises:
+            OSError: If the FIFO can't be opened
+        """
+        fd = os.open(fifo, os.O_RDONLY | os.O_NONBLOCK)
+        cast_input = CastInput(key, fd, writer)
+        with self._lock:
+            self._inputs[key] = cast_input
+            self._selector.register(fd, selectors.EVENT_READ, cast_input)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="tvmux-recorder", daemon=True)
+                self._thread.start()
+
+        logger.debug(f"Recording {fifo} to {writer.path} for {key}")
+
+    def remove(self, key: str, timeout: float = END_TIMEOUT) -> Optional[RecorderStats]:
+        """Wait for a recording's input to end and its cast to be closed.
+
+        The input ends once the relay has closed the FIFO. If it hasn't by
+        the timeout, whatever has arrived is written and the cast closed
+        anyway.
+
+        Returns:
+            The final counters, or None if nothing was being recorded
+        """
+        with self._lock:
+            cast_input = self._inputs.get(key) or self._finished.get(key)
+        if cast_input is None:
+            return None
+
+        if not cast_input.ended.wait(timeout):
+            logger.warning(f"Output for {key} didn't end within {timeout}s, closing its cast")
+            with self._lock:
+                if self._inputs.get(key) is cast_input:
+                    while self._read(cast_input):
+                        pass
+                    self._finish(cast_input)
+
+        with self._lock:
+            if self._finished.get(key) is cast_input:
+                del self._finished[key]
+        return cast_input.stats
+
+    def rollover(self, key: str, writer: CastWriter, marker: bytes) -> Optional[threading.Event]:
+        """Switch a recording to a new cast where a marker turns up in its output.
+
+        Output before the marker goes into the current cast, which is then
+        closed, and output after it into the new one. The marker itself
+        isn't written. If it doesn't turn up, cut() switches anyway.
+
+        Args:
+            key: Recording to switch
+            writer: Cast to switch to, flushed by the recorder like add()'s
+            marker: Written into the output where the switch should be
+
+        Returns:
+            Set once the old cast is closed, or None if the recording's cast
+            isn't being written
+        """
+        with self._lock:
+            cast_input = self._inputs.get(key)
+            if cast_input is None:
+                return None
+            if cast_input.rollover is not None:
+                self._switch(cast_input)
+            cast_input.rollover = Rollover(writer, marker)
+            return cast_input.rollover.done
+
+    def cut(self, key: str) -> None:
+        """Switch a recording to the cast given to rollover() now, after whatever has arrived."""
+        with self._lock:
+            cast_input = self._inputs.get(key)
+            if cast_input is None or cast_input.rollover is None:
+                return
+            while cast_input.rollover is not None and self._read(cast_input):
+                pass
+            if cast_input.rollover is not None:
+                logger.warning(f"Rollover marker for {key} didn't turn up, switching casts anyway")
+                self._switch(cast_input)
+
+    def mark(self, key: str, label: str = "") -> bool:
+        """Write a marker into a recording's cast, after the output written so far.
+
+        Returns:
+            Whether the recording's cast is being written
+        """
+        with self._lock:
+            cast_input = self._inputs.get(key)
+            if cast_input is None:
+                return False
+            cast_input.writer.marker(label, time.monotonic())
+            cast_input.stats.events += 1
+            cast_input.unflushed = True
+        return True
+
+    def resize(self, key: str, width: int, height: int) -> bool:
+        """Write a resize into a recording's cast, after the output written so far.
+
+        The cast writer only writes one if the cast isn't that size already.
+
+        Returns:
+            Whether the recording's cast is being written
+        """
+        with self._lock:
+            cast_input = self._inputs.get(key)
+            if cast_input is None:
+                return False
+            events = cast_input.writer.events
+            cast_input.writer.resize(width, height, time.monotonic())
+            cast_input.stats.events += cast_input.writer.events - events
+            cast_input.unflushed = True
+        return True
+
+    def stats(self, key: str) -> Optional[RecorderStats]:
+        """Get the counters for a recording, if its cast is being written."""
+        with self._lock:
+            cast_input = self._inputs.get(key)
+            return cast_input.stats.model_copy() if cast_input else None
+
+    def _run(self) -> None:
+        """Write output as it arrives until no inputs are left."""
+        while True:
+            with self._lock:
+                if not self._inputs:
+                    self._thread = None
+                    return
+
+            ready = self._selector.select(SELECT_TIMEOUT)
+
+            with self._lock:
+                for key, _ in ready:
+                    cast_input = key.data
+                    if self._inputs.get(cast_input.key) is not cast_input:
+                        continue  # Closed while we were waiting
+                    try:
+                        self._read(cast_input)
+                        if cast_input.at_end:
+                            self._finish(cast_input)
+                    except OSError as e:
+                        logger.error(f"Failed to write {cast_input.writer.path}: {e}")
+                        self._finish(cast_input)
+                self._flush()
+
+    def _read(self, cast_input: CastInput) -> bool:
+        """Read one chunk of output into the cast. Called with the lock held.
+
+        Returns:
+            Whether anything was read
+        """
+        try:
+            data = os.read(cast_input.fd, READ_SIZE)
+        except BlockingIOError:
+            return False
+        if not data:
+            cast_input.at_end = True
+            return False
+
+        now = time.monotonic()
+        cast_input.stats.reads += 1
+        cast_input.stats.bytes_in += len(data)
+        rollover = cast_input.rollover
+        if rollover is not None:
+            data = rollover.tail + data
+            rollover.tail = b""
+            index = data.find(rollover.marker)
+            if index >= 0:
+                self._write(cast_input, data[:index], now)
+                self._switch(cast_input)
+                data = data[index + len(rollover.marker):]
+            else:
+                # Keep back anything that could be the start of the marker
+                for length in range(min(len(rollover.marker) - 1, len(data)), 0, -1):
+                    if data.endswith(rollover.marker[:length]):
+                        rollover.tail = data[-length:]
+                        data = data[:-length]
+                        break
+        self._write(cast_input, data, now)
+        return True
+
+    def _write(self, cast_input: CastInput, data: bytes, now: float) -> None:
+        """Write output into an input's cast. Called with the lock held."""
+        if not data:
+            return
+        events = cast_input.writer.events
+        cast_input.writer.output(data, now)
+        cast_input.stats.events += cast_input.writer.events - events
+        cast_input.unflushed = True
+
+    def _switch(self, cast_input: CastInput) -> None:
+        """Close an input's cast and carry on in the one it rolls over to. Called with the lock held."""
+        rollover = cast_input.rollover
+        cast_input.rollover = None
+        self._write(cast_input, rollover.tail, time.monotonic())  # Held back, but not the marker after all
+        try:
+            cast_input.writer.close()
+        except OSError as e:
+            logger.warning(f"Failed to close {cast_input.writer.path}: {e}")
+        cast_input.writer = rollover.writer
+        cast_input.unflushed = True
+        rollover.done.set()
+        logger.debug(f"Switched {cast_input.key} to {rollover.writer.path}")
+
+    def _flush(self) -> None:
+        """Flush every cast written to since the last pass. Called with the lock held."""
+        for cast_input in list(self._inputs.values()):
+            if not cast_input.unflushed:
+                continue
+            try:
+                cast_input.writer.flush()
+                cast_input.stats.flushes += 1
+            except OSError as e:
+                logger.error(f"Failed to write {cast_input.writer.path}: {e}")
+                self._finish(cast_input)
+            cast_input.unflushed = cast_input.writer.holding
+
+    def _finish(self, cast_input: CastInput) -> None:
+        """Stop reading an input and close its cast. Called with the lock held."""
+        if cast_input.rollover is not None:
+            self._switch(cast_input)  # So both casts are closed
+        self._selector.unregister(cast_input.fd)
+        del self._inputs[cast_input.key]
+        self._finished[cast_input.key] = cast_input
+        os.close(cast_input.fd)
+        try:
+            cast_input.writer.close()
+        except OSError as e:
+            logger.warning(f"Failed to close {cast_input.writer.path}: {e}")
+        cast_input.ended.set()
+        logger.debug(f"Stopped recording {cast_input.key}: {cast_input.stats}")
+
+
+_recorder: Optional[Recorder] = None
+
+
+def get_recorder() -> Recorder:
+    """Get the server's recorder."""
+    global _recorder
+    if _recorder is None:
+        _recorder = Recorder()
+    return _recorder
@@ -0,0 +1,785 @@
+"""Relay pane output from tmux to the cast writers through the server.
+
+Each recording has two FIFOs: tmux writes into ``window_X.in.fifo``, and
+the cast writer reads ``window_X.fifo``. One
+relay thread copies between every pair using a selector. Since all output
+passes through it, the server can look at the stream as it is recorded,
+e.g. to match live output against patterns, without re-reading casts.
+
+The relay opens the input FIFO read-write, so it never sees end-of-file
+while writers come and go, and writers never block waiting for a reader.
+
+Output is read as soon as it arrives and held in a bounded buffer until
+the cast writer takes it, so a writer that falls behind doesn't hold up
+tmux, and through it the pane. What happens when the buffer is full is
+set by the overflow policy:
+
+    resync  drop the backlog and anything more until the writer catches
+            up, then redraw the screen from a fresh snapshot
+    drop    drop anything more until there is room again
+    block   stop reading until there is room, which can slow the pane
+
+Chatty programs make thousands of tiny writes a second, and each one the
+writer sees becomes its own cast event. With a coalescing interval, output
+is held until the interval has passed since the first unwritten byte
+arrived, or enough has piled up, and then written in one go.
+
+Pane tracks are channels of their own, each with a FIFO to its track's
+writer, so they get the same buffer and overflow policy as a recording,
+and the relay never waits on a disk. A track can also forward its output
+to a recording's channel, which is how the main cast follows the active
+pane when every pane is being recorded, and can be tapped to hand each
+chunk of output to something else, such as the window's compositor.
+
+Switching a recording to another pane must not lose or repeat output.
+The new pane's stream starts at the very point its snapshot is taken, and
+is held here until the old stream has ended, which its writer marks by
+writing an end marker after its last byte. Then the snapshot and the held
+output are passed on, in that order, and the new stream forwarded from
+then on. End markers are taken out of the output.
+
+Snapshots are handed to the relay with write() rather than written into
+the input FIFO. They go wherever the channel's output goes, after what
+has been read so far, but redraw output from before, so listeners don't
+see them as new lines.
+"""
+import codecs
+import errno
+import fcntl
+import logging
+import os
+import selectors
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from .cast.text import TextLines
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from a FIFO at a time
+READ_SIZE = 64 * 1024
+
+# How long to wait for the writer to open its end of the output FIFO
+OPEN_TIMEOUT = 10.0
+
+# Wakes the relay thread to check for shutdown when there is no output
+SELECT_TIMEOUT = 0.5
+
+# How long a switch waits for the old stream to end before going ahead
+SWITCH_TIMEOUT = 2.0
+
+DEFAULT_BUFFER_BYTES = 4 * 1024 * 1024
+DEFAULT_PIPE_SIZE = 0  # The system default, as big pipes count against a per-user quota
+DEFAULT_COALESCE_BYTES = 64 * 1024
+
+OVERFLOW_POLICIES = ("resync", "drop", "block")
+
+# Called with (recording_id, unix time, line) for each line of live output
+LineListener = Callable[[str, float, str], None]
+
+
+class RelayStats(BaseModel):
+    """Counters for one recording's output on its way to the cast writer."""
+    bytes_in: int = Field(0, description="Bytes read from tmux")
+    bytes_out: int = Field(0, description="Bytes passed on to the cast writer")
+    buffered: int = Field(0, description="Bytes waiting for the cast writer")
+    max_buffered: int = Field(0, description="Most bytes ever waiting at once")
+    dropped_bytes: int = Field(0, description="Bytes dropped because the buffer was full")
+    overflows: int = Field(0, description="Times the buffer filled up")
+    resyncs: int = Field(0, description="Screen redraws after dropping output")
+    stalled_seconds: float = Field(0.0, description="Time the cast writer wasn't keeping up")
+    blocked_seconds: float = Field(0.0, description="Time tmux wasn't read from (block policy)")
+    reads: int = Field(0, description="Reads from tmux")
+    writes: int = Field(0, description="Writes to the cast writer")
+
+
+class Switch:
+    """A recording moving from one stream of output to another."""
+
+    def __init__(self, target: str, after: str, prelude: bytes, deadline: float):
+        self.target = target  # Channel that gets the new stream
+        self.after = after  # Channel with the old stream, which has to end first
+        self.prelude = prelude  # Written before the new stream, i.e. its snapshot
+        self.deadline = deadline  # Go ahead anyway after this
+
+
+class Channel:
+    """One input FIFO's path through the relay."""
+
+    def __init__(self, recording_id: str, source_fd: int, sink_fd: Optional[int],
+                 buffer_bytes: int = DEFAULT_BUFFER_BYTES, policy: str = "resync",
+                 on_resync: Optional[Callable[[], None]] = None,
+                 coalesce_interval: float = 0.0, coalesce_bytes: int = DEFAULT_COALESCE_BYTES):
+        self.key = recording_id
+        self.recording_id = recording_id
+        self.source_fd = source_fd
+        self.sink_fd = sink_fd
+        self.forward: Optional[str] = None  # Channel that also gets this output
+        self.tap: Optional[Callable[[bytes], None]] = None  # Also called with each chunk of output
+        self.end_marker: Optional[bytes] = None  # Written after the last byte of the current stream
+        self.ended = False  # The end marker has been seen
+        self.marker_tail = b""  # Output that might be the start of the end marker
+        self.switch: Optional[Switch] = None  # Held until the switch can go ahead
+        self.buffer = bytearray()
+        self.buffer_bytes = buffer_bytes
+        self.policy = policy
+        self.on_resync = on_resync
+        self.coalesce_interval = coalesce_interval
+        self.coalesce_bytes = coalesce_bytes
+        self.stats = RelayStats()
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.lines: Optional[TextLines] = None
+
+        self.dropping = False  # Discarding output until the writer catches up
+        self.reading = False  # Source registered with the selector
+        self.writing = False  # Sink registered with the selector
+        self.stalled_since: Optional[float] = None
+        self.blocked_since: Optional[float] = None
+        self.held_since: Optional[float] = None  # When the oldest unwritten output arrived
+
+    def write_due(self) -> Optional[float]:
+        """Get when buffered output should be written, or None if there is none."""
+        if not self.buffer or self.sink_fd is None:
+            return None
+        if not self.coalesce_interval or self.held_since is None or self.dropping \
+                or len(self.buffer) >= self.coalesce_bytes:
+            return 0.0
+        return self.held_since + self.coalesce_interval
+
+    def snapshot(self) -> RelayStats:
+        """Get the counters, including any stall still going on."""
+        stats = self.stats.model_copy()
+        stats.buffered = len(self.buffer)
+        now = time.monotonic()
+        if self.stalled_since is not None:
+            stats.stalled_seconds += now - self.stalled_since
+        if self.blocked_since is not None:
+            stats.blocked_seconds += now - self.blocked_since
+        return stats
+
+
+def set_pipe_size(fd: int, size: int) -> None:
+    """Ask for a bigger kernel buffer on a FIFO, where supported.
+
+    Unprivileged users are capped by /proc/sys/fs/pipe-max-size, and once
+    their pipes use more than /proc/sys/fs/pipe-user-pages-soft in all,
+    every new pipe gets a single page, so the FIFO keeps whatever size it
+    had and a warning is logged.
+    """
+    if not size or not hasattr(fcntl, "F_SETPIPE_SZ"):
+        return
+    try:
+        fcntl.fcntl(fd, fcntl.F_SETPIPE_SZ, size)
+    except OSError as e:
+        logger.warning(f"Can't set pipe size to {size}, keeping the system default: {e}")
+
+
+def _open_sink(path: Path, timeout: float) -> int:
+    """Open a FIFO for non-blocking writes once its reader has opened it."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+        except OSError as e:
+            if e.errno != errno.ENXIO or time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+class Relay:
+    """Copies output for all recordings in a single thread."""
+
+    def __init__(self):
+        self._selector = selectors.DefaultSelector()
+        self._channels: Dict[str, Channel] = {}
+        self._listeners: List[LineListener] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, recording_id: str, source: Path, sink: Path,
+            timeout: float = OPEN_TIMEOUT, buffer_bytes: int = DEFAULT_BUFFER_BYTES,
+            policy: str = "resync", pipe_size: int = DEFAULT_PIPE_SIZE,
+            on_resync: Optional[Callable[[], None]] = None, coalesce_interval: float = 0.0,
+            coalesce_bytes: int = DEFAULT_COALESCE_BYTES) -> None:
+        """Start relaying from a recording's input FIFO to its writer's FIFO.
+
+        Args:
+            recording_id: Recording the FIFOs belong to
+            source: FIFO that tmux writes to
+            sink: FIFO that the cast writer reads
+            timeout: How long to wait for the writer to open the sink
+            buffer_bytes: Most output held for a writer that falls behind
+            policy: What to do when the buffer is full, see the module docs
+            pipe_size: Kernel buffer size to ask for on both FIFOs (0 = default)
+            on_resync: Writes a fresh snapshot of the screen into the source,
+                for the resync policy. Called in a thread of its own.
+            coalesce_interval: Seconds to hold output for more to write
+                with it (0 = write as soon as possible)
+            coalesce_bytes: Write held output once this much has piled up
+
+        Raises:
+            OSError: If either FIFO can't be opened
+            ValueError: If the policy isn't known
+        """
+        channel = self._open(recording_id, source, sink, timeout, buffer_bytes, policy, pipe_size,
+                             on_resync, coalesce_interval, coalesce_bytes)
+        self._start(recording_id, channel)
+        logger.debug(f"Relaying {source} to {sink} for {recording_id}")
+
+    def add_track(self, key: str, recording_id: str, source: Path, sink: Path,
+                  timeout: float = OPEN_TIMEOUT, buffer_bytes: int = DEFAULT_BUFFER_BYTES,
+                  policy: str = "resync", pipe_size: int = DEFAULT_PIPE_SIZE,
+                  on_resync: Optional[Callable[[], None]] = None,
+                  tap: Optional[Callable[[bytes], None]] = None) -> None:
+        """Start relaying a pane's output to its track's writer.
+
+        Args:
+            key: Name for the channel, unique across the relay
+            recording_id: Recording the track belongs to, as given to listeners
+            source: FIFO that tmux writes to
+            sink: FIFO that the track's writer reads
+            timeout: How long to wait for the writer to open the sink
+            buffer_bytes: Most output held for a writer that falls behind
+            policy: What to do when the buffer is full, see the module docs
+            pipe_size: Kernel buffer size to ask for on both FIFOs (0 = default)
+            on_resync: Writes a fresh snapshot of the pane into the source,
+                for the resync policy. Called in a thread of its own.
+            tap: Also called with each chunk of output, in the relay thread,
+                so it should only queue the data
+
+        Raises:
+            OSError: If either FIFO can't be opened
+            ValueError: If the policy isn't known
+        """
+        channel = self._open(recording_id, source, sink, timeout, buffer_bytes, policy, pipe_size,
+                             on_resync)
+        channel.key = key
+        channel.tap = tap
+        self._start(key, channel)
+        logger.debug(f"Relaying {source} to {sink} for track {key}")
+
+    def _open(self, recording_id: str, source: Path, sink: Path, timeout: float, buffer_bytes: int,
+              policy: str, pipe_size: int, on_resync: Optional[Callable[[], None]],
+              coalesce_interval: float = 0.0, coalesce_bytes: int = DEFAULT_COALESCE_BYTES) -> Channel:
+        """Open a channel's FIFOs, see add()."""
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {policy!r}, "
+                             f"expected one of {', '.join(OVERFLOW_POLICIES)}")
+
+        source_fd = os.open(source, os.O_RDWR | os.O_NONBLOCK)
+        try:
+            sink_fd = _open_sink(sink, timeout)
+        except OSError:
+            os.close(source_fd)
+            raise
+
+        set_pipe_size(source_fd, pipe_size)
+        set_pipe_size(sink_fd, pipe_size)
+
+        return Channel(recording_id, source_fd, sink_fd, buffer_bytes, policy, on_resync,
+                       coalesce_interval, coalesce_bytes)
+
+    def _start(self, key: str, channel: Channel) -> None:
+        """Start selecting on a channel that has been opened."""
+        with self._lock:
+            if self._listeners:
+                channel.lines = TextLines()
+            self._channels[key] = channel
+            self._update_interest(channel)
+            self._ensure_thread()
+
+    def hold(self, key: str, recording_id: str, source: Path, end_marker: Optional[bytes] = None,
+             pipe_size: int = DEFAULT_PIPE_SIZE) -> None:
+        """Start reading a stream that is held until a switch passes it on.
+
+        Args:
+            key: Name for the channel, unique across the relay
+            recording_id: Recording the stream belongs to, as given to listeners
+            source: FIFO the stream is written to
+            end_marker: What the stream's writer writes after its last byte
+            pipe_size: Kernel buffer size to ask for on the FIFO (0 = default)
+
+        Raises:
+            OSError: If the FIFO can't be opened
+        """
+        source_fd = os.open(source, os.O_RDWR | os.O_NONBLOCK)
+        set_pipe_size(source_fd, pipe_size)
+
+        channel = Channel(recording_id, source_fd, None)
+        channel.key = key
+        channel.end_marker = end_marker
+        channel.switch = Switch(recording_id, "", b"", float("inf"))  # Until switch() says otherwise
+        with self._lock:
+            if self._listeners:
+                channel.lines = TextLines()
+            self._channels[key] = channel
+            self._update_interest(channel)
+            self._ensure_thread()
+
+    def switch(self, old: str, new: str, target: str, prelude: bytes,
+               timeout: float = SWITCH_TIMEOUT) -> None:
+        """Move a recording from one held stream to another, without a gap or overlap.
+
+        Once the old stream's end marker has been read, or the timeout is up,
+        the prelude and then everything held on the new channel are passed
+        to the target, and the new channel is forwarded to it from then on.
+        The old channel is closed then, unless it is the target itself.
+
+        Args:
+            old: Channel with the stream being switched away from
+            new: Channel from hold() with the stream being switched to
+            target: Recording channel that gets the output
+            prelude: Written first, e.g. a snapshot of the screen as of the
+                start of the new stream
+            timeout: Longest to wait for the old stream to end
+        """
+        with self._lock:
+            channel = self._channels.get(new)
+            if channel is None:
+                return
+            channel.switch = Switch(target, old, prelude, time.monotonic() + timeout)
+            self._finish_switch(channel)
+
+    def write(self, key: str, data: bytes, timeout: float = OPEN_TIMEOUT) -> bool:
+        """Pass a snapshot on from a channel, after the output read so far, without telling listeners.
+
+        Waits for room in the buffer, as a writer into the FIFO would, but
+        only up to the timeout, after which the overflow policy applies.
+
+        Returns:
+            Whether the channel was there to write to
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                channel = self._channels.get(key)
+                if channel is None:
+                    return False
+                if len(channel.buffer) + len(data) <= channel.buffer_bytes or channel.dropping \
+                        or time.monotonic() > deadline:
+                    try:
+                        while self._read(channel):
+                            pass
+                        self._pass_on(channel, data, notify=False)
+                        self._flush(channel)
+                        self._update_interest(channel)
+                    except OSError as e:
+                        self._fail(channel, e)
+                    return True
+            time.sleep(0.01)
+
+    def forward(self, key: str, target: Optional[str]) -> None:
+        """Also pass a channel's output on to another channel, or stop doing so."""
+        with self._lock:
+            channel = self._channels.get(key)
+            if channel is not None:
+                channel.forward = target
+
+    def remove(self, key: str) -> Optional[RelayStats]:
+        """Stop relaying for a recording, or a track.
+
+        Whatever is still buffered, here or in the input FIFO, is passed on
+        first, waiting for the writer if need be. Then the output FIFO is
+        closed so the writer sees end-of-file.
+
+        Returns:
+            The final counters, or None if nothing was being relayed
+        """
+        self._wait_for_end(key)
+
+        with self._lock:
+            channel = self._channels.pop(key, None)
+            if channel is None:
+                return None
+            self._unwatch(channel)
+
+            try:
+                # Nothing more is coming, so waiting for the writer is fine now
+                channel.dropping = False
+                if channel.sink_fd is not None:
+                    os.set_blocking(channel.sink_fd, True)
+                self._flush(channel, writable=True, force=True)
+                while self._read(channel):
+                    self._flush(channel, writable=True, force=True)
+            except OSError as e:
+                logger.warning(f"Failed to pass on the last output for {key}: {e}")
+            finally:
+                self._end_stall(channel)
+                self._close(channel)
+
+        stats = channel.snapshot()
+        logger.debug(f"Stopped relaying for {key}: {stats}")
+        if stats.dropped_bytes:
+            logger.warning(f"Dropped {stats.dropped_bytes} bytes of output from {key} "
+                           f"in {stats.overflows} overflows, writer stalled for "
+                           f"{stats.stalled_seconds:.1f}s")
+        return stats
+
+    def _wait_for_end(self, key: str, timeout: float = SWITCH_TIMEOUT) -> None:
+        """Give a channel's stream a moment to end, if it has an end marker."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                channel = self._channels.get(key)
+                if channel is None or channel.end_marker is None or channel.ended:
+                    return
+            time.sleep(0.01)
+        logger.warning(f"Output for {key} didn't end within {timeout}s")
+
+    def stats(self, key: str) -> Optional[RelayStats]:
+        """Get the counters for a recording or track, if it is being relayed."""
+        with self._lock:
+            channel = self._channels.get(key)
+            return channel.snapshot() if channel else None
+
+    def subscribe(self, listener: LineListener) -> None:
+        """Get every line of live output from every recording.
+
+        Listeners are called in the relay thread, so they should only queue
+        the line, and leave anything slower to another thread or task.
+        """
+        with self._lock:
+            self._listeners.append(listener)
+            for channel in self._channels.values():
+                if channel.lines is None:
+                    channel.lines = TextLines()
+
+    def unsubscribe(self, listener: LineListener) -> None:
+        """Stop sending lines to a listener."""
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+            if not self._listeners:
+                # Nobody is looking, so don't spend time splitting lines
+                for channel in self._channels.values():
+                    channel.lines = None
+
+    def _ensure_thread(self) -> None:
+        """Start the relay thread if it isn't running."""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="tvmux-relay", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        """Copy output as it arrives until no channels are left."""
+        while True:
+            with self._lock:
+                if not self._channels:
+                    self._thread = None
+                    return
+                timeout = self._next_timeout()
+
+            for key, _events in self._selector.select(timeout):
+                with self._lock:
+                    channel = key.data
+                    if self._channels.get(channel.key) is not channel:
+                        continue  # Removed while we were waiting
+                    try:
+                        if key.fd == channel.source_fd:
+                            self._read(channel)
+                            if self._channels.get(channel.key) is not channel:
+                                continue  # Its stream ended and a switch closed it
+                        self._flush(channel, writable=key.fd == channel.sink_fd)
+                        self._update_interest(channel)
+                    except OSError as e:
+                        self._fail(channel, e)
+
+            with self._lock:
+                self._write_held()
+                self._expire_switches()
+
+    def _next_timeout(self) -> float:
+        """Get how long to wait for output before held output is due. Called with the lock held."""
+        timeout = SELECT_TIMEOUT
+        now = time.monotonic()
+        for channel in self._channels.values():
+            due = channel.write_due()
+            if due is not None and not channel.writing:
+                timeout = min(timeout, max(0.0, due - now))
+            if channel.switch is not None:
+                timeout = min(timeout, max(0.0, channel.switch.deadline - now))
+        return timeout
+
+    def _write_held(self) -> None:
+        """Start writing held output whose interval is up. Called with the lock held."""
+        now = time.monotonic()
+        for channel in list(self._channels.values()):
+            due = channel.write_due()
+            if due is None or channel.writing or due > now:
+                continue
+            try:
+                self._flush(channel)
+                self._update_interest(channel)
+            except OSError as e:
+                self._fail(channel, e)
+
+    def _expire_switches(self) -> None:
+        """Go ahead with switches whose old stream took too long to end. Called with the lock held."""
+        now = time.monotonic()
+        for channel in list(self._channels.values()):
+            if channel.switch is not None and channel.switch.deadline <= now:
+                self._finish_switch(channel)
+
+    def _finish_switch(self, channel: Channel) -> None:
+        """Pass a held stream on, if the stream before it has ended. Called with the lock held."""
+        switch = channel.switch
+        old = self._channels.get(switch.after)
+        ended = old is None or old.end_marker is None or old.ended
+        if not ended and time.monotonic() < switch.deadline:
+            return
+        if not ended:
+            logger.warning(f"Output for {switch.after} didn't end, switching to {channel.key} anyway")
+
+        if old is not None and old is not self._channels.get(switch.target):
+            self._unwatch(old)
+            del self._channels[old.key]
+            self._close(old)
+
+        channel.switch = None
+        target = self._channels.get(switch.target)
+        if target is None:
+            return
+
+        held = bytes(channel.buffer)
+        channel.buffer.clear()
+        channel.forward = switch.target
+        try:
+            # Anything already written to the target, like a snapshot, comes first
+            while target is not old and self._read(target):
+                pass
+            if switch.prelude:
+                self._accept(target, switch.prelude)
+            if held:
+                self._accept(target, held)
+            self._flush(target)
+            self._update_interest(target)
+        except OSError as e:
+            self._fail(target, e)
+
+    def _fail(self, channel: Channel, error: OSError) -> None:
+        """Give up on a channel that can't be read or written. Called with the lock held."""
+        logger.error(f"Relay failed for {channel.key}: {error}")
+        self._unwatch(channel)
+        del self._channels[channel.key]
+        self._close(channel)
+
+    def _close(self, channel: Channel) -> None:
+        """Close a channel's FIFOs."""
+        os.close(channel.source_fd)
+        if channel.sink_fd is not None:
+            os.close(channel.sink_fd)
+
+    def _read(self, channel: Channel) -> bool:
+        """Read one chunk of output and pass it on. Called with the lock held.
+
+        Returns:
+            Whether anything was read
+        """
+        try:
+            data = os.read(channel.source_fd, READ_SIZE)
+        except BlockingIOError:
+            return False
+        if not data:
+            return False
+
+        channel.stats.reads += 1
+        if channel.end_marker is not None and not channel.ended:
+            data, after = self._find_end(channel, data)
+            if after is not None:
+                # The stream before this one has ended, so the next can go ahead
+                if data:
+                    self._pass_on(channel, data)
+                for waiting in list(self._channels.values()):
+                    if waiting.switch is not None and waiting.switch.after == channel.key:
+                        self._finish_switch(waiting)
+                if after and self._channels.get(channel.key) is channel:
+                    self._pass_on(channel, after)
+                return True
+        if data:
+            self._pass_on(channel, data)
+        return True
+
+    def _find_end(self, channel: Channel, data: bytes):
+        """Look for a channel's end marker, which might be split between reads.
+
+        Returns:
+            (output before the marker, output after it or None if not found yet)
+        """
+        data = channel.marker_tail + data
+        channel.marker_tail = b""
+        marker = channel.end_marker
+
+        index = data.find(marker)
+        if index >= 0:
+            channel.ended = True
+            return data[:index], data[index + len(marker):]
+
+        # Keep back anything that could be the start of the marker
+        for length in range(min(len(marker) - 1, len(data)), 0, -1):
+            if data.endswith(marker[:length]):
+                channel.marker_tail = data[-length:]
+                return data[:-length], None
+        return data, None
+
+    def _pass_on(self, channel: Channel, data: bytes, notify: bool = True) -> None:
+        """Send output wherever the channel sends it. Called with the lock held."""
+        if notify:
+            self._notify(channel, data)
+
+        if channel.tap is not None:
+            try:
+                channel.tap(data)
+            except Exception:
+                logger.exception(f"Output tap failed for {channel.key}")
+        if channel.sink_fd is not None or channel.switch is not None:
+            self._accept(channel, data)
+
+        if channel.forward:
+            self._forward(channel, data)
+
+    def _accept(self, channel: Channel, data: bytes) -> None:
+        """Buffer output for a channel's writer, unless it is full. Called with the lock held."""
+        channel.stats.bytes_in += len(data)
+
+        if channel.dropping:
+            channel.stats.dropped_bytes += len(data)
+        elif len(channel.buffer) + len(data) > channel.buffer_bytes and channel.policy != "block":
+            channel.stats.overflows += 1
+            channel.dropping = True
+            channel.stats.dropped_bytes += len(data)
+            if channel.policy == "resync":
+                # The redraw will replace the backlog, so the writer catches up sooner
+                channel.stats.dropped_bytes += len(channel.buffer)
+                channel.buffer.clear()
+        else:
+            if not channel.buffer:
+                channel.held_since = time.monotonic()
+            channel.buffer += data
+            channel.stats.max_buffered = max(channel.stats.max_buffered, len(channel.buffer))
+
+    def _forward(self, channel: Channel, data: bytes) -> None:
+        """Pass output on to the channel it is forwarded to. Called with the lock held."""
+        target = self._channels.get(channel.forward)
+        if target is None or target.sink_fd is None:
+            return
+
+        self._accept(target, data)
+        try:
+            self._flush(target)
+            self._update_interest(target)
+        except OSError as e:
+            self._fail(target, e)
+
+    def _flush(self, channel: Channel, writable: bool = False, force: bool = False) -> None:
+        """Write as much of the buffer as the writer will take. Called with the lock held.
+
+        Args:
+            channel: Channel to write out
+            writable: The selector reported the sink writable, so an empty
+                buffer means the writer really has caught up
+            force: Write now even if output is being held to coalesce
+        """
+        if not force:
+            due = channel.write_due()
+            if due is not None and due > time.monotonic():
+                return
+
+        if channel.sink_fd is None:
+            return
+
+        while channel.buffer:
+            try:
+                written = os.write(channel.sink_fd, channel.buffer)
+            except BlockingIOError:
+                written = 0
+            if not written:
+                if channel.stalled_since is None:
+                    channel.stalled_since = time.monotonic()
+                return
+            del channel.buffer[:written]
+            channel.stats.bytes_out += written
+            channel.stats.writes += 1
+        channel.held_since = None
+
+        if channel.dropping and not writable:
+            return
+        self._end_stall(channel)
+
+        if channel.dropping:
+            # Caught up, so start passing output on again
+            channel.dropping = False
+            if channel.policy == "resync" and channel.on_resync:
+                channel.stats.resyncs += 1
+                threading.Thread(target=channel.on_resync, name="tvmux-resync", daemon=True).start()
+
+    def _end_stall(self, channel: Channel) -> None:
+        """Count a stall as over."""
+        if channel.stalled_since is not None:
+            channel.stats.stalled_seconds += time.monotonic() - channel.stalled_since
+            channel.stalled_since = None
+
+    def _update_interest(self, channel: Channel) -> None:
+        """Select on the sink only while output is due, and on the source while there is room."""
+        reading = channel.policy != "block" or len(channel.buffer) < channel.buffer_bytes
+        due = channel.write_due()
+        writing = channel.sink_fd is not None and (
+            (due is not None and due <= time.monotonic()) or channel.dropping
+        )
+
+        if reading != channel.reading:
+            if reading:
+                self._selector.register(channel.source_fd, selectors.EVENT_READ, channel)
+                if channel.blocked_since is not None:
+                    channel.stats.blocked_seconds += time.monotonic() - channel.blocked_since
+                    channel.blocked_since = None
+            else:
+                self._selector.unregister(channel.source_fd)
+                channel.blocked_since = time.monotonic()
+            channel.reading = reading
+
+        if writing != channel.writing:
+            if writing:
+                self._selector.register(channel.sink_fd, selectors.EVENT_WRITE, channel)
+            else:
+                self._selector.unregister(channel.sink_fd)
+            channel.writing = writing
+
+    def _unwatch(self, channel: Channel) -> None:
+        """Stop selecting on a channel's FIFOs."""
+        if channel.reading:
+            self._selector.unregister(channel.source_fd)
+            channel.reading = False
+        if channel.writing:
+            self._selector.unregister(channel.sink_fd)
+            channel.writing = False
+        if channel.blocked_since is not None:
+            channel.stats.blocked_seconds += time.monotonic() - channel.blocked_since
+            channel.blocked_since = None
+
+    def _notify(self, channel: Channel, data: bytes) -> None:
+        """Pass complete lines of output to listeners, dropped or not."""
+        if channel.lines is None or not self._listeners:
+            return
+
+        text = channel.decoder.decode(data)
+        for started, line in channel.lines.feed(time.time(), text):
+            for listener in self._listeners:
+                try:
+                    listener(channel.recording_id, started, line)
+                except Exception:
+                    logger.exception("Live output listener failed")
+
+
+_relay: Optional[Relay] = None
+
+
+def get_relay() -> Relay:
+    """Get the server's relay."""
+    global _relay
+    if _relay is None:
+        _relay = Relay()
+    return _relay
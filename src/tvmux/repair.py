@@ -3,15 +3,28 @@
 Asciinema cast file repair utilities.
 
 Simple functions to detect and repair corrupted asciinema cast files.
-Handles large files by streaming instead of loading into RAM.
+Handles large files by streaming instead of loading into RAM, and fixes
+the usual truncated last event in place without touching the rest.
+Works on asciicast v2 and v3, whose comment lines (starting with ``#``)
+are kept. Binary casts are cut off after their last intact block.
 """
 
 import json
 import logging
 from pathlib import Path
+from typing import Optional
+
+from .cast.binary import is_binary, repair_binary_cast, validate_binary_cast
+from .cast.compress import is_compressed, repair_compressed_cast, validate_compressed_cast
 
 logger = logging.getLogger(__name__)
 
+# Read size for streaming copies and backwards scans
+CHUNK_SIZE = 64 * 1024
+
+# How far back from EOF the tail repair looks before giving up
+TAIL_SCAN_LIMIT = 1024 * 1024
+
 
 def validate_cast_file(cast_path: Path) -> bool:
     """
@@ -27,6 +40,11 @@ def validate_cast_file(cast_path: Path) -> bool:
     if not cast_path.exists() or cast_path.stat().st_size == 0:
         return False
 
+    if is_compressed(cast_path):
+        return validate_compressed_cast(cast_path)
+    if is_binary(cast_path):
+        return validate_binary_cast(cast_path)
+
     try:
         with open(cast_path, 'r', encoding='utf-8') as f:
             # Check header
@@ -61,22 +79,25 @@ def validate_cast_file(cast_path: Path) -> bool:
                 last_line = chunk.strip().split('\n')[-1]
 
             # Last line should end with ']' if it's an event
-            return not last_line or last_line.endswith(']')
+            return not last_line or last_line.endswith(']') or _is_comment(last_line)
 
     except (IOError, UnicodeDecodeError):
         return False
 
 
-def repair_cast_file(cast_path: Path, backup: bool = True) -> bool:
+def repair_cast_file(cast_path: Path, backup: bool = True, full: bool = False) -> bool:
     """
     Repair a corrupted asciinema cast file.
 
-    Streams the file to avoid memory issues with large files.
-    Fixes incomplete JSON arrays due to asciinema termination during write.
+    By default only the tail is checked, and a truncated final event is cut
+    off in place. Compressed casts have a cut-off final frame dropped, and
+    binary casts anything after their last intact block. The whole file is only rewritten if the damage goes beyond
+    the tail, or if a full repair is requested.
 
     Args:
         cast_path: Path to the cast file to repair
-        backup: Whether to create a backup before repair
+        backup: Whether to create a backup before a full rewrite
+        full: Skip the tail check and rewrite the whole file
 
     Returns:
         True if repair was successful or unnecessary, False on failure
@@ -84,16 +105,130 @@ def repair_cast_file(cast_path: Path, backup: bool = True) -> bool:
     if not cast_path.exists():
         return False
 
-    # Check if repair is needed
-    if validate_cast_file(cast_path):
+    # Compressed and binary casts can only lose their last frame or blocks
+    if is_compressed(cast_path):
+        return validate_compressed_cast(cast_path) or repair_compressed_cast(cast_path)
+    if is_binary(cast_path):
+        return validate_binary_cast(cast_path) or repair_binary_cast(cast_path)
+
+    if not full:
+        repaired = repair_cast_tail(cast_path)
+        if repaired is not None:
+            return repaired
+        logger.info(f"Damage in {cast_path} goes beyond the tail, rewriting whole file")
+
+    return _rewrite_cast_file(cast_path, backup)
+
+
+def repair_cast_tail(cast_path: Path, scan_limit: int = TAIL_SCAN_LIMIT) -> Optional[bool]:
+    """
+    Truncate a cast file in place to its last intact line.
+
+    Reads backwards from EOF, so the cost depends on the size of the damage
+    rather than the size of the file.
+
+    Args:
+        cast_path: Path to the cast file to repair
+        scan_limit: Maximum number of bytes to examine from the end
+
+    Returns:
+        True if the file was intact or has been fixed, False if the header is
+        unreadable, None if a full rewrite is needed
+    """
+    try:
+        with open(cast_path, 'r+b') as f:
+            header = f.readline()
+            if not _is_intact(header):
+                return False
+
+            size = f.seek(0, 2)
+            end = _find_tail_end(f, size, scan_limit)
+            if end is None:
+                return None
+
+            if end + 1 == size:
+                return True  # Nothing after the last newline
+
+            logger.info(f"Truncating {size - end} damaged bytes from {cast_path}")
+            f.truncate(end)
+            f.seek(end)
+            f.write(b'\n')
+            return True
+
+    except OSError:
+        return False
+
+
+def _is_comment(line) -> bool:
+    """Check whether a line is an asciicast v3 comment."""
+    return line[:1] in ("#", b"#")
+
+
+def _is_intact(line: bytes) -> bool:
+    """Check whether a line is a complete JSON document, or a comment."""
+    if _is_comment(line):
         return True
+    try:
+        json.loads(line)
+        return True
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return False
+
+
+def _reverse_lines(f, size: int, scan_limit: int):
+    """Yield (offset, line) pairs from the end of a binary file backwards."""
+    pos = size
+    remainder = b''
+
+    while pos > 0 and size - pos < scan_limit:
+        read_size = min(CHUNK_SIZE, pos, scan_limit - (size - pos))
+        pos -= read_size
+        f.seek(pos)
+        buf = f.read(read_size) + remainder
+
+        end = len(buf)
+        while (newline := buf.rfind(b'\n', 0, end)) >= 0:
+            yield pos + newline + 1, buf[newline + 1:end]
+            end = newline
+        remainder = buf[:end]
+
+    if pos == 0:
+        yield 0, remainder
+
 
+def _find_tail_end(f, size: int, scan_limit: int) -> Optional[int]:
+    """
+    Find the offset just past the last intact line.
+
+    Every line within the scanned tail is checked, so damage that sits
+    between intact lines is caught there too.
+
+    Returns:
+        Offset of the end of the last intact line, or None if the damage is
+        not confined to the tail
+    """
+    last_end = None
+
+    for offset, line in _reverse_lines(f, size, scan_limit):
+        if not line.strip():
+            continue
+        if _is_intact(line):
+            if last_end is None:
+                last_end = offset + len(line)
+        elif last_end is not None:
+            return None  # Bad line with good ones after it
+
+    return last_end
+
+
+def _rewrite_cast_file(cast_path: Path, backup: bool) -> bool:
+    """Stream the whole file through a temp copy, dropping corrupt lines."""
     try:
         # Create backup if requested
         if backup:
             backup_path = cast_path.with_suffix(cast_path.suffix + '.backup')
             with open(cast_path, 'rb') as src, open(backup_path, 'wb') as dst:
-                while chunk := src.read(8192):
+                while chunk := src.read(CHUNK_SIZE):
                     dst.write(chunk)
 
         # Stream repair using temporary file
@@ -118,6 +253,9 @@ def repair_cast_file(cast_path: Path, backup: bool = True) -> bool:
                 line = line.rstrip()
                 if not line:
                     continue
+                if _is_comment(line):
+                    dst.write(line + '\n')
+                    continue
 
                 try:
                     # Try to parse as JSON array
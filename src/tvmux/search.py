@@ -0,0 +1,349 @@
+"""Full-text search over recorded terminal output.
+
+Output text is stored next to the catalog, one row per visible line with
+the time it appeared, behind an SQLite FTS5 index. Each cast remembers how
+far it has been read and its unfinished last line, so growing recordings
+are indexed incrementally and a finished cast is never read twice.
+"""
+import logging
+import sqlite3
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+
+from pydantic import BaseModel, Field
+
+from .catalog import Catalog, get_catalog
+from .cast.binary import BinaryCast, is_binary
+from .cast.compress import is_compressed, iter_frame_lines
+from .cast.events import EventClock, cast_version
+from .cast.text import TextLines
+from .config import get_config
+
+logger = logging.getLogger(__name__)
+
+# Lines inserted per statement while indexing
+BATCH_SIZE = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS text_casts (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    offset INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    pending TEXT NOT NULL DEFAULT '',
+    pending_time REAL,
+    clock REAL NOT NULL DEFAULT 0,
+    finished INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS text_lines (
+    id INTEGER PRIMARY KEY,
+    cast_id INTEGER NOT NULL,
+    time REAL NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS text_lines_cast ON text_lines (cast_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS text_fts USING fts5(
+    text, content='text_lines', content_rowid='id'
+);
+
+CREATE TRIGGER IF NOT EXISTS text_lines_insert AFTER INSERT ON text_lines BEGIN
+    INSERT INTO text_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS text_lines_delete AFTER DELETE ON text_lines BEGIN
+    INSERT INTO text_fts (text_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS text_casts_delete AFTER DELETE ON text_casts BEGIN
+    DELETE FROM text_lines WHERE cast_id = old.id;
+END;
+
+-- Follow the catalog as casts are removed or renamed
+CREATE TRIGGER IF NOT EXISTS recordings_text_delete AFTER DELETE ON recordings BEGIN
+    DELETE FROM text_casts WHERE path = old.path;
+END;
+CREATE TRIGGER IF NOT EXISTS recordings_text_rename AFTER UPDATE OF path ON recordings BEGIN
+    UPDATE text_casts SET path = new.path WHERE path = old.path;
+END;
+"""
+
+
+class SearchHit(BaseModel):
+    """A line of output matching a search."""
+    path: str = Field(..., description="Cast file containing the line")
+    host: Optional[str] = Field(None, description="Host the recording was made on")
+    session: Optional[str] = Field(None, description="tmux session, if known")
+    name: Optional[str] = Field(None, description="Window name")
+    time: float = Field(..., description="Seconds into the cast")
+    at: Optional[float] = Field(None, description="When the line appeared (unix timestamp)")
+    text: str = Field(..., description="The matching line, without escape sequences")
+
+
+def phrase_query(query: str) -> str:
+    """Quote a plain search string as an FTS5 phrase."""
+    return '"' + query.replace('"', '""') + '"'
+
+
+class SearchIndex:
+    """Text index stored in a catalog's database."""
+
+    def __init__(self, catalog: Catalog):
+        self.catalog = catalog
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        """Open the catalog database with the search tables in place."""
+        with self.catalog.connect() as conn:
+            conn.executescript(SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(text_casts)")}
+            if "clock" not in columns:
+                # Time of the last event read, for asciicast v3 casts, added later
+                conn.execute("ALTER TABLE text_casts ADD COLUMN clock REAL NOT NULL DEFAULT 0")
+            yield conn
+
+    def index_cast(self, cast_path: Path, final: bool = False) -> int:
+        """Index the part of a cast written since it was last indexed.
+
+        Args:
+            cast_path: The cast, which should already be in the catalog
+            final: The cast is finished, so index its last line too and
+                don't read it again
+
+        Returns:
+            Number of lines added
+        """
+        try:
+            size = cast_path.stat().st_size
+        except OSError:
+            return 0
+
+        with self.connect() as conn:
+            row = conn.execute(
+                "SELECT id, offset, pending, pending_time, clock, finished FROM text_casts WHERE path = ?",
+                (str(cast_path),)
+            ).fetchone()
+
+            if row and not is_compressed(cast_path) and size < row["offset"]:
+                # Rewritten since, e.g. by a repair, so start over
+                conn.execute("DELETE FROM text_casts WHERE id = ?", (row["id"],))
+                row = None
+
+            if row is None:
+                cast_id = conn.execute(
+                    "INSERT INTO text_casts (path) VALUES (?)", (str(cast_path),)
+                ).lastrowid
+                offset, lines, clock, finished = 0, TextLines(), EventClock(), False
+            else:
+                cast_id = row["id"]
+                offset, finished = row["offset"], bool(row["finished"])
+                lines = TextLines(row["pending"], row["pending_time"])
+                clock = EventClock(time=row["clock"])
+
+            added = 0
+            if not finished:
+                batch = []
+                end = offset
+                try:
+                    for end, completed in self._read_lines(cast_path, offset, lines, clock, final):
+                        batch.extend((cast_id, at, text) for at, text in completed)
+                        if len(batch) >= BATCH_SIZE:
+                            added += self._insert(conn, batch)
+                            batch = []
+                except (OSError, EOFError, zlib.error) as e:
+                    logger.warning(f"Failed to index text of {cast_path}: {e}")
+                offset = end
+                added += self._insert(conn, batch)
+
+            conn.execute(
+                "UPDATE text_casts SET offset = ?, bytes = ?, pending = ?, pending_time = ?,"
+                " clock = ?, finished = ? WHERE id = ?",
+                (offset, size, lines.pending, lines.pending_time, clock.time, int(finished or final), cast_id)
+            )
+
+        return added
+
+    def forget(self, cast_path: Path) -> None:
+        """Drop a cast's indexed text, e.g. after it was rewritten, so it is read again from the start."""
+        with self.connect() as conn:
+            conn.execute("DELETE FROM text_casts WHERE path = ?", (str(cast_path),))
+
+    def _insert(self, conn: sqlite3.Connection, batch: list) -> int:
+        """Insert a batch of (cast_id, time, text) lines."""
+        conn.executemany("INSERT INTO text_lines (cast_id, time, text) VALUES (?, ?, ?)", batch)
+        return len(batch)
+
+    def _read_lines(self, cast_path: Path, offset: int, lines: TextLines, clock: EventClock,
+                    final: bool) -> Iterator[tuple]:
+        """Read complete events after `offset`, feeding their output to `lines`.
+
+        Args:
+            clock: Left at the time of the last event read, which v3 casts
+                need to carry on from `offset` next time
+
+        Yields:
+            (offset after the event, lines it completed) for each event
+        """
+        if is_binary(cast_path):
+            yield from self._read_blocks(cast_path, offset, lines, final)
+            return
+
+        if is_compressed(cast_path):
+            # Through the frame table, so only the frames from `offset` on are decompressed
+            header = next(iter_frame_lines(cast_path), b"")
+            raws = iter_frame_lines(cast_path, offset or len(header))
+            yield from self._read_events(header, raws, offset, lines, clock, final)
+            return
+
+        with open(cast_path, "rb") as f:
+            header = f.readline()
+            if offset:
+                f.seek(offset)
+            yield from self._read_events(header, f, offset, lines, clock, final)
+
+    def _read_events(self, header: bytes, raws: Iterable[bytes], offset: int, lines: TextLines,
+                     clock: EventClock, final: bool) -> Iterator[tuple]:
+        """Read the complete events in `raws`, the lines of a cast after `offset`, feeding their output to `lines`.
+
+        Yields:
+            (offset after the event, lines it completed) for each event
+        """
+        if not header.endswith(b"\n"):
+            return
+        clock.version = cast_version(header)
+        offset = offset or len(header)
+
+        for raw in raws:
+            if not raw.endswith(b"\n"):
+                break  # Still being written
+            offset += len(raw)
+
+            try:
+                time, kind, data = clock.decode(raw)
+            except (ValueError, TypeError):
+                continue
+            # Every event is yielded, so the offset saved always matches the clock
+            yield offset, lines.feed(time, data) if kind == "o" else []
+
+        if final:
+            yield offset, lines.flush()
+
+    def _read_blocks(self, cast_path: Path, offset: int, lines: TextLines, final: bool) -> Iterator[tuple]:
+        """Read the complete blocks of a binary cast from `offset` on, feeding their output to `lines`.
+
+        Yields:
+            (offset after the block, lines it completed) for each block
+        """
+        try:
+            cast = BinaryCast(cast_path)
+        except ValueError as e:
+            logger.warning(f"Failed to index text of {cast_path}: {e}")
+            return
+
+        with cast:
+            for block in cast.blocks:
+                if block.offset < offset:
+                    continue
+                completed = []
+                try:
+                    for time, kind, data in cast.block_events(block):
+                        if kind == "o":
+                            completed.extend(lines.feed(time, data))
+                except ValueError as e:
+                    logger.warning(f"Failed to index text of {cast_path}: {e}")
+                offset = block.end
+                yield offset, completed
+
+        if final:
+            yield offset, lines.flush()
+
+    def update(self) -> int:
+        """Index every catalogued cast that has changed since it was last indexed.
+
+        Returns:
+            Number of lines added
+        """
+        return self.index_casts(self.changed_casts())
+
+    def changed_casts(self) -> List[tuple]:
+        """Get (path, final) for every catalogued cast changed since it was last indexed."""
+        with self.connect() as conn:
+            rows = conn.execute("""
+                SELECT r.path, r.active FROM recordings r
+                LEFT JOIN text_casts t ON t.path = r.path
+                WHERE t.id IS NULL OR t.bytes != r.bytes OR (r.active = 0 AND t.finished = 0)
+            """).fetchall()
+        return [(Path(row["path"]), not row["active"]) for row in rows]
+
+    def index_casts(self, casts: Iterable[tuple]) -> int:
+        """Index several (path, final) casts, carrying on past failures."""
+        added = 0
+        for cast_path, final in casts:
+            try:
+                added += self.index_cast(cast_path, final)
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to index text of {cast_path}: {e}")
+        return added
+
+    def search(self, query: str, name: Optional[str] = None, host: Optional[str] = None,
+               session: Optional[str] = None, raw: bool = False,
+               limit: int = 50) -> List[SearchHit]:
+        """Find lines of output, most recently recorded first.
+
+        Args:
+            query: Text to find, matched as a phrase of whole words
+            name: Substring of the window name
+            host: Exact host
+            session: Exact session
+            raw: Pass `query` through as FTS5 query syntax
+            limit: Maximum number of results
+
+        Raises:
+            ValueError: If a raw query isn't valid FTS5 syntax
+        """
+        clauses = ["text_fts MATCH ?"]
+        params = [query if raw else phrase_query(query)]
+
+        if name:
+            clauses.append("r.name LIKE ?")
+            params.append(f"%{name}%")
+        if host:
+            clauses.append("r.host = ?")
+            params.append(host)
+        if session:
+            clauses.append("r.session = ?")
+            params.append(session)
+        params.append(limit)
+
+        try:
+            with self.connect() as conn:
+                rows = conn.execute(f"""
+                    SELECT r.path, r.host, r.session, r.name, r.started, l.time, l.text
+                    FROM text_fts
+                    JOIN text_lines l ON l.id = text_fts.rowid
+                    JOIN text_casts c ON c.id = l.cast_id
+                    JOIN recordings r ON r.path = c.path
+                    WHERE {' AND '.join(clauses)}
+                    ORDER BY text_fts.rowid DESC
+                    LIMIT ?
+                """, params).fetchall()
+        except sqlite3.OperationalError as e:
+            if raw:
+                raise ValueError(f"Invalid search query: {e}")
+            raise
+
+        return [
+            SearchHit(
+                path=row["path"], host=row["host"], session=row["session"], name=row["name"],
+                time=row["time"], text=row["text"],
+                at=row["started"] + row["time"] if row["started"] is not None else None,
+            )
+            for row in rows
+        ]
+
+
+def get_search_index() -> Optional[SearchIndex]:
+    """Get the search index for the configured output directory, if enabled."""
+    catalog = get_catalog()
+    if catalog is None or not get_config().search.enabled:
+        return None
+    return SearchIndex(catalog)
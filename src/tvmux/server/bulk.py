@@ -0,0 +1,257 @@
+"""Bulk operations over many recordings at once."""
+import asyncio
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from pydantic import BaseModel
+
+from ..models import Recording
+from .state import recorders
+from .work_queue import work_queues
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on worker threads, stops are mostly waiting on subprocesses
+MAX_WORKERS = 32
+
+
+class StopResult(BaseModel):
+    """Outcome of stopping a single recording."""
+    recording_id: str
+    status: str  # "stopped", "not_found", "timeout" or "error"
+    cast_path: Optional[str] = None
+    error: Optional[str] = None
+
+
+class WindowTarget(BaseModel):
+    """A window to record, as reported by tmux."""
+    session_id: str
+    window_id: str
+    active_pane: str
+    window_name: str
+
+
+class StartResult(BaseModel):
+    """Outcome of starting a single recording."""
+    recording_id: str
+    status: str  # "started", "already_active" or "error"
+    cast_path: Optional[str] = None
+    error: Optional[str] = None
+
+
+def list_window_targets(session_id: Optional[str] = None) -> List[WindowTarget]:
+    """List recordable windows with a single tmux query.
+
+    Args:
+        session_id: Only list windows in this session, otherwise all sessions
+
+    Returns:
+        One target per window, with its active pane and name
+    """
+    scope = ["-t", session_id] if session_id else ["-a"]
+    result = subprocess.run(
+        ["tmux", "list-windows", *scope, "-F", "#{session_name}|#{window_id}|#{pane_id}|#{window_name}"],
+        capture_output=True,
+        text=True
+    )
+
+    targets = []
+    if result.returncode != 0:
+        logger.warning(f"Failed to list windows: {result.stderr.strip()}")
+        return targets
+
+    for line in result.stdout.strip().split("\n"):
+        # Window names may contain the separator, so they go last
+        parts = line.split("|", 3)
+        if len(parts) == 4:
+            targets.append(WindowTarget(
+                session_id=parts[0],
+                window_id=parts[1],
+                active_pane=parts[2],
+                window_name=parts[3]
+            ))
+
+    return targets
+
+
+async def start_recordings(targets: Iterable[WindowTarget], output_dir: Path,
+                           coalesce_interval: Optional[float] = None,
+                           all_panes: Optional[bool] = None) -> List[StartResult]:
+    """Start recording many windows concurrently.
+
+    Args:
+        targets: Windows to record
+        output_dir: Base directory for cast files
+        coalesce_interval: Overrides recording.coalesce_interval for these windows
+        all_panes: Overrides recording.all_panes for these windows
+
+    Returns:
+        One result per distinct window, in request order
+    """
+    unique_targets = {f"{t.session_id}:{t.window_id}": t for t in targets}
+
+    async def start_one(recording_id: str, target: WindowTarget) -> StartResult:
+        existing = recorders.get(recording_id)
+        if existing and existing.active:
+            return StartResult(recording_id=recording_id, status="already_active", cast_path=existing.cast_path)
+
+        recording = Recording(id=recording_id, session_id=target.session_id, window_id=target.window_id,
+                              coalesce_interval=coalesce_interval, all_panes=all_panes)
+        try:
+            await recording.start(target.active_pane, output_dir, window_name=target.window_name)
+        except Exception as e:
+            logger.error(f"Failed to start recording for {recording_id}: {e}")
+            return StartResult(recording_id=recording_id, status="error", error=str(e))
+
+        recorders[recording_id] = recording
+        return StartResult(recording_id=recording_id, status="started", cast_path=recording.cast_path)
+
+    if unique_targets:
+        logger.info(f"Starting {len(unique_targets)} recordings")
+
+    return list(await asyncio.gather(*(
+        start_one(recording_id, target) for recording_id, target in unique_targets.items()
+    )))
+
+
+def select_recordings(session_id: Optional[str] = None,
+                      recording_ids: Optional[List[str]] = None) -> List[str]:
+    """Pick recording IDs by explicit list or session, or all of them.
+
+    Args:
+        session_id: Only select recordings in this session
+        recording_ids: Explicit recording IDs (may include unknown IDs)
+
+    Returns:
+        Recording IDs to operate on
+    """
+    if recording_ids is not None:
+        selected = list(recording_ids)
+    else:
+        selected = list(recorders.keys())
+
+    if session_id:
+        selected = [key for key in selected if key.startswith(f"{session_id}:")]
+
+    return selected
+
+
+def stop_recordings(recording_ids: Iterable[str], timeout: float = 10.0) -> List[StopResult]:
+    """Stop recordings concurrently with a global deadline.
+
+    Each recording is removed from the active set before its stop begins,
+    so a stop that misses the deadline carries on in the background
+    without being picked up again.
+
+    Args:
+        recording_ids: IDs of recordings to stop
+        timeout: Seconds to wait for all stops to finish
+
+    Returns:
+        One result per requested ID, in request order
+    """
+    recording_ids = list(dict.fromkeys(recording_ids))
+    results = {}
+    pending = {}
+
+    for recording_id in recording_ids:
+        recording = recorders.pop(recording_id, None)
+        if recording is None:
+            results[recording_id] = StopResult(recording_id=recording_id, status="not_found")
+        else:
+            pending[recording_id] = recording
+
+    if pending:
+        logger.info(f"Stopping {len(pending)} recordings (deadline {timeout}s)")
+        executor = ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(pending)),
+                                      thread_name_prefix="tvmux-stop")
+        futures = {
+            executor.submit(recording.stop): recording_id
+            for recording_id, recording in pending.items()
+        }
+        done, not_done = wait(futures, timeout=timeout)
+        executor.shutdown(wait=False)
+
+        for future, recording_id in futures.items():
+            cast_path = pending[recording_id].cast_path
+            if future in not_done:
+                logger.warning(f"Recording {recording_id} did not stop within {timeout}s")
+                results[recording_id] = StopResult(
+                    recording_id=recording_id, status="timeout", cast_path=cast_path
+                )
+            elif future.exception():
+                error = future.exception()
+                logger.error(f"Failed to stop recording {recording_id}: {error}")
+                results[recording_id] = StopResult(
+                    recording_id=recording_id, status="error", cast_path=cast_path, error=str(error)
+                )
+            else:
+                results[recording_id] = StopResult(
+                    recording_id=recording_id, status="stopped", cast_path=cast_path
+                )
+
+    return [results[recording_id] for recording_id in recording_ids]
+
+
+def stop_recording(recording_id: str) -> StopResult:
+    """Stop one recording in the calling thread, as queued by submit_stop()."""
+    recording = recorders.pop(recording_id, None)
+    if recording is None:
+        return StopResult(recording_id=recording_id, status="not_found")
+
+    try:
+        recording.stop()
+    except Exception as e:
+        logger.error(f"Failed to stop recording {recording_id}: {e}")
+        return StopResult(recording_id=recording_id, status="error", cast_path=recording.cast_path,
+                          error=str(e))
+    return StopResult(recording_id=recording_id, status="stopped", cast_path=recording.cast_path)
+
+
+def submit_stop(recording_id: str) -> asyncio.Future:
+    """Queue a recording's stop after whatever is already queued for it. Called on the event loop."""
+    return work_queues.submit(recording_id, stop_recording, recording_id)
+
+
+async def queue_stops(recording_ids: Iterable[str], timeout: float = 10.0) -> List[StopResult]:
+    """Stop recordings on their work queues, and wait for them up to a deadline.
+
+    Each stop runs after the work already queued for its recording, such
+    as a pane switch, and stops of different recordings run concurrently.
+    A stop that misses the deadline carries on in the background.
+
+    Args:
+        recording_ids: IDs of recordings to stop
+        timeout: Seconds to wait for all stops to finish
+
+    Returns:
+        One result per requested ID, in request order
+    """
+    recording_ids = list(dict.fromkeys(recording_ids))
+    results = {}
+    pending = {}
+
+    for recording_id in recording_ids:
+        recording = recorders.get(recording_id)
+        if recording is None:
+            results[recording_id] = StopResult(recording_id=recording_id, status="not_found")
+        else:
+            pending[recording_id] = (recording, submit_stop(recording_id))
+
+    if pending:
+        logger.info(f"Queued stops for {len(pending)} recordings (deadline {timeout}s)")
+        await asyncio.wait([future for _, future in pending.values()], timeout=timeout)
+
+        for recording_id, (recording, future) in pending.items():
+            if future.done():
+                results[recording_id] = future.result()
+            else:
+                logger.warning(f"Recording {recording_id} did not stop within {timeout}s")
+                results[recording_id] = StopResult(
+                    recording_id=recording_id, status="timeout", cast_path=recording.cast_path
+                )
+
+    return [results[recording_id] for recording_id in recording_ids]
@@ -1,4 +1,5 @@
 """FastAPI server that manages tmux connections."""
+import asyncio
 import logging
 import os
 import signal
@@ -10,7 +11,11 @@ from fastapi.responses import RedirectResponse
 import uvicorn
 
 from .state import server_dir, recorders, SERVER_HOST
-from .routers import session, window, panes, callbacks, hook, recording
+from .routers import session, window, panes, callbacks, hook, recording, catalog, search, grep, usage
+from .bulk import queue_stops, stop_recordings
+from .segment_monitor import segment_monitor
+from .work_queue import work_queues
+from .search_monitor import catch_up, search_monitor
 from ..config import get_config
 from .. import __version__
 
@@ -76,18 +81,33 @@ async def lifespan(app: FastAPI):
 
     # TODO: Discover existing panes and start tracking them
 
+    # Roll long recordings over into new segments
+    monitor = asyncio.create_task(segment_monitor())
+
+    # Pick up casts written or removed while the server was down and index
+    # their text, in the background so requests are served straight away,
+    # and keep the search index up to date as recordings grow
+    archive = asyncio.create_task(catch_up())
+    indexer = asyncio.create_task(search_monitor())
+
     yield
 
     # Shutdown
+    monitor.cancel()
+    archive.cancel()
+    indexer.cancel()
+
     # Remove tmux hooks
     callbacks.remove_all_hooks()
 
     # Remove PID file
     (server_dir / "server.pid").unlink(missing_ok=True)
 
-    # Clean up recorders
-    for recorder in recorders.values():
-        recorder.stop()
+    # Let queued hooks and switches finish, then clean up recorders
+    stop_timeout = get_config().server.stop_timeout
+    if not await work_queues.join(stop_timeout):
+        logger.warning(f"Queued work didn't finish within {stop_timeout}s")
+    await queue_stops(list(recorders), stop_timeout)
 
 
 app = FastAPI(title="tvmux server", lifespan=lifespan)
@@ -99,6 +119,10 @@ app.include_router(panes.router, prefix="/panes", tags=["panes"])
 app.include_router(callbacks.router, prefix="/callbacks", tags=["callbacks"])
 app.include_router(hook.router, prefix="/hook", tags=["hook"])
 app.include_router(recording.router, prefix="/recordings", tags=["recordings"])
+app.include_router(catalog.router, prefix="/catalog", tags=["catalog"])
+app.include_router(search.router, prefix="/search", tags=["search"])
+app.include_router(grep.router, prefix="/grep", tags=["grep"])
+app.include_router(usage.router, prefix="/usage", tags=["usage"])
 
 
 @app.get("/")
@@ -124,13 +148,11 @@ def cleanup_and_exit(signum=None, frame=None):
     """Clean up and exit gracefully."""
     print("\nCleaning up...")
 
-    # Stop all recorders first (kills asciinema processes)
+    # Stop all recorders first, so their casts are finished
     print(f"Stopping {len(recorders)} active recordings...")
-    for recorder in recorders.values():
-        try:
-            recorder.stop()
-        except Exception as e:
-            print(f"Error stopping recorder: {e}")
+    for result in stop_recordings(list(recorders), get_config().server.stop_timeout):
+        if result.status != "stopped":
+            print(f"Error stopping recorder {result.recording_id}: {result.error or result.status}")
 
     # Remove tmux hooks
     callbacks.remove_all_hooks()
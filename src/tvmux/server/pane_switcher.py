@@ -0,0 +1,99 @@
+"""Follow pane selections without switching for every hook in a burst.
+
+Cycling through panes fires after-select-pane once per pane, and each
+switch stops a stream, snapshots a pane and starts another. Only the last
+selection of a burst matters, so selections are handled per window: each
+one replaces the window's target and restarts its settle time, and once
+the selection has stayed put that long, the recording switches once, to
+the latest target. The switch runs on the recording's work queue, after
+anything already queued for it, and selections arriving meanwhile are
+handled the same way once it is done.
+"""
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from .state import recorders
+from .work_queue import work_queues
+from ..config import get_config
+
+logger = logging.getLogger(__name__)
+
+
+class PendingSwitch:
+    """A window's latest selection, waiting to settle."""
+
+    def __init__(self, pane_id: str, deadline: float):
+        self.pane_id: Optional[str] = pane_id  # None once taken for a switch
+        self.deadline = deadline
+        self.task: Optional[asyncio.Task] = None
+
+
+class PaneSwitcher:
+    """Debounces pane selections for every recorded window."""
+
+    def __init__(self):
+        self._pending: Dict[str, PendingSwitch] = {}
+
+    def select(self, recording_id: str, pane_id: str, settle: Optional[float] = None) -> None:
+        """Note that a pane was selected in a recorded window. Called on the event loop.
+
+        Args:
+            recording_id: Recording of the window the pane is in
+            pane_id: Pane now selected
+            settle: Seconds to wait for another selection, default recording.switch_settle_time
+        """
+        recording = recorders.get(recording_id)
+        if recording is None:
+            return
+        recording.switch_stats.requested += 1
+
+        loop = asyncio.get_running_loop()
+        if settle is None:
+            settle = get_config().recording.switch_settle_time
+        deadline = loop.time() + max(settle, 0.0)
+
+        pending = self._pending.get(recording_id)
+        if pending is None:
+            pending = self._pending[recording_id] = PendingSwitch(pane_id, deadline)
+            pending.task = loop.create_task(self._follow(recording_id, pending))
+            return
+
+        if pending.pane_id is not None:
+            recording.switch_stats.skipped += 1  # Superseded before it was acted on
+        pending.pane_id = pane_id
+        pending.deadline = deadline
+
+    def pending(self, recording_id: str) -> Optional[str]:
+        """Get the pane a window is waiting to switch to, if any."""
+        pending = self._pending.get(recording_id)
+        return pending.pane_id if pending else None
+
+    async def _follow(self, recording_id: str, pending: PendingSwitch) -> None:
+        """Switch once the selection settles, until no more selections are waiting."""
+        loop = asyncio.get_running_loop()
+        try:
+            while pending.pane_id is not None:
+                while (delay := pending.deadline - loop.time()) > 0:
+                    await asyncio.sleep(delay)
+
+                pane_id, pending.pane_id = pending.pane_id, None
+                recording = recorders.get(recording_id)
+                if recording is None or not recording.active:
+                    return
+                if recording.active_pane == pane_id:
+                    recording.switch_stats.skipped += 1
+                    continue
+
+                logger.info(f"Switching recording {recording_id} to pane {pane_id}")
+                try:
+                    await work_queues.run(recording_id, recording.switch_pane, pane_id)
+                    recording.switch_stats.switched += 1
+                except Exception:
+                    pass  # Logged by the work queue
+        finally:
+            if self._pending.get(recording_id) is pending:
+                del self._pending[recording_id]
+
+
+pane_switcher = PaneSwitcher()
@@ -1,4 +1,4 @@
 """tvmux server routers."""
-from . import callbacks, hook, panes, recording, session, window
+from . import callbacks, catalog, grep, hook, panes, recording, search, session, usage, window
 
-__all__ = ["callbacks", "hook", "panes", "recording", "session", "window"]
+__all__ = ["callbacks", "catalog", "grep", "hook", "panes", "recording", "search", "session", "usage", "window"]
@@ -244,6 +244,9 @@ def setup_default_hooks():
         "after-select-pane",  # Essential for pane switching
         "session-closed",     # Essential for cleanup
         "window-unlinked",    # Helpful for cleanup
+        "after-split-window",  # Pane tracks, when recording all panes
+        "after-kill-pane",
+        "after-resize-pane",
     ]
 
     for hook_name in default_hooks:
@@ -0,0 +1,43 @@
+"""Recording catalog endpoints."""
+import asyncio
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException
+
+from ...catalog import CatalogEntry, ScanResult, get_catalog
+
+router = APIRouter()
+
+
+def _require_catalog():
+    """Get the catalog, or fail if it is disabled."""
+    catalog = get_catalog()
+    if catalog is None:
+        raise HTTPException(status_code=404, detail="Catalog is disabled")
+    return catalog
+
+
+@router.get("/", response_model=List[CatalogEntry])
+async def search_catalog(
+    name: Optional[str] = None,
+    host: Optional[str] = None,
+    session: Optional[str] = None,
+    window: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    active: Optional[bool] = None,
+    limit: int = 100,
+):
+    """Find recordings in the catalog, newest first."""
+    catalog = _require_catalog()
+    return await asyncio.to_thread(
+        catalog.search, name=name, host=host, session=session, window=window,
+        since=since, until=until, active=active, limit=limit
+    )
+
+
+@router.post("/scan", response_model=ScanResult)
+async def scan_catalog():
+    """Bring the catalog up to date with the files in the output directory."""
+    catalog = _require_catalog()
+    return await asyncio.to_thread(catalog.scan)
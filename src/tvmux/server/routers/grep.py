@@ -0,0 +1,105 @@
+"""Live output grep endpoint."""
+import asyncio
+import logging
+import queue
+import threading
+from pathlib import Path
+from typing import List
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from ..state import recorders
+from ...grep import GrepMatch, PatternSet, grep_cast
+from ...relay import get_relay
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Lines queued per client before new ones are dropped
+QUEUE_SIZE = 1000
+
+
+async def _written_matches(patterns: PatternSet):
+    """Stream matches from what active recordings have written so far."""
+    for recording in list(recorders.values()):
+        if not (recording.active and recording.cast_path):
+            continue
+        matches = await asyncio.to_thread(
+            list, grep_cast(Path(recording.cast_path), recording.id, patterns)
+        )
+        for match in matches:
+            yield match.model_dump_json() + "\n"
+
+
+async def _live_matches(patterns: PatternSet):
+    """Stream matches from live output until the client goes away.
+
+    The relay thread only queues lines, and wakes this task at most once
+    per batch; they are matched here, so patterns never hold up output.
+    """
+    loop = asyncio.get_running_loop()
+    lines: queue.Queue = queue.Queue(maxsize=QUEUE_SIZE)
+    arrived = asyncio.Event()
+    waking = threading.Lock()
+    wake_pending = False
+    dropped = 0
+
+    def wake():
+        nonlocal wake_pending
+        with waking:
+            wake_pending = False
+        arrived.set()
+
+    def listener(recording_id: str, at: float, line: str):
+        # Runs in the relay thread, once per line for all recordings
+        nonlocal dropped, wake_pending
+        try:
+            lines.put_nowait((recording_id, at, line))
+        except queue.Full:
+            dropped += 1
+            if dropped == 1:
+                logger.warning("Live grep client is falling behind, dropping lines")
+            return
+        with waking:
+            if wake_pending:
+                return
+            wake_pending = True
+        loop.call_soon_threadsafe(wake)
+
+    relay = get_relay()
+    relay.subscribe(listener)
+    try:
+        while True:
+            await arrived.wait()
+            arrived.clear()
+            while True:
+                try:
+                    recording_id, at, line = lines.get_nowait()
+                except queue.Empty:
+                    break
+                matched = patterns.match(line)
+                if matched:
+                    match = GrepMatch(recording_id=recording_id, at=at, text=line, patterns=matched)
+                    yield match.model_dump_json() + "\n"
+    finally:
+        relay.unsubscribe(listener)
+        if dropped:
+            logger.info(f"Live grep dropped {dropped} lines")
+
+
+@router.get("/", response_class=StreamingResponse)
+async def grep_output(
+    pattern: List[str] = Query(..., description="Regular expressions, any of which may match"),
+    follow: bool = Query(False, description="Stream matches from live output instead"),
+    ignore_case: bool = Query(False, description="Match case-insensitively"),
+):
+    """Match active recordings' output against patterns, streamed as JSON lines."""
+    try:
+        patterns = PatternSet(pattern, ignore_case)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    stream = _live_matches(patterns) if follow else _written_matches(patterns)
+    return StreamingResponse(stream, media_type="application/x-ndjson")
@@ -1,4 +1,5 @@
 """Single endpoint for receiving tmux hook events."""
+import asyncio
 import logging
 from datetime import datetime
 from fastapi import APIRouter
@@ -6,7 +7,10 @@ from pydantic import BaseModel
 from typing import Optional, Dict, Any
 
 from ..state import recorders
-from ..window_monitor import cleanup_closed_windows
+from ..bulk import select_recordings, submit_stop
+from ..pane_switcher import pane_switcher
+from ..work_queue import work_queues
+from ..window_monitor import queue_cleanup
 
 logger = logging.getLogger(__name__)
 
@@ -27,7 +31,11 @@ class HookEvent(BaseModel):
 
 @router.post("")
 async def receive_hook(event: HookEvent) -> Dict[str, str]:
-    """Receive and process a hook event from tmux."""
+    """Receive a hook event from tmux, and queue it to be processed.
+
+    Events are processed in order for each window, after the response,
+    so tmux isn't kept waiting for pane switches or stops.
+    """
     # Log the event using standard Python logging
     logger.info(
         f"Hook {event.hook_name} fired: "
@@ -36,14 +44,35 @@ async def receive_hook(event: HookEvent) -> Dict[str, str]:
         f"pane={event.pane_id}"
     )
 
-    # Process the event
-    action = await _process_hook_event(event)
+    key = _queue_key(event)
+    work_queues.submit(key, _process_hook_event, event)
+
+    return {"status": "queued", "queue": key}
+
+
+def _queue_key(event: HookEvent) -> str:
+    """Get the work queue for an event: its window's recording, or its session if it has no window."""
+    if event.session_name and event.window_id:
+        return f"{event.session_name}:{event.window_id}"
+    return event.session_name or ""
+
+
+def _resize_panes(event: HookEvent) -> None:
+    """Record a resize for the window's panes that changed size, if it is recorded."""
+    recorder = recorders.get(f"{event.session_name}:{event.window_id}")
+    if recorder:
+        recorder.resize_panes()
+
 
-    return {"status": "ok", "action": action}
+def _update_panes(event: HookEvent) -> None:
+    """Bring a window's pane tracks in line after panes change, if it has any."""
+    recorder = recorders.get(f"{event.session_name}:{event.window_id}")
+    if recorder and recorder.track_paths:
+        recorder.update_panes()
 
 
 async def _process_hook_event(event: HookEvent) -> str:
-    """Process a hook event and return the action taken."""
+    """Process a hook event and return the action taken. Runs on the event's work queue."""
     hook_name = event.hook_name
 
     # Log warnings for missing critical values
@@ -65,10 +94,12 @@ async def _process_hook_event(event: HookEvent) -> str:
 
     elif hook_name == "after-split-window":
         logger.debug(f"Window split: new pane {event.pane_id}")
+        await asyncio.to_thread(_update_panes, event)
         return "pane_created"
 
     elif hook_name == "after-kill-pane":
         logger.debug(f"Pane killed: {event.pane_id}")
+        await asyncio.to_thread(_update_panes, event)
         return "pane_closed"
 
     elif hook_name == "window-unlinked":
@@ -77,18 +108,15 @@ async def _process_hook_event(event: HookEvent) -> str:
         return "window_unlinked"
 
     elif hook_name == "session-closed":
-        # Session died - stop all recordings for this session
+        # Session died - stop all recordings for this session, each after
+        # whatever is already queued for it
         logger.info(f"Session {event.session_name} closed")
         if event.session_name:
-            session_recorders = [
-                key for key in recorders.keys()
-                if key.startswith(f"{event.session_name}:")
-            ]
-            for recorder_key in session_recorders:
-                logger.info(f"Stopping recording {recorder_key} due to session close")
-                recorder = recorders[recorder_key]
-                recorder.stop()
-                del recorders[recorder_key]
+            session_recorders = select_recordings(session_id=event.session_name)
+            if session_recorders:
+                logger.info(f"Stopping recordings {session_recorders} due to session close")
+                for recording_id in session_recorders:
+                    submit_stop(recording_id)
         return "session_destroyed"
 
     elif hook_name == "after-select-pane":
@@ -98,18 +126,16 @@ async def _process_hook_event(event: HookEvent) -> str:
             f"in window {event.window_id}"
         )
 
-        # Clean up any recordings for windows that no longer exist
-        cleanup_closed_windows()
+        # Clean up any recordings for windows that no longer exist, without waiting
+        queue_cleanup()
 
         if event.session_name and event.window_id:
             recorder_key = f"{event.session_name}:{event.window_id}"
 
             if recorder_key in recorders:
-                # Switch recording to new active pane
-                recorder = recorders[recorder_key]
+                # Follow the new active pane once the selection settles
                 if event.pane_id:
-                    logger.info(f"Switching recording to pane {event.pane_id}")
-                    recorder.switch_pane(event.pane_id)
+                    pane_switcher.select(recorder_key, event.pane_id)
                 else:
                     logger.warning("No pane_id in select-pane event")
             else:
@@ -120,6 +146,7 @@ async def _process_hook_event(event: HookEvent) -> str:
 
     elif hook_name == "after-resize-pane":
         logger.debug(f"Pane {event.pane_id} resized")
+        await asyncio.to_thread(_resize_panes, event)
         return "pane_resized"
 
     elif hook_name == "after-rename-window":
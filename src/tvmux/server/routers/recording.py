@@ -7,10 +7,15 @@ import subprocess
 from pathlib import Path
 from fastapi import APIRouter, HTTPException, Response
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 from ...models import Recording
+from ...relay import RelayStats, get_relay
+from ...usage import RecordingUsage, recording_usage
 from ..state import recorders
+from ..bulk import (
+    StartResult, StopResult, list_window_targets, queue_stops, select_recordings, start_recordings
+)
 from ...config import get_config
 
 logger = logging.getLogger(__name__)
@@ -62,6 +67,15 @@ def display_name(session_id: str, window_id: str) -> str:
     except Exception:
         return window_id
 
+def resolve_output_dir(output_dir: Optional[str] = None) -> Path:
+    """Get the output directory from a request, or the configured default."""
+    if output_dir:
+        return Path(output_dir).expanduser()
+
+    # Use configured output directory
+    config = get_config()
+    return Path(config.output.directory).expanduser()
+
 router = APIRouter()
 
 
@@ -71,6 +85,33 @@ class RecordingCreate(BaseModel):
     window_id: str  # Window ID to record
     active_pane: Optional[str] = None  # If not provided, will detect active pane
     output_dir: Optional[str] = None
+    coalesce_interval: Optional[float] = None  # Overrides recording.coalesce_interval
+    all_panes: Optional[bool] = None  # Overrides recording.all_panes
+
+
+class RecordingCreateBatch(BaseModel):
+    """Request to start recording many windows at once."""
+    session_id: Optional[str] = None  # Record every window in this session
+    all: bool = False  # Record every window in every session
+    window_ids: Optional[List[str]] = None  # Only record these windows
+    output_dir: Optional[str] = None
+    coalesce_interval: Optional[float] = None  # Overrides recording.coalesce_interval
+    all_panes: Optional[bool] = None  # Overrides recording.all_panes
+
+
+class RecordingMarker(BaseModel):
+    """Request to mark a point in a recording."""
+    label: str = ""  # Shown by players at the marker
+
+
+class RecordingStopBulk(BaseModel):
+    """Request to stop many recordings at once.
+
+    With no filters every active recording is stopped.
+    """
+    session_id: Optional[str] = None  # Only stop recordings in this session
+    recording_ids: Optional[List[str]] = None  # Only stop these recordings
+    timeout: Optional[float] = None  # Overall deadline, defaults to server.stop_timeout
 
 
 @router.post("", response_model=Recording)
@@ -109,12 +150,7 @@ async def create_recording(request: RecordingCreate, response: Response) -> Reco
             return recording
 
     # Determine output directory
-    if request.output_dir:
-        output_dir = Path(request.output_dir).expanduser()
-    else:
-        # Use configured output directory
-        config = get_config()
-        output_dir = Path(config.output.directory).expanduser()
+    output_dir = resolve_output_dir(request.output_dir)
 
     logger.info(f"Creating recording for {recording_id}, output_dir={output_dir}")
 
@@ -122,7 +158,9 @@ async def create_recording(request: RecordingCreate, response: Response) -> Reco
     recording = Recording(
         id=recording_id,
         session_id=request.session_id,
-        window_id=request.window_id
+        window_id=request.window_id,
+        coalesce_interval=request.coalesce_interval,
+        all_panes=request.all_panes,
     )
 
     # Start recording
@@ -137,21 +175,46 @@ async def create_recording(request: RecordingCreate, response: Response) -> Reco
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/batch", response_model=List[StartResult])
+async def create_recordings_batch(request: RecordingCreateBatch) -> List[StartResult]:
+    """Start recording every window in a session, in all sessions, or a list of windows."""
+    if not (request.session_id or request.all or request.window_ids):
+        raise HTTPException(status_code=400, detail="Specify session_id, all or window_ids")
+
+    # One topology query for every window we might start
+    targets = await asyncio.to_thread(list_window_targets, None if request.all else request.session_id)
+    if request.window_ids:
+        targets = [t for t in targets if t.window_id in request.window_ids]
+
+    logger.info(f"Batch recording request for {len(targets)} windows")
+
+    return await start_recordings(targets, resolve_output_dir(request.output_dir),
+                                  coalesce_interval=request.coalesce_interval,
+                                  all_panes=request.all_panes)
+
+
 @router.delete("/{recording_id}")
 async def delete_recording(recording_id: str) -> dict:
-    """Stop a recording."""
+    """Stop a recording, after whatever is already queued for it."""
     if recording_id not in recorders:
         raise HTTPException(status_code=404, detail="Recording not found")
 
-    recording = recorders[recording_id]
-    cast_path = recording.cast_path  # Get path before stopping
-    recording.stop()
+    result, = await queue_stops([recording_id], get_config().server.stop_timeout)
+    if result.status == "not_found":
+        raise HTTPException(status_code=404, detail="Recording not found")
+    if result.status == "error":
+        raise HTTPException(status_code=500, detail=result.error)
+
+    return {"status": result.status, "recording_id": recording_id, "cast_path": result.cast_path}
 
-    # Remove from active recorders
-    del recorders[recording_id]
 
+@router.post("/stop", response_model=List[StopResult])
+async def stop_recordings_bulk(request: RecordingStopBulk) -> List[StopResult]:
+    """Stop all recordings, a session's recordings, or a list of IDs concurrently."""
+    recording_ids = select_recordings(request.session_id, request.recording_ids)
+    timeout = request.timeout if request.timeout is not None else get_config().server.stop_timeout
 
-    return {"status": "stopped", "recording_id": recording_id, "cast_path": cast_path}
+    return await queue_stops(recording_ids, timeout)
 
 
 async def _shutdown_server_delayed():
@@ -172,6 +235,36 @@ async def get_recording(recording_id: str) -> Recording:
     return recorders[recording_id]
 
 
+@router.get("/{recording_id}/stats", response_model=RelayStats)
+async def get_recording_stats(recording_id: str) -> RelayStats:
+    """Get buffering counters for a recording's output: drops, overflows and stalls."""
+    stats = get_relay().stats(recording_id) if recording_id in recorders else None
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Recording not found")
+
+    return stats
+
+
+@router.get("/{recording_id}/usage", response_model=RecordingUsage)
+async def get_recording_usage(recording_id: str) -> RecordingUsage:
+    """Get what a recording costs: CPU, memory and I/O of its processes, and what it has written."""
+    recording = recorders.get(recording_id)
+    if recording is None or not recording.active:
+        raise HTTPException(status_code=404, detail="Recording not found")
+
+    return await asyncio.to_thread(recording_usage, recording)
+
+
+@router.post("/{recording_id}/marker")
+async def mark_recording(recording_id: str, request: RecordingMarker) -> dict:
+    """Mark the current point in a recording's cast, e.g. to annotate it."""
+    recording = recorders.get(recording_id)
+    if recording is None or not await asyncio.to_thread(recording.mark, request.label):
+        raise HTTPException(status_code=404, detail="Recording not found")
+
+    return {"status": "marked", "recording_id": recording_id}
+
+
 @router.get("", response_model=list[Recording])
 async def list_recordings() -> list[Recording]:
     """List all active recordings."""
@@ -0,0 +1,31 @@
+"""Full-text search endpoints."""
+import asyncio
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException
+
+from ...search import SearchHit, get_search_index
+
+router = APIRouter()
+
+
+@router.get("/", response_model=List[SearchHit])
+async def search_output(
+    q: str,
+    name: Optional[str] = None,
+    host: Optional[str] = None,
+    session: Optional[str] = None,
+    raw: bool = False,
+    limit: int = 50,
+):
+    """Find recorded output lines containing `q`, most recent first."""
+    search_index = get_search_index()
+    if search_index is None:
+        raise HTTPException(status_code=404, detail="Search is disabled")
+
+    try:
+        return await asyncio.to_thread(
+            search_index.search, q, name=name, host=host, session=session, raw=raw, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,15 @@
+"""Resource usage endpoint."""
+import asyncio
+
+from fastapi import APIRouter
+
+from ..state import recorders
+from ...usage import UsageReport, usage_report
+
+router = APIRouter()
+
+
+@router.get("", response_model=UsageReport)
+async def get_usage() -> UsageReport:
+    """Get what every recording costs, the totals across them, and what the server uses."""
+    return await asyncio.to_thread(usage_report, list(recorders.values()))
@@ -0,0 +1,85 @@
+"""Keep the search index up to date as recordings grow."""
+import asyncio
+import logging
+import sqlite3
+from pathlib import Path
+from typing import Set
+
+from .state import recorders
+from ..catalog import get_catalog
+from ..config import get_config
+from ..search import get_search_index
+
+logger = logging.getLogger(__name__)
+
+
+def refresh_catalog():
+    """Scan the output directory for casts written or removed while the server was down.
+
+    Run in the background at startup, while recordings may be starting, so
+    the casts still active are only looked up once the scan is done.
+    """
+    catalog = get_catalog()
+    if catalog is None:
+        return
+
+    try:
+        catalog.scan(active=lambda: {str(path) for path in recording_paths()})
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(f"Failed to scan {catalog.root} for recordings: {e}")
+
+
+def recording_paths() -> Set[Path]:
+    """Get the casts and pane tracks of every active recording."""
+    paths = set()
+    for recording in list(recorders.values()):
+        if recording.active and recording.cast_path and not recording.rolling_over:
+            paths.add(Path(recording.cast_path))
+            paths.update(Path(track) for track in list(recording.track_paths.values()))
+    return paths
+
+
+async def index_archive():
+    """Index text of every cast that changed while the server was down, a cast at a time."""
+    search_index = get_search_index()
+    if search_index is None:
+        return
+
+    try:
+        casts = await asyncio.to_thread(search_index.changed_casts)
+        added = 0
+        for cast_path, final in casts:
+            # A recording may have started on the same path since the scan
+            final = final and cast_path not in recording_paths()
+            added += await asyncio.to_thread(search_index.index_casts, [(cast_path, final)])
+        logger.info(f"Indexed {added} lines of recorded output")
+    except Exception:
+        logger.exception("Indexing recorded output failed")
+
+
+async def catch_up():
+    """Catalog, then index the text of, casts written or removed while the server was down."""
+    await asyncio.to_thread(refresh_catalog)
+    await index_archive()
+
+
+async def index_active_recordings():
+    """Index output written to active recordings since the last run."""
+    search_index = get_search_index()
+    if search_index is None:
+        return
+
+    casts = [(path, False) for path in recording_paths()]
+    if casts:
+        await asyncio.to_thread(search_index.index_casts, casts)
+
+
+async def search_monitor():
+    """Index active recordings periodically until cancelled."""
+    while True:
+        await asyncio.sleep(get_config().search.index_interval)
+
+        try:
+            await index_active_recordings()
+        except Exception:
+            logger.exception("Search indexing failed")
@@ -0,0 +1,47 @@
+"""Roll recordings over to new cast segments when they get too big or old."""
+import asyncio
+import logging
+
+from .state import recorders
+from .work_queue import work_queues
+from ..config import get_config
+
+logger = logging.getLogger(__name__)
+
+# How often to check segment sizes and ages, in seconds
+CHECK_INTERVAL = 5.0
+
+
+async def rollover_due_recordings():
+    """Start a new segment for every recording that has hit its limit.
+
+    Each rollover waits for the work already queued for its recording, and
+    the old segment is finished after it, as more work on the same queue.
+    """
+    due = [recording for recording in list(recorders.values()) if recording.needs_rollover()]
+    if not due:
+        return
+
+    results = await asyncio.gather(
+        *(work_queues.run(recording.id, recording.rollover) for recording in due), return_exceptions=True
+    )
+    for recording, result in zip(due, results):
+        if isinstance(result, Exception):
+            logger.error(f"Failed to start new segment for {recording.id}: {result}")
+        elif result is not None:
+            work_queues.submit(recording.id, result)
+
+
+async def segment_monitor():
+    """Check for due rollovers until cancelled."""
+    while True:
+        await asyncio.sleep(CHECK_INTERVAL)
+
+        config = get_config()
+        if not (config.recording.segment_max_bytes or config.recording.segment_max_seconds):
+            continue
+
+        try:
+            await rollover_due_recordings()
+        except Exception:
+            logger.exception("Segment check failed")
@@ -1,12 +1,19 @@
 """Monitor tmux windows to detect when they're closed."""
+import asyncio
 import logging
 import subprocess
-from typing import Set
+from typing import List, Set
 
 from .state import recorders
+from .bulk import submit_stop
+from .work_queue import work_queues
 
 logger = logging.getLogger(__name__)
 
+# Work queue for closed window checks, apart from every recording's, as
+# tmux session names can't contain a colon
+CLEANUP_QUEUE = ":closed-windows"
+
 
 def get_current_windows() -> Set[str]:
     """Get the set of current window IDs as session:window_id keys."""
@@ -29,22 +36,28 @@ def get_current_windows() -> Set[str]:
     return set()
 
 
-def cleanup_closed_windows():
-    """Check for closed windows and clean up their recordings."""
-    current_windows = get_current_windows()
+async def cleanup_closed_windows() -> List[str]:
+    """Stop the recordings of windows that have closed, each on its own work queue.
+
+    Returns:
+        IDs of the recordings whose stops were queued
+    """
+    current_windows = await asyncio.to_thread(get_current_windows)
 
     # Check which recordings reference windows that no longer exist
-    closed_recordings = []
-    for recorder_key in recorders:
-        if recorder_key not in current_windows:
-            closed_recordings.append(recorder_key)
+    closed_recordings = [recorder_key for recorder_key in recorders if recorder_key not in current_windows]
 
-    # Clean up recordings for closed windows
+    # Each stop goes after whatever is already queued for its recording
     for recorder_key in closed_recordings:
         logger.info(f"Window {recorder_key} was closed, stopping recording")
-        recorder = recorders[recorder_key]
-        recorder.stop()
-        del recorders[recorder_key]
+        submit_stop(recorder_key)
 
     if closed_recordings:
-        logger.info(f"Cleaned up {len(closed_recordings)} recordings for closed windows")
+        logger.info(f"Queued stops for {len(closed_recordings)} recordings of closed windows")
+    return closed_recordings
+
+
+def queue_cleanup() -> None:
+    """Queue a check for closed windows, unless one is already waiting to run. Called on the event loop."""
+    if work_queues.depth(CLEANUP_QUEUE) < 2:  # Nothing waiting behind the one running, if any
+        work_queues.submit(CLEANUP_QUEUE, cleanup_closed_windows)
@@ -0,0 +1,101 @@
+"""Run each recording's work in order, in the background.
+
+Hooks, debounced pane switches and segment rollovers all change a
+recording. They used to run inside the request or task that asked for
+them, so a hook's HTTP request, and the tmux command that fired it,
+waited for a whole pane switch or stop. Now each piece of work goes on
+its recording's queue and the caller carries on.
+
+Work on one queue runs in the order it was submitted, one piece at a
+time. Queues for different recordings run concurrently, each with a
+worker task of its own that exits once its queue is empty. Plain
+functions run in a worker thread, coroutine functions on the event loop.
+"""
+import asyncio
+import inspect
+import logging
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Work = Tuple[Callable[..., Any], tuple, asyncio.Future]
+
+
+class WorkQueues:
+    """One ordered queue of work per key, e.g. per recording ID."""
+
+    def __init__(self):
+        self._queues: Dict[str, Deque[Work]] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+
+    def submit(self, key: str, work: Callable[..., Any], *args) -> asyncio.Future:
+        """Queue work to run after everything already queued for the key. Called on the event loop.
+
+        Args:
+            key: Queue to add to, usually a recording ID
+            work: Function or coroutine function to call
+            *args: Arguments to call it with
+
+        Returns:
+            A future for the work's result. Failures are logged, so nobody
+            has to wait for it.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queues.setdefault(key, deque()).append((work, args, future))
+        if key not in self._workers:
+            self._workers[key] = loop.create_task(self._work(key))
+        return future
+
+    async def run(self, key: str, work: Callable[..., Any], *args) -> Any:
+        """Queue work and wait for its result."""
+        return await self.submit(key, work, *args)
+
+    def depth(self, key: str) -> int:
+        """Count the work waiting or running for a key."""
+        return len(self._queues.get(key, ())) + (key in self._workers)
+
+    async def join(self, timeout: Optional[float] = None) -> bool:
+        """Wait for every queue to empty, including work queued meanwhile.
+
+        Returns:
+            Whether they all emptied within the timeout
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while self._workers:
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                return False
+            await asyncio.wait(list(self._workers.values()), timeout=remaining)
+        return True
+
+    async def _work(self, key: str) -> None:
+        """Run a queue's work in order until it is empty."""
+        queue = self._queues[key]
+        try:
+            while queue:
+                work, args, future = queue.popleft()
+                if future.cancelled():
+                    continue
+                try:
+                    if inspect.iscoroutinefunction(work):
+                        result = await work(*args)
+                    else:
+                        result = await asyncio.to_thread(work, *args)
+                except Exception as e:
+                    logger.exception(f"Queued {getattr(work, '__name__', work)} for {key} failed")
+                    if not future.done():
+                        future.set_exception(e)
+                        future.exception()  # Marks it retrieved, it has been logged
+                else:
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            del self._workers[key]
+            if self._queues.get(key) is queue and not queue:
+                del self._queues[key]
+
+
+work_queues = WorkQueues()
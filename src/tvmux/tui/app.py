@@ -14,6 +14,7 @@ from textual_asciinema import AsciinemaPlayer
 from urllib.parse import quote
 from ..connection import Connection
 from ..config import get_config
+from .player import CastPlayer
 
 logger = logging.getLogger(__name__)
 
@@ -220,7 +221,7 @@ class CRTPlayer(Static):
                 pass
 
             # Create new player
-            self.player = AsciinemaPlayer(str(recording_path))
+            self.player = CastPlayer(str(recording_path))
 
             # Mount to the container
             container = self.query_one("#player-container")
@@ -425,11 +426,20 @@ class TVMuxApp(App):
             return
 
         channel = self.tuner.get_selected_channel()
-        if not channel or not channel.get('recording'):
-            # Show blank player for channels not recording
+        if not channel or not channel.get('id'):
             await self.player.show_blank()
             return
 
+        if not channel.get('recording'):
+            # Replay the channel's last recording, or show blank if it has none
+            cast_file = self.last_recording(channel)
+            if cast_file:
+                logger.info(f"Replaying channel: {channel['name']} from {cast_file}")
+                await self.player.play_recording(cast_file)
+            else:
+                await self.player.show_blank()
+            return
+
         # Find the recording file for this channel
         try:
             client = self.connection.client()
@@ -453,6 +463,25 @@ class TVMuxApp(App):
         except Exception:
             logger.exception(f"Error playing channel: {channel['name']}")
 
+    def last_recording(self, channel: dict) -> Optional[Path]:
+        """Find a channel's latest finished recording in the server's catalog."""
+        try:
+            response = self.connection.client().get("/catalog/", params={
+                'session': channel['session'], 'window': channel['window'], 'active': False, 'limit': 20,
+            })
+        except Exception:
+            logger.exception(f"Error looking up recordings of channel: {channel['name']}")
+            return None
+        if response.status_code != 200:
+            return None  # The catalog is disabled
+
+        # Pane tracks and composites of the window are listed under names of their own
+        window_name = channel['name'].split(':', 1)[-1]
+        for entry in response.json():
+            if entry['name'] == window_name and Path(entry['path']).exists():
+                return Path(entry['path'])
+        return None
+
     async def on_channel_tuner_channel_selected(self, message: ChannelTuner.ChannelSelected) -> None:
         """Handle channel selection from button clicks."""
         if self.tuner:
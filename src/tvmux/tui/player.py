@@ -0,0 +1,206 @@
+"""Playing casts in the asciinema player widget without copying them.
+
+The player reads asciicast v2 files line by line, and parses all of them
+to find the duration before it can start; compressed casts it first
+decompresses into a copy. Casts here can also be v3 or binary, so the
+player is given a parser for each that reads the cast as it goes, and
+frames converted as they are read: binary casts give their header and
+duration straight from the block headers and their frames as blocks are
+decoded, asciicast ones (plain or compressed, v2 or v3) their events
+with times since the start of the cast. Their duration comes from the
+seek index, which the server keeps up to date while recording, or the
+frame table of a compressed cast, and so does frames_from(). Playback
+itself always replays from the start, even when seeking, as the screen
+at any point depends on every frame before it. Nothing is written to
+disk.
+
+This replaces private parts of textual_asciinema, so its version is
+pinned, and a test checks they are still as expected.
+"""
+import json
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from textual.app import ComposeResult
+from textual.widget import Widget
+from textual_asciinema import AsciinemaPlayer
+from textual_asciinema.parser import CastFrame, CastHeader, CastParser
+
+from ..cast import BinaryCast, is_binary, is_compressed, iter_events, open_cast, read_index
+from ..cast.compress import load_frame_table
+from ..cast.convert import convert_header
+from ..cast.events import EventClock, cast_version
+
+
+class BinaryCastParser(CastParser):
+    """Cast parser reading a binary cast through its block headers."""
+
+    def __init__(self, cast_path: str | Path):
+        super().__init__(cast_path)
+        self.cast = BinaryCast(self.cast_path)
+
+    def cleanup(self):
+        """Unmap the cast."""
+        self.cast.close()
+        super().cleanup()
+
+    def _parse_header(self) -> CastHeader:
+        return CastHeader.from_dict(self.cast.header)
+
+    def _calculate_duration(self) -> float:
+        return self.cast.duration
+
+    def events(self) -> Iterator[list]:
+        """Iterate over all events, with times since the start of the cast."""
+        return self.cast.events()
+
+    def frames(self) -> Iterator[CastFrame]:
+        """Iterate over all frames in the cast."""
+        for event in self.cast.events():
+            yield CastFrame(*event)
+
+    def frames_with_offsets(self) -> Iterator[Tuple[int, CastFrame]]:
+        """Iterate over frames with the offset of the block they're in."""
+        for block in self.cast.blocks:
+            for event in self.cast.block_events(block):
+                yield block.offset, CastFrame(*event)
+
+    def parse_from_offset(self, offset: int) -> Iterator[CastFrame]:
+        """Parse frames starting from the block at `offset`."""
+        for block in self.cast.blocks:
+            if block.offset >= offset:
+                for event in self.cast.block_events(block):
+                    yield CastFrame(*event)
+
+
+class AsciicastParser(CastParser):
+    """Cast parser reading a plain or compressed cast of either asciicast version as it goes."""
+
+    def __init__(self, cast_path: str | Path):
+        # Not CastParser's own, which decompresses a compressed cast into a copy
+        self.cast_path = Path(cast_path)
+        self._header = None
+        self._duration = None
+        self._is_gzipped = False
+        self._working_file_path = self.cast_path
+        self._temp_cache_file = False
+
+    def _parse_header(self) -> CastHeader:
+        with open_cast(self.cast_path) as f:
+            return CastHeader.from_dict(convert_header(json.loads(f.readline()), 2))
+
+    def _calculate_duration(self) -> float:
+        # The seek index or frame table has it, and only what was written since is read
+        if is_compressed(self.cast_path):
+            table = load_frame_table(self.cast_path)
+            if table is not None:
+                return table.last_time
+        else:
+            index = read_index(self.cast_path)
+            if index is not None:
+                return index.duration
+
+        with open_cast(self.cast_path) as f:
+            clock = EventClock(cast_version(f.readline()))
+            for line in f:
+                clock.feed(line)
+        return clock.time
+
+    def events(self) -> Iterator[list]:
+        """Iterate over all events, with times since the start of the cast."""
+        with open_cast(self.cast_path) as f:
+            clock = EventClock(cast_version(f.readline()))
+            for line in f:
+                event = clock.decode(line)
+                if event is not None and len(event) >= 3:
+                    yield event[:3]
+
+    def frames(self) -> Iterator[CastFrame]:
+        """Iterate over all frames in the cast."""
+        for event in self.events():
+            yield CastFrame(*event)
+
+    def frames_from(self, start_timestamp: float) -> Iterator[CastFrame]:
+        """Iterate over frames from a time on, seeking to it with the seek index or frame table."""
+        index = None if is_compressed(self.cast_path) else read_index(self.cast_path)
+        for event in iter_events(self.cast_path, start_timestamp, index=index):
+            yield CastFrame(*event[:3])
+
+    def frames_with_offsets(self) -> Iterator[Tuple[int, CastFrame]]:
+        """Iterate over frames, all at offset 0, as frames are only read from the start by offset.
+
+        frames_from() seeks by time instead.
+        """
+        for frame in self.frames():
+            yield 0, frame
+
+    def parse_from_offset(self, offset: int) -> Iterator[CastFrame]:
+        """Parse frames from the start, the only offset there is."""
+        return self.frames()
+
+
+class EventVideoFile:
+    """Hands the playback engine the frames of a cast up to a time, from its parser's events."""
+
+    def __init__(self, events: Callable[[], Iterator[list]]):
+        self.source = events
+        self.events: Optional[Iterator[list]] = None
+        self.restart()
+
+    def get_frames_until(self, target_time: float) -> List[CastFrame]:
+        """Get all frames from the current position up to target time."""
+        frames = []
+        while True:
+            if self.next_event is None:
+                self.next_event = next(self.events, None)
+                if self.next_event is None:
+                    break
+            if self.next_event[0] > target_time:
+                break
+            frames.append(CastFrame(*self.next_event))
+            self.next_event = None
+        return frames
+
+    def restart(self) -> None:
+        """Rewind to the first frame."""
+        self.cleanup()
+        self.events = self.source()
+        self.next_event: Optional[list] = None
+
+    def cleanup(self) -> None:
+        """Close the cast, if the events were being read from it."""
+        close = getattr(self.events, "close", None)
+        if close is not None:
+            close()
+
+
+class CastPlayer(AsciinemaPlayer):
+    """Asciinema player for any cast tvmux writes, read as it plays."""
+
+    def __init__(self, cast_path: str | Path, **kwargs):
+        # Not AsciinemaPlayer's own, whose parser decompresses a compressed cast into a copy
+        Widget.__init__(self, **kwargs)
+        self.cast_path = Path(cast_path)
+        if is_binary(self.cast_path):
+            self.parser = BinaryCastParser(self.cast_path)
+        else:
+            self.parser = AsciicastParser(self.cast_path)
+        self.terminal = None
+        self.engine = None
+        self.controls = None
+
+    def compose(self) -> ComposeResult:
+        """Compose the player, with its engine reading frames through the parser."""
+        for widget in super().compose():
+            # The engine is created before the first widget, reading the cast as asciicast v2
+            if not isinstance(self.engine.video_file, EventVideoFile):
+                self.engine.video_file.cleanup()
+                self.engine.video_file = EventVideoFile(self.parser.events)
+            yield widget
+
+    async def on_unmount(self) -> None:
+        """Stop playing and close the cast once the player is gone."""
+        await self.pause()
+        if self.engine is not None:
+            self.engine.video_file.cleanup()
+        self.parser.cleanup()
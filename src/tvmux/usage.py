@@ -0,0 +1,148 @@
+"""Account for what each recording costs in CPU, memory and disk.
+
+A recording's own processes are the ones tmux runs to stream its panes,
+a shell and a `cat` for each. They are found by the FIFO they write to,
+which their command line names. Relaying and writing casts happen in the
+server's threads, shared by every recording, so the server is reported
+on its own, and each recording's share of it shows in what it writes:
+every cast it writes, main cast, tracks and composite, counts towards its
+bytes, events and write rate.
+
+Processes that have exited are no longer counted, so the CPU time and
+I/O are for the streams running now, e.g. since the last pane switch.
+"""
+from typing import Dict, Iterable, List, Optional
+
+import psutil
+from pydantic import BaseModel, Field
+
+from .models import Recording
+
+
+class ProcessUsage(BaseModel):
+    """What a group of processes is using."""
+    processes: int = Field(0, description="Processes running")
+    cpu_seconds: float = Field(0.0, description="CPU time used, user and system")
+    rss_bytes: int = Field(0, description="Resident memory")
+    read_bytes: int = Field(0, description="Bytes read, including from pipes")
+    write_bytes: int = Field(0, description="Bytes written, including to pipes")
+
+    def add(self, other: "ProcessUsage") -> None:
+        """Add another group's usage to this one's."""
+        self.processes += other.processes
+        self.cpu_seconds += other.cpu_seconds
+        self.rss_bytes += other.rss_bytes
+        self.read_bytes += other.read_bytes
+        self.write_bytes += other.write_bytes
+
+
+class RecordingUsage(ProcessUsage):
+    """What a recording costs: its processes, and what it writes to its casts."""
+    recording_id: Optional[str] = Field(None, description="Recording ID, or None for totals")
+    cast_bytes: int = Field(0, description="Bytes written to its casts since it started")
+    events: int = Field(0, description="Events written to its casts since it started")
+    write_rate: float = Field(0.0, description="Bytes written a second, over the last few seconds")
+
+    def add(self, other: "ProcessUsage") -> None:
+        """Add another recording's usage to this one's."""
+        super().add(other)
+        if isinstance(other, RecordingUsage):
+            self.cast_bytes += other.cast_bytes
+            self.events += other.events
+            self.write_rate += other.write_rate
+
+
+class UsageReport(BaseModel):
+    """What every recording costs, in total, and what the server itself uses."""
+    recordings: List[RecordingUsage] = Field(default_factory=list, description="Each active recording")
+    total: RecordingUsage = Field(default_factory=RecordingUsage, description="All recordings together")
+    server: ProcessUsage = Field(default_factory=ProcessUsage,
+                                 description="The server, whose threads relay and write for every recording")
+
+
+def process_usage(processes: Iterable[psutil.Process]) -> ProcessUsage:
+    """Add up what some processes are using, skipping any that have gone."""
+    usage = ProcessUsage()
+    for process in processes:
+        try:
+            with process.oneshot():
+                cpu = process.cpu_times()
+                rss = process.memory_info().rss
+                try:
+                    io = process.io_counters()
+                except (psutil.AccessDenied, AttributeError):
+                    io = None  # Not allowed or not supported here, the rest still counts
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            continue
+
+        usage.processes += 1
+        usage.cpu_seconds += cpu.user + cpu.system
+        usage.rss_bytes += rss
+        if io is not None:
+            usage.read_bytes += getattr(io, "read_chars", io.read_bytes)
+            usage.write_bytes += getattr(io, "write_chars", io.write_bytes)
+    return usage
+
+
+def recording_processes(prefixes: Dict[str, str]) -> Dict[str, List[psutil.Process]]:
+    """Find the processes streaming into each recording's FIFOs, and their children.
+
+    Args:
+        prefixes: Each recording's FIFO path prefix, see Recording.fifo_prefix()
+
+    Returns:
+        The processes of each recording, by ID
+    """
+    found: Dict[str, List[psutil.Process]] = {recording_id: [] for recording_id in prefixes}
+    children: Dict[int, List[psutil.Process]] = {}
+    owners: Dict[int, str] = {}
+
+    for process in psutil.process_iter(["ppid", "cmdline"]):
+        children.setdefault(process.info["ppid"], []).append(process)
+        command = " ".join(process.info["cmdline"] or ())
+        for recording_id, prefix in prefixes.items():
+            if prefix in command:
+                owners[process.pid] = recording_id
+                found[recording_id].append(process)
+                break
+
+    for pid, recording_id in owners.items():
+        pending = [pid]
+        while pending:
+            for child in children.get(pending.pop(), []):
+                if child.pid not in owners:  # Otherwise it is counted as a stream of its own
+                    found[recording_id].append(child)
+                    pending.append(child.pid)
+    return found
+
+
+def recording_usage(recording: Recording, processes: Optional[List[psutil.Process]] = None) -> RecordingUsage:
+    """Get what a recording costs.
+
+    Args:
+        recording: An active recording
+        processes: Its processes, if already found, otherwise they are looked up
+    """
+    if processes is None:
+        processes = recording_processes({recording.id: recording.fifo_prefix()})[recording.id]
+
+    usage = RecordingUsage(recording_id=recording.id, **process_usage(processes).model_dump())
+    if recording.meter is not None:
+        usage.cast_bytes = recording.meter.bytes
+        usage.events = recording.meter.events
+        usage.write_rate = round(recording.meter.rate(), 1)
+    return usage
+
+
+def usage_report(recordings: Iterable[Recording]) -> UsageReport:
+    """Get what each recording costs, the totals, and what the server uses."""
+    recordings = [recording for recording in recordings if recording.active]
+    processes = recording_processes({recording.id: recording.fifo_prefix() for recording in recordings})
+
+    report = UsageReport(server=process_usage([psutil.Process()]))
+    for recording in recordings:
+        usage = recording_usage(recording, processes[recording.id])
+        report.recordings.append(usage)
+        report.total.add(usage)
+    report.total.write_rate = round(report.total.write_rate, 1)
+    return report
@@ -0,0 +1,148 @@
+"""Tests for compact binary casts."""
+import json
+from pathlib import Path
+
+import pytest
+
+from tvmux.cast import binary as binary_module
+from tvmux.cast import convert_cast, iter_events, open_cast
+from tvmux.cast.binary import BLOCK, BinaryCast, BinaryCastWriter, is_binary
+from tvmux.cast.writer import WriteMeter
+from tvmux.repair import repair_cast_file, validate_cast_file
+
+
+def write_binary(path: Path, events: int = 100, block_size: int = 256) -> Path:
+    """Write a binary cast with one output event a second."""
+    writer = BinaryCastWriter(path, 80, 24, started=0.0, timestamp=1_700_000_000, block_size=block_size)
+    for i in range(events):
+        writer.output(f"line {i}\r\n".encode(), at=float(i))
+    writer.close()
+    return path
+
+
+def test_is_binary():
+    """Test detecting binary cast names."""
+    assert is_binary(Path("a.tvcast"))
+    assert not is_binary(Path("a.cast"))
+
+
+def test_round_trip(tmp_path):
+    """Test events come back as written, from the block headers and blocks."""
+    path = tmp_path / "a.tvcast"
+    writer = BinaryCastWriter(path, 80, 24, started=10.0, timestamp=5)
+    writer.output("✓ 1\r\n".encode(), at=10.5)
+    writer.output(b"\x1b[8;30;100t", at=11.25)
+    writer.marker("here", at=12.0)
+    writer.output(b"late", at=11.0)  # Kept after the marker
+    writer.close()
+
+    with BinaryCast(path) as cast:
+        assert cast.header["width"] == 80 and cast.header["timestamp"] == 5
+        assert (cast.event_count, cast.duration) == (5, 2.0)
+        assert list(cast.events()) == [
+            [0.5, "o", "✓ 1\r\n"], [1.25, "o", "\x1b[8;30;100t"], [1.25, "r", "100x30"],
+            [2.0, "m", "here"], [2.0, "o", "late"],
+        ]
+    assert writer.bytes_written == path.stat().st_size
+
+
+def test_seeks_by_block(tmp_path):
+    """Test a time window only decodes the blocks it needs."""
+    path = write_binary(tmp_path / "a.tvcast", events=1000)
+
+    with BinaryCast(path) as cast:
+        assert len(cast.blocks) > 10
+        assert (cast.event_count, cast.duration) == (1000, 999.0)
+        assert [e[2] for e in cast.events(500.0, 502.0)] == ["line 500\r\n", "line 501\r\n", "line 502\r\n"]
+
+    assert [e[0] for e in iter_events(path, start=998.0)] == [998.0, 999.0]
+
+
+def test_buffered_blocks_wait(tmp_path, monkeypatch):
+    """Test flush() holds a block until it's old enough, and close() writes it anyway."""
+    now = [100.0]
+    monkeypatch.setattr(binary_module.time, "monotonic", lambda: now[0])
+    meter = WriteMeter()
+    path = tmp_path / "a.tvcast"
+    writer = BinaryCastWriter(path, 80, 24, started=100.0, buffered=True, meter=meter)
+    header_size = path.stat().st_size
+
+    writer.output(b"a", at=100.0)
+    writer.flush()
+    assert path.stat().st_size == header_size
+    assert writer.events == 1
+
+    now[0] += binary_module.BLOCK_AGE
+    writer.flush()
+    with BinaryCast(path) as cast:
+        assert cast.event_count == 1
+
+    writer.output(b"b", at=now[0])
+    writer.close()
+    with BinaryCast(path) as cast:
+        assert [e[2] for e in cast.events()] == ["a", "b"]
+    assert (meter.bytes, meter.events) == (path.stat().st_size, 2)
+
+
+def test_partial_block_ignored(tmp_path):
+    """Test a block still being written isn't read, and repair cuts it off."""
+    path = write_binary(tmp_path / "a.tvcast", events=50)
+    with BinaryCast(path) as cast:
+        blocks, end = len(cast.blocks), cast.end
+    with open(path, "ab") as f:
+        f.write(BLOCK.pack(100, 1, 0, 0, 0) + b"cut")
+
+    with BinaryCast(path) as cast:
+        assert len(cast.blocks) == blocks
+    assert not validate_cast_file(path)
+    assert repair_cast_file(path) is True
+    assert path.stat().st_size == end
+    assert validate_cast_file(path)
+
+
+def test_damaged_block_skipped(tmp_path):
+    """Test a block whose CRC doesn't match is skipped, and repair truncates from it."""
+    path = write_binary(tmp_path / "a.tvcast", events=50)
+    with BinaryCast(path) as cast:
+        damaged = cast.blocks[-2]
+        good = sum(block.event_count for block in cast.blocks[:-2])
+        last = cast.blocks[-1].event_count
+    data = bytearray(path.read_bytes())
+    data[damaged.offset + BLOCK.size] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+    with BinaryCast(path) as cast:
+        assert len(list(cast.events())) == good + last
+
+    assert repair_cast_file(path) is True
+    assert path.stat().st_size == damaged.offset
+
+
+def test_not_binary(tmp_path):
+    """Test other files are refused."""
+    path = tmp_path / "a.tvcast"
+    path.write_text('{"version": 2}\n')
+
+    with pytest.raises(ValueError):
+        BinaryCast(path)
+    assert not validate_cast_file(path)
+
+
+def test_convert_both_ways(tmp_path):
+    """Test asciicast v3 to binary and back to v2 keeps every event, streaming through open_cast."""
+    v3 = tmp_path / "a.cast"
+    v3.write_text("\n".join([
+        json.dumps({"version": 3, "term": {"cols": 90, "rows": 30}, "timestamp": 7}),
+        '[0.5, "o", "a"]', "# comment", '[0.25, "r", "100x40"]', '[1.0, "o", "ü"]', "",
+    ]))
+
+    assert convert_cast(v3, tmp_path / "a.tvcast", 2) == 3
+    with BinaryCast(tmp_path / "a.tvcast") as cast:
+        assert (cast.header["width"], cast.header["height"], cast.header["timestamp"]) == (90, 30, 7)
+        assert list(cast.events()) == [[0.5, "o", "a"], [0.75, "r", "100x40"], [1.75, "o", "ü"]]
+
+    assert convert_cast(tmp_path / "a.tvcast", tmp_path / "v2.cast", 2) == 3
+    with open_cast(tmp_path / "a.tvcast") as f:
+        assert f.read() == (tmp_path / "v2.cast").read_bytes()
+    lines = (tmp_path / "v2.cast").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line) for line in lines[1:]] == [[0.5, "o", "a"], [0.75, "r", "100x40"], [1.75, "o", "ü"]]
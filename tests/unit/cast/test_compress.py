@@ -0,0 +1,210 @@
+"""Tests for framed gzip cast compression."""
+import gzip
+import json
+from pathlib import Path
+
+import pytest
+
+from tvmux.cast.compress import (
+    CompressedCastWriter, compress_cast, frames_path, is_compressed, iter_frame_events, iter_frame_lines,
+    load_frame_table, open_cast, read_frame, repair_compressed_cast, scan_frames, validate_compressed_cast
+)
+from tvmux.cast.index import index_path, iter_events, update_index
+from tvmux.repair import repair_cast_file, validate_cast_file
+
+HEADER = json.dumps({"version": 2, "width": 80, "height": 24}) + "\n"
+
+
+@pytest.fixture
+def cast_path(tmp_path) -> Path:
+    """A plain cast with 500 one-second events."""
+    path = tmp_path / "test.cast"
+    path.write_text(HEADER + "".join(
+        json.dumps([i * 1.0, "o", f"output line {i}\r\n"]) + "\n" for i in range(500)
+    ))
+    return path
+
+
+def test_is_compressed():
+    """Test detecting compressed cast names."""
+    assert is_compressed(Path("a.cast.gz"))
+    assert not is_compressed(Path("a.cast"))
+
+
+def test_compress_round_trip(cast_path):
+    """Test that plain gzip readers see the original cast."""
+    original = cast_path.read_bytes()
+    update_index(cast_path)
+
+    gz_path = compress_cast(cast_path, frame_size=1000)
+
+    assert gz_path == cast_path.with_name("test.cast.gz")
+    assert gzip.decompress(gz_path.read_bytes()) == original
+    assert gz_path.stat().st_size < len(original)
+    assert not cast_path.exists()
+    assert not index_path(cast_path).exists()
+
+
+def test_keep_original(cast_path):
+    """Test compressing without removing the plain cast."""
+    compress_cast(cast_path, remove=False)
+
+    assert cast_path.exists()
+
+
+def test_frames_decode_independently(cast_path):
+    """Test that each frame is a complete gzip member of whole lines."""
+    original = cast_path.read_bytes()
+    gz_path = compress_cast(cast_path, frame_size=1000)
+    table = load_frame_table(gz_path)
+
+    assert len(table.frames) > 10
+    assert table.event_count == 500
+    assert table.last_time == 499.0
+
+    for number, frame in enumerate(table.frames):
+        data = read_frame(gz_path, table, number)
+        assert original[frame.uncompressed_offset:].startswith(data)
+        assert data.endswith(b"\n")
+
+
+def test_scan_matches_saved_table(cast_path):
+    """Test rebuilding the frame table from the members alone."""
+    gz_path = compress_cast(cast_path, frame_size=1000)
+
+    scanned, good_end = scan_frames(gz_path)
+
+    assert scanned == load_frame_table(gz_path)
+    assert good_end == gz_path.stat().st_size
+
+
+def test_seek_by_time(cast_path):
+    """Test reading a time window from a compressed cast."""
+    gz_path = compress_cast(cast_path, frame_size=1000)
+
+    events = list(iter_events(gz_path, start=300.0, end=302.0))
+
+    assert [e[0] for e in events] == [300.0, 301.0, 302.0]
+
+
+def test_open_cast_transparent(cast_path):
+    """Test open_cast reads plain and compressed casts alike."""
+    original = cast_path.read_bytes()
+    with open_cast(cast_path) as f:
+        assert f.read() == original
+
+    gz_path = compress_cast(cast_path)
+    with open_cast(gz_path) as f:
+        assert f.read() == original
+
+
+def test_repair_partial_frame(cast_path):
+    """Test dropping a cut-off last frame."""
+    gz_path = compress_cast(cast_path, frame_size=1000)
+    table = load_frame_table(gz_path)
+    size = gz_path.stat().st_size
+    with open(gz_path, "r+b") as f:
+        f.truncate(size - 10)
+    frames_path(gz_path).unlink()
+
+    assert not validate_compressed_cast(gz_path)
+    assert not validate_cast_file(gz_path)
+    assert repair_cast_file(gz_path) is True
+
+    repaired = load_frame_table(gz_path)
+    assert repaired.frames == table.frames[:-1]
+    assert gz_path.stat().st_size == table.frames[-1].offset
+    assert validate_cast_file(gz_path)
+
+
+def test_repair_garbage(tmp_path):
+    """Test that a file with no complete frames can't be repaired."""
+    gz_path = tmp_path / "junk.cast.gz"
+    gz_path.write_bytes(b"not gzip at all")
+
+    assert repair_compressed_cast(gz_path) is False
+
+
+def test_v3_frames_count_from_start(tmp_path):
+    """Test frame times of a v3 cast are since the start, and reads from a later frame are too."""
+    path = tmp_path / "v3.cast"
+    path.write_text(json.dumps({"version": 3, "term": {"cols": 80, "rows": 24}}) + "\n" + "".join(
+        json.dumps([1.0, "o", f"output line {i}\r\n"]) + "\n" for i in range(500)
+    ))
+
+    gz_path = compress_cast(path, frame_size=4096)
+    table = load_frame_table(gz_path)
+    assert len(table.frames) > 2
+    assert (table.event_count, table.last_time) == (500, 500.0)
+    assert scan_frames(gz_path)[0] == table
+
+    events = list(iter_events(gz_path, start=300.0, end=301.0))
+    assert [(e[0], e[2]) for e in events] == [(300.0, "output line 299\r\n"), (301.0, "output line 300\r\n")]
+
+
+def test_frames_without_events(tmp_path):
+    """Test a frame holding no events keeps frame times in order and reads resume after it."""
+    path = tmp_path / "v3.cast"
+    path.write_text(json.dumps({"version": 3, "term": {"cols": 80, "rows": 24}}) + "\n" + "".join(
+        json.dumps([1.0, "o", f"{i}" + "x" * 1000]) + "\n" for i in range(50)
+    ) + "#" + "x" * 1000 + "\n" + "".join(
+        json.dumps([1.0, "o", f"{i}" + "x" * 1000]) + "\n" for i in range(50, 100)
+    ))
+
+    gz_path = compress_cast(path, frame_size=1000)
+    table = load_frame_table(gz_path)
+    times = [frame.first_time for frame in table.frames]
+    assert times[49:52] == [50.0, 50.0, 51.0]  # The comment's frame carries the time before it
+    assert scan_frames(gz_path)[0] == table
+
+    events = list(iter_events(gz_path, start=50.0, end=52.0))
+    assert [(e[0], e[2][:2]) for e in events] == [(50.0, "49"), (51.0, "50"), (52.0, "51")]
+    events = list(iter_events(gz_path, start=50.5, end=52.0))
+    assert [(e[0], e[2][:2]) for e in events] == [(51.0, "50"), (52.0, "51")]
+
+
+def test_no_frames(tmp_path):
+    """Test reading events from a compressed cast with no complete frames gives none."""
+    gz_path = tmp_path / "junk.cast.gz"
+    gz_path.write_bytes(b"not gzip at all")
+
+    assert list(iter_frame_events(gz_path)) == []
+
+
+@pytest.mark.parametrize("version", [2, 3])
+def test_writer_compresses_as_it_goes(tmp_path, version):
+    """Test the writer writes whole frames, and their table, while the cast is still open."""
+    gz_path = tmp_path / "live.cast.gz"
+    writer = CompressedCastWriter(gz_path, 80, 24, started=0.0, buffered=True, version=version,
+                                  frame_size=1000)
+    with open_cast(gz_path) as f:
+        assert json.loads(f.readline())["version"] == version  # The header is there straight away
+
+    for i in range(200):
+        writer.output(f"output line {i}\r\n".encode(), at=i * 0.5)
+    table = load_frame_table(gz_path)
+    assert len(table.frames) > 2
+    assert writer.holding
+    assert scan_frames(gz_path)[0] == table  # Only whole frames, all in the table
+    lines = list(iter_frame_lines(gz_path))
+    assert lines[-1].endswith(b"\n") and len(lines) == table.event_count + 1
+
+    writer.close()
+    table = load_frame_table(gz_path)
+    assert (table.event_count, table.last_time) == (200, 99.5)
+    assert scan_frames(gz_path) == (table, gz_path.stat().st_size)
+    assert validate_compressed_cast(gz_path)
+    assert [e[2] for e in iter_events(gz_path, start=50.0, end=50.5)] == ["output line 100\r\n",
+                                                                         "output line 101\r\n"]
+
+
+def test_frame_lines_from_offset(cast_path):
+    """Test reading lines from an offset part way through a frame, and past a frame still being written."""
+    original = cast_path.read_bytes()
+    gz_path = compress_cast(cast_path, frame_size=1000)
+    offset = original.index(b"[300.0")
+    with open(gz_path, "ab") as f:
+        f.write(gzip.compress(b"[500.0, ")[:10])  # Cut off, and not in the table
+
+    assert b"".join(iter_frame_lines(gz_path, offset)) == original[offset:]
+    assert not validate_compressed_cast(gz_path)
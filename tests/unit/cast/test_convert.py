@@ -0,0 +1,51 @@
+"""Tests for converting casts between asciicast versions."""
+import json
+from pathlib import Path
+
+from tvmux.cast import compress_cast, convert_cast
+from tvmux.cast.convert import convert_header
+from tvmux.cast.index import iter_events
+
+HEADER = {"version": 2, "width": 80, "height": 24, "timestamp": 1, "env": {"SHELL": "/bin/sh", "TERM": "xterm"}}
+
+
+def read_cast(cast_path: Path):
+    """Get the header and events of a plain cast."""
+    header, *events = [json.loads(line) for line in cast_path.read_text().splitlines()]
+    return header, events
+
+
+def test_header_round_trip():
+    """Test headers keep their size, terminal type and other fields both ways."""
+    v3 = convert_header(HEADER, 3)
+    assert v3 == {"version": 3, "timestamp": 1, "env": {"SHELL": "/bin/sh"},
+                  "term": {"cols": 80, "rows": 24, "type": "xterm"}}
+    assert convert_header(v3, 2) == HEADER
+
+
+def test_round_trip(tmp_path):
+    """Test v2 to v3 and back gives the same events, with v3 times between events."""
+    v2 = tmp_path / "a.cast"
+    v2.write_text(json.dumps(HEADER) + "\n" + "".join(
+        json.dumps(event) + "\n" for event in [[0.5, "o", "a"], [1.25, "r", "90x30"], [4.0, "m", "x"]]
+    ))
+
+    assert convert_cast(v2, tmp_path / "v3.cast", 3) == 3
+    _, events = read_cast(tmp_path / "v3.cast")
+    assert [e[0] for e in events] == [0.5, 0.75, 2.75]
+    assert [e[0] for e in iter_events(tmp_path / "v3.cast")] == [0.5, 1.25, 4.0]
+
+    assert convert_cast(tmp_path / "v3.cast", tmp_path / "back.cast", 2) == 3
+    assert read_cast(tmp_path / "back.cast") == read_cast(v2)
+
+
+def test_v3_to_v2_drops_comments_and_exits(tmp_path):
+    """Test what v2 can't hold is left out, reading a compressed cast."""
+    v3 = tmp_path / "a.cast"
+    v3.write_text("\n".join([
+        json.dumps({"version": 3, "term": {"cols": 80, "rows": 24}}),
+        "# a comment", '[1.0, "o", "a"]', '[2.0, "x", "0"]', "",
+    ]))
+
+    assert convert_cast(compress_cast(v3), tmp_path / "v2.cast", 2) == 1
+    assert read_cast(tmp_path / "v2.cast") == ({"version": 2, "width": 80, "height": 24}, [[1.0, "o", "a"]])
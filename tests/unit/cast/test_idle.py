@@ -0,0 +1,98 @@
+"""Tests for idle gap compression."""
+import json
+from pathlib import Path
+
+from tvmux.cast.idle import compress_idle, idle_path, load_idle_map
+from tvmux.cast.index import index_path, update_index
+
+HEADER = json.dumps({"version": 2, "width": 80, "height": 24}) + "\n"
+
+
+def write_cast(tmp_path: Path, times) -> Path:
+    """Write a cast with one event per timestamp."""
+    cast_path = tmp_path / "test.cast"
+    cast_path.write_text(HEADER + "".join(json.dumps([t, "o", f"at {t}"]) + "\n" for t in times))
+    return cast_path
+
+
+def read_events(cast_path: Path):
+    """Get (time, data) for every event."""
+    lines = cast_path.read_text().splitlines()
+    return [tuple(json.loads(line)[::2]) for line in lines[1:]]
+
+
+def test_caps_long_gaps(tmp_path):
+    """Test gaps over the limit are shortened and recorded in the sidecar."""
+    cast_path = write_cast(tmp_path, [0.5, 1.0, 3601.0, 3602.0, 10802.0])
+
+    idle_map = compress_idle(cast_path, limit=2.0)
+
+    assert read_events(cast_path) == [
+        (0.5, "at 0.5"), (1.0, "at 1.0"), (3.0, "at 3601.0"), (4.0, "at 3602.0"), (6.0, "at 10802.0")
+    ]
+    assert json.loads(cast_path.read_text().splitlines()[0])["idle_time_limit"] == 2.0
+
+    assert [(p.start, p.original_start, p.original) for p in idle_map.periods] == [
+        (1.0, 1.0, 3600.0), (4.0, 3602.0, 7200.0)
+    ]
+    assert idle_map.removed == 10796.0
+    assert idle_map.original_duration == 10802.0
+    assert load_idle_map(cast_path) == idle_map
+
+
+def test_original_time(tmp_path):
+    """Test stored times map back to the original timeline."""
+    cast_path = write_cast(tmp_path, [0.5, 1.0, 3601.0, 3602.0, 10802.0])
+    idle_map = compress_idle(cast_path, limit=2.0)
+
+    for stored, original in zip([0.5, 1.0, 3.0, 4.0, 6.0], [0.5, 1.0, 3601.0, 3602.0, 10802.0]):
+        assert idle_map.original_time(stored) == original
+
+
+def test_nothing_to_cap(tmp_path):
+    """Test a busy cast is left as it is but still gets a sidecar."""
+    cast_path = write_cast(tmp_path, [0.5, 1.0, 1.5])
+    before = cast_path.read_bytes()
+
+    idle_map = compress_idle(cast_path, limit=2.0)
+
+    assert cast_path.read_bytes() == before
+    assert idle_map.periods == []
+    assert idle_path(cast_path).exists()
+
+
+def test_capped_once(tmp_path):
+    """Test a cast with a sidecar isn't capped again."""
+    cast_path = write_cast(tmp_path, [1.0, 100.0])
+    compress_idle(cast_path, limit=10.0)
+    after = cast_path.read_bytes()
+
+    idle_map = compress_idle(cast_path, limit=1.0)
+
+    assert cast_path.read_bytes() == after
+    assert idle_map.limit == 10.0
+
+
+def test_rewrite_drops_stale_index(tmp_path):
+    """Test the seek index is removed when times change, so it gets rebuilt."""
+    cast_path = write_cast(tmp_path, [1.0, 100.0])
+    update_index(cast_path)
+
+    compress_idle(cast_path, limit=10.0)
+
+    assert not index_path(cast_path).exists()
+    assert update_index(cast_path).duration == 11.0
+
+
+def test_caps_v3_intervals(tmp_path):
+    """Test only the long intervals of a v3 cast change."""
+    cast_path = tmp_path / "test.cast"
+    cast_path.write_text(json.dumps({"version": 3, "term": {"cols": 80, "rows": 24}}) + "\n" + "".join(
+        json.dumps(event) + "\n" for event in [[0.5, "o", "a"], [0.5, "o", "b"], [3600.0, "o", "c"], [1.0, "o", "d"]]
+    ))
+
+    idle_map = compress_idle(cast_path, limit=2.0)
+
+    assert read_events(cast_path) == [(0.5, "a"), (0.5, "b"), (2.0, "c"), (1.0, "d")]
+    assert [(p.start, p.original_start, p.original) for p in idle_map.periods] == [(1.0, 1.0, 3600.0)]
+    assert idle_map.original_duration == 3602.0
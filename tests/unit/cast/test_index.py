@@ -0,0 +1,187 @@
+"""Tests for the cast time-to-offset index."""
+import json
+from pathlib import Path
+
+from tvmux.cast.index import (
+    CastIndex, LiveIndex, event_time, index_path, iter_events, load_index, update_index
+)
+from tvmux.cast.writer import CastWriter
+
+HEADER = json.dumps({"version": 2, "width": 80, "height": 24}) + "\n"
+
+
+def event(time: float, data: str = "x") -> str:
+    """Format one event line."""
+    return json.dumps([time, "o", data]) + "\n"
+
+
+def write_cast(tmp_path: Path, times) -> Path:
+    """Write a cast with one event per timestamp."""
+    cast_path = tmp_path / "test.cast"
+    cast_path.write_text(HEADER + "".join(event(t, f"at {t}") for t in times))
+    return cast_path
+
+
+def test_event_time():
+    """Test reading the timestamp prefix of event lines."""
+    assert event_time(b'[1.25, "o", "hi"]') == 1.25
+    assert event_time(b'{"version": 2}') is None
+    assert event_time(b'[bad, "o"]') is None
+
+
+def test_build_index(tmp_path):
+    """Test building an index for an existing file."""
+    cast_path = write_cast(tmp_path, [i * 1.0 for i in range(60)])
+
+    index = update_index(cast_path, every_seconds=10.0)
+
+    assert index.event_count == 60
+    assert index.duration == 59.0
+    assert index.times == [0.0, 10.0, 20.0, 30.0, 40.0, 50.0]
+    assert index.indexed_to == cast_path.stat().st_size
+    assert index_path(cast_path).exists()
+
+
+def test_entries_point_at_lines(tmp_path):
+    """Test that every offset is the start of the matching event."""
+    cast_path = write_cast(tmp_path, [i * 0.5 for i in range(100)])
+    index = update_index(cast_path, every_seconds=5.0)
+    data = cast_path.read_bytes()
+
+    for time, offset in zip(index.times, index.offsets):
+        line = data[offset:data.index(b"\n", offset)]
+        assert json.loads(line)[0] == time
+
+
+def test_index_by_bytes(tmp_path):
+    """Test entries are added by size when time barely moves."""
+    cast_path = write_cast(tmp_path, [0.001 * i for i in range(100)])
+
+    index = update_index(cast_path, every_seconds=1000.0, every_bytes=200)
+
+    assert len(index.offsets) > 5
+
+
+def test_load_round_trip(tmp_path):
+    """Test that a saved index loads back the same."""
+    cast_path = write_cast(tmp_path, [i * 3.0 for i in range(20)])
+    built = update_index(cast_path)
+
+    loaded = load_index(cast_path)
+
+    assert loaded.times == built.times
+    assert loaded.offsets == built.offsets
+    assert loaded.event_count == built.event_count
+    assert loaded.indexed_to == built.indexed_to
+
+
+def test_incremental_update(tmp_path):
+    """Test that appended events are indexed without a rebuild."""
+    cast_path = write_cast(tmp_path, [i * 1.0 for i in range(25)])
+    update_index(cast_path, every_seconds=10.0)
+
+    with open(cast_path, "a") as f:
+        f.write("".join(event(25.0 + i) for i in range(25)))
+        f.write('[50.0, "o", "half wri')  # Still being written
+
+    index = update_index(cast_path, every_seconds=10.0)
+
+    assert index.event_count == 50
+    assert index.times == [0.0, 10.0, 20.0, 30.0, 40.0]
+    assert load_index(cast_path).times == index.times
+    assert index.indexed_to < cast_path.stat().st_size
+
+
+def test_rewritten_cast_rebuilds(tmp_path):
+    """Test that an index is rebuilt when its cast shrinks."""
+    cast_path = write_cast(tmp_path, [i * 1.0 for i in range(50)])
+    update_index(cast_path)
+
+    write_cast(tmp_path, [i * 1.0 for i in range(5)])
+    index = update_index(cast_path)
+
+    assert index.event_count == 5
+    assert index.duration == 4.0
+
+
+def test_corrupt_index_rebuilds(tmp_path):
+    """Test that a garbage index file is replaced."""
+    cast_path = write_cast(tmp_path, [0.0, 1.0])
+    index_path(cast_path).write_bytes(b"nonsense")
+
+    assert load_index(cast_path) is None
+    assert update_index(cast_path).event_count == 2
+
+
+def test_offset_for():
+    """Test bisecting for a start offset."""
+    index = CastIndex()
+    index.times = [0.0, 10.0, 20.0]
+    index.offsets = [100, 200, 300]
+
+    assert index.offset_for(-5.0) == 100
+    assert index.offset_for(10.0) == 200
+    assert index.offset_for(15.0) == 200
+    assert index.offset_for(99.0) == 300
+
+
+def test_iter_events_window(tmp_path):
+    """Test reading only a time window."""
+    cast_path = write_cast(tmp_path, [i * 1.0 for i in range(100)])
+
+    events = list(iter_events(cast_path, start=42.0, end=45.0))
+
+    assert [e[0] for e in events] == [42.0, 43.0, 44.0, 45.0]
+    assert events[0][2] == "at 42.0"
+
+
+def test_iter_events_without_index(tmp_path):
+    """Test reading from the start when there's nothing to seek with."""
+    cast_path = write_cast(tmp_path, [0.0, 1.0])
+
+    assert [e[0] for e in iter_events(cast_path, index=CastIndex())] == [0.0, 1.0]
+
+
+def test_iter_events_v3(tmp_path):
+    """Test a v3 cast is indexed and read with times since the start, seeking part way in."""
+    cast_path = tmp_path / "test.cast"
+    cast_path.write_text(json.dumps({"version": 3, "term": {"cols": 80, "rows": 24}}) + "\n" + "".join(
+        ("# comment\n" if i % 7 == 0 else "") + json.dumps([1.0 if i else 0.0, "o", f"at {i}"]) + "\n"
+        for i in range(100)
+    ))
+
+    index = update_index(cast_path)
+    assert (index.event_count, index.last_time) == (100, 99.0)
+    assert index.times[:3] == [0.0, 10.0, 20.0]
+
+    events = list(iter_events(cast_path, start=42.0, end=45.0))
+    assert [(e[0], e[2]) for e in events] == [(42.0, "at 42"), (43.0, "at 43"), (44.0, "at 44"), (45.0, "at 45")]
+
+
+def test_live_index_while_recording(tmp_path):
+    """Test a writer's live index covers what it flushed, and matches one built afterwards."""
+    for version in (2, 3):
+        cast_path = tmp_path / f"live.v{version}.cast"
+        writer = CastWriter(cast_path, 80, 24, started=0.0, buffered=True, version=version,
+                            index=LiveIndex(cast_path, every_seconds=10.0))
+        for i in range(30):
+            writer.output(f"line {i}\r\n".encode(), at=i * 1.0)
+        assert load_index(cast_path) is None  # Nothing flushed yet
+        writer.flush()
+
+        live = load_index(cast_path)
+        assert (live.event_count, live.duration, live.times) == (30, 29.0, [0.0, 10.0, 20.0])
+        assert live.indexed_to == cast_path.stat().st_size
+        events = list(iter_events(cast_path, start=25.0, end=26.0, index=live))
+        assert [(e[0], e[2]) for e in events] == [(25.0, "line 25\r\n"), (26.0, "line 26\r\n")]
+
+        for i in range(30, 45):
+            writer.output(f"line {i}\r\n".encode(), at=i * 1.0)
+        writer.close()
+
+        live = load_index(cast_path)
+        index_path(cast_path).unlink()
+        rebuilt = update_index(cast_path, every_seconds=10.0)
+        assert (live.times, live.offsets) == (rebuilt.times, rebuilt.offsets)
+        assert (live.event_count, live.last_time, live.indexed_to) == \
+            (rebuilt.event_count, rebuilt.last_time, rebuilt.indexed_to)
@@ -0,0 +1,58 @@
+"""Tests for segmented recording manifests."""
+from datetime import datetime
+from pathlib import Path
+
+from tvmux.cast.segments import (
+    Manifest, Segment, load_manifest, manifest_path, save_manifest, segment_path, segment_paths
+)
+
+
+def test_segment_path():
+    """Test naming of later segments after the first."""
+    first = Path("/rec/2025-01-01_1200_host_@1_build.cast")
+
+    assert segment_path(first, 0) == first
+    assert segment_path(first, 1) == Path("/rec/2025-01-01_1200_host_@1_build.part0001.cast")
+    assert segment_path(first, 12).name.endswith(".part0012.cast")
+
+    binary = Path("/rec/2025-01-01_1200_host_@1_build.tvcast")
+    assert segment_path(binary, 1) == Path("/rec/2025-01-01_1200_host_@1_build.part0001.tvcast")
+
+    compressed = Path("/rec/2025-01-01_1200_host_@1_build.cast.gz")
+    assert segment_path(compressed, 1) == Path("/rec/2025-01-01_1200_host_@1_build.part0001.cast.gz")
+
+
+def test_manifest_path():
+    """Test the manifest sits next to the first segment."""
+    first = Path("/rec/2025-01-01_1200_host_@1_build.cast")
+
+    assert manifest_path(first) == Path("/rec/2025-01-01_1200_host_@1_build.manifest.json")
+
+
+def test_manifest_round_trip(tmp_path):
+    """Test saving and loading a manifest."""
+    path = tmp_path / "rec.manifest.json"
+    manifest = Manifest(
+        recording_id="main:@1", hostname="host", session_id="main",
+        window_id="@1", window_name="build",
+        segments=[
+            Segment(path="rec.cast.gz", started=datetime(2025, 1, 1, 12), ended=datetime(2025, 1, 1, 13), bytes=100),
+            Segment(path="rec.part0001.cast", started=datetime(2025, 1, 1, 13)),
+        ]
+    )
+
+    save_manifest(path, manifest)
+
+    assert load_manifest(path) == manifest
+    assert segment_paths(path) == [tmp_path / "rec.cast.gz", tmp_path / "rec.part0001.cast"]
+    assert not path.with_name(path.name + ".tmp").exists()
+
+
+def test_load_missing_or_broken(tmp_path):
+    """Test unreadable manifests load as None."""
+    broken = tmp_path / "broken.manifest.json"
+    broken.write_text("{")
+
+    assert load_manifest(tmp_path / "missing.manifest.json") is None
+    assert load_manifest(broken) is None
+    assert segment_paths(broken) == []
@@ -0,0 +1,46 @@
+"""Tests for extracting text from terminal output."""
+from tvmux.cast.text import MAX_LINE, TextLines, strip_escapes, visible_line
+
+
+def test_strip_escapes():
+    """Test removing colours, cursor movement, titles and controls."""
+    assert strip_escapes("\x1b[1;31merror\x1b[0m: bad") == "error: bad"
+    assert strip_escapes("\x1b]0;vim main.py\x07text") == "text"
+    assert strip_escapes("\x1b[?1049h\x1b[2J\x1b[Hhome") == "home"
+    assert strip_escapes("\x1b(Bplain\x07\x08") == "plain"
+    assert strip_escapes("tab\tkept") == "tab\tkept"
+
+
+def test_visible_line_carriage_returns():
+    """Test that only the last overwrite of a line is kept."""
+    assert visible_line("10%\r50%\r100%\r\n") == "100%"
+    assert visible_line("  done  \r") == "done"
+
+
+def test_lines_across_events():
+    """Test assembling lines split over events, timed by their first part."""
+    lines = TextLines()
+
+    assert lines.feed(1.0, "conn") == []
+    assert lines.feed(2.0, "ection refused\r\nnext") == [(1.0, "connection refused")]
+    assert lines.feed(3.0, "\r\n\r\n") == [(2.0, "next")]
+    assert lines.feed(4.0, "tail") == []
+    assert lines.flush() == [(4.0, "tail")]
+
+
+def test_lines_resume():
+    """Test continuing from saved pending state."""
+    first = TextLines()
+    first.feed(1.0, "half ")
+
+    resumed = TextLines(first.pending, first.pending_time)
+
+    assert resumed.feed(2.0, "line\n") == [(1.0, "half line")]
+
+
+def test_long_line_cut():
+    """Test that output without newlines doesn't grow without bound."""
+    lines = TextLines()
+
+    assert len(lines.feed(0.0, "x" * (MAX_LINE + 10))) == 1
+    assert lines.pending == ""
@@ -0,0 +1,74 @@
+"""Tests for per-pane tracks and the cast writer."""
+import json
+from pathlib import Path
+
+from tvmux.cast.tracks import (
+    TrackLayout, layout_path, load_layout, parse_panes, save_layout, track_path,
+)
+from tvmux.cast.writer import CastWriter
+
+PANES = (
+    "%1\t0\t0\t0\t40\t24\t1\t81\t24\tb25f,81x24,0,0{40x24,0,0,1,40x24,41,0,2}\n"
+    "%2\t1\t41\t0\t40\t24\t0\t81\t24\tb25f,81x24,0,0{40x24,0,0,1,40x24,41,0,2}\n"
+)
+
+
+def test_track_and_layout_paths():
+    """Test tracks and the layout file sit next to the window's cast."""
+    cast_path = Path("/rec/2026-01-01T00:00:00_host_work_1.cast")
+
+    assert track_path(cast_path, "%12").name == "2026-01-01T00:00:00_host_work_1.pane-12.cast"
+    assert layout_path(cast_path).name == "2026-01-01T00:00:00_host_work_1.layout.json"
+
+    compressed = cast_path.with_name(cast_path.name + ".gz")
+    assert track_path(compressed, "%12").name == "2026-01-01T00:00:00_host_work_1.pane-12.cast.gz"
+    assert layout_path(compressed) == layout_path(cast_path)
+
+
+def test_parse_panes():
+    """Test list-panes output becomes a snapshot of every pane."""
+    snapshot = parse_panes(PANES + "garbage\n", time=1.5)
+
+    assert snapshot.time == 1.5
+    assert (snapshot.width, snapshot.height) == (81, 24)
+    assert [(p.pane_id, p.left, p.width, p.active) for p in snapshot.panes] == [
+        ("%1", 0, 40, True), ("%2", 41, 40, False)
+    ]
+    assert parse_panes("") is None
+
+
+def test_same_as_ignores_time():
+    """Test snapshots only differ when the arrangement does."""
+    first = parse_panes(PANES, time=0.0)
+
+    assert first.same_as(parse_panes(PANES, time=9.0))
+    assert not first.same_as(parse_panes(PANES.replace("\t1\t81", "\t0\t81"), time=0.0))
+
+
+def test_layout_round_trip(tmp_path):
+    """Test a saved layout loads back unchanged."""
+    layout = TrackLayout(recording_id="work:@1", window_id="@1", timestamp=100,
+                         snapshots=[parse_panes(PANES)])
+    path = tmp_path / "test.layout.json"
+
+    save_layout(path, layout)
+
+    assert load_layout(path) == layout
+    assert load_layout(tmp_path / "missing.layout.json") is None
+
+
+def test_cast_writer(tmp_path):
+    """Test output is timed from the shared clock and split characters are kept whole."""
+    cast_path = tmp_path / "test.cast"
+    writer = CastWriter(cast_path, 80, 24, started=100.0, timestamp=1234)
+
+    writer.output("é".encode()[:1], at=100.5)
+    writer.output("é!".encode()[1:], at=101.25)
+    writer.event("r", "100x30", at=102.0)
+    writer.close()
+
+    lines = cast_path.read_text().splitlines()
+    header = json.loads(lines[0])
+    assert (header["version"], header["width"], header["height"], header["timestamp"]) == (2, 80, 24, 1234)
+    assert [json.loads(line) for line in lines[1:]] == [[1.25, "o", "é!"], [2.0, "r", "100x30"]]
+    assert writer.events == 2
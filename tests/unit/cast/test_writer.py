@@ -0,0 +1,170 @@
+"""Tests for the cast writer and its meter."""
+import json
+
+import pytest
+
+from tvmux.cast import load_idle_map
+from tvmux.cast import writer as writer_module
+from tvmux.cast.writer import CastWriter, WriteMeter
+
+
+def test_counts_bytes_and_events(tmp_path):
+    """Test a writer counts what it writes, header included, and so does its meter."""
+    meter = WriteMeter()
+    writer = CastWriter(tmp_path / "a.cast", 80, 24, meter=meter)
+    writer.output("✓ done\r\n".encode())
+    writer.event("r", "100x30")
+    writer.close()
+
+    size = (tmp_path / "a.cast").stat().st_size
+    assert writer.bytes_written == size
+    assert writer.events == 2
+    assert (meter.bytes, meter.events) == (size, 2)
+    assert json.loads((tmp_path / "a.cast").read_text(encoding="utf-8").splitlines()[1])[2] == "✓ done\r\n"
+
+
+def test_meter_shared_between_writers(tmp_path):
+    """Test one meter adds up several writers."""
+    meter = WriteMeter()
+    first = CastWriter(tmp_path / "a.cast", 80, 24, meter=meter)
+    second = CastWriter(tmp_path / "b.cast", 80, 24, meter=meter)
+    first.output(b"a")
+    second.output(b"b")
+    first.close()
+    second.close()
+
+    assert meter.bytes == first.bytes_written + second.bytes_written
+    assert meter.events == 2
+
+
+def test_meter_rate_covers_recent_writes(monkeypatch):
+    """Test the rate averages writes over the window, forgetting older ones."""
+    now = [1000.0]
+    monkeypatch.setattr(writer_module.time, "monotonic", lambda: now[0])
+    meter = WriteMeter()
+
+    meter.add(500)
+    now[0] += 2
+    meter.add(500)
+    assert meter.rate() == 1000 / writer_module.RATE_WINDOW
+
+    now[0] += writer_module.RATE_WINDOW - 1
+    assert meter.rate() == 500 / writer_module.RATE_WINDOW
+    now[0] += 5
+    assert meter.rate() == 0.0
+    assert meter.bytes == 1000
+
+
+def test_buffered_writer_waits_for_flush(tmp_path):
+    """Test a buffered writer leaves events for flush(), apart from the header."""
+    writer = CastWriter(tmp_path / "a.cast", 80, 24, buffered=True)
+    header_size = (tmp_path / "a.cast").stat().st_size
+    writer.output(b"held")
+    assert (tmp_path / "a.cast").stat().st_size == header_size
+
+    writer.flush()
+    assert (tmp_path / "a.cast").stat().st_size == writer.bytes_written
+    writer.close()
+
+
+def _events(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()[1:]]
+
+
+def test_size_sequence_becomes_resize(tmp_path):
+    """Test output that sets a new terminal size is followed by a resize event."""
+    writer = CastWriter(tmp_path / "a.cast", 80, 24)
+    writer.output(b"before\033[8;30;100tafter")
+    writer.output(b"\033[8;30;100tsame size")
+    writer.close()
+
+    assert [event[1:] for event in _events(tmp_path / "a.cast")] == [
+        ["o", "before\033[8;30;100t"],
+        ["r", "100x30"],
+        ["o", "after"],
+        ["o", "\033[8;30;100tsame size"],
+    ]
+    assert (writer.width, writer.height) == (100, 30)
+
+
+def test_size_sequence_split_across_output(tmp_path):
+    """Test a size sequence cut in two is held back until the rest arrives."""
+    writer = CastWriter(tmp_path / "a.cast", 80, 24)
+    writer.output(b"text\033[8;4")
+    writer.output(b"0;120tmore\033")
+    writer.close()
+
+    assert [event[1:] for event in _events(tmp_path / "a.cast")] == [
+        ["o", "text"],
+        ["o", "\033[8;40;120t"],
+        ["r", "120x40"],
+        ["o", "more"],
+        ["o", "\033"],
+    ]
+
+
+def test_v3_header_and_intervals(tmp_path):
+    """Test a v3 cast has a term header and times counted from the event before."""
+    writer = CastWriter(tmp_path / "a.cast", 80, 24, started=100.0, timestamp=1, version=3)
+    writer.output(b"a", at=100.5)
+    writer.marker("pane %1", at=101.25)
+    writer.output(b"b", at=101.0)  # Arrived late, so kept after the marker
+    writer.exit(0, at=103.0)
+    writer.close()
+
+    header, *events = [json.loads(line) for line in (tmp_path / "a.cast").read_text().splitlines()]
+    assert header["version"] == 3
+    assert (header["term"]["cols"], header["term"]["rows"], header["timestamp"]) == (80, 24, 1)
+    assert events == [[0.5, "o", "a"], [0.75, "m", "pane %1"], [0.0, "o", "b"], [1.75, "x", "0"]]
+
+
+def test_v2_has_no_exit_events(tmp_path):
+    """Test exit events are left out of v2 casts, and bad versions are refused."""
+    writer = CastWriter(tmp_path / "a.cast", 80, 24, started=0.0, version=2)
+    writer.marker("here", at=1.0)
+    writer.exit(1, at=2.0)
+    writer.close()
+
+    lines = (tmp_path / "a.cast").read_text().splitlines()
+    assert [json.loads(line) for line in lines[1:]] == [[1.0, "m", "here"]]
+
+    with pytest.raises(ValueError):
+        CastWriter(tmp_path / "b.cast", 80, 24, version=1)
+
+
+def test_idle_gaps_capped_as_written(tmp_path):
+    """Test long gaps are written as the limit and noted in the sidecar straight away."""
+    path = tmp_path / "a.cast"
+    writer = CastWriter(path, 80, 24, started=0.0, idle_time_limit=2.0)
+    writer.output(b"a", at=1.0)
+    writer.output(b"b", at=61.0)
+
+    idle_map = load_idle_map(path)  # Already there while the cast is being written
+    assert [(p.start, p.original_start, p.original, p.stored) for p in idle_map.periods] == \
+        [(1.0, 1.0, 60.0, 2.0)]
+
+    writer.marker("late", at=60.5)  # Arrived late, not a gap after the last output
+    writer.output(b"c", at=62.5)
+    writer.close()
+
+    header, *events = [json.loads(line) for line in path.read_text().splitlines()]
+    assert header["idle_time_limit"] == 2.0
+    assert events == [[1.0, "o", "a"], [3.0, "o", "b"], [2.5, "m", "late"], [4.5, "o", "c"]]
+    idle_map = load_idle_map(path)
+    assert idle_map.removed == 58.0
+    assert idle_map.original_duration == 62.5
+    assert idle_map.original_time(4.5) == 62.5
+
+
+def test_idle_gaps_capped_in_v3(tmp_path):
+    """Test a v3 cast's interval after a long gap is the limit."""
+    path = tmp_path / "a.cast"
+    writer = CastWriter(path, 80, 24, started=0.0, version=3, idle_time_limit=2.0)
+    writer.output(b"a", at=1.0)
+    writer.output(b"b", at=61.0)
+    writer.output(b"c", at=61.5)
+    writer.close()
+
+    _, *events = [json.loads(line) for line in path.read_text().splitlines()]
+    assert events == [[1.0, "o", "a"], [2.0, "o", "b"], [0.5, "o", "c"]]
+    assert load_idle_map(path).removed == 58.0
@@ -0,0 +1,14 @@
+"""Tests for the CLI generated from the API routes."""
+from tvmux.cli.api_cli import api, api_routes
+
+
+def test_routes_of_included_routers():
+    """Test routes registered on included routers are found, with their full paths."""
+    paths = {route.path for route in api_routes()}
+    assert "/hook" in paths
+    assert "/recordings/{recording_id}" in paths
+
+
+def test_hook_command_generated():
+    """Test tmux hooks have the command they call."""
+    assert "create" in api.commands["hook"].commands
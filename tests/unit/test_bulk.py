@@ -0,0 +1,213 @@
+"""Tests for bulk recording operations."""
+import asyncio
+import subprocess
+import threading
+import time
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import pytest
+
+from tvmux.server import bulk, window_monitor
+from tvmux.server.state import recorders
+
+
+@pytest.fixture
+def fake_recorders():
+    """Replace the global recorders with fakes for the test."""
+    original = dict(recorders)
+    recorders.clear()
+
+    def make(recording_id, stop=None):
+        recording = Mock()
+        recording.cast_path = f"/tmp/{recording_id}.cast"
+        recording.stop = stop or Mock()
+        recorders[recording_id] = recording
+        return recording
+
+    yield make
+
+    recorders.clear()
+    recorders.update(original)
+
+
+def test_select_recordings_all(fake_recorders):
+    """Test selecting every recording when no filter is given."""
+    fake_recorders("main:@1")
+    fake_recorders("work:@2")
+
+    assert bulk.select_recordings() == ["main:@1", "work:@2"]
+
+
+def test_select_recordings_by_session(fake_recorders):
+    """Test selecting recordings belonging to one session."""
+    fake_recorders("main:@1")
+    fake_recorders("main:@3")
+    fake_recorders("mainframe:@2")
+
+    assert bulk.select_recordings(session_id="main") == ["main:@1", "main:@3"]
+
+
+def test_select_recordings_by_ids(fake_recorders):
+    """Test explicit IDs are passed through, even unknown ones."""
+    fake_recorders("main:@1")
+
+    assert bulk.select_recordings(recording_ids=["main:@1", "nope:@9"]) == ["main:@1", "nope:@9"]
+
+
+def test_stop_recordings_results(fake_recorders):
+    """Test per-recording results and removal from the active set."""
+    first = fake_recorders("main:@1")
+    fake_recorders("main:@2", stop=Mock(side_effect=RuntimeError("boom")))
+
+    results = bulk.stop_recordings(["main:@1", "missing:@5", "main:@2"])
+
+    assert [r.recording_id for r in results] == ["main:@1", "missing:@5", "main:@2"]
+    assert [r.status for r in results] == ["stopped", "not_found", "error"]
+    assert results[0].cast_path == "/tmp/main:@1.cast"
+    assert results[2].error == "boom"
+    first.stop.assert_called_once()
+    assert recorders == {}
+
+
+def test_stop_recordings_runs_concurrently(fake_recorders):
+    """Test that slow stops overlap instead of adding up."""
+    barrier = threading.Barrier(5, timeout=2)
+
+    for i in range(5):
+        fake_recorders(f"main:@{i}", stop=Mock(side_effect=barrier.wait))
+
+    start = time.monotonic()
+    results = bulk.stop_recordings(list(recorders), timeout=5)
+
+    assert all(r.status == "stopped" for r in results)
+    assert time.monotonic() - start < 2
+
+
+def test_stop_recordings_deadline(fake_recorders):
+    """Test that stops missing the deadline are reported as timeouts."""
+    release = threading.Event()
+    fake_recorders("main:@1")
+    fake_recorders("main:@2", stop=Mock(side_effect=lambda: release.wait(5)))
+
+    try:
+        results = bulk.stop_recordings(["main:@1", "main:@2"], timeout=0.2)
+    finally:
+        release.set()
+
+    assert [r.status for r in results] == ["stopped", "timeout"]
+    assert "main:@2" not in recorders
+
+
+def test_queue_stops_after_queued_work(fake_recorders):
+    """Test a queued stop runs after the recording's queued work, off the event loop, within the deadline."""
+    order = []
+    fake_recorders("main:@1", stop=Mock(side_effect=lambda: order.append("stop")))
+    release = threading.Event()
+    fake_recorders("main:@2", stop=Mock(side_effect=lambda: release.wait(5)))
+
+    async def switch():
+        await asyncio.sleep(0.05)
+        order.append("switch")
+
+    async def scenario():
+        bulk.work_queues.submit("main:@1", switch)
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        try:
+            return await bulk.queue_stops(["main:@1", "missing:@5", "main:@2"], timeout=0.3), ticks
+        finally:
+            ticker.cancel()
+            release.set()
+            await bulk.work_queues.join(5.0)
+
+    results, ticks = asyncio.run(scenario())
+
+    assert [r.status for r in results] == ["stopped", "not_found", "timeout"]
+    assert order == ["switch", "stop"]
+    assert ticks > 10  # The loop kept running while the stops waited
+    assert recorders == {}
+
+
+def test_closed_windows_stopped_on_their_queues(fake_recorders):
+    """Test the closed window check queues each stop instead of stopping in the caller."""
+    fake_recorders("main:@1")
+    closed = fake_recorders("main:@2")
+
+    async def scenario():
+        with patch.object(window_monitor, "get_current_windows", return_value={"main:@1"}):
+            window_monitor.queue_cleanup()
+            assert await bulk.work_queues.join(5.0)
+
+    asyncio.run(scenario())
+
+    closed.stop.assert_called_once()
+    assert list(recorders) == ["main:@1"]
+
+
+def test_list_window_targets_parses_tmux_output():
+    """Test parsing list-windows output, including names containing the separator."""
+    output = "main|@1|%1|editor\nmain|@2|%4|logs | errors\n"
+    completed = subprocess.CompletedProcess([], 0, stdout=output, stderr="")
+
+    with patch("subprocess.run", return_value=completed) as mock_run:
+        targets = bulk.list_window_targets("main")
+
+    assert mock_run.call_args[0][0][:4] == ["tmux", "list-windows", "-t", "main"]
+    assert [(t.window_id, t.active_pane, t.window_name) for t in targets] == [
+        ("@1", "%1", "editor"),
+        ("@2", "%4", "logs | errors"),
+    ]
+
+
+def test_list_window_targets_tmux_failure():
+    """Test that a failing tmux query gives no targets."""
+    completed = subprocess.CompletedProcess([], 1, stdout="", stderr="no server running")
+
+    with patch("subprocess.run", return_value=completed) as mock_run:
+        assert bulk.list_window_targets() == []
+
+    assert "-a" in mock_run.call_args[0][0]
+
+
+def test_start_recordings(fake_recorders):
+    """Test concurrent starts with already-active and failing windows."""
+    active = fake_recorders("main:@1")
+    active.active = True
+
+    class FakeRecording:
+        def __init__(self, id, session_id, window_id, coalesce_interval=None, all_panes=None):
+            self.id = id
+            self.cast_path = None
+
+        async def start(self, active_pane, output_dir, window_name=None):
+            if window_name == "broken":
+                raise RuntimeError("no reader")
+            await asyncio.sleep(0.01)
+            self.cast_path = str(output_dir / f"{window_name}.cast")
+
+    targets = [
+        bulk.WindowTarget(session_id="main", window_id="@1", active_pane="%1", window_name="one"),
+        bulk.WindowTarget(session_id="main", window_id="@2", active_pane="%2", window_name="two"),
+        bulk.WindowTarget(session_id="main", window_id="@3", active_pane="%3", window_name="broken"),
+        bulk.WindowTarget(session_id="main", window_id="@2", active_pane="%2", window_name="two"),
+    ]
+
+    with patch.object(bulk, "Recording", FakeRecording):
+        results = asyncio.run(bulk.start_recordings(targets, Path("/out")))
+
+    assert [(r.recording_id, r.status) for r in results] == [
+        ("main:@1", "already_active"),
+        ("main:@2", "started"),
+        ("main:@3", "error"),
+    ]
+    assert results[1].cast_path == "/out/two.cast"
+    assert results[2].error == "no reader"
+    assert set(recorders) == {"main:@1", "main:@2"}
@@ -0,0 +1,189 @@
+"""Tests for the recording catalog."""
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from tvmux.cast import compress_cast, convert_cast, index_path, update_index
+from tvmux.cast.segments import Manifest, Segment, manifest_path, save_manifest
+from tvmux.catalog import CATALOG_NAME, Catalog, parse_cast_filename
+
+
+def write_cast(path: Path, events: int = 10, timestamp: int = 1_700_000_000) -> Path:
+    """Write a cast with one event per second."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    header = {"version": 2, "width": 80, "height": 24, "timestamp": timestamp}
+    path.write_text(json.dumps(header) + "\n" + "".join(
+        json.dumps([i * 1.0, "o", f"line {i}\r\n"]) + "\n" for i in range(events)
+    ))
+    return path
+
+
+@pytest.fixture
+def catalog(tmp_path) -> Catalog:
+    """A catalog over an empty output directory."""
+    return Catalog(tmp_path)
+
+
+def test_parse_cast_filename():
+    """Test reading origin fields from cast names."""
+    assert parse_cast_filename("2025-01-01_1200_my-host_@3_vim_main.py.cast") == {
+        "host": "my-host", "window": "@3", "name": "vim_main.py", "segment": 0
+    }
+    assert parse_cast_filename("2025-01-01_1200_h_@3_build.part0002.cast.gz")["segment"] == 2
+    assert parse_cast_filename("2025-01-01_1200_h_@3_build.part0002.pane-7.cast") == {
+        "host": "h", "window": "@3", "name": "build.pane-7", "segment": 2
+    }
+    assert parse_cast_filename("2025-01-01_1200_h_@3_build.composite.cast")["name"] == "build.composite"
+    assert parse_cast_filename("2025-01-01_1200_h_@3_build.part0002.tvcast")["name"] == "build"
+    assert parse_cast_filename("random.cast") == {}
+
+
+def test_scan_adds_casts(catalog, tmp_path):
+    """Test a first scan catalogs every cast with its stats."""
+    write_cast(tmp_path / "2025-01" / "2025-01-01_1200_host_@1_build.cast", events=10)
+    write_cast(tmp_path / "2025-02" / "2025-02-01_1200_host_@2_logs.cast", events=5,
+               timestamp=1_800_000_000)
+
+    result = catalog.scan()
+
+    assert (result.added, result.updated, result.unchanged) == (2, 0, 0)
+    assert (tmp_path / CATALOG_NAME).exists()
+
+    entries = catalog.search()
+    assert [e.name for e in entries] == ["logs", "build"]
+    build = entries[1]
+    assert build.host == "host"
+    assert build.window == "@1"
+    assert build.events == 10
+    assert build.duration == 9.0
+    assert build.started == 1_700_000_000
+    assert build.ended == 1_700_000_009
+
+
+def test_scan_is_incremental(catalog, tmp_path):
+    """Test unchanged files are skipped and changed ones refreshed."""
+    cast = write_cast(tmp_path / "2025-01-01_1200_host_@1_build.cast", events=10)
+    other = write_cast(tmp_path / "2025-01-01_1200_host_@2_logs.cast")
+    catalog.scan()
+
+    with open(cast, "a") as f:
+        f.write(json.dumps([20.0, "o", "more"]) + "\n")
+    os.utime(cast, (1, 1))
+
+    result = catalog.scan()
+
+    assert (result.added, result.updated, result.unchanged) == (0, 1, 1)
+    assert catalog.search(name="build")[0].events == 11
+
+    other.unlink()
+    assert catalog.scan().removed == 1
+    assert [e.name for e in catalog.search()] == ["build"]
+
+
+def test_scan_only_reads(catalog, tmp_path):
+    """Test a scan uses a seek index it finds, but never writes one."""
+    cast = write_cast(tmp_path / "2025-01-01_1200_host_@1_build.cast", events=10)
+    indexed = write_cast(tmp_path / "2025-01-01_1200_host_@2_logs.cast", events=5)
+    update_index(indexed)
+    before = index_path(indexed).read_bytes()
+    with open(indexed, "a") as f:
+        f.write(json.dumps([7.0, "o", "more"]) + "\n")
+
+    catalog.scan()
+
+    assert not index_path(cast).exists()
+    assert index_path(indexed).read_bytes() == before
+    assert catalog.search(name="logs")[0].events == 6
+    assert catalog.search(name="build")[0].events == 10
+
+
+def test_scan_compressed_and_segments(catalog, tmp_path):
+    """Test compressed casts and manifest session info."""
+    first = write_cast(tmp_path / "2025-01-01_1200_host_@1_build.cast")
+    second = write_cast(tmp_path / "2025-01-01_1200_host_@1_build.part0001.cast",
+                        timestamp=1_700_000_100)
+    compressed = compress_cast(first)
+    save_manifest(manifest_path(first), Manifest(
+        recording_id="dev:@1", hostname="host", session_id="dev", window_id="@1",
+        window_name="build", segments=[
+            Segment(path=compressed.name, started=datetime.now()),
+            Segment(path=second.name, started=datetime.now()),
+        ]
+    ))
+
+    catalog.scan()
+
+    entries = catalog.search(session="dev")
+    assert [e.segment for e in entries] == [1, 0]
+    assert entries[1].path == str(compressed)
+    assert entries[1].events == 10
+    assert all(e.manifest == str(manifest_path(first)) for e in entries)
+
+
+def test_search_filters(catalog, tmp_path):
+    """Test searching by name, host, window, time and active state."""
+    catalog.add_cast(write_cast(tmp_path / "a.cast", timestamp=1000),
+                     host="alpha", session="s", window="@1", name="editor")
+    catalog.add_cast(write_cast(tmp_path / "b.cast", timestamp=2000),
+                     host="beta", session="s", window="@2", name="server logs", active=True)
+
+    assert [e.name for e in catalog.search(name="log")] == ["server logs"]
+    assert [e.host for e in catalog.search(host="alpha")] == ["alpha"]
+    assert [e.name for e in catalog.search(session="s", window="@2")] == ["server logs"]
+    assert [e.name for e in catalog.search(since=1500)] == ["server logs"]
+    assert [e.name for e in catalog.search(until=1500)] == ["editor"]
+    assert [e.name for e in catalog.search(active=False)] == ["editor"]
+    assert len(catalog.search(limit=1)) == 1
+
+
+def test_scan_resets_active(catalog, tmp_path):
+    """Test a scan with known active paths clears stale active flags."""
+    cast = write_cast(tmp_path / "a.cast")
+    catalog.add_cast(cast, active=True)
+
+    catalog.scan()
+    assert catalog.search()[0].active is True
+
+    catalog.scan(active=set)
+    assert catalog.search()[0].active is False
+
+
+def test_scan_gets_active_casts_once_done(catalog, tmp_path):
+    """Test a scan looks up active casts at its end, when recordings started meanwhile can be added."""
+    write_cast(tmp_path / "old.cast")
+    started = tmp_path / "new.cast"
+
+    def active():
+        # A recording starting as the scan finishes, as the server would add it
+        catalog.add_cast(write_cast(started), active=True)
+        return {str(started)}
+
+    catalog.scan(active=active)
+
+    assert {(Path(e.path).name, e.active) for e in catalog.search()} == {("old.cast", False), ("new.cast", True)}
+
+
+def test_remove(catalog, tmp_path):
+    """Test forgetting a cast."""
+    cast = write_cast(tmp_path / "a.cast")
+    catalog.add_cast(cast)
+
+    catalog.remove(cast)
+
+    assert catalog.search() == []
+
+
+def test_scan_binary(catalog, tmp_path):
+    """Test binary casts are catalogued with stats from their block headers."""
+    cast = write_cast(tmp_path / "2025-01-01_1200_host_@1_build.cast", events=10)
+    convert_cast(cast, tmp_path / "2025-01-01_1200_host_@1_build.tvcast", 2)
+    cast.unlink()
+
+    catalog.scan()
+
+    [entry] = catalog.search()
+    assert entry.path.endswith(".tvcast")
+    assert (entry.name, entry.events, entry.duration, entry.started) == ("build", 10, 9.0, 1_700_000_000)
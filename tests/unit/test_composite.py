@@ -0,0 +1,136 @@
+"""Tests for compositing a window's panes."""
+import json
+
+import pytest
+from bittty import Board
+
+from tvmux.cast.compress import open_cast
+from tvmux.cast.tracks import LayoutSnapshot, PaneGeometry
+from tvmux.composite import Compositor, composite_path, draw_borders, render_row
+
+
+def side_by_side(width=81, active=0) -> LayoutSnapshot:
+    """Two panes split left and right, with a border between them."""
+    left = (width - 1) // 2
+    return LayoutSnapshot(time=0.0, layout="", width=width, height=5, panes=[
+        PaneGeometry(pane_id="%1", index=0, left=0, top=0, width=left, height=5, active=active == 0),
+        PaneGeometry(pane_id="%2", index=1, left=left + 1, top=0, width=width - left - 1, height=5,
+                     active=active == 1),
+    ])
+
+
+def read_events(compositor):
+    """Get every event written so far."""
+    with open_cast(compositor.path) as f:
+        lines = f.read().decode().splitlines()
+    return json.loads(lines[0]), [json.loads(line) for line in lines[1:]]
+
+
+def replay(compositor) -> str:
+    """Play the composite into a terminal and get the screen's text."""
+    header, events = read_events(compositor)
+    board = Board(width=header["width"], height=header["height"])
+    for _, kind, data in events:
+        if kind == "o":
+            board.parser.feed(data)
+    return board.capture_text()
+
+
+def test_composite_path(tmp_path):
+    """Test the composite sits next to the window's cast."""
+    assert composite_path(tmp_path / "a_host_@1_work.cast") == tmp_path / "a_host_@1_work.composite.cast"
+    assert composite_path(tmp_path / "a_host_@1_work.cast.gz") == tmp_path / "a_host_@1_work.composite.cast.gz"
+
+
+def test_render_row_matches_bittty():
+    """Test rows render the same as bittty's own line renderer."""
+    board = Board(width=12, height=2)
+    board.parser.feed("a\033[1;31mbold red\033[0m 界\r\n\033[44mblue bg")
+    page = board.blitter.current_buffer
+
+    for y in range(2):
+        assert render_row(page.grid[y], 12) == page.get_line(y, width=12)
+        assert render_row(page.grid[y], 10) == page.get_line(y, width=10)
+
+
+def test_draw_borders():
+    """Test the border between panes, with joins where borders meet."""
+    board = Board(width=11, height=5)
+    snapshot = LayoutSnapshot(time=0.0, layout="", width=11, height=5, panes=[
+        PaneGeometry(pane_id="%1", index=0, left=0, top=0, width=5, height=5),
+        PaneGeometry(pane_id="%2", index=1, left=6, top=0, width=5, height=2),
+        PaneGeometry(pane_id="%3", index=2, left=6, top=3, width=5, height=2, active=True),
+    ])
+
+    board.parser.feed(draw_borders(snapshot))
+
+    rows = [board.blitter.current_buffer.get_line_text(y) for y in range(5)]
+    assert [row[5:] for row in rows] == ["│     ", "│     ", "├─────", "│     ", "│     "]
+    assert "\033[32m" in draw_borders(snapshot)
+
+
+@pytest.mark.parametrize("name", ["test.composite.cast", "test.composite.cast.gz"])
+def test_panes_laid_out(tmp_path, name):
+    """Test each pane's output lands in its place on the window, compressed or not."""
+    compositor = Compositor(tmp_path / name, started=0.0, timestamp=1)
+    compositor.set_layout(side_by_side())
+    compositor.feed("%1", b"left pane\r\n")
+    compositor.feed("%2", "right é".encode())
+
+    assert compositor.render(now=0.5)
+    compositor.close()
+
+    lines = replay(compositor).splitlines()
+    assert lines[0].startswith("left pane")
+    assert lines[0][40:] == "│right é"
+    assert all(line[40] == "│" for line in lines)
+
+
+def test_only_changed_rows_redrawn(tmp_path):
+    """Test a frame only carries the rows that changed."""
+    compositor = Compositor(tmp_path / "test.composite.cast", started=0.0, timestamp=1)
+    compositor.set_layout(side_by_side())
+    compositor.feed("%1", b"one\r\ntwo")
+    compositor.render(now=0.1)
+
+    compositor.feed("%2", b"\033[3;1Hthree")
+    compositor.feed("%1", b"\033[1;1Hone")  # Same as before
+    compositor.render(now=0.2)
+    assert not compositor.render(now=0.3)
+    compositor.close()
+
+    _, events = read_events(compositor)
+    assert len(events) == 2
+    last = events[-1][2]
+    assert "\033[3;42Hthree" in last
+    assert "one" not in last and "│" not in last
+
+
+def test_window_resize(tmp_path):
+    """Test the window changing size is written as a resize and a full redraw."""
+    compositor = Compositor(tmp_path / "test.composite.cast", started=0.0, timestamp=1)
+    compositor.set_layout(side_by_side())
+    compositor.feed("%1", b"kept")
+    compositor.render(now=0.1)
+
+    compositor.set_layout(side_by_side(width=101))
+    compositor.render(now=0.2)
+    compositor.close()
+
+    header, events = read_events(compositor)
+    assert (header["width"], header["height"]) == (81, 5)
+    assert events[1] == [0.2, "r", "101x5"]
+    assert "\033[2J" in events[2][2] and "kept" in events[2][2]
+    assert replay(compositor).splitlines()[0][50] == "│"
+
+
+def test_throttled(tmp_path):
+    """Test frames are only due once the interval has passed."""
+    compositor = Compositor(tmp_path / "test.composite.cast", started=0.0, timestamp=1, fps=4)
+    assert compositor.due() is None
+
+    compositor.set_layout(side_by_side())
+    compositor.render(now=10.0)
+    compositor.feed("%1", b"x")
+
+    assert compositor.due() == 10.25
@@ -0,0 +1,88 @@
+"""Tests for matching recorded output against patterns."""
+import asyncio
+import json
+import threading
+
+import pytest
+
+from tvmux.grep import PatternSet, grep_cast
+from tvmux.server.routers import grep as grep_router
+
+
+def test_pattern_set():
+    """Test reporting which of several patterns matched."""
+    patterns = PatternSet([r"ERR\w+", "panic"])
+
+    assert patterns.match("ERRNO and panic") == [r"ERR\w+", "panic"]
+    assert patterns.match("kernel panic") == ["panic"]
+    assert patterns.match("all good") == []
+
+
+def test_pattern_set_ignore_case():
+    """Test case-insensitive matching."""
+    assert PatternSet(["error"], ignore_case=True).match("ERROR") == ["error"]
+    assert PatternSet(["error"]).match("ERROR") == []
+
+
+def test_invalid_pattern():
+    """Test a bad regular expression is reported as ValueError."""
+    with pytest.raises(ValueError):
+        PatternSet(["(unclosed"])
+
+
+def test_grep_cast(tmp_path):
+    """Test matching cast output with escapes stripped and absolute times."""
+    cast = tmp_path / "a.cast"
+    cast.write_text(
+        json.dumps({"version": 2, "width": 80, "height": 24, "timestamp": 1000}) + "\n"
+        + json.dumps([0.5, "o", "\x1b[1mbuild\x1b[0m ok\r\n"]) + "\n"
+        + json.dumps([2.0, "o", "build failed"]) + "\n"
+    )
+
+    matches = list(grep_cast(cast, "s:@1", PatternSet(["^build"])))
+
+    assert [(m.at, m.text) for m in matches] == [(1000.5, "build ok"), (1002.0, "build failed")]
+    assert matches[0].recording_id == "s:@1"
+
+
+def test_live_matches_made_off_the_relay_thread(monkeypatch):
+    """Test the relay thread only queues lines, which the endpoint matches, dropping them if it falls behind."""
+    class FakeRelay:
+        listener = None
+
+        def subscribe(self, listener):
+            self.listener = listener
+
+        def unsubscribe(self, listener):
+            self.listener = None
+
+    relay = FakeRelay()
+    monkeypatch.setattr(grep_router, "get_relay", lambda: relay)
+    monkeypatch.setattr(grep_router, "QUEUE_SIZE", 3)
+    patterns = PatternSet(["fail"])
+    matched_in = []
+    match = patterns.match
+    monkeypatch.setattr(patterns, "match", lambda line: matched_in.append(threading.current_thread()) or match(line))
+
+    async def scenario():
+        stream = grep_router._live_matches(patterns)
+        first = asyncio.ensure_future(stream.__anext__())
+        while relay.listener is None:
+            await asyncio.sleep(0)
+
+        def relay_thread():
+            for index, line in enumerate(["ok", "build failed", "fail again", "dropped fail"]):
+                relay.listener("s:@1", 1000.0 + index, line)
+
+        thread = threading.Thread(target=relay_thread)
+        thread.start()
+        thread.join()
+        results = [await first, await stream.__anext__()]
+        await stream.aclose()
+        return results
+
+    results = [json.loads(line) for line in asyncio.run(scenario())]
+
+    assert [(r["at"], r["text"]) for r in results] == [(1001.0, "build failed"), (1002.0, "fail again")]
+    assert set(matched_in) == {threading.main_thread()}
+    assert relay.listener is None
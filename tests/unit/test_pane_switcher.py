@@ -0,0 +1,133 @@
+"""Tests for debouncing pane selections."""
+import asyncio
+from unittest.mock import Mock
+
+import pytest
+
+from tvmux.models.recording import SwitchStats
+from tvmux.server.pane_switcher import PaneSwitcher
+from tvmux.server.state import recorders
+
+SETTLE = 0.05
+
+
+@pytest.fixture
+def fake_recording():
+    """Replace the global recorders with fakes that note their switches."""
+    original = dict(recorders)
+    recorders.clear()
+
+    def make(recording_id, active_pane="%1"):
+        recording = Mock()
+        recording.active = True
+        recording.active_pane = active_pane
+        recording.switch_stats = SwitchStats()
+        recording.switches = []
+
+        def switch_pane(pane_id):
+            recording.switches.append(pane_id)
+            recording.active_pane = pane_id
+        recording.switch_pane = switch_pane
+        recorders[recording_id] = recording
+        return recording
+
+    yield make
+
+    recorders.clear()
+    recorders.update(original)
+
+
+def test_burst_switches_once_to_latest(fake_recording):
+    """Test a burst of selections costs one switch, to the last pane selected."""
+    recording = fake_recording("main:@1")
+
+    async def scenario():
+        switcher = PaneSwitcher()
+        for pane_id in ("%2", "%3", "%4"):
+            switcher.select("main:@1", pane_id, SETTLE)
+            await asyncio.sleep(SETTLE / 5)
+        assert recording.switches == []
+        assert switcher.pending("main:@1") == "%4"
+        await asyncio.sleep(SETTLE * 3)
+        assert switcher.pending("main:@1") is None
+
+    asyncio.run(scenario())
+
+    assert recording.switches == ["%4"]
+    assert recording.switch_stats == SwitchStats(requested=3, switched=1, skipped=2)
+
+
+def test_back_to_recorded_pane_is_skipped(fake_recording):
+    """Test a burst that ends on the pane already recorded doesn't switch at all."""
+    recording = fake_recording("main:@1", active_pane="%1")
+
+    async def scenario():
+        switcher = PaneSwitcher()
+        switcher.select("main:@1", "%2", SETTLE)
+        switcher.select("main:@1", "%1", SETTLE)
+        await asyncio.sleep(SETTLE * 3)
+
+    asyncio.run(scenario())
+
+    assert recording.switches == []
+    assert recording.switch_stats == SwitchStats(requested=2, switched=0, skipped=2)
+
+
+def test_settled_selections_each_switch(fake_recording):
+    """Test selections further apart than the settle time are each followed."""
+    recording = fake_recording("main:@1")
+
+    async def scenario():
+        switcher = PaneSwitcher()
+        switcher.select("main:@1", "%2", SETTLE)
+        await asyncio.sleep(SETTLE * 3)
+        switcher.select("main:@1", "%3", SETTLE)
+        await asyncio.sleep(SETTLE * 3)
+
+    asyncio.run(scenario())
+
+    assert recording.switches == ["%2", "%3"]
+    assert recording.switch_stats.skipped == 0
+
+
+def test_windows_settle_separately(fake_recording):
+    """Test one window's selections don't hold up or replace another's."""
+    first = fake_recording("main:@1")
+    second = fake_recording("main:@2", active_pane="%5")
+
+    async def scenario():
+        switcher = PaneSwitcher()
+        switcher.select("main:@1", "%2", SETTLE)
+        switcher.select("main:@2", "%6", SETTLE)
+        await asyncio.sleep(SETTLE * 3)
+
+    asyncio.run(scenario())
+
+    assert first.switches == ["%2"]
+    assert second.switches == ["%6"]
+
+
+def test_stopped_recording_not_switched(fake_recording):
+    """Test nothing happens if the recording stops before the selection settles."""
+    recording = fake_recording("main:@1")
+
+    async def scenario():
+        switcher = PaneSwitcher()
+        switcher.select("main:@1", "%2", SETTLE)
+        recording.active = False
+        await asyncio.sleep(SETTLE * 3)
+        assert switcher.pending("main:@1") is None
+
+    asyncio.run(scenario())
+
+    assert recording.switches == []
+
+
+def test_unrecorded_window_ignored(fake_recording):
+    """Test selections in windows nobody records are dropped straight away."""
+    async def scenario():
+        switcher = PaneSwitcher()
+        switcher.select("main:@9", "%2", SETTLE)
+        assert switcher.pending("main:@9") is None
+
+    asyncio.run(scenario())
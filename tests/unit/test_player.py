@@ -0,0 +1,133 @@
+"""Tests for playing casts in the TUI player."""
+import asyncio
+import gzip
+import json
+from importlib.metadata import version
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from textual.app import App
+from textual_asciinema import AsciinemaPlayer
+from textual_asciinema.engine import PlaybackEngine
+from textual_asciinema.parser import CastParser
+from textual_asciinema.video_file import VideoFile
+
+from tvmux.cast import update_index
+from tvmux.cast.events import EventClock
+from tvmux.tui import player
+from tvmux.tui.player import AsciicastParser, CastPlayer, EventVideoFile
+
+
+def write_v3(path: Path, events: int = 10) -> Path:
+    """Write a v3 cast with an output event every half second."""
+    path.write_text(json.dumps({"version": 3, "term": {"cols": 40, "rows": 10}}) + "\n" + "".join(
+        json.dumps([0.5, "o", f"line {i}\r\n"]) + "\n" for i in range(events)
+    ) + "# a comment\n" + json.dumps([0.5, "x", "0"]) + "\n")
+    return path
+
+
+@pytest.mark.parametrize("compressed", [False, True])
+def test_v3_cast_read_as_it_plays(tmp_path, compressed):
+    """Test v3 casts, plain or compressed, play with times since the start and no copy."""
+    path = write_v3(tmp_path / "v3.cast")
+    if compressed:
+        gz_path = tmp_path / "v3.cast.gz"
+        gz_path.write_bytes(gzip.compress(path.read_bytes()))
+        path.unlink()
+        path = gz_path
+
+    parser = AsciicastParser(path)
+
+    assert (parser.header.version, parser.header.width, parser.header.height) == (2, 40, 10)
+    assert parser.duration == 5.5
+    events = list(parser.events())
+    assert [e[0] for e in events[:3]] == [0.5, 1.0, 1.5]
+    assert events[-1] == [5.5, "x", "0"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == [path.name]
+
+
+def test_duration_from_seek_index(tmp_path):
+    """Test the duration comes from the cast's seek index, without reading the cast through."""
+    path = write_v3(tmp_path / "v3.cast")
+    update_index(path)
+
+    with patch.object(player, "open_cast", side_effect=AssertionError("read the cast")):
+        assert AsciicastParser(path).duration == 5.5
+
+
+def test_frames_from_seek_with_index(tmp_path):
+    """Test frames from a time on are read from the seek index's entry, not the start."""
+    path = write_v3(tmp_path / "v3.cast", events=200)
+    update_index(path, every_seconds=10.0)
+    fed = []
+    feed = EventClock.feed
+
+    def counting_feed(clock, line):
+        fed.append(line)
+        return feed(clock, line)
+
+    with patch.object(EventClock, "feed", counting_feed):
+        frames = list(AsciicastParser(path).frames_from(60.0))
+
+    assert [(f.timestamp, f.data) for f in frames[:2]] == [(60.0, "line 119\r\n"), (60.5, "line 120\r\n")]
+    assert len(fed) < 110  # Not the 119 events before 60s, only those from there on
+
+
+def test_player_seeks_through_v3_cast(tmp_path):
+    """Test the player reads a v3 cast through its parser, forwards and back."""
+    path = write_v3(tmp_path / "v3.cast")
+
+    class PlayerApp(App):
+        def compose(self):
+            yield CastPlayer(path)
+
+    async def scenario():
+        app = PlayerApp()
+        async with app.run_test() as pilot:
+            player = app.query_one(CastPlayer)
+            assert isinstance(player.engine.video_file, EventVideoFile)
+            await player.seek(4.0)
+            await player.seek(1.0)
+            await pilot.pause()
+            return player.engine.current_time, player.engine.video_file.next_event
+
+    current_time, next_event = asyncio.run(scenario())
+
+    assert current_time == 1.0
+    assert next_event == [1.5, "o", "line 2\r\n"]
+
+
+def test_pinned_player_internals(tmp_path):
+    """Test the textual_asciinema internals the player relies on are still as it expects.
+
+    textual_asciinema is pinned, as the parsers and CastPlayer replace
+    private parts of it. If this fails after changing the pin, update
+    tvmux.tui.player to match before anything else.
+    """
+    path = write_v3(tmp_path / "v3.cast")
+    v2_path = tmp_path / "v2.cast"
+    v2_path.write_text(json.dumps({"version": 2, "width": 40, "height": 10}) + "\n")
+
+    assert version("textual-asciinema") == "0.1.0"
+
+    # Parsers get their header and duration from these, and set up what __init__ does
+    class Sentinel(CastParser):
+        def _parse_header(self):
+            return "header"
+
+        def _calculate_duration(self):
+            return 12.5
+
+    assert (Sentinel(v2_path).header, Sentinel(v2_path).duration) == ("header", 12.5)
+    assert set(vars(AsciicastParser(path))) == set(vars(CastParser(v2_path)))
+
+    # CastPlayer sets up what AsciinemaPlayer.__init__ does, without its parser
+    assert set(vars(CastPlayer(path))) == set(vars(AsciinemaPlayer(v2_path)))
+
+    # The engine reads frames from a video file that compose() swaps out
+    engine = PlaybackEngine(CastParser(v2_path), None)
+    assert isinstance(engine.video_file, VideoFile)
+    for method in ("get_frames_until", "restart", "cleanup"):
+        assert callable(getattr(VideoFile, method))
+    engine.video_file.cleanup()
@@ -0,0 +1,207 @@
+"""Tests for the recorder that writes every recording's cast."""
+import json
+import os
+import threading
+import time
+
+from tvmux.cast import binary
+from tvmux.cast.binary import BinaryCast, BinaryCastWriter
+from tvmux.cast.writer import CastWriter
+from tvmux.recorder import Recorder
+from tvmux.relay import Relay
+
+
+def wait_for(condition, timeout=5.0):
+    """Wait until condition() is true."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out")
+        time.sleep(0.01)
+
+
+def read_cast(path):
+    """Get a cast's header and events."""
+    header, *events = [json.loads(line) for line in path.read_text().splitlines()]
+    return header, events
+
+
+def test_writes_relayed_output_until_input_ends(tmp_path):
+    """Test output relayed to the recorder ends up in the cast, which is closed at the end."""
+    source, sink = tmp_path / "in.fifo", tmp_path / "out.fifo"
+    os.mkfifo(source)
+    os.mkfifo(sink)
+
+    recorder, relay = Recorder(), Relay()
+    recorder.add("s:@1", sink, CastWriter(tmp_path / "s.cast", 120, 40, buffered=True))
+    relay.add("s:@1", source, sink, timeout=0.1)  # The recorder is reading already
+
+    for part in ("first ", "second ", "✓"):
+        with open(source, "wb") as f:
+            f.write(part.encode())
+
+    relay.remove("s:@1")
+    stats = recorder.remove("s:@1")
+
+    header, events = read_cast(tmp_path / "s.cast")
+    assert (header["width"], header["height"]) == (120, 40)
+    assert "".join(event[2] for event in events) == "first second ✓"
+    assert stats.bytes_in == len("first second ✓".encode())
+    assert stats.events == len(events)
+    assert recorder.stats("s:@1") is None
+
+
+def test_many_casts_in_one_thread(tmp_path):
+    """Test one thread writes every cast, each flushed while it is still open."""
+    recorder = Recorder()
+    writers = {}
+    for index in range(50):
+        fifo = tmp_path / f"{index}.fifo"
+        os.mkfifo(fifo)
+        recorder.add(f"s:@{index}", fifo, CastWriter(tmp_path / f"{index}.cast", 80, 24, buffered=True))
+        writers[index] = open(fifo, "wb", buffering=0)
+
+    for index, writer in writers.items():
+        writer.write(f"window {index}\r\n".encode())
+    wait_for(lambda: all(recorder.stats(f"s:@{index}").bytes_in for index in writers))
+
+    threads = [thread for thread in threading.enumerate() if thread.name == "tvmux-recorder"]
+    assert len(threads) == 1
+    wait_for(lambda: all(len(read_cast(tmp_path / f"{index}.cast")[1]) == 1 for index in writers))
+
+    for index, writer in writers.items():
+        writer.close()
+        recorder.remove(f"s:@{index}")
+        _, events = read_cast(tmp_path / f"{index}.cast")
+        assert [event[2] for event in events] == [f"window {index}\r\n"]
+    wait_for(lambda: not any(thread.name == "tvmux-recorder" for thread in threading.enumerate()))
+
+
+def test_resize_written_between_output(tmp_path):
+    """Test a resize is written as an event of its own, after the output read so far, once per size."""
+    fifo = tmp_path / "out.fifo"
+    os.mkfifo(fifo)
+
+    recorder = Recorder()
+    recorder.add("s:@1", fifo, CastWriter(tmp_path / "s.cast", 80, 24, buffered=True))
+    with open(fifo, "wb", buffering=0) as writer:
+        writer.write(b"\x1b[1;3")
+        wait_for(lambda: recorder.stats("s:@1").bytes_in == 5)
+        assert recorder.resize("s:@1", 100, 30)
+        assert recorder.resize("s:@1", 100, 30)
+        writer.write(b"1mred")
+    recorder.remove("s:@1")
+
+    _, events = read_cast(tmp_path / "s.cast")
+    assert [(event[1], event[2]) for event in events] == [("o", "\x1b[1;3"), ("r", "100x30"), ("o", "1mred")]
+    assert not recorder.resize("s:@1", 90, 30)
+
+
+def test_rollover_switches_casts_at_marker(tmp_path):
+    """Test output goes into the next cast from the marker on, even split between reads, or when cut."""
+    fifo = tmp_path / "out.fifo"
+    os.mkfifo(fifo)
+    marker = b"\x1bPtvmux;segment;1\x1b\\"
+
+    recorder = Recorder()
+    recorder.add("s:@1", fifo, CastWriter(tmp_path / "0.cast", 80, 24, buffered=True))
+    switched = recorder.rollover("s:@1", CastWriter(tmp_path / "1.cast", 80, 24, buffered=True), marker)
+    with open(fifo, "wb", buffering=0) as writer:
+        writer.write(b"old \x1bP" + marker[:6])
+        wait_for(lambda: recorder.stats("s:@1").bytes_in == 12)
+        assert not switched.is_set()
+        writer.write(marker[6:] + b"new")
+        assert switched.wait(5)
+
+        # Nothing like the marker turns up for the next one, so it is cut where the output has got to
+        recorder.rollover("s:@1", CastWriter(tmp_path / "2.cast", 80, 24, buffered=True), b"\x1bPnever\x1b\\")
+        writer.write(b" more \x1bP")
+        wait_for(lambda: recorder.stats("s:@1").bytes_in == len(marker) + 17)
+        recorder.cut("s:@1")
+        writer.write(b"last")
+    recorder.remove("s:@1")
+
+    outputs = ["".join(event[2] for event in read_cast(tmp_path / f"{n}.cast")[1]) for n in range(3)]
+    assert outputs == ["old \x1bP", "new more \x1bP", "last"]
+    unused = CastWriter(tmp_path / "3.cast", 80, 24)
+    assert recorder.rollover("s:@1", unused, marker) is None
+    unused.close()
+
+
+def test_remove_gives_up_waiting(tmp_path):
+    """Test a cast is closed with what has arrived if its input doesn't end in time."""
+    fifo = tmp_path / "out.fifo"
+    os.mkfifo(fifo)
+
+    recorder = Recorder()
+    recorder.add("s:@1", fifo, CastWriter(tmp_path / "s.cast", 80, 24, buffered=True))
+    with open(fifo, "wb", buffering=0) as writer:
+        writer.write(b"still open")
+        stats = recorder.remove("s:@1", timeout=0.2)
+
+    _, events = read_cast(tmp_path / "s.cast")
+    assert "".join(event[2] for event in events) == "still open"
+    assert stats.bytes_in == 10
+
+
+def test_held_binary_block_written_once_old(tmp_path, monkeypatch):
+    """Test a block a binary writer holds back is written once it's old enough, without more output."""
+    monkeypatch.setattr(binary, "BLOCK_AGE", 0.2)
+    fifo = tmp_path / "in.fifo"
+    os.mkfifo(fifo)
+    recorder = Recorder()
+    recorder.add("s:@1", fifo, BinaryCastWriter(tmp_path / "s.tvcast", 80, 24, buffered=True))
+
+    with open(fifo, "wb", buffering=0) as f:
+        f.write(b"quiet after this")
+
+        def written():
+            with BinaryCast(tmp_path / "s.tvcast") as cast:
+                return [event[2] for event in cast.events()] == ["quiet after this"]
+        wait_for(written)
+
+    recorder.remove("s:@1")
+
+
+class StuckWriter(CastWriter):
+    """A cast writer on a disk that stops responding until released."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.released = threading.Event()
+
+    def output(self, data, at):
+        self.released.wait()
+        super().output(data, at)
+
+
+def test_slow_track_doesnt_hold_up_other_recordings(tmp_path):
+    """Test a track whose writer is stuck on disk doesn't stop the relay passing on other output."""
+    track_source, track_sink = tmp_path / "pane.in.fifo", tmp_path / "pane.fifo"
+    source, sink = tmp_path / "in.fifo", tmp_path / "out.fifo"
+    for fifo in (track_source, track_sink, source, sink):
+        os.mkfifo(fifo)
+
+    recorder, relay = Recorder(), Relay()
+    writer = StuckWriter(tmp_path / "pane.cast", 80, 24, buffered=True)
+    recorder.add("s:@1/%1", track_sink, writer)
+    relay.add_track("s:@1/%1", "s:@1", track_source, track_sink, timeout=0.1)
+    other = os.open(sink, os.O_RDONLY | os.O_NONBLOCK)
+    relay.add("s:@2", source, sink, timeout=0.1)
+
+    with open(track_source, "wb") as f:
+        f.write(b"x" * 200_000)
+    wait_for(lambda: relay.stats("s:@1/%1").bytes_in == 200_000)
+
+    with open(source, "wb") as f:
+        f.write(b"other window")
+    wait_for(lambda: relay.stats("s:@2").bytes_out == 12, timeout=1.0)
+    assert os.read(other, 100) == b"other window"
+
+    writer.released.set()
+    relay.remove("s:@1/%1")
+    recorder.remove("s:@1/%1")
+    relay.remove("s:@2")
+    os.close(other)
+    _, events = read_cast(tmp_path / "pane.cast")
+    assert sum(len(event[2]) for event in events) == 200_000
@@ -0,0 +1,285 @@
+"""Tests for the Recording model."""
+import asyncio
+import io
+import json
+import os
+import subprocess
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import Mock
+
+import pytest
+
+from tvmux.cast import open_cast
+from tvmux.cast.compress import CompressedCastWriter
+from tvmux.cast.segments import Manifest, Segment, load_manifest, save_manifest
+from tvmux.cast.writer import CastWriter
+from tvmux.catalog import Catalog
+from tvmux.config import Config, get_config, set_config
+from tvmux.models import Recording
+from tvmux.models import recording as recording_module
+from tvmux.search import SearchIndex
+
+
+@pytest.fixture
+def config():
+    """Install a fresh config for the test."""
+    original = get_config()
+    config = Config()
+    set_config(config)
+    yield config
+    set_config(original)
+
+
+@pytest.fixture
+def recording(tmp_path):
+    """An active recording writing to a cast in tmp_path."""
+    cast_path = tmp_path / "rec.cast"
+    cast_path.write_text(json.dumps({"version": 2}) + "\n" + json.dumps([0.5, "o", "hi"]) + "\n")
+
+    recording = Recording(id="main:@1", session_id="main", window_id="@1")
+    recording.active = True
+    recording.cast_path = str(cast_path)
+    recording.first_cast_path = cast_path
+    recording.segment_started = time.monotonic()
+    return recording
+
+
+def test_no_rollover_by_default(config, recording):
+    """Test segmenting is off unless configured."""
+    assert recording.needs_rollover() is False
+
+
+def test_rollover_by_size(config, recording):
+    """Test the size limit."""
+    config.recording.segment_max_bytes = 10
+
+    assert recording.needs_rollover() is True
+
+    config.recording.segment_max_bytes = 10_000
+    assert recording.needs_rollover() is False
+
+
+def test_rollover_by_age(config, recording):
+    """Test the age limit."""
+    config.recording.segment_max_seconds = 60
+
+    assert recording.needs_rollover() is False
+
+    recording.segment_started -= 61
+    assert recording.needs_rollover() is True
+
+
+def test_no_rollover_while_rolling(config, recording):
+    """Test a rollover in progress isn't started again."""
+    config.recording.segment_max_bytes = 1
+    recording.rolling_over = True
+
+    assert recording.needs_rollover() is False
+
+
+@pytest.mark.parametrize("compressed", [False, True])
+def test_rollover_loses_no_output(config, recording, tmp_path, monkeypatch, compressed):
+    """Test output written while a rollover happens is all in one segment or the other."""
+    if compressed:
+        config.recording.compression = "gzip"
+        recording.cast_path = str(tmp_path / "rec.cast.gz")
+        recording.first_cast_path = tmp_path / "rec.cast.gz"
+    first = Path(recording.cast_path)
+    recording.active_pane = "%1"
+    recording.input_fifo_path = tmp_path / "in.fifo"
+    recording.fifo_path = tmp_path / "out.fifo"
+    os.mkfifo(recording.input_fifo_path)
+    os.mkfifo(recording.fifo_path)
+    Path(recording.cast_path).unlink(missing_ok=True)
+    monkeypatch.setattr(recording, "_query_pane_size", lambda pane_id: (80, 24), raising=False)
+    monkeypatch.setattr(recording, "_switch_stream", lambda pane_id, before: False, raising=False)
+    monkeypatch.setattr(recording, "_dump_pane", lambda pane_id, key=None, history=0:
+                        recording_module.get_relay().write(key or recording.id, b"<snapshot>"), raising=False)
+    recording._start_writer()
+    asyncio.run(recording._connect_relay())
+
+    written = []
+    writing = threading.Event()
+
+    def write():
+        with open(recording.input_fifo_path, "wb", buffering=0) as f:
+            for index in range(2000):
+                line = f"line {index}\n".encode()
+                f.write(line)
+                written.append(line)
+                writing.set()
+                if index % 100 == 0:
+                    time.sleep(0.01)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    writing.wait()
+    finish_segment = asyncio.run(recording.rollover())
+    writer.join()
+    finish_segment()
+    recording._close_writer()
+
+    suffix = ".cast.gz" if compressed else ".cast"
+    assert recording.cast_path == str(tmp_path / f"rec.part0001{suffix}")
+    old, new = cast_output(first), cast_output(Path(recording.cast_path))
+    assert new.count("<snapshot>") == 1
+    assert old + new.replace("<snapshot>", "") == b"".join(written).decode()
+    assert old and new.replace("<snapshot>", "")  # Output on both sides of the cut
+
+
+def cast_output(cast_path: Path) -> str:
+    """Get all of a cast's output."""
+    with open_cast(cast_path) as f:
+        f.readline()
+        return "".join(event[2] for event in map(json.loads, f) if event[1] == "o")
+
+
+def test_finish_segment_updates_manifest(config, recording, tmp_path):
+    """Test closing a segment records when it ended and its size."""
+    manifest = tmp_path / "rec.manifest.json"
+    save_manifest(manifest, Manifest(
+        recording_id="main:@1", hostname="host", session_id="main", window_id="@1", window_name="w",
+        segments=[Segment(path="rec.cast", started=datetime.now())]
+    ))
+    recording.manifest_path = str(manifest)
+
+    recording._finish_segment()
+
+    segment = load_manifest(manifest).segments[0]
+    assert segment.path == "rec.cast"
+    assert segment.ended is not None
+    assert segment.bytes == Path(recording.cast_path).stat().st_size
+
+
+def test_finish_cast_indexes_plain(config, recording, tmp_path):
+    """Test that an uncompressed cast gets a seek index."""
+    recording._finish_cast(Path(recording.cast_path))
+
+    assert (tmp_path / "rec.cast.idx").exists()
+
+
+@pytest.mark.parametrize("compressed", [False, True])
+def test_finish_cast_keeps_idle_capped_cast(config, recording, tmp_path, compressed):
+    """Test a cast capped, and compressed, as it was written is left as it was."""
+    config.recording.idle_time_limit = 5.0
+    cast_path = tmp_path / ("rec.cast.gz" if compressed else "rec.cast")
+    writer_class = CompressedCastWriter if compressed else CastWriter
+    writer = writer_class(cast_path, 80, 24, started=0.0, idle_time_limit=5.0)
+    writer.output(b"hi", at=0.5)
+    writer.output(b"back", at=3600.5)
+    writer.close()
+    written = cast_path.read_bytes()
+
+    recording._finish_cast(cast_path)
+
+    assert cast_path.read_bytes() == written
+    assert not (tmp_path / "rec.cast.gz.gz").exists()
+    sidecar = json.loads(cast_path.with_name(cast_path.name + ".idle.json").read_text())
+    assert sidecar["removed"] == 3595.0
+
+
+def test_finish_segment_updates_catalog(config, recording, tmp_path):
+    """Test a finished cast replaces its active catalog row."""
+    recording.output_dir = tmp_path
+    recording.window_name = "build"
+    recording._catalog(Path(recording.cast_path), True)
+
+    recording._finish_segment()
+
+    entries = Catalog(tmp_path).search()
+    assert [(e.path, e.active) for e in entries] == [(recording.cast_path, False)]
+    assert entries[0].session == "main"
+    assert entries[0].name == "build"
+
+
+@pytest.mark.parametrize("compressed", [False, True])
+def test_text_indexed_while_idle_capped(config, recording, tmp_path, compressed):
+    """Test a cast indexed while it was written, with idle gaps capped, is indexed once, in stored time."""
+    config.recording.idle_time_limit = 5.0
+    recording.output_dir = tmp_path
+    if compressed:
+        cast_path = tmp_path / "rec.cast.gz"
+        recording.cast_path = str(cast_path)
+        writer = CompressedCastWriter(cast_path, 80, 24, started=0.0, idle_time_limit=5.0, frame_size=1)
+    else:
+        cast_path = Path(recording.cast_path)
+        writer = CastWriter(cast_path, 80, 24, started=0.0, idle_time_limit=5.0)
+    recording._catalog(cast_path, True)
+    search_index = SearchIndex(Catalog(tmp_path))
+
+    writer.output(b"before the gap\r\n", at=1.0)
+    assert search_index.index_cast(cast_path) == 1  # Periodic indexing while recording
+    writer.output(b"after the gap\r\n", at=3601.0)
+    assert search_index.index_cast(cast_path) == 1
+    writer.output(b"last", at=3602.0)
+    writer.close()
+
+    recording._finish_segment()
+
+    hits = search_index.search("gap")
+    assert sorted((hit.text, hit.time, hit.path) for hit in hits) == [
+        ("after the gap", 6.0, str(cast_path)), ("before the gap", 1.0, str(cast_path))
+    ]
+    assert [hit.time for hit in search_index.search("last")] == [7.0]
+
+
+def test_rewritten_cast_indexed_again(config, recording, tmp_path):
+    """Test a cast a repair rewrote is indexed from the start, not from its old offset."""
+    recording.output_dir = tmp_path
+    cast_path = Path(recording.cast_path)
+    recording._catalog(cast_path, True)
+    search_index = SearchIndex(Catalog(tmp_path))
+    with open(cast_path, "a") as f:
+        f.write("not an event\n" + json.dumps([1.0, "o", " there\r\n"]) + "\n")
+    search_index.index_cast(cast_path)
+    with open(cast_path, "a") as f:
+        f.write(json.dumps([2.0, "o", "next line, long enough to outlast the damage\r\n"]) + "\n")
+
+    recording._finish_segment()
+
+    assert "not an event" not in cast_path.read_text()  # Rewritten without the damaged line
+    assert [hit.text for hit in search_index.search("there")] == ["hi there"]
+    assert [hit.text for hit in search_index.search("next")] == ["next line, long enough to outlast the damage"]
+
+
+def test_copy_capture_streams_history(recording, monkeypatch):
+    """Test captured lines are copied in chunks, CRLF ended, without a final newline."""
+    commands = []
+    real_popen = subprocess.Popen
+
+    def fake_popen(command, **kwargs):
+        commands.append(command)
+        return real_popen(["printf", "old\\nline two\\n\\nbottom\\n"], **kwargs)
+
+    monkeypatch.setattr(recording_module.subprocess, "Popen", fake_popen)
+    monkeypatch.setattr(recording_module, "CAPTURE_CHUNK_SIZE", 4)
+    out = io.BytesIO()
+
+    recording._copy_capture("main:@1.%1", out, history=500)
+
+    assert out.getvalue() == b"old\r\nline two\r\n\r\nbottom"
+    assert commands[0][-2:] == ["-S", "-500"]
+
+
+def test_stream_command_escapes_tmux_expansion(tmp_path):
+    """Test pane FIFO names survive tmux's format and strftime expansion."""
+    command = recording_module._stream_command(tmp_path / "window_@2.pane_%14.in.fifo", b"\033Pend\033\\")
+    assert "pane_%%14.in.fifo" in command
+    assert "printf '\\033Pend\\033\\\\'" in command
+
+
+def test_resize_written_once_per_change(recording, monkeypatch):
+    """Test a resize goes to the recorder as its own event, only when the pane's size changed."""
+    sizes = iter([(100, 30), (100, 30), (90, 30)])
+    monkeypatch.setattr(recording, "_query_pane_size", lambda pane_id: next(sizes), raising=False)
+    recorder = Mock()
+    monkeypatch.setattr(recording_module, "get_recorder", lambda: recorder)
+    recording.active_pane = "%1"
+
+    for _ in range(3):
+        recording.resize_panes()
+
+    assert [c.args for c in recorder.resize.call_args_list] == [(recording.id, 100, 30), (recording.id, 90, 30)]
@@ -0,0 +1,409 @@
+"""Tests for the output relay."""
+import logging
+import os
+import threading
+import time
+
+import pytest
+
+from tvmux.relay import Relay, set_pipe_size
+
+
+def wait_for(condition, timeout=5.0):
+    """Wait until condition() is true."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out")
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def fifos(tmp_path):
+    """An input FIFO, an output FIFO and a thread collecting the output."""
+    source = tmp_path / "in.fifo"
+    sink = tmp_path / "out.fifo"
+    os.mkfifo(source)
+    os.mkfifo(sink)
+
+    received = []
+
+    def read():
+        with open(sink, "rb") as f:
+            while chunk := f.read1(4096):
+                received.append(chunk)
+        received.append(None)  # End of file
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    return source, sink, received
+
+
+def test_relays_until_removed(fifos):
+    """Test output from several writers arrives in order, then end-of-file."""
+    source, sink, received = fifos
+    relay = Relay()
+    relay.add("s:@1", source, sink)
+
+    for part in (b"first ", b"second ", b"third"):
+        with open(source, "wb") as f:  # Writers come and go
+            f.write(part)
+
+    relay.remove("s:@1")
+    wait_for(lambda: received and received[-1] is None)
+
+    assert b"".join(received[:-1]) == b"first second third"
+
+
+def test_listeners_get_lines(fifos):
+    """Test listeners see each line of output once it is complete."""
+    source, sink, received = fifos
+    relay = Relay()
+    lines = []
+    relay.subscribe(lambda recording_id, at, line: lines.append((recording_id, line)))
+    relay.add("s:@1", source, sink)
+
+    with open(source, "wb") as f:
+        f.write(b"\x1b[31mred\x1b[0m text\r\nhalf")
+    wait_for(lambda: lines)
+    assert lines == [("s:@1", "red text")]
+
+    with open(source, "wb") as f:
+        f.write(b" done\n")
+    wait_for(lambda: len(lines) == 2)
+    assert lines[1] == ("s:@1", "half done")
+
+    relay.remove("s:@1")
+
+
+def test_snapshot_written_after_output_without_listeners(fifos):
+    """Test a snapshot follows the output read so far, and listeners don't see it as new lines."""
+    source, sink, received = fifos
+    relay = Relay()
+    lines = []
+    tapped = bytearray()
+    relay.subscribe(lambda recording_id, at, line: lines.append(line))
+    relay.add_track("s:@1/%2", "s:@1", source, sink, tap=tapped.extend)
+
+    with open(source, "wb") as f:
+        f.write(b"live\n")
+    assert relay.write("s:@1/%2", b"\x1b[2Jold screen\r\n")
+    with open(source, "wb") as f:
+        f.write(b"more\n")
+    wait_for(lambda: len(lines) == 2)
+
+    relay.remove("s:@1/%2")
+    wait_for(lambda: received and received[-1] is None)
+    assert b"".join(received[:-1]) == b"live\n\x1b[2Jold screen\r\nmore\n"
+    assert bytes(tapped) == b"live\n\x1b[2Jold screen\r\nmore\n"
+    assert lines == ["live", "more"]
+    assert not relay.write("s:@1/%2", b"gone")
+
+
+def test_unsubscribed_listener(fifos):
+    """Test a listener stops getting lines after unsubscribing."""
+    source, sink, received = fifos
+    relay = Relay()
+    lines = []
+
+    def listener(recording_id, at, line):
+        lines.append(line)
+
+    relay.subscribe(listener)
+    relay.unsubscribe(listener)
+    relay.add("s:@1", source, sink)
+
+    with open(source, "wb") as f:
+        f.write(b"unseen\n")
+    relay.remove("s:@1")
+
+    assert lines == []
+
+
+def test_add_without_reader(tmp_path):
+    """Test adding fails if nothing opens the output FIFO."""
+    source = tmp_path / "in.fifo"
+    sink = tmp_path / "out.fifo"
+    os.mkfifo(source)
+    os.mkfifo(sink)
+
+    with pytest.raises(OSError):
+        Relay().add("s:@1", source, sink, timeout=0.1)
+
+
+@pytest.fixture
+def stalled(tmp_path):
+    """An input FIFO and an output FIFO whose reader hasn't started reading yet."""
+    source = tmp_path / "in.fifo"
+    sink = tmp_path / "out.fifo"
+    os.mkfifo(source)
+    os.mkfifo(sink)
+
+    reader_fd = os.open(sink, os.O_RDONLY | os.O_NONBLOCK)
+    yield source, sink, reader_fd
+    os.close(reader_fd)
+
+
+def write_in_background(path, data):
+    """Write to a FIFO from another thread, since it may block."""
+    def write():
+        with open(path, "wb") as f:
+            f.write(data)
+
+    writer = threading.Thread(target=write, daemon=True)
+    writer.start()
+    return writer
+
+
+def read_until_eof(fd):
+    """Read everything from a non-blocking FIFO until its writer closes it."""
+    chunks = []
+    while True:
+        try:
+            chunk = os.read(fd, 65536)
+        except BlockingIOError:
+            time.sleep(0.01)
+            continue
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
+
+
+def test_drop_policy_counts_overflow(stalled):
+    """Test output is dropped and counted, not waited for, when the writer stalls."""
+    source, sink, reader_fd = stalled
+    relay = Relay()
+    relay.add("s:@1", source, sink, buffer_bytes=8192, policy="drop", pipe_size=4096)
+
+    write_in_background(source, b"x" * 500_000).join(timeout=5)
+    wait_for(lambda: relay.stats("s:@1").bytes_in == 500_000)
+
+    stats = relay.stats("s:@1")
+    assert stats.overflows == 1
+    assert stats.dropped_bytes > 0
+    assert stats.buffered <= 8192
+    assert stats.stalled_seconds > 0
+
+    reader = threading.Thread(target=read_until_eof, args=(reader_fd,), daemon=True)
+    reader.start()
+    stats = relay.remove("s:@1")
+    reader.join(timeout=5)
+    assert stats.bytes_in == stats.bytes_out + stats.dropped_bytes
+
+
+def test_resync_after_overflow(stalled):
+    """Test the backlog is dropped and a redraw requested once the writer catches up."""
+    source, sink, reader_fd = stalled
+    relay = Relay()
+    resyncs = []
+    relay.add("s:@1", source, sink, buffer_bytes=8192, policy="resync", pipe_size=4096,
+              on_resync=lambda: resyncs.append(True))
+
+    write_in_background(source, b"x" * 500_000).join(timeout=5)
+    wait_for(lambda: relay.stats("s:@1").bytes_in == 500_000)
+    assert relay.stats("s:@1").buffered == 0
+
+    # Start reading again
+    reader = threading.Thread(target=read_until_eof, args=(reader_fd,), daemon=True)
+    reader.start()
+    wait_for(lambda: resyncs)
+
+    stats = relay.remove("s:@1")
+    reader.join(timeout=5)
+    assert stats.resyncs == 1
+    assert stats.overflows == 1
+
+
+def test_block_policy_keeps_everything(stalled):
+    """Test the block policy stops reading when full and loses nothing."""
+    source, sink, reader_fd = stalled
+    relay = Relay()
+    relay.add("s:@1", source, sink, buffer_bytes=8192, policy="block", pipe_size=4096)
+
+    data = os.urandom(200_000)
+    writer = write_in_background(source, data)
+    time.sleep(0.2)
+    assert writer.is_alive()  # Held up by the full buffer
+    assert relay.stats("s:@1").blocked_seconds > 0
+
+    result = []
+    reader = threading.Thread(target=lambda: result.append(read_until_eof(reader_fd)), daemon=True)
+    reader.start()
+    writer.join(timeout=5)
+
+    stats = relay.remove("s:@1")
+    reader.join(timeout=5)
+    assert result == [data]
+    assert stats.dropped_bytes == 0
+
+
+def test_unknown_policy(tmp_path):
+    """Test an unknown overflow policy is rejected before opening anything."""
+    with pytest.raises(ValueError):
+        Relay().add("s:@1", tmp_path / "in.fifo", tmp_path / "out.fifo", policy="wait")
+
+
+def test_pipe_size_failure_warns(caplog):
+    """Test a FIFO that can't be resized keeps its size, with a warning."""
+    read_fd, write_fd = os.pipe()
+    os.close(read_fd)
+    os.close(write_fd)
+
+    with caplog.at_level(logging.WARNING, logger="tvmux.relay"):
+        set_pipe_size(read_fd, 1024 * 1024)
+        set_pipe_size(read_fd, 0)
+
+    assert len(caplog.records) == 1
+    assert "system default" in caplog.text
+
+
+def test_coalesces_small_writes(fifos):
+    """Test many small writes within the interval reach the writer in a few large ones."""
+    source, sink, received = fifos
+    relay = Relay()
+    relay.add("s:@1", source, sink, coalesce_interval=0.2)
+
+    with open(source, "wb", buffering=0) as f:
+        for number in range(200):
+            f.write(b"%d\n" % number)
+    wait_for(lambda: relay.stats("s:@1").bytes_in == relay.stats("s:@1").bytes_out
+             and relay.stats("s:@1").bytes_out > 0)
+
+    stats = relay.remove("s:@1")
+    wait_for(lambda: received and received[-1] is None)
+    assert b"".join(received[:-1]) == b"".join(b"%d\n" % number for number in range(200))
+    assert stats.writes < 5
+
+
+def test_coalesce_byte_cap(fifos):
+    """Test held output is written early once enough has piled up."""
+    source, sink, received = fifos
+    relay = Relay()
+    relay.add("s:@1", source, sink, coalesce_interval=60.0, coalesce_bytes=1000)
+
+    with open(source, "wb") as f:
+        f.write(b"x" * 1500)
+    wait_for(lambda: relay.stats("s:@1").bytes_out == 1500)
+
+    relay.remove("s:@1")
+
+
+def test_track_relayed_to_its_writer(fifos):
+    """Test a track's output goes to its writer's FIFO, and to its tap."""
+    source, sink, received = fifos
+
+    relay = Relay()
+    lines = []
+    tapped = bytearray()
+    relay.subscribe(lambda recording_id, at, line: lines.append((recording_id, line)))
+    relay.add_track("s:@1/%2", "s:@1", source, sink, tap=tapped.extend)
+
+    with open(source, "wb") as f:
+        f.write("background ✓\n".encode())
+    wait_for(lambda: lines)
+
+    stats = relay.remove("s:@1/%2")
+    wait_for(lambda: received and received[-1] is None)
+    assert b"".join(received[:-1]) == "background ✓\n".encode()
+    assert lines == [("s:@1", "background ✓")]
+    assert bytes(tapped) == "background ✓\n".encode()
+    assert stats.bytes_out == len("background ✓\n".encode())
+
+
+def test_forward_track_to_recording(fifos, tmp_path):
+    """Test forwarded track output reaches the recording's writer too, until stopped."""
+    source, sink, received = fifos
+    pane_source = tmp_path / "pane.fifo"
+    pane_sink = tmp_path / "pane.out.fifo"
+    os.mkfifo(pane_source)
+    os.mkfifo(pane_sink)
+    pane_reader = os.open(pane_sink, os.O_RDONLY | os.O_NONBLOCK)
+
+    relay = Relay()
+    relay.add("s:@1", source, sink)
+    relay.add_track("s:@1/%2", "s:@1", pane_source, pane_sink)
+    relay.forward("s:@1/%2", "s:@1")
+
+    with open(pane_source, "wb") as f:
+        f.write(b"shown")
+    wait_for(lambda: relay.stats("s:@1").bytes_out == 5)
+
+    relay.forward("s:@1/%2", None)
+    with open(pane_source, "wb") as f:
+        f.write(b"hidden")
+    wait_for(lambda: relay.stats("s:@1/%2").bytes_out == 11)
+
+    relay.remove("s:@1/%2")
+    relay.remove("s:@1")
+    wait_for(lambda: received and received[-1] is None)
+    assert b"".join(received[:-1]) == b"shown"
+    assert read_until_eof(pane_reader) == b"shownhidden"
+    os.close(pane_reader)
+
+
+def test_switch_waits_for_end_marker(fifos, tmp_path):
+    """Test a switched-to stream is held until the old one ends, then follows its prelude."""
+    source, sink, received = fifos
+    old_source = tmp_path / "old.fifo"
+    new_source = tmp_path / "new.fifo"
+    os.mkfifo(old_source)
+    os.mkfifo(new_source)
+
+    relay = Relay()
+    relay.add("s:@1", source, sink)
+    relay.hold("s:@1/%1#1", "s:@1", old_source, b"\x1bPend;1\x1b\\")
+    relay.switch("s:@1", "s:@1/%1#1", "s:@1", b"[one]")
+    with open(old_source, "wb") as f:
+        f.write(b"a1 ")
+
+    relay.hold("s:@1/%2#2", "s:@1", new_source, b"\x1bPend;2\x1b\\")
+    with open(new_source, "wb") as f:
+        f.write(b"b1 ")
+    relay.switch("s:@1/%1#1", "s:@1/%2#2", "s:@1", b"[two]")
+    time.sleep(0.1)
+    assert relay.stats("s:@1").bytes_in == len(b"[one]a1 ")
+
+    # The marker can arrive in pieces
+    with open(old_source, "wb") as f:
+        f.write(b"a2 \x1bPend")
+    with open(old_source, "wb") as f:
+        f.write(b";1\x1b\\")
+    wait_for(lambda: relay.stats("s:@1/%1#1") is None)
+    with open(new_source, "wb") as f:
+        f.write(b"b2")
+    wait_for(lambda: relay.stats("s:@1").bytes_out == len(b"[one]a1 a2 [two]b1 b2"))
+
+    with open(new_source, "wb") as f:
+        f.write(b"\x1bPend;2\x1b\\")
+    relay.remove("s:@1/%2#2")
+    relay.remove("s:@1")
+    wait_for(lambda: received and received[-1] is None)
+    assert b"".join(received[:-1]) == b"[one]a1 a2 [two]b1 b2"
+
+
+def test_switch_gives_up_waiting(fifos, tmp_path):
+    """Test a switch goes ahead once the timeout is up if the old stream never ends."""
+    source, sink, received = fifos
+    old_source = tmp_path / "old.fifo"
+    new_source = tmp_path / "new.fifo"
+    os.mkfifo(old_source)
+    os.mkfifo(new_source)
+
+    relay = Relay()
+    relay.add("s:@1", source, sink)
+    relay.hold("old", "s:@1", old_source, b"\x1bPend;1\x1b\\")
+    relay.switch("s:@1", "old", "s:@1", b"")
+    relay.hold("new", "s:@1", new_source, b"\x1bPend;2\x1b\\")
+    with open(new_source, "wb") as f:
+        f.write(b"new")
+    relay.switch("old", "new", "s:@1", b"", timeout=0.1)
+
+    wait_for(lambda: relay.stats("s:@1").bytes_out == 3)
+    assert relay.stats("old") is None
+
+    with open(new_source, "wb") as f:
+        f.write(b"\x1bPend;2\x1b\\")
+    relay.remove("new")
+    relay.remove("s:@1")
+    wait_for(lambda: received and received[-1] is None)
+    assert b"".join(received[:-1]) == b"new"
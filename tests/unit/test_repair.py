@@ -0,0 +1,121 @@
+"""Tests for cast file repair."""
+import json
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from tvmux import repair
+from tvmux.repair import repair_cast_file, repair_cast_tail, validate_cast_file
+
+HEADER = json.dumps({"version": 2, "width": 80, "height": 24}) + "\n"
+
+
+def make_cast(tmp_path: Path, body: str) -> Path:
+    """Write a cast file with a standard header."""
+    cast_path = tmp_path / "test.cast"
+    cast_path.write_text(HEADER + body)
+    return cast_path
+
+
+def events(count: int, start: int = 0) -> str:
+    """Generate event lines."""
+    return "".join(json.dumps([i * 0.1, "o", f"line {i}\r\n"]) + "\n" for i in range(start, start + count))
+
+
+def test_intact_file_untouched(tmp_path):
+    """Test that a valid file is left exactly as it was."""
+    cast_path = make_cast(tmp_path, events(10))
+    before = cast_path.read_bytes()
+
+    assert repair_cast_file(cast_path) is True
+    assert cast_path.read_bytes() == before
+
+
+def test_truncated_last_event(tmp_path):
+    """Test that a half-written last event is cut off in place."""
+    good = events(10)
+    cast_path = make_cast(tmp_path, good + '[1.5, "o", "trunc')
+
+    assert repair_cast_file(cast_path) is True
+    assert cast_path.read_text() == HEADER + good
+    assert validate_cast_file(cast_path)
+    assert not cast_path.with_suffix(".cast.backup").exists()
+
+
+def test_missing_final_newline(tmp_path):
+    """Test that an intact last event without a newline gets one."""
+    cast_path = make_cast(tmp_path, events(3).rstrip("\n"))
+
+    assert repair_cast_file(cast_path) is True
+    assert cast_path.read_text() == HEADER + events(3)
+
+
+def test_header_only_with_truncated_event(tmp_path):
+    """Test truncating back to the header."""
+    cast_path = make_cast(tmp_path, '[0.1, "o"')
+
+    assert repair_cast_file(cast_path) is True
+    assert cast_path.read_text() == HEADER
+
+
+def test_tail_scan_spans_chunks(tmp_path):
+    """Test finding the last intact line across several read chunks."""
+    good = events(2000)
+    cast_path = make_cast(tmp_path, good + "[9.9, " + "x" * 300)
+
+    with patch.object(repair, "CHUNK_SIZE", 97):
+        assert repair_cast_tail(cast_path) is True
+
+    assert cast_path.read_text() == HEADER + good
+
+
+def test_mid_file_damage_falls_back_to_rewrite(tmp_path):
+    """Test that damage between intact events triggers a full rewrite."""
+    cast_path = make_cast(tmp_path, events(5) + "[garbage\n" + events(5, start=5) + "[trunc")
+
+    assert repair_cast_tail(cast_path) is None
+    assert repair_cast_file(cast_path) is True
+    assert cast_path.read_text() == HEADER + events(10)
+    assert cast_path.with_suffix(".cast.backup").exists()
+
+
+def test_damage_beyond_scan_limit(tmp_path):
+    """Test that a tail with no intact line in range needs a rewrite."""
+    cast_path = make_cast(tmp_path, events(5) + "[" + "x" * 5000)
+
+    assert repair_cast_tail(cast_path, scan_limit=1024) is None
+
+
+def test_bad_header(tmp_path):
+    """Test that an unreadable header can't be repaired."""
+    cast_path = tmp_path / "bad.cast"
+    cast_path.write_text('{"version": 2,\n' + events(2))
+
+    assert repair_cast_tail(cast_path) is False
+    assert repair_cast_file(cast_path) is False
+
+
+def test_missing_file(tmp_path):
+    """Test repairing a file that doesn't exist."""
+    assert repair_cast_file(tmp_path / "nope.cast") is False
+
+
+@pytest.mark.parametrize("backup", [True, False])
+def test_full_repair(tmp_path, backup):
+    """Test forcing a full rewrite."""
+    cast_path = make_cast(tmp_path, events(3) + "[bad\n" + events(1, start=3))
+
+    assert repair_cast_file(cast_path, backup=backup, full=True) is True
+    assert cast_path.read_text() == HEADER + events(4)
+    assert cast_path.with_suffix(".cast.backup").exists() is backup
+
+
+def test_comments_kept(tmp_path):
+    """Test v3 comment lines count as intact and survive a full rewrite."""
+    cast_path = make_cast(tmp_path, events(3) + "# note\n" + 'not json\n' + events(2, start=3))
+
+    assert validate_cast_file(cast_path)
+    assert repair_cast_file(cast_path, backup=False, full=True) is True
+    assert "# note\n" in cast_path.read_text()
+    assert "not json" not in cast_path.read_text()
@@ -0,0 +1,173 @@
+"""Tests for full-text search over recordings."""
+import asyncio
+import json
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import pytest
+
+from tvmux.cast import BinaryCastWriter, compress_cast
+from tvmux.catalog import Catalog
+from tvmux.search import SearchIndex
+from tvmux.server import search_monitor
+
+
+def write_cast(path: Path, outputs, timestamp: int = 1_700_000_000) -> Path:
+    """Write a cast with one output event per second."""
+    header = {"version": 2, "width": 80, "height": 24, "timestamp": timestamp}
+    path.write_text(json.dumps(header) + "\n" + "".join(
+        json.dumps([i * 1.0, "o", data]) + "\n" for i, data in enumerate(outputs)
+    ))
+    return path
+
+
+def append_events(path: Path, events):
+    """Append (time, data) output events to a cast."""
+    with open(path, "a") as f:
+        for time, data in events:
+            f.write(json.dumps([time, "o", data]) + "\n")
+
+
+@pytest.fixture
+def catalog(tmp_path) -> Catalog:
+    """A catalog over tmp_path."""
+    return Catalog(tmp_path)
+
+
+@pytest.fixture
+def search_index(catalog) -> SearchIndex:
+    """A search index in the catalog's database."""
+    return SearchIndex(catalog)
+
+
+def test_search_finished_cast(catalog, search_index, tmp_path):
+    """Test finding a line with its recording and time."""
+    cast = write_cast(tmp_path / "build.cast", [
+        "$ make\r\n", "\x1b[31merror:\x1b[0m connection refused\r\n", "$ "
+    ])
+    catalog.add_cast(cast, host="box", session="dev", name="build")
+
+    assert search_index.index_cast(cast, final=True) == 3
+
+    hits = search_index.search("connection refused")
+    assert len(hits) == 1
+    assert hits[0].text == "error: connection refused"
+    assert hits[0].time == 1.0
+    assert hits[0].at == 1_700_000_001
+    assert (hits[0].path, hits[0].host, hits[0].session, hits[0].name) == (str(cast), "box", "dev", "build")
+
+    assert search_index.search("refused connection") == []
+    assert search_index.search("dev", session="other") == []
+
+
+def test_incremental_indexing(catalog, search_index, tmp_path):
+    """Test that a growing cast is only read from where indexing stopped."""
+    cast = write_cast(tmp_path / "live.cast", ["first line\r\n", "second "])
+    catalog.add_cast(cast, active=True)
+
+    assert search_index.index_cast(cast) == 1
+    assert search_index.search("second") == []
+
+    append_events(cast, [(2.0, "half\r\n"), (3.0, "third line\r\n")])
+    with open(cast, "a") as f:
+        f.write('[4.0, "o", "partial')  # Still being written
+
+    assert search_index.index_cast(cast) == 2
+    assert [h.time for h in search_index.search("second half")] == [1.0]
+    assert search_index.index_cast(cast) == 0
+
+
+def test_update_and_removal(catalog, search_index, tmp_path):
+    """Test update() indexes new casts and removed casts drop their text."""
+    cast = write_cast(tmp_path / "2025-01-01_1200_host_@1_logs.cast", ["needle in a haystack\r\n"])
+    catalog.scan()
+
+    assert search_index.update() == 1
+    assert search_index.update() == 0
+    assert len(search_index.search("needle")) == 1
+
+    cast.unlink()
+    catalog.scan()
+
+    assert search_index.search("needle") == []
+
+
+def test_rename_keeps_text(catalog, search_index, tmp_path):
+    """Test compressing a cast moves its text to the new path."""
+    cast = write_cast(tmp_path / "a.cast", ["kept after compression\r\n"])
+    catalog.add_cast(cast)
+    search_index.index_cast(cast, final=True)
+
+    compressed = compress_cast(cast)
+    catalog.rename(cast, compressed)
+    catalog.add_cast(compressed)
+
+    assert search_index.update() == 0
+    assert [h.path for h in search_index.search("compression")] == [str(compressed)]
+
+
+def test_raw_queries(catalog, search_index, tmp_path):
+    """Test FTS5 syntax in raw mode and that plain mode quotes it."""
+    cast = write_cast(tmp_path / "a.cast", ["alpha beta\r\n", "gamma\r\n"])
+    catalog.add_cast(cast)
+    search_index.index_cast(cast, final=True)
+
+    assert [h.text for h in search_index.search("alpha OR gamma", raw=True)] == ["gamma", "alpha beta"]
+    assert search_index.search("alpha OR gamma") == []
+    assert [h.text for h in search_index.search("gam*", raw=True)] == ["gamma"]
+
+    with pytest.raises(ValueError):
+        search_index.search('"unbalanced', raw=True)
+
+
+def test_incremental_indexing_v3(catalog, search_index, tmp_path):
+    """Test a growing v3 cast keeps its times since the start between updates."""
+    cast = tmp_path / "live.cast"
+    cast.write_text(json.dumps({"version": 3, "term": {"cols": 80, "rows": 24}, "timestamp": 100}) + "\n"
+                    + '[1.0, "o", "first line\\r\\n"]\n[0.5, "m", "pane %1"]\n')
+    catalog.add_cast(cast, active=True)
+
+    assert search_index.index_cast(cast) == 1
+
+    with open(cast, "a") as f:
+        f.write('[2.0, "o", "second line\\r\\n"]\n')
+
+    assert search_index.index_cast(cast) == 1
+    hits = search_index.search("second")
+    assert [(h.time, h.at) for h in hits] == [(3.5, 103.5)]
+
+
+def test_incremental_indexing_binary(catalog, search_index, tmp_path):
+    """Test a growing binary cast is indexed a block at a time."""
+    cast = tmp_path / "live.tvcast"
+    writer = BinaryCastWriter(cast, 80, 24, started=0.0, timestamp=100)
+    writer.output(b"first line\r\nsecond ", at=1.0)
+    catalog.add_cast(cast, active=True)
+
+    assert search_index.index_cast(cast) == 1
+
+    writer.output(b"half\r\n", at=2.0)
+    writer.close()
+
+    assert search_index.index_cast(cast, final=True) == 1
+    assert [(h.time, h.at) for h in search_index.search("second half")] == [(1.0, 101.0)]
+    assert search_index.index_cast(cast) == 0
+
+
+def test_archive_indexed_after_startup_scan(catalog, search_index, tmp_path):
+    """Test text of casts found at startup is indexed, leaving casts being recorded open."""
+    done = write_cast(tmp_path / "2025-01-01_1200_host_@1_done.cast", ["finished output\r\n"])
+    live = write_cast(tmp_path / "2025-01-01_1200_host_@2_live.cast", ["still going\r\n"])
+    recording = Mock(active=True, cast_path=str(live), rolling_over=False, track_paths={})
+
+    with patch.object(search_monitor, "get_catalog", return_value=catalog), \
+            patch.object(search_monitor, "get_search_index", return_value=search_index), \
+            patch.dict(search_monitor.recorders, {"main:@2": recording}):
+        search_monitor.refresh_catalog()
+        asyncio.run(search_monitor.index_archive())
+
+    assert len(search_index.search("finished")) == 1
+    assert len(search_index.search("going")) == 1
+    with search_index.connect() as conn:
+        finished = dict(conn.execute("SELECT path, finished FROM text_casts").fetchall())
+    assert finished == {str(done): 1, str(live): 0}
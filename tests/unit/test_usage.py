@@ -0,0 +1,78 @@
+"""Tests for per-recording resource accounting."""
+import os
+import signal
+import subprocess
+
+import pytest
+
+from tvmux.cast.writer import WriteMeter
+from tvmux.models import Recording
+from tvmux.usage import recording_processes, recording_usage, usage_report
+
+
+@pytest.fixture
+def recording():
+    """An active recording whose casts have written something."""
+    recording = Recording(id="main:@1", session_id="main", window_id="@1")
+    recording.active = True
+    recording.meter = WriteMeter()
+    recording.meter.add(300, events=3)
+    return recording
+
+
+@pytest.fixture
+def stream(recording):
+    """A shell and its child standing in for tmux streaming a pane into the recording."""
+    fifo = recording.fifo_prefix() + "pane_%1.in.fifo"
+    proc = subprocess.Popen(["sh", "-c", f"{{ sleep 30; true; }} >> '{fifo}'"], start_new_session=True)
+    yield proc
+    os.killpg(proc.pid, signal.SIGKILL)
+    proc.wait()
+    os.unlink(fifo)
+
+
+def test_finds_stream_processes(recording, stream):
+    """Test the shell naming the recording's FIFO is found, with its children."""
+    other = Recording(id="main:@10", session_id="main", window_id="@10")
+
+    def found():
+        return recording_processes({recording.id: recording.fifo_prefix(), other.id: other.fifo_prefix()})
+
+    processes = found()
+    for _ in range(50):  # Until the shell has started its child
+        if len(processes[recording.id]) == 2:
+            break
+        subprocess.run(["sleep", "0.02"])
+        processes = found()
+
+    assert stream.pid in {process.pid for process in processes[recording.id]}
+    assert len(processes[recording.id]) == 2
+    assert processes[other.id] == []
+
+
+def test_recording_usage(recording, stream):
+    """Test a recording reports its processes and what its casts wrote."""
+    usage = recording_usage(recording)
+
+    assert usage.recording_id == "main:@1"
+    assert usage.processes >= 1
+    assert usage.rss_bytes > 0
+    assert (usage.cast_bytes, usage.events) == (300, 3)
+    assert usage.write_rate == 30.0
+
+
+def test_report_totals(recording):
+    """Test the report adds up active recordings only, and includes the server."""
+    second = Recording(id="main:@2", session_id="main", window_id="@2")
+    second.active = True
+    second.meter = WriteMeter()
+    second.meter.add(700, events=7)
+    stopped = Recording(id="main:@3", session_id="main", window_id="@3")
+
+    report = usage_report([recording, second, stopped])
+
+    assert [usage.recording_id for usage in report.recordings] == ["main:@1", "main:@2"]
+    assert (report.total.cast_bytes, report.total.events) == (1000, 10)
+    assert report.total.recording_id is None
+    assert report.server.processes == 1
+    assert report.server.rss_bytes > 0
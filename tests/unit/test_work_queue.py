@@ -0,0 +1,108 @@
+"""Tests for per-recording work queues and queued hook processing."""
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from tvmux.server.routers import hook
+from tvmux.server.work_queue import WorkQueues
+
+
+def test_work_runs_in_order():
+    """Test work on one queue runs one piece at a time, in order."""
+    order = []
+
+    def slow(name):
+        order.append(f"{name} start")
+        time.sleep(0.02)
+        order.append(f"{name} end")
+
+    async def quick(name):
+        order.append(name)
+
+    async def scenario():
+        queues = WorkQueues()
+        queues.submit("main:@1", slow, "a")
+        queues.submit("main:@1", quick, "b")
+        queues.submit("main:@1", slow, "c")
+        assert queues.depth("main:@1") == 4  # Three waiting, one worker
+        assert await queues.join(5.0)
+        assert queues.depth("main:@1") == 0
+
+    asyncio.run(scenario())
+
+    assert order == ["a start", "a end", "b", "c start", "c end"]
+
+
+def test_queues_run_concurrently():
+    """Test one window's work doesn't wait for another's."""
+    other_ran = threading.Event()
+
+    def waits_for_other():
+        return other_ran.wait(5.0)
+
+    async def scenario():
+        queues = WorkQueues()
+        first = queues.submit("main:@1", waits_for_other)
+        second = queues.submit("main:@2", other_ran.set)
+        await asyncio.wait_for(asyncio.gather(first, second), 5.0)
+        return first.result()
+
+    assert asyncio.run(scenario()) is True
+
+
+def test_failure_doesnt_stop_queue():
+    """Test a failure reaches whoever waits for it, and later work still runs."""
+    def fails():
+        raise RuntimeError("boom")
+
+    async def scenario():
+        queues = WorkQueues()
+        queues.submit("main:@1", fails)  # Nobody waits for this one
+        with pytest.raises(RuntimeError):
+            await queues.run("main:@1", fails)
+        return await queues.run("main:@1", lambda: "ok")
+
+    assert asyncio.run(scenario()) == "ok"
+
+
+def test_join_timeout():
+    """Test join gives up on work that runs too long."""
+    async def scenario():
+        queues = WorkQueues()
+        queues.submit("main:@1", asyncio.sleep, 1.0)
+        return await queues.join(0.05)
+
+    assert asyncio.run(scenario()) is False
+
+
+def test_hook_returns_before_processing():
+    """Test a hook is acknowledged at once and processed afterwards, in order per window."""
+    processed = []
+
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def process(event):
+            await gate.wait()
+            processed.append(event.pane_id)
+            return "pane_switched"
+
+        with patch.object(hook, "_process_hook_event", process):
+            responses = [
+                await asyncio.wait_for(hook.receive_hook(hook.HookEvent(
+                    hook_name="after-select-pane", session_name="main", window_id="@1", pane_id=pane_id,
+                )), 0.5)
+                for pane_id in ("%1", "%2", "%3")
+            ]
+            assert processed == []
+            gate.set()
+            assert await hook.work_queues.join(5.0)
+        return responses
+
+    responses = asyncio.run(scenario())
+
+    assert responses[0] == {"status": "queued", "queue": "main:@1"}
+    assert processed == ["%1", "%2", "%3"]